@@ -0,0 +1,148 @@
+"""ローソク足の mmap キャッシュ (列ごとの .npy)。
+
+保存済みのローソク足を <root>/<DURATION>/<code>/<行数>_<最新time>/<列>.npy に
+固定 dtype で書き出し、np.load(mmap_mode="r") で開く。ディレクトリ名が元データの
+(行数, 最新 time) を表すので、元データが変われば自動的に別のキャッシュになる。
+
+- 複数ワーカープロセスが同じファイルを mmap するため、ページキャッシュを共有し
+  プロセスごとに配列を持たない
+- 作成は一時ディレクトリへ書いてから rename するので、同時に作っても壊れない
+"""
+
+import logging
+import os
+import shutil
+import uuid
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, Optional, Tuple
+
+import numpy as np
+
+from app.data.candle_frame import OHLCV_FIELDS, CandleFrame
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_CACHE_SUBDIR = "candles_npy"
+
+CACHE_DTYPES: Dict[str, str] = {
+    "time": "datetime64[ns]",
+    "open": "float64",
+    "high": "float64",
+    "low": "float64",
+    "close": "float64",
+    "volume": "int64",
+}
+
+
+def configured_cache_dir() -> Path:
+    """settings.ini の [paths] cache_dir 配下(設定ファイルなしなら results/cache 配下)"""
+    try:
+        import settings
+
+        base = settings.cache_dir
+    except Exception:
+        base = "results/cache"
+    return Path(base) / DEFAULT_CACHE_SUBDIR
+
+
+def cache_version(rows: int, latest: Optional[datetime]) -> str:
+    """元データの (行数, 最新 time) からキャッシュのディレクトリ名を作る"""
+    stamp = int(np.datetime64(latest, "ns").astype(np.int64)) if latest is not None else 0
+    return f"{int(rows)}_{stamp}"
+
+
+class MmapCandleCache:
+    """CandleStore の内容を mmap 可能な .npy に派生キャッシュする
+
+    store は stats(code, duration) と load(code, duration) を持つもの
+    (TableCandleStore / UnifiedCandleStore / ParquetCandleStore)。
+    """
+
+    def __init__(self, store, root: Optional[Path] = None):
+        self.store = store
+        self.root = Path(root) if root is not None else configured_cache_dir()
+        self.hits = 0
+        self.misses = 0
+
+    def series_dir(self, product_code: str, duration: str) -> Path:
+        return self.root / duration.upper() / str(product_code).strip().replace("^", "IDX_")
+
+    def version_dir(self, product_code: str, duration: str) -> Tuple[Path, int]:
+        """元データの現在の状態に対応するキャッシュのパスと行数"""
+        rows, latest = self.store.stats(product_code, duration)
+        return self.series_dir(product_code, duration) / cache_version(rows, latest), rows
+
+    def load(self, product_code: str, duration: str) -> CandleFrame:
+        """
+        全期間を mmap した CandleFrame を返す(必要ならキャッシュを作り直す)
+
+        配列は読み取り専用の np.memmap で、スライスしてもコピーされない。
+        """
+        path, rows = self.version_dir(product_code, duration)
+        if rows == 0:
+            return CandleFrame.empty()
+
+        if not (path / "time.npy").exists():
+            self.misses += 1
+            self._build(product_code, duration, path)
+        else:
+            self.hits += 1
+        return _open_frame(path)
+
+    def load_since(self, product_code: str, duration: str, start: Optional[datetime]) -> CandleFrame:
+        """start 以降の足(ビューなのでコピーなし)"""
+        frame = self.load(product_code, duration)
+        if start is None or not frame:
+            return frame
+        return frame[int(np.searchsorted(frame.time, np.datetime64(start, "ns"))) :]
+
+    def _build(self, product_code: str, duration: str, path: Path) -> None:
+        frame = self.store.load(product_code, duration)
+        tmp = path.with_name(f".{path.name}.{os.getpid()}.{uuid.uuid4().hex[:8]}.tmp")
+        tmp.mkdir(parents=True, exist_ok=True)
+        try:
+            for name, dtype in CACHE_DTYPES.items():
+                np.save(tmp / f"{name}.npy", np.ascontiguousarray(getattr(frame, name), dtype=dtype))
+            try:
+                tmp.rename(path)
+            except OSError:
+                # 他のプロセスが先に作成済み(中身は同じ)
+                if not (path / "time.npy").exists():
+                    raise
+        finally:
+            if tmp.exists():
+                shutil.rmtree(tmp, ignore_errors=True)
+
+        self._remove_stale(path)
+        logger.info(f"action=mmap_cache_build code={product_code} duration={duration} rows={len(frame)} path={path}")
+
+    def _remove_stale(self, current: Path) -> None:
+        """
+        同じ系列の古い版を消す(mmap 中のプロセスがあっても POSIX では開いたまま読める)
+
+        他のプロセスが直前に作った新しい版を消さないよう、(最新 time, 行数) が current より
+        小さい版だけを消す。
+        """
+        current_key = _version_key(current.name)
+        if current_key is None:
+            return
+        for old in current.parent.iterdir():
+            if old == current or old.name.startswith("."):
+                continue
+            key = _version_key(old.name)
+            if key is not None and key < current_key:
+                shutil.rmtree(old, ignore_errors=True)
+
+
+def _version_key(name: str) -> Optional[Tuple[int, int]]:
+    """cache_version のディレクトリ名を (最新 time, 行数) にする(形式が違えば None)"""
+    rows, sep, stamp = name.partition("_")
+    if not sep or not rows.isdigit() or not stamp.lstrip("-").isdigit():
+        return None
+    return int(stamp), int(rows)
+
+
+def _open_frame(path: Path) -> CandleFrame:
+    columns = {name: np.load(path / f"{name}.npy", mmap_mode="r") for name in ("time", *OHLCV_FIELDS)}
+    return CandleFrame(**columns)
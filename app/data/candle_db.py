@@ -0,0 +1,316 @@
+"""ローソク足テーブルへの生SQLアクセス。
+
+ORM を経由せず、1銘柄分をまとめて1トランザクションで書き込む。
+銘柄・時間軸ごとの表 (CANDLE_<code>_<DURATION>) と、全銘柄を1つにまとめた
+candles 表 (series=(symbol, duration) を指定) の両方に対応する。
+"""
+
+import logging
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+from app.models.base import engine
+
+from app.data.candle_frame import CandleFrame
+
+logger = logging.getLogger(__name__)
+
+# テーブル定義の列順 (time, open, close, high, low, volume)
+CANDLE_COLUMNS = ("time", "open", "close", "high", "low", "volume")
+
+ON_CONFLICT_MODES = ("update", "ignore")
+
+# 統合レイアウト: candles(symbol, duration, time, ...) を (symbol, duration, time) で clustered 格納
+UNIFIED_TABLE = "candles"
+UNIFIED_SERIES_TABLE = "candle_series"
+SERIES_COLUMNS = ("symbol", "duration")
+
+_UNIFIED_SCHEMA = (
+    f"""
+    CREATE TABLE IF NOT EXISTS {UNIFIED_TABLE} (
+        symbol TEXT NOT NULL,
+        duration TEXT NOT NULL,
+        time DATETIME NOT NULL,
+        open FLOAT,
+        close FLOAT,
+        high FLOAT,
+        low FLOAT,
+        volume INTEGER,
+        PRIMARY KEY (symbol, duration, time)
+    ) WITHOUT ROWID
+    """,
+    # 銘柄一覧を candles 全体の走査なしで引くための登録表
+    f"""
+    CREATE TABLE IF NOT EXISTS {UNIFIED_SERIES_TABLE} (
+        symbol TEXT NOT NULL,
+        duration TEXT NOT NULL,
+        PRIMARY KEY (duration, symbol)
+    ) WITHOUT ROWID
+    """,
+)
+
+
+def candle_table_name(product_code: str, duration: str) -> str:
+    """銘柄コードと時間軸からローソク足テーブル名を作る(^ は IDX_ に変換)"""
+    code = str(product_code).strip().replace("^", "IDX_")
+    return f"CANDLE_{code}_{duration.upper()}"
+
+
+def parse_candle_table_name(table_name: str) -> Optional[Tuple[str, str]]:
+    """CANDLE_<code>_<DURATION> から (銘柄コード, 時間軸) を返す(IDX_ は ^ に戻す)"""
+    prefix = "CANDLE_"
+    if not table_name.startswith(prefix) or "_" not in table_name[len(prefix) :]:
+        return None
+    body, duration = table_name[len(prefix) :].rsplit("_", 1)
+    if not body or not duration:
+        return None
+    if body.startswith("IDX_"):
+        body = "^" + body[len("IDX_") :]
+    return body, duration.lower()
+
+
+def series_key(product_code: str, duration: str) -> Tuple[str, str]:
+    """統合レイアウトの (symbol, duration) キー"""
+    return str(product_code).strip(), duration.lower()
+
+
+def ensure_unified_tables(bind=None) -> None:
+    """統合レイアウトの candles / candle_series 表を作成する"""
+    bind = bind if bind is not None else engine
+    with bind.begin() as conn:
+        for sql in _UNIFIED_SCHEMA:
+            conn.exec_driver_sql(sql)
+
+
+def _series_where(series: Optional[Tuple[str, str]]) -> Tuple[str, tuple]:
+    if series is None:
+        return "", ()
+    return "symbol = ? AND duration = ? AND ", tuple(series)
+
+
+def format_db_times(times: np.ndarray) -> List[str]:
+    """datetime64 配列を SQLAlchemy(SQLite DATETIME) の保存形式の文字列に変換"""
+    if len(times) == 0:
+        return []
+    text = np.datetime_as_string(np.asarray(times, dtype="datetime64[us]"), unit="us")
+    return np.char.replace(text, "T", " ").tolist()
+
+
+def _upsert_sql(table_name: str, on_conflict: str, key_prefix: Tuple[str, ...] = ()) -> str:
+    all_columns = (*key_prefix, *CANDLE_COLUMNS)
+    columns = ", ".join(all_columns)
+    placeholders = ", ".join("?" for _ in all_columns)
+    conflict = ", ".join((*key_prefix, "time"))
+    sql = f'INSERT INTO "{table_name}" ({columns}) VALUES ({placeholders}) ON CONFLICT({conflict}) '
+    if on_conflict == "ignore":
+        return sql + "DO NOTHING"
+
+    values = [c for c in CANDLE_COLUMNS if c != "time"]
+    assignments = ", ".join(f"{c}=excluded.{c}" for c in values)
+    current = ", ".join(values)
+    incoming = ", ".join(f"excluded.{c}" for c in values)
+    # 値が変わらない行は更新しない(skipped として数える)
+    return sql + f"DO UPDATE SET {assignments} WHERE ({current}) IS NOT ({incoming})"
+
+
+def upsert_candle_frame(
+    table_name: str,
+    frame: CandleFrame,
+    on_conflict: str = "update",
+    bind=None,
+    series: Optional[Tuple[str, str]] = None,
+) -> Dict[str, int]:
+    """
+    CandleFrame をローソク足テーブルへ一括書き込み
+
+    Args:
+        table_name: 書き込み先テーブル名(作成済みであること)
+        frame: 書き込むローソク足
+        on_conflict: 既存 time と衝突した場合の動作
+            - 'update': 値が異なれば上書き
+            - 'ignore': 既存行を残す
+        bind: SQLAlchemy Engine(省略時は app.models.base.engine)
+        series: 統合レイアウト時の (symbol, duration)。指定時は行にキーを付けて書き込む
+
+    Returns:
+        {'inserted': 新規行数, 'updated': 上書き行数, 'skipped': 書き込まなかった行数}
+    """
+    if on_conflict not in ON_CONFLICT_MODES:
+        raise ValueError(f"unknown on_conflict: {on_conflict}")
+
+    stats = {"inserted": 0, "updated": 0, "skipped": 0}
+    if not frame:
+        return stats
+
+    times = format_db_times(frame.time)
+    key = tuple(series) if series is not None else ()
+    rows = list(
+        zip(
+            *([v] * len(times) for v in key),
+            times,
+            frame.open.tolist(),
+            frame.close.tolist(),
+            frame.high.tolist(),
+            frame.low.tolist(),
+            frame.volume.tolist(),
+            strict=True,
+        )
+    )
+
+    series_sql, series_params = _series_where(series)
+    bind = bind if bind is not None else engine
+    with bind.begin() as conn:
+        existing = conn.exec_driver_sql(
+            f'SELECT time FROM "{table_name}" WHERE {series_sql}time >= ? AND time <= ?',
+            (*series_params, min(times), max(times)),
+        ).fetchall()
+        existing_times = {str(t) for (t,) in existing}
+        unique_times = set(times)
+        new_count = len(unique_times - existing_times)
+
+        before = conn.exec_driver_sql("SELECT total_changes()").scalar()
+        conn.exec_driver_sql(_upsert_sql(table_name, on_conflict, SERIES_COLUMNS if series else ()), rows)
+        changed = conn.exec_driver_sql("SELECT total_changes()").scalar() - before
+        if series is not None and new_count:
+            conn.exec_driver_sql(
+                f"INSERT OR IGNORE INTO {UNIFIED_SERIES_TABLE} (symbol, duration) VALUES (?, ?)", series_params
+            )
+
+    stats["inserted"] = new_count
+    stats["updated"] = max(0, changed - new_count)
+    stats["skipped"] = len(rows) - stats["inserted"] - stats["updated"]
+
+    logger.info(
+        f"action=upsert_candle_frame table={table_name} inserted={stats['inserted']} "
+        f"updated={stats['updated']} skipped={stats['skipped']}"
+    )
+    return stats
+
+
+def latest_candle_time(table_name: str, bind=None, series: Optional[Tuple[str, str]] = None) -> Optional[datetime]:
+    """テーブルに保存済みの最新 time を返す(テーブルが無い・空なら None)"""
+    series_sql, series_params = _series_where(series)
+    bind = bind if bind is not None else engine
+    with bind.connect() as conn:
+        exists = conn.exec_driver_sql(
+            "SELECT 1 FROM sqlite_master WHERE type='table' AND name = ?", (table_name,)
+        ).fetchone()
+        if not exists:
+            return None
+        value = conn.exec_driver_sql(
+            f'SELECT MAX(time) FROM "{table_name}" WHERE {series_sql}1', series_params
+        ).scalar()
+
+    if value is None:
+        return None
+    if isinstance(value, datetime):
+        return value
+    return datetime.fromisoformat(str(value))
+
+
+def candle_series_stats(
+    table_name: str, bind=None, series: Optional[Tuple[str, str]] = None
+) -> Tuple[int, Optional[datetime]]:
+    """保存済みの (行数, 最新 time) を返す(テーブルが無い・空なら (0, None))。派生キャッシュの鮮度判定用"""
+    series_sql, series_params = _series_where(series)
+    bind = bind if bind is not None else engine
+    with bind.connect() as conn:
+        exists = conn.exec_driver_sql(
+            "SELECT 1 FROM sqlite_master WHERE type='table' AND name = ?", (table_name,)
+        ).fetchone()
+        if not exists:
+            return 0, None
+        count, value = conn.exec_driver_sql(
+            f'SELECT COUNT(*), MAX(time) FROM "{table_name}" WHERE {series_sql}1', series_params
+        ).fetchone()
+
+    if not count or value is None:
+        return 0, None
+    return int(count), value if isinstance(value, datetime) else datetime.fromisoformat(str(value))
+
+
+# SQLAlchemy の保存形式 'YYYY-MM-DD HH:MM:SS.ffffff' を epoch マイクロ秒の整数にする(壁時計時刻のまま)
+_TIME_US_SQL = "CAST(strftime('%s', time) AS INTEGER) * 1000000 + CAST(substr(time, 21, 6) AS INTEGER)"
+
+_ARRAY_DTYPE = np.dtype(
+    [("time", "<i8"), ("open", "<f8"), ("high", "<f8"), ("low", "<f8"), ("close", "<f8"), ("volume", "<i8")]
+)
+
+
+def load_candle_table_arrays(
+    table_name: str,
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None,
+    limit: Optional[int] = None,
+    bind=None,
+    series: Optional[Tuple[str, str]] = None,
+) -> Dict[str, np.ndarray]:
+    """
+    ローソク足テーブルを time 昇順の numpy 配列 (time/open/high/low/close/volume) で読み込む
+
+    1回の SELECT に期間・本数の条件を渡し、カーソルから np.fromiter で直接配列へ詰める
+    (1本ごとの Python オブジェクトは作らない)。time は datetime64[ns]。
+
+    Args:
+        table_name: 読み込むテーブル名(無ければ長さ0の配列)
+        start: この時刻以降(含む)
+        end: この時刻以前(含む)
+        limit: 指定時は条件内の最新 limit 本
+        bind: SQLAlchemy Engine(省略時は app.models.base.engine)
+        series: 統合レイアウト時の (symbol, duration)
+    """
+    where = []
+    params: list = []
+    if series is not None:
+        where.append("symbol = ? AND duration = ?")
+        params.extend(series)
+    if start is not None:
+        where.append("time >= ?")
+        params.append(format_db_times(np.array([start], dtype="datetime64[ns]"))[0])
+    if end is not None:
+        where.append("time <= ?")
+        params.append(format_db_times(np.array([end], dtype="datetime64[ns]"))[0])
+    where_sql = f" WHERE {' AND '.join(where)}" if where else ""
+    columns = f"{_TIME_US_SQL}, open, high, low, close, COALESCE(volume, 0)"
+
+    if limit is not None:
+        # 最新 limit 本を取り、昇順に並べ直す
+        sql = (
+            f'SELECT {columns} FROM (SELECT * FROM "{table_name}"{where_sql} '
+            f"ORDER BY time DESC LIMIT {int(limit)}) ORDER BY time"
+        )
+    else:
+        sql = f'SELECT {columns} FROM "{table_name}"{where_sql} ORDER BY time'
+
+    bind = bind if bind is not None else engine
+    records = np.empty(0, dtype=_ARRAY_DTYPE)
+    with bind.connect() as conn:
+        exists = conn.exec_driver_sql(
+            "SELECT 1 FROM sqlite_master WHERE type='table' AND name = ?", (table_name,)
+        ).fetchone()
+        if exists:
+            cursor = conn.connection.cursor()
+            try:
+                cursor.execute(sql, tuple(params))
+                records = np.fromiter(cursor, dtype=_ARRAY_DTYPE)
+            finally:
+                cursor.close()
+
+    arrays = {name: np.ascontiguousarray(records[name]) for name in _ARRAY_DTYPE.names}
+    arrays["time"] = arrays["time"].view("datetime64[us]").astype("datetime64[ns]")
+    return arrays
+
+
+def load_candle_frame(
+    table_name: str,
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None,
+    limit: Optional[int] = None,
+    bind=None,
+    series: Optional[Tuple[str, str]] = None,
+) -> CandleFrame:
+    """ローソク足テーブルを time 昇順で CandleFrame として読み込む(引数は load_candle_table_arrays と同じ)"""
+    return CandleFrame(
+        **load_candle_table_arrays(table_name, start=start, end=end, limit=limit, bind=bind, series=series)
+    )
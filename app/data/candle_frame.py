@@ -0,0 +1,176 @@
+"""列指向のローソク足コンテナ。
+
+yfinance の DataFrame から行ループなしで numpy 配列を切り出し、
+エンジンや DB 書き込みが配列のまま扱えるようにする。
+"""
+
+from typing import Dict, Iterator, List, Optional
+
+import numpy as np
+import pandas as pd
+
+OHLCV_FIELDS = ("open", "high", "low", "close", "volume")
+
+
+class CandleFrame:
+    """time/open/high/low/close/volume を numpy 配列で保持するローソク足集合
+
+    time は取引所ローカルの壁時計時刻 (tz なし datetime64[ns]) で保持し、
+    元のタイムゾーンは tz 属性に残す。DB の DATETIME 列と同じ表現になる。
+    """
+
+    __slots__ = ("_candles", "close", "high", "low", "open", "time", "tz", "volume")
+
+    def __init__(self, time, open, high, low, close, volume, tz: Optional[str] = None):
+        self.time = np.asarray(time, dtype="datetime64[ns]")
+        self.open = np.asarray(open, dtype=np.float64)
+        self.high = np.asarray(high, dtype=np.float64)
+        self.low = np.asarray(low, dtype=np.float64)
+        self.close = np.asarray(close, dtype=np.float64)
+        self.volume = np.asarray(volume, dtype=np.int64)
+        self.tz = tz
+        self._candles = None
+
+        n = len(self.time)
+        for name in OHLCV_FIELDS:
+            if len(getattr(self, name)) != n:
+                raise ValueError(f"column length mismatch: {name}")
+
+    @classmethod
+    def empty(cls) -> "CandleFrame":
+        return cls([], [], [], [], [], [])
+
+    @classmethod
+    def from_dataframe(cls, df: pd.DataFrame) -> "CandleFrame":
+        """yfinance 形式 (Open/High/Low/Close/Volume 列 + DatetimeIndex) から生成"""
+        if df is None or df.empty:
+            return cls.empty()
+
+        index = pd.DatetimeIndex(df.index)
+        tz = str(index.tz) if index.tz is not None else None
+        if tz is not None:
+            index = index.tz_localize(None)
+
+        return cls(
+            time=index.to_numpy(dtype="datetime64[ns]"),
+            open=df["Open"].to_numpy(dtype=np.float64),
+            high=df["High"].to_numpy(dtype=np.float64),
+            low=df["Low"].to_numpy(dtype=np.float64),
+            close=df["Close"].to_numpy(dtype=np.float64),
+            volume=df["Volume"].fillna(0).to_numpy(dtype=np.int64),
+            tz=tz,
+        )
+
+    @classmethod
+    def from_candles(cls, candles) -> "CandleFrame":
+        """time/open/high/low/close/volume 属性を持つオブジェクト列から生成"""
+        if isinstance(candles, CandleFrame):
+            return candles
+        candles = list(candles)
+        if not candles:
+            return cls.empty()
+
+        index = pd.DatetimeIndex([c.time for c in candles])
+        tz = str(index.tz) if index.tz is not None else None
+        if tz is not None:
+            index = index.tz_localize(None)
+
+        return cls(
+            time=index.to_numpy(dtype="datetime64[ns]"),
+            open=[c.open for c in candles],
+            high=[c.high for c in candles],
+            low=[c.low for c in candles],
+            close=[c.close for c in candles],
+            volume=[c.volume for c in candles],
+            tz=tz,
+        )
+
+    def __len__(self) -> int:
+        return len(self.time)
+
+    def __bool__(self) -> bool:
+        return len(self.time) > 0
+
+    def __iter__(self) -> Iterator:
+        return iter(self.candles)
+
+    def __getitem__(self, key):
+        if isinstance(key, slice):
+            return CandleFrame(
+                self.time[key],
+                self.open[key],
+                self.high[key],
+                self.low[key],
+                self.close[key],
+                self.volume[key],
+                tz=self.tz,
+            )
+        return self.candles[key]
+
+    def __repr__(self) -> str:
+        return f"CandleFrame(len={len(self)}, tz={self.tz})"
+
+    def python_times(self) -> List:
+        """time 列を datetime のリストで返す (tz があれば付与)"""
+        index = pd.DatetimeIndex(self.time)
+        if self.tz is not None:
+            index = index.tz_localize(self.tz)
+        return list(index.to_pydatetime())
+
+    @property
+    def candles(self) -> List:
+        """旧来の YahooFinanceCandle リスト表現 (初回アクセス時に一度だけ生成)"""
+        if self._candles is None:
+            from app.data.yahoo import YahooFinanceCandle
+
+            self._candles = [
+                YahooFinanceCandle(time=t, open=o, high=h, low=lo, close=c, volume=v)
+                for t, o, h, lo, c, v in zip(
+                    self.python_times(),
+                    self.open.tolist(),
+                    self.high.tolist(),
+                    self.low.tolist(),
+                    self.close.tolist(),
+                    self.volume.tolist(),
+                    strict=True,
+                )
+            ]
+        return self._candles
+
+    def arrays(self) -> Dict[str, np.ndarray]:
+        """列配列をコピーせずに辞書で返す"""
+        return {
+            "time": self.time,
+            "open": self.open,
+            "high": self.high,
+            "low": self.low,
+            "close": self.close,
+            "volume": self.volume,
+        }
+
+    def context_arrays(self) -> Dict[str, np.ndarray]:
+        """StrategyContext のコンストラクタ引数名に合わせた配列 (コピーなし)"""
+        return {
+            "times": self.time,
+            "opens": self.open,
+            "highs": self.high,
+            "lows": self.low,
+            "closes": self.close,
+            "volumes": self.volume,
+        }
+
+    def to_dataframe(self) -> pd.DataFrame:
+        """time/open/high/low/close/volume 列の DataFrame に変換 (tz があれば付与)"""
+        time = pd.DatetimeIndex(self.time)
+        if self.tz is not None:
+            time = time.tz_localize(self.tz)
+        return pd.DataFrame(
+            {
+                "time": time,
+                "open": self.open,
+                "high": self.high,
+                "low": self.low,
+                "close": self.close,
+                "volume": self.volume,
+            }
+        )
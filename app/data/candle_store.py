@@ -0,0 +1,373 @@
+"""ローソク足の保存レイアウトの切り替え。
+
+- tables : 銘柄・時間軸ごとの CANDLE_<code>_<DURATION> 表(従来どおり factory_candle_class で作成)
+- unified: candles(symbol, duration, time, ...) の1表(WITHOUT ROWID, 主キー順に clustered)
+- parquet: 銘柄・時間軸・年ごとの Parquet ファイル(app.data.parquet_store, pyarrow が必要)
+- archive: 銘柄・時間軸・年ごとの圧縮アーカイブ(app.data.tick_archive, 価格は呼値単位の int32)
+
+settings.ini の [db] layout で選択し、どちらも同じメソッドで読み書きできる。
+[db] cold_archive_dir を指定すると、古い履歴をそのアーカイブから補って読む (TieredCandleStore)。
+"""
+
+import logging
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+from app.models.base import engine
+
+from app.data.candle_db import (
+    UNIFIED_SERIES_TABLE,
+    UNIFIED_TABLE,
+    candle_series_stats,
+    candle_table_name,
+    ensure_unified_tables,
+    latest_candle_time,
+    load_candle_frame,
+    load_candle_table_arrays,
+    parse_candle_table_name,
+    series_key,
+    upsert_candle_frame,
+)
+from app.data.candle_frame import CandleFrame
+
+logger = logging.getLogger(__name__)
+
+CANDLE_LAYOUTS = ("tables", "unified", "parquet", "archive")
+
+DEFAULT_PARQUET_DIR = "results/candles"
+DEFAULT_ARCHIVE_DIR = "results/candles_archive"
+
+
+class TableCandleStore:
+    """銘柄・時間軸ごとの表に保存する(従来レイアウト)"""
+
+    layout = "tables"
+
+    def __init__(self, bind=None):
+        self.bind = bind
+
+    def table_name(self, product_code: str, duration: str) -> Optional[str]:
+        """書き込み先の表を用意して名前を返す(未知の時間軸なら None)"""
+        from app.models.candle import factory_candle_class
+
+        candle_cls = factory_candle_class(product_code, duration)
+        return candle_cls.__tablename__ if candle_cls is not None else None
+
+    def upsert(
+        self, product_code: str, duration: str, frame: CandleFrame, on_conflict: str = "update"
+    ) -> Dict[str, int]:
+        table_name = self.table_name(product_code, duration)
+        if table_name is None:
+            raise ValueError(f"unknown duration: {duration}")
+        return upsert_candle_frame(table_name, frame, on_conflict=on_conflict, bind=self.bind)
+
+    def latest_time(self, product_code: str, duration: str) -> Optional[datetime]:
+        return latest_candle_time(candle_table_name(product_code, duration), bind=self.bind)
+
+    def stats(self, product_code: str, duration: str) -> Tuple[int, Optional[datetime]]:
+        """(行数, 最新 time)。派生キャッシュの無効化キーに使う"""
+        return candle_series_stats(candle_table_name(product_code, duration), bind=self.bind)
+
+    def load(
+        self,
+        product_code: str,
+        duration: str,
+        start: Optional[datetime] = None,
+        end: Optional[datetime] = None,
+        limit: Optional[int] = None,
+    ) -> CandleFrame:
+        return load_candle_frame(
+            candle_table_name(product_code, duration), start=start, end=end, limit=limit, bind=self.bind
+        )
+
+    def load_arrays(
+        self,
+        product_code: str,
+        duration: str,
+        start: Optional[datetime] = None,
+        end: Optional[datetime] = None,
+        limit: Optional[int] = None,
+    ) -> Dict[str, np.ndarray]:
+        return load_candle_table_arrays(
+            candle_table_name(product_code, duration), start=start, end=end, limit=limit, bind=self.bind
+        )
+
+    def list_codes(self, duration: str) -> List[str]:
+        """保存済みの銘柄コード一覧(sqlite_master から表名を解析)"""
+        bind = self.bind if self.bind is not None else engine
+        with bind.connect() as conn:
+            rows = conn.exec_driver_sql(
+                "SELECT name FROM sqlite_master WHERE type='table' AND name LIKE ? ORDER BY name",
+                (f"CANDLE_%_{duration.upper()}",),
+            ).fetchall()
+
+        codes: List[str] = []
+        for (name,) in rows:
+            parsed = parse_candle_table_name(str(name))
+            if parsed and parsed[1] == duration.lower():
+                codes.append(parsed[0])
+        return list(dict.fromkeys(codes))
+
+
+class UnifiedCandleStore:
+    """全銘柄を candles 表1つに保存する(表の作成は書き込み時のみ。読み込みは読み取り専用エンジンでも可)"""
+
+    layout = "unified"
+
+    def __init__(self, bind=None):
+        self.bind = bind
+        self._ready = False
+
+    def _ensure(self) -> None:
+        if not self._ready:
+            ensure_unified_tables(self.bind)
+            self._ready = True
+
+    def upsert(
+        self, product_code: str, duration: str, frame: CandleFrame, on_conflict: str = "update"
+    ) -> Dict[str, int]:
+        self._ensure()
+        return upsert_candle_frame(
+            UNIFIED_TABLE, frame, on_conflict=on_conflict, bind=self.bind, series=series_key(product_code, duration)
+        )
+
+    def latest_time(self, product_code: str, duration: str) -> Optional[datetime]:
+        return latest_candle_time(UNIFIED_TABLE, bind=self.bind, series=series_key(product_code, duration))
+
+    def stats(self, product_code: str, duration: str) -> Tuple[int, Optional[datetime]]:
+        return candle_series_stats(UNIFIED_TABLE, bind=self.bind, series=series_key(product_code, duration))
+
+    def load(
+        self,
+        product_code: str,
+        duration: str,
+        start: Optional[datetime] = None,
+        end: Optional[datetime] = None,
+        limit: Optional[int] = None,
+    ) -> CandleFrame:
+        return load_candle_frame(
+            UNIFIED_TABLE,
+            start=start,
+            end=end,
+            limit=limit,
+            bind=self.bind,
+            series=series_key(product_code, duration),
+        )
+
+    def load_arrays(
+        self,
+        product_code: str,
+        duration: str,
+        start: Optional[datetime] = None,
+        end: Optional[datetime] = None,
+        limit: Optional[int] = None,
+    ) -> Dict[str, np.ndarray]:
+        return load_candle_table_arrays(
+            UNIFIED_TABLE,
+            start=start,
+            end=end,
+            limit=limit,
+            bind=self.bind,
+            series=series_key(product_code, duration),
+        )
+
+    def list_codes(self, duration: str) -> List[str]:
+        bind = self.bind if self.bind is not None else engine
+        with bind.connect() as conn:
+            exists = conn.exec_driver_sql(
+                "SELECT 1 FROM sqlite_master WHERE type='table' AND name = ?", (UNIFIED_SERIES_TABLE,)
+            ).fetchone()
+            if not exists:
+                return []
+            rows = conn.exec_driver_sql(
+                f"SELECT symbol FROM {UNIFIED_SERIES_TABLE} WHERE duration = ? ORDER BY symbol", (duration.lower(),)
+            ).fetchall()
+        return [str(symbol) for (symbol,) in rows]
+
+
+def configured_layout() -> str:
+    """settings.ini の [db] layout(未設定・設定ファイルなしなら 'tables')"""
+    try:
+        import settings
+    except Exception:
+        return "tables"
+    return getattr(settings, "db_layout", "tables")
+
+
+def configured_parquet_dir() -> Path:
+    """settings.ini の [db] parquet_dir(未設定なら results/candles)"""
+    try:
+        import settings
+    except Exception:
+        return Path(DEFAULT_PARQUET_DIR)
+    return Path(getattr(settings, "db_parquet_dir", DEFAULT_PARQUET_DIR))
+
+
+def configured_archive() -> Tuple[Path, str]:
+    """settings.ini の [db] archive_dir と archive_codec(未設定なら results/candles_archive, zlib)"""
+    try:
+        import settings
+    except Exception:
+        return Path(DEFAULT_ARCHIVE_DIR), "zlib"
+    return Path(getattr(settings, "db_archive_dir", DEFAULT_ARCHIVE_DIR)), getattr(settings, "db_archive_codec", "zlib")
+
+
+def configured_cold_archive_dir() -> Optional[Path]:
+    """settings.ini の [db] cold_archive_dir(未設定・空なら None)"""
+    try:
+        import settings
+    except Exception:
+        return None
+    value = getattr(settings, "db_cold_archive_dir", "")
+    return Path(value) if value else None
+
+
+def get_candle_store(
+    layout: Optional[str] = None,
+    bind=None,
+    parquet_dir: Optional[Path] = None,
+    archive_dir: Optional[Path] = None,
+    archive_codec: Optional[str] = None,
+    cold_archive_dir: Optional[Path] = None,
+):
+    """
+    レイアウト名からストアを返す(省略時は settings.ini の設定)
+
+    cold_archive_dir(省略時は [db] cold_archive_dir)があれば、レイアウトのストアを hot、
+    そのディレクトリの ArchiveCandleStore を cold とする TieredCandleStore を返す。
+    """
+    store = _layout_store(layout or configured_layout(), bind, parquet_dir, archive_dir, archive_codec)
+    cold_dir = cold_archive_dir if cold_archive_dir is not None else configured_cold_archive_dir()
+    if cold_dir is None:
+        return store
+    from app.data.tick_archive import ArchiveCandleStore, TieredCandleStore
+
+    return TieredCandleStore(store, ArchiveCandleStore(cold_dir, codec=archive_codec or configured_archive()[1]))
+
+
+def _layout_store(layout: str, bind, parquet_dir: Optional[Path], archive_dir: Optional[Path], archive_codec):
+    if layout == "parquet":
+        from app.data.parquet_store import ParquetCandleStore
+
+        return ParquetCandleStore(parquet_dir if parquet_dir is not None else configured_parquet_dir())
+    if layout == "archive":
+        from app.data.tick_archive import ArchiveCandleStore
+
+        default_dir, default_codec = configured_archive()
+        return ArchiveCandleStore(
+            archive_dir if archive_dir is not None else default_dir, codec=archive_codec or default_codec
+        )
+    if layout == "unified":
+        return UnifiedCandleStore(bind=bind)
+    if layout == "tables":
+        return TableCandleStore(bind=bind)
+    raise ValueError(f"unknown candle layout: {layout} (choices: {', '.join(CANDLE_LAYOUTS)})")
+
+
+def load_candle_arrays(
+    product_code: str,
+    duration: str,
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None,
+    limit: Optional[int] = None,
+    store=None,
+) -> Dict[str, np.ndarray]:
+    """
+    保存済みのローソク足を numpy 配列 (time/open/high/low/close/volume) で返す
+
+    期間・本数の条件は1回の SELECT(parquet は行グループの絞り込み)に渡す。
+    store 省略時は settings.ini の [db] layout のストアを読み取り専用接続で使う。
+    """
+    if store is None:
+        from app.data.sqlite_engine import get_read_engine
+
+        store = get_candle_store(bind=get_read_engine())
+    return store.load_arrays(product_code, duration, start=start, end=end, limit=limit)
+
+
+def migrate_tables_to_unified(
+    bind=None, durations: Optional[List[str]] = None, drop_source: bool = False, progress=None
+) -> Dict[str, int]:
+    """
+    CANDLE_<code>_<DURATION> 表の行を candles 表へ SQL だけで一括移行する
+
+    Args:
+        bind: SQLAlchemy Engine(省略時は app.models.base.engine)
+        durations: 移行する時間軸(省略時は全て)
+        drop_source: True なら移行した元の表を削除する
+        progress: progress(table_name, rows) を表ごとに呼ぶ(任意)
+
+    Returns:
+        {'tables': 移行した表の数, 'rows': 移行した行数}
+    """
+    bind = bind if bind is not None else engine
+    ensure_unified_tables(bind)
+    wanted = {d.lower() for d in durations} if durations else None
+
+    with bind.connect() as conn:
+        names = [
+            str(name)
+            for (name,) in conn.exec_driver_sql(
+                "SELECT name FROM sqlite_master WHERE type='table' AND name LIKE 'CANDLE\\_%' ESCAPE '\\' ORDER BY name"
+            )
+        ]
+
+    stats = {"tables": 0, "rows": 0}
+    for table_name in names:
+        parsed = parse_candle_table_name(table_name)
+        if parsed is None or (wanted is not None and parsed[1] not in wanted):
+            continue
+        symbol, duration = parsed
+
+        # 1表ごとに1トランザクション(途中で止めても再実行で続きから移行できる)
+        with bind.begin() as conn:
+            rows = conn.exec_driver_sql(
+                f"""
+                INSERT INTO {UNIFIED_TABLE} (symbol, duration, time, open, close, high, low, volume)
+                SELECT ?, ?, time, open, close, high, low, volume FROM "{table_name}" WHERE true
+                ON CONFLICT(symbol, duration, time) DO UPDATE SET
+                    open=excluded.open, close=excluded.close, high=excluded.high,
+                    low=excluded.low, volume=excluded.volume
+                """,
+                (symbol, duration),
+            ).rowcount
+            conn.exec_driver_sql(
+                f"INSERT OR IGNORE INTO {UNIFIED_SERIES_TABLE} (symbol, duration) VALUES (?, ?)", (symbol, duration)
+            )
+            if drop_source:
+                conn.exec_driver_sql(f'DROP TABLE "{table_name}"')
+
+        stats["tables"] += 1
+        stats["rows"] += max(0, rows)
+        if progress is not None:
+            progress(table_name, rows)
+
+    logger.info(f"action=migrate_tables_to_unified tables={stats['tables']} rows={stats['rows']}")
+    return stats
+
+
+def copy_candle_store(src, dst, durations: List[str], progress=None) -> Dict[str, int]:
+    """
+    ストア間で全銘柄のローソク足をコピーする(例: tables -> parquet)
+
+    系列ごとに load -> upsert するため、再実行しても差分だけが書き込まれる。
+
+    Returns:
+        {'series': コピーした系列数, 'rows': 追加・更新した行数}
+    """
+    stats = {"series": 0, "rows": 0}
+    for duration in durations:
+        for code in src.list_codes(duration):
+            result = dst.upsert(code, duration, src.load(code, duration))
+            rows = result["inserted"] + result["updated"]
+            stats["series"] += 1
+            stats["rows"] += rows
+            if progress is not None:
+                progress(f"{code}_{duration.upper()}", rows)
+
+    logger.info(
+        f"action=copy_candle_store src={src.layout} dst={dst.layout} series={stats['series']} rows={stats['rows']}"
+    )
+    return stats
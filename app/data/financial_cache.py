@@ -0,0 +1,246 @@
+"""財務諸表キャッシュテーブル (financial_cache) へのアクセス。
+
+取得は複数スレッド、書き込みは専用の1スレッドがまとめてコミットする。
+財務表の JSON は任意で zlib 圧縮した BLOB として保存できる。
+"""
+
+import json
+import logging
+import queue
+import sqlite3
+import threading
+import zlib
+from pathlib import Path
+from typing import Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+
+import pandas as pd
+import yfinance as yf
+
+from app.data.sqlite_engine import apply_pragmas, configured_pragmas
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_CACHE_DB = Path(__file__).resolve().parents[2] / "stockdata.sql"
+
+# fetch_financial_row が1銘柄で送るリクエスト数 (info / financials / balance_sheet / cashflow)
+FINANCIAL_REQUESTS_PER_ROW = 4
+
+FINANCIAL_CACHE_COLUMNS = (
+    "symbol",
+    "updated_at",
+    "info_json",
+    "financials_json",
+    "balance_sheet_json",
+    "cashflow_json",
+)
+
+FinancialRow = Tuple[str, str, object, object, object, object]
+
+_UPSERT_SQL = """
+    INSERT INTO financial_cache (
+        symbol, updated_at, info_json, financials_json, balance_sheet_json, cashflow_json
+    ) VALUES (?, ?, ?, ?, ?, ?)
+    ON CONFLICT(symbol) DO UPDATE SET
+        updated_at=excluded.updated_at,
+        info_json=excluded.info_json,
+        financials_json=excluded.financials_json,
+        balance_sheet_json=excluded.balance_sheet_json,
+        cashflow_json=excluded.cashflow_json
+"""
+
+
+def ensure_financial_cache_table(db_path: Path) -> None:
+    """financial_cache テーブルと updated_at の索引を作成する"""
+    db_path = Path(db_path)
+    db_path.parent.mkdir(parents=True, exist_ok=True)
+    with sqlite3.connect(db_path) as con:
+        con.execute(
+            """
+            CREATE TABLE IF NOT EXISTS financial_cache (
+                symbol TEXT PRIMARY KEY,
+                updated_at TEXT NOT NULL,
+                info_json TEXT NOT NULL,
+                financials_json TEXT NOT NULL,
+                balance_sheet_json TEXT NOT NULL,
+                cashflow_json TEXT NOT NULL
+            )
+            """
+        )
+        con.execute("CREATE INDEX IF NOT EXISTS idx_financial_cache_updated_at ON financial_cache(updated_at)")
+
+
+def df_to_json(df: Optional[pd.DataFrame]) -> str:
+    if df is None:
+        return ""
+    try:
+        return df.to_json(orient="split", date_format="iso")
+    except Exception:
+        return ""
+
+
+def encode_payload(text: str, compress: bool = False):
+    """JSON 文字列を保存形式にする(compress=True なら zlib 圧縮 BLOB)"""
+    if not compress or not text:
+        return text
+    return zlib.compress(text.encode("utf-8"), 6)
+
+
+def decode_payload(value) -> str:
+    """encode_payload で保存した値を JSON 文字列に戻す(圧縮・非圧縮どちらも可)"""
+    if value is None:
+        return ""
+    if isinstance(value, (bytes, bytearray, memoryview)):
+        return zlib.decompress(bytes(value)).decode("utf-8")
+    return str(value)
+
+
+def utc_now_iso() -> str:
+    return pd.Timestamp.now(tz="UTC").isoformat()
+
+
+def fetch_financial_row(
+    symbol: str, compress: bool = False, ticker_factory: Callable = yf.Ticker, limiter=None
+) -> FinancialRow:
+    """
+    yfinance から1銘柄の info / 財務諸表を取得して financial_cache の1行にする
+
+    Ticker の属性ごとに Yahoo へ1回ずつ、計 FINANCIAL_REQUESTS_PER_ROW 回リクエストする。
+    limiter (TokenBucket) を渡すとリクエストごとにトークンを1つ取得する。
+    """
+    ticker = ticker_factory(symbol)
+
+    def request(name: str):
+        if limiter is not None:
+            limiter.acquire()
+        return getattr(ticker, name)
+
+    info = request("info") or {}
+    return (
+        symbol,
+        utc_now_iso(),
+        encode_payload(json.dumps(info, ensure_ascii=False, default=str), compress),
+        encode_payload(df_to_json(request("financials")), compress),
+        encode_payload(df_to_json(request("balance_sheet")), compress),
+        encode_payload(df_to_json(request("cashflow")), compress),
+    )
+
+
+def upsert_financial_rows(con: sqlite3.Connection, rows: Sequence[FinancialRow]) -> None:
+    """financial_cache へ複数行を upsert する(コミットは呼び出し側)"""
+    con.executemany(_UPSERT_SQL, rows)
+
+
+def stale_symbols(
+    db_path: Path, symbols: Iterable[str], max_age_days: float, now: Optional[pd.Timestamp] = None
+) -> List[str]:
+    """
+    未取得または updated_at が max_age_days より古い銘柄を元の順序で返す
+
+    updated_at の索引を使って「新しい行」だけを読むため、キャッシュ全体は走査しない。
+    """
+    now = now if now is not None else pd.Timestamp.now(tz="UTC")
+    cutoff = (now - pd.Timedelta(days=float(max_age_days))).isoformat()
+    with sqlite3.connect(db_path) as con:
+        fresh = {
+            symbol for (symbol,) in con.execute("SELECT symbol FROM financial_cache WHERE updated_at >= ?", (cutoff,))
+        }
+    return [s for s in symbols if s not in fresh]
+
+
+def load_financial_cache_row(db_path: Path, symbol: str) -> Optional[Dict[str, str]]:
+    """1銘柄分のキャッシュを列名 -> JSON 文字列(展開済み)の辞書で返す"""
+    with sqlite3.connect(db_path) as con:
+        row = con.execute(
+            f"SELECT {', '.join(FINANCIAL_CACHE_COLUMNS)} FROM financial_cache WHERE symbol = ?", (symbol,)
+        ).fetchone()
+    if row is None:
+        return None
+    out = dict(zip(FINANCIAL_CACHE_COLUMNS, row, strict=True))
+    for col in FINANCIAL_CACHE_COLUMNS[2:]:
+        out[col] = decode_payload(out[col])
+    return out
+
+
+_STOP = object()
+
+
+class FinancialCacheWriter:
+    """financial_cache への書き込みを1スレッドに集約し、まとめてコミットする
+
+    - put() はキューに積むだけで、取得スレッドは SQLite のロックを待たない
+    - batch_size 件たまるか flush_interval 秒経過でコミット
+    - コミット後に on_commit(コミットした銘柄リスト) を書き込みスレッドから呼ぶ
+    """
+
+    def __init__(
+        self,
+        db_path: Path,
+        batch_size: int = 50,
+        flush_interval: float = 2.0,
+        on_commit: Optional[Callable[[List[str]], None]] = None,
+    ):
+        self.db_path = Path(db_path)
+        self.batch_size = max(1, int(batch_size))
+        self.flush_interval = max(0.01, float(flush_interval))
+        self.on_commit = on_commit
+        self.written = 0
+        self.commits = 0
+        self._queue: queue.Queue = queue.Queue()
+        self._error: Optional[BaseException] = None
+        self._thread = threading.Thread(target=self._run, name="financial-cache-writer", daemon=True)
+        self._thread.start()
+
+    def __enter__(self) -> "FinancialCacheWriter":
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        self.close()
+
+    def put(self, row: FinancialRow) -> None:
+        if self._error is not None:
+            raise RuntimeError(f"financial cache writer stopped: {self._error}") from self._error
+        self._queue.put(row)
+
+    def close(self) -> None:
+        """残りを書き込んでスレッドを終了する(書き込み中の例外があれば送出)"""
+        if self._thread.is_alive():
+            self._queue.put(_STOP)
+            self._thread.join()
+        if self._error is not None:
+            raise self._error
+
+    def _run(self) -> None:
+        pending: List[FinancialRow] = []
+        try:
+            con = sqlite3.connect(self.db_path)
+            apply_pragmas(con, configured_pragmas())
+            try:
+                while True:
+                    try:
+                        item = self._queue.get(timeout=self.flush_interval)
+                    except queue.Empty:
+                        self._flush(con, pending)
+                        continue
+                    if item is _STOP:
+                        self._flush(con, pending)
+                        return
+                    pending.append(item)
+                    if len(pending) >= self.batch_size:
+                        self._flush(con, pending)
+            finally:
+                con.close()
+        except BaseException as e:
+            logger.error(f"action=financial_cache_writer error={e!s}")
+            self._error = e
+
+    def _flush(self, con: sqlite3.Connection, pending: List[FinancialRow]) -> None:
+        if not pending:
+            return
+        with con:
+            upsert_financial_rows(con, pending)
+        self.written += len(pending)
+        self.commits += 1
+        symbols = [row[0] for row in pending]
+        pending.clear()
+        if self.on_commit is not None:
+            self.on_commit(symbols)
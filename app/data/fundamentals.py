@@ -0,0 +1,288 @@
+"""financial_cache から展開した正規化ファンダメンタルズ表。
+
+JSON の塊を銘柄横断で読まなくて済むように、数値項目を
+fundamentals(symbol, period, statement, item, value) の縦持ち表へ展開する。
+文字列項目(社名・セクター・業種)は fundamentals_profile に置く。
+financial_cache の updated_at が変わった銘柄だけを差分で作り直す。
+"""
+
+import json
+import logging
+import math
+import sqlite3
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+import pandas as pd
+
+from app.data.financial_cache import decode_payload
+
+logger = logging.getLogger(__name__)
+
+# info_json 由来の行の period
+LATEST_PERIOD = "latest"
+
+STATEMENT_COLUMNS = {
+    "financials": "financials_json",
+    "balance_sheet": "balance_sheet_json",
+    "cashflow": "cashflow_json",
+}
+
+PROFILE_FIELDS = {
+    "name": ("longName", "shortName"),
+    "sector": ("sector",),
+    "industry": ("industry",),
+    "currency": ("currency", "financialCurrency"),
+}
+
+FundamentalRow = Tuple[str, str, str, str, float]
+
+_SCHEMA = (
+    """
+    CREATE TABLE IF NOT EXISTS fundamentals (
+        symbol TEXT NOT NULL,
+        period TEXT NOT NULL,
+        statement TEXT NOT NULL,
+        item TEXT NOT NULL,
+        value REAL NOT NULL,
+        PRIMARY KEY (symbol, period, statement, item)
+    ) WITHOUT ROWID
+    """,
+    # 銘柄横断(同一項目・同一期)の検索用
+    "CREATE INDEX IF NOT EXISTS idx_fundamentals_item_period ON fundamentals(item, period, value)",
+    """
+    CREATE TABLE IF NOT EXISTS fundamentals_profile (
+        symbol TEXT PRIMARY KEY,
+        name TEXT NOT NULL,
+        sector TEXT NOT NULL,
+        industry TEXT NOT NULL,
+        currency TEXT NOT NULL
+    )
+    """,
+    "CREATE INDEX IF NOT EXISTS idx_fundamentals_profile_industry ON fundamentals_profile(industry)",
+    "CREATE INDEX IF NOT EXISTS idx_fundamentals_profile_sector ON fundamentals_profile(sector)",
+    """
+    CREATE TABLE IF NOT EXISTS fundamentals_sync (
+        symbol TEXT PRIMARY KEY,
+        source_updated_at TEXT NOT NULL
+    )
+    """,
+)
+
+
+def ensure_fundamentals_tables(con: sqlite3.Connection) -> None:
+    for sql in _SCHEMA:
+        con.execute(sql)
+
+
+def _to_float(value) -> Optional[float]:
+    if value is None or isinstance(value, bool):
+        return None
+    try:
+        out = float(value)
+    except (TypeError, ValueError):
+        return None
+    return out if math.isfinite(out) else None
+
+
+def extract_info_rows(symbol: str, info: dict) -> List[FundamentalRow]:
+    """info の数値項目を period='latest', statement='info' の行にする"""
+    rows: List[FundamentalRow] = []
+    for key, raw in info.items():
+        value = _to_float(raw)
+        if value is not None:
+            rows.append((symbol, LATEST_PERIOD, "info", str(key), value))
+    return rows
+
+
+def extract_statement_rows(symbol: str, statement: str, text: str) -> List[FundamentalRow]:
+    """to_json(orient='split') の財務表を (期, 項目) ごとの行にする"""
+    if not text:
+        return []
+    payload = json.loads(text)
+    columns = payload.get("columns") or []
+    periods = [str(c)[:10] for c in columns]
+
+    rows: List[FundamentalRow] = []
+    for item, values in zip(payload.get("index") or [], payload.get("data") or [], strict=True):
+        for period, raw in zip(periods, values, strict=True):
+            value = _to_float(raw)
+            if value is not None:
+                rows.append((symbol, period, statement, str(item), value))
+    return rows
+
+
+def extract_profile(symbol: str, info: dict) -> Tuple[str, str, str, str, str]:
+    def _pick(keys: Sequence[str]) -> str:
+        for key in keys:
+            if info.get(key):
+                return str(info[key])
+        return ""
+
+    return (symbol, *(_pick(keys) for keys in PROFILE_FIELDS.values()))
+
+
+def extract_cache_row(row: dict) -> Tuple[List[FundamentalRow], Tuple[str, str, str, str, str]]:
+    """financial_cache の1行(列名 -> 値)を fundamentals 行とプロフィールに展開する"""
+    symbol = row["symbol"]
+    info_text = decode_payload(row.get("info_json"))
+    try:
+        info = json.loads(info_text) if info_text else {}
+    except ValueError as e:
+        logger.warning(f"action=extract_fundamentals symbol={symbol} statement=info error={e!s}")
+        info = {}
+    if not isinstance(info, dict):
+        info = {}
+
+    rows = extract_info_rows(symbol, info)
+    for statement, column in STATEMENT_COLUMNS.items():
+        try:
+            rows.extend(extract_statement_rows(symbol, statement, decode_payload(row.get(column))))
+        except Exception as e:
+            logger.warning(f"action=extract_fundamentals symbol={symbol} statement={statement} error={e!s}")
+    return rows, extract_profile(symbol, info)
+
+
+def sync_fundamentals(db_path: Path, full: bool = False, batch_size: int = 200) -> Dict[str, int]:
+    """
+    financial_cache の変更分だけ fundamentals を作り直す
+
+    Args:
+        db_path: financial_cache を含む SQLite ファイル(同じファイルに表を作る)
+        full: True なら全銘柄を作り直す
+        batch_size: 1トランザクションで処理する銘柄数
+
+    Returns:
+        {'rebuilt': 作り直した銘柄数, 'removed': 削除した銘柄数, 'rows': 書き込んだ行数}
+    """
+    stats = {"rebuilt": 0, "removed": 0, "rows": 0}
+    with sqlite3.connect(db_path) as con:
+        ensure_fundamentals_tables(con)
+        if full:
+            con.execute("DELETE FROM fundamentals_sync")
+
+        changed = [
+            symbol
+            for (symbol,) in con.execute(
+                """
+                SELECT c.symbol FROM financial_cache AS c
+                LEFT JOIN fundamentals_sync AS s ON s.symbol = c.symbol
+                WHERE s.source_updated_at IS NULL OR s.source_updated_at <> c.updated_at
+                ORDER BY c.symbol
+                """
+            )
+        ]
+        removed = [
+            symbol
+            for (symbol,) in con.execute(
+                "SELECT symbol FROM fundamentals_sync WHERE symbol NOT IN (SELECT symbol FROM financial_cache)"
+            )
+        ]
+
+        for symbol in removed:
+            _delete_symbol(con, symbol)
+            con.execute("DELETE FROM fundamentals_sync WHERE symbol = ?", (symbol,))
+        stats["removed"] = len(removed)
+
+        columns = ["symbol", "updated_at", *STATEMENT_COLUMNS.values(), "info_json"]
+        for start in range(0, len(changed), max(1, int(batch_size))):
+            chunk = changed[start : start + max(1, int(batch_size))]
+            placeholders = ", ".join("?" for _ in chunk)
+            cache_rows = con.execute(
+                f"SELECT {', '.join(columns)} FROM financial_cache WHERE symbol IN ({placeholders})", chunk
+            ).fetchall()
+            for values in cache_rows:
+                row = dict(zip(columns, values, strict=True))
+                fundamentals, profile = extract_cache_row(row)
+                _delete_symbol(con, row["symbol"])
+                con.executemany(
+                    "INSERT OR REPLACE INTO fundamentals (symbol, period, statement, item, value) VALUES (?, ?, ?, ?, ?)",
+                    fundamentals,
+                )
+                con.execute("INSERT OR REPLACE INTO fundamentals_profile VALUES (?, ?, ?, ?, ?)", profile)
+                con.execute(
+                    "INSERT OR REPLACE INTO fundamentals_sync (symbol, source_updated_at) VALUES (?, ?)",
+                    (row["symbol"], row["updated_at"]),
+                )
+                stats["rows"] += len(fundamentals)
+            con.commit()
+            stats["rebuilt"] += len(cache_rows)
+
+    logger.info(f"action=sync_fundamentals rebuilt={stats['rebuilt']} removed={stats['removed']} rows={stats['rows']}")
+    return stats
+
+
+def _delete_symbol(con: sqlite3.Connection, symbol: str) -> None:
+    con.execute("DELETE FROM fundamentals WHERE symbol = ?", (symbol,))
+    con.execute("DELETE FROM fundamentals_profile WHERE symbol = ?", (symbol,))
+
+
+def has_fundamentals(db_path: Path) -> bool:
+    """fundamentals 表が作成済みか"""
+    if not Path(db_path).exists():
+        return False
+    with sqlite3.connect(db_path) as con:
+        return (
+            con.execute("SELECT 1 FROM sqlite_master WHERE type='table' AND name='fundamentals'").fetchone() is not None
+        )
+
+
+def latest_snapshot(
+    db_path: Path,
+    items: Iterable[str],
+    statement: str = "info",
+    period: str = LATEST_PERIOD,
+    symbols: Optional[Iterable[str]] = None,
+) -> pd.DataFrame:
+    """
+    指定項目を1銘柄1行の横持ちで返す(プロフィール列付き)
+
+    例: latest_snapshot(db, ['trailingPE', 'returnOnEquity']) で PER/ROE の一覧
+    symbols を渡すとその銘柄だけに絞る(主キーの先頭列なので索引で引ける)。
+    """
+    items = list(items)
+    pivots = ", ".join(f'MAX(CASE WHEN f.item = ? THEN f.value END) AS "{item}"' for item in items)
+    placeholders = ", ".join("?" for _ in items)
+    params = [*items, statement, period, *items]
+    symbol_filter = ""
+    if symbols is not None:
+        symbols = list(dict.fromkeys(symbols))
+        symbol_filter = f"AND f.symbol IN ({', '.join('?' for _ in symbols)})"
+        params.extend(symbols)
+    sql = f"""
+        SELECT f.symbol, p.name, p.sector, p.industry, {pivots}
+        FROM fundamentals AS f
+        LEFT JOIN fundamentals_profile AS p ON p.symbol = f.symbol
+        WHERE f.statement = ? AND f.period = ? AND f.item IN ({placeholders}) {symbol_filter}
+        GROUP BY f.symbol
+        ORDER BY f.symbol
+    """
+    with sqlite3.connect(db_path) as con:
+        return pd.read_sql_query(sql, con, params=params)
+
+
+def group_averages(
+    db_path: Path, items: Iterable[str], industry: Optional[str] = None, sector: Optional[str] = None
+) -> Dict[str, Tuple[float, int]]:
+    """
+    業種(またはセクター)内の info 項目の平均値と銘柄数を返す
+
+    Returns:
+        {item: (平均値, 銘柄数)}(該当なしの項目は含まない)
+    """
+    items = list(items)
+    if not items or (not industry and not sector):
+        return {}
+
+    column, key = ("industry", industry) if industry else ("sector", sector)
+    placeholders = ", ".join("?" for _ in items)
+    sql = f"""
+        SELECT f.item, AVG(f.value), COUNT(*)
+        FROM fundamentals_profile AS p
+        JOIN fundamentals AS f ON f.symbol = p.symbol
+        WHERE p.{column} = ? AND f.statement = 'info' AND f.period = ? AND f.item IN ({placeholders})
+        GROUP BY f.item
+    """
+    with sqlite3.connect(db_path) as con:
+        rows = con.execute(sql, [key, LATEST_PERIOD, *items]).fetchall()
+    return {item: (float(avg), int(count)) for item, avg, count in rows}
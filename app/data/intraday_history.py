@@ -0,0 +1,218 @@
+"""日中足の長期履歴を取得上限内の区間に分けて取得し、つなぎ合わせる。
+
+Yahoo Finance の日中足は「1リクエストの期間」と「遡れる日数」に上限がある
+(1m: 1回7日・過去30日、5m など: 過去60日、1h: 過去730日)。毎日実行して
+遡れる範囲のうち未取得の区間だけを上限内の区間に分けて取得し、保存済みの
+履歴を途切れなく伸ばす。
+
+取得済みの区間は candle_coverage 表 (symbol, duration, start, end) に銘柄・時間軸ごとに
+記録する。当日分は取引中に取得すると未完成のため、取得済みとは記録せず次回も取り直す
+(重なった足は upsert で上書きされる)。取得結果が空の区間は、取引日が無い(休日だけの)
+場合のみ記録し、取得失敗による空は次回取り直す。
+"""
+
+import logging
+from datetime import datetime, timedelta
+from typing import Callable, Dict, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+from app.models.base import engine
+
+from app.data.candle_db import format_db_times, series_key
+from app.data.candle_frame import CandleFrame
+from app.data.trading_calendar import get_calendar
+
+logger = logging.getLogger(__name__)
+
+COVERAGE_TABLE = "candle_coverage"
+
+# interval ごとの (1リクエストの最大日数, 遡れる日数)。境界の取りこぼしを避けるため上限より1日短くする
+INTRADAY_LIMITS: Dict[str, Tuple[int, int]] = {
+    "1m": (7, 29),
+    "2m": (59, 59),
+    "5m": (59, 59),
+    "15m": (59, 59),
+    "30m": (59, 59),
+    "90m": (59, 59),
+    "1h": (729, 729),
+}
+
+Interval = Tuple[datetime, datetime]
+
+
+def jst_now() -> datetime:
+    """東証の壁時計時刻 (tz なし)。CandleFrame の time と同じ表現"""
+    return pd.Timestamp.now(tz="Asia/Tokyo").tz_localize(None).to_pydatetime()
+
+
+def ensure_coverage_table(bind=None) -> None:
+    bind = bind if bind is not None else engine
+    with bind.begin() as conn:
+        conn.exec_driver_sql(
+            f"""
+            CREATE TABLE IF NOT EXISTS {COVERAGE_TABLE} (
+                symbol TEXT NOT NULL,
+                duration TEXT NOT NULL,
+                start DATETIME NOT NULL,
+                "end" DATETIME NOT NULL,
+                PRIMARY KEY (symbol, duration, start)
+            ) WITHOUT ROWID
+            """
+        )
+
+
+def _to_datetime(value) -> datetime:
+    return value if isinstance(value, datetime) else datetime.fromisoformat(str(value))
+
+
+def load_coverage(product_code: str, duration: str, bind=None) -> List[Interval]:
+    """取得済み区間 [start, end) を開始時刻順で返す"""
+    bind = bind if bind is not None else engine
+    with bind.connect() as conn:
+        rows = conn.exec_driver_sql(
+            f'SELECT start, "end" FROM {COVERAGE_TABLE} WHERE symbol = ? AND duration = ? ORDER BY start',
+            series_key(product_code, duration),
+        ).fetchall()
+    return [(_to_datetime(s), _to_datetime(e)) for s, e in rows]
+
+
+def merge_intervals(intervals: List[Interval]) -> List[Interval]:
+    """重なる・接する区間をまとめる"""
+    merged: List[Interval] = []
+    for start, end in sorted(i for i in intervals if i[1] > i[0]):
+        if merged and start <= merged[-1][1]:
+            merged[-1] = (merged[-1][0], max(merged[-1][1], end))
+        else:
+            merged.append((start, end))
+    return merged
+
+
+def add_coverage(product_code: str, duration: str, start: datetime, end: datetime, bind=None) -> List[Interval]:
+    """取得済み区間を追加して、まとめ直した区間一覧を保存・返却する"""
+    if end <= start:
+        return load_coverage(product_code, duration, bind=bind)
+    bind = bind if bind is not None else engine
+    key = series_key(product_code, duration)
+    merged = merge_intervals([*load_coverage(product_code, duration, bind=bind), (start, end)])
+    with bind.begin() as conn:
+        conn.exec_driver_sql(f"DELETE FROM {COVERAGE_TABLE} WHERE symbol = ? AND duration = ?", key)
+        starts = format_db_times(np.array([s for s, _ in merged], dtype="datetime64[ns]"))
+        ends = format_db_times(np.array([e for _, e in merged], dtype="datetime64[ns]"))
+        conn.exec_driver_sql(
+            f'INSERT INTO {COVERAGE_TABLE} (symbol, duration, start, "end") VALUES (?, ?, ?, ?)',
+            [(*key, s, e) for s, e in zip(starts, ends, strict=True)],
+        )
+    return merged
+
+
+def has_trading_days(start: datetime, end: datetime) -> bool:
+    """[start, end) に東証の取引日があるか"""
+    last_day = end - timedelta(microseconds=1)
+    return len(get_calendar().trading_days_between(start, last_day)) > 0
+
+
+def missing_windows(covered: List[Interval], start: datetime, end: datetime, window_days: int) -> List[Interval]:
+    """[start, end) のうち covered に含まれない部分を window_days 以内の区間に分けて返す"""
+    gaps: List[Interval] = []
+    cursor = start
+    for c_start, c_end in merge_intervals(covered):
+        if c_end <= cursor:
+            continue
+        if c_start >= end:
+            break
+        if c_start > cursor:
+            gaps.append((cursor, c_start))
+        cursor = max(cursor, c_end)
+    if cursor < end:
+        gaps.append((cursor, end))
+
+    step = timedelta(days=int(window_days))
+    windows: List[Interval] = []
+    for g_start, g_end in gaps:
+        w_start = g_start
+        while w_start < g_end:
+            w_end = min(w_start + step, g_end)
+            windows.append((w_start, w_end))
+            w_start = w_end
+    return windows
+
+
+def stitch_intraday_history(
+    product_code: str,
+    duration: str = "1m",
+    market: str = "T",
+    store=None,
+    bind=None,
+    fetch_window: Optional[Callable[[str, datetime, datetime, str, str], CandleFrame]] = None,
+    now: Optional[datetime] = None,
+    raise_errors: bool = False,
+    limiter=None,
+) -> Dict[str, int]:
+    """
+    遡れる範囲のうち未取得の区間だけを取得して保存し、取得済み区間を記録する
+
+    Args:
+        product_code: 銘柄コード
+        duration: 時間軸(INTRADAY_LIMITS のキー)
+        market: 市場サフィックス
+        store: 保存先の CandleStore(省略時は settings.ini の [db] layout)
+        bind: candle_coverage 表の SQLAlchemy Engine(省略時は app.models.base.engine)
+        fetch_window: fetch_window(code, start, end, duration, market) -> CandleFrame(省略時は Yahoo Finance)
+        now: 現在時刻(東証の壁時計時刻。テスト用)
+        raise_errors: True なら取得時の例外を送出する(呼び出し側で再試行する場合)
+        limiter: 区間を取得するたびに1トークン取る TokenBucket(1区間 = 1リクエスト)
+
+    Returns:
+        {'windows': 取得した区間数, 'saved': 追加・更新した足の数, 'gap_days': 遡れず欠けた日数}
+    """
+    if duration not in INTRADAY_LIMITS:
+        raise ValueError(f"unsupported intraday duration: {duration} (choices: {', '.join(INTRADAY_LIMITS)})")
+    if store is None:
+        from app.data.candle_store import get_candle_store
+
+        store = get_candle_store()
+    if fetch_window is None:
+        from app.data.yahoo import fetch_yahoo_window
+
+        def fetch_window(code, start, end, dur, mkt):
+            return fetch_yahoo_window(code, start, end, dur, mkt, raise_errors=raise_errors)
+
+    ensure_coverage_table(bind)
+    window_days, lookback_days = INTRADAY_LIMITS[duration]
+    now = now if now is not None else jst_now()
+    today = datetime(now.year, now.month, now.day)
+    earliest = today - timedelta(days=lookback_days)
+    end = today + timedelta(days=1)
+
+    covered = load_coverage(product_code, duration, bind=bind)
+    gap_days = 0
+    if covered and covered[-1][1] < earliest:
+        # 前回から遡れる日数以上あいた分は取り戻せない
+        gap_days = (earliest - covered[-1][1]).days
+        logger.warning(
+            f"action=stitch_intraday_history warning=unrecoverable_gap code={product_code} "
+            f"duration={duration} from={covered[-1][1]} to={earliest}"
+        )
+
+    stats = {"windows": 0, "saved": 0, "gap_days": gap_days}
+    for w_start, w_end in missing_windows(covered, earliest, end, window_days):
+        if limiter is not None:
+            limiter.acquire()
+        frame = fetch_window(product_code, w_start, w_end, duration, market)
+        stats["windows"] += 1
+        # 当日分は未完成の可能性があるため記録しない
+        covered_end = min(w_end, today)
+        if frame:
+            result = store.upsert(product_code, duration, frame)
+            stats["saved"] += result["inserted"] + result["updated"]
+            add_coverage(product_code, duration, w_start, covered_end, bind=bind)
+        elif covered_end > w_start and not has_trading_days(w_start, covered_end):
+            # 取引日が無い区間(休日)は空でも記録して再取得しない。取得失敗の空は次回取り直す
+            add_coverage(product_code, duration, w_start, covered_end, bind=bind)
+
+    logger.info(
+        f"action=stitch_intraday_history code={product_code} duration={duration} windows={stats['windows']} "
+        f"saved={stats['saved']} gap_days={gap_days}"
+    )
+    return stats
@@ -0,0 +1,396 @@
+"""複数銘柄を 銘柄 × 時刻 の2次元配列にそろえるパネル。
+
+銘柄ごとに時刻の異なる CandleFrame を共通の時刻軸に並べ、各列 (open/high/low/close/volume)
+を (銘柄数, 時刻数) の float64 配列として持つ。相関・順位・相対強度のような銘柄横断の
+計算が numpy の1回の演算になる。
+
+時刻軸は次の2種類:
+- union: 全銘柄の足の時刻の和集合
+- calendar: app.data.trading_calendar の立会時間内の全ての足の枠(取引のない枠も列になる)
+
+欠けた足は fill="ffill" なら直前の終値で埋め (volume は 0)、fill="nan" なら NaN のまま。
+各銘柄の足 -> 列番号の対応 (alignment map) も保持し、PanelCache はパネル全体を
+<root>/<DURATION>/<銘柄・期間のハッシュ>/<元データの版>.npz に保存する。
+"""
+
+import hashlib
+import json
+import logging
+import os
+import uuid
+import warnings
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional
+
+import numpy as np
+import pandas as pd
+
+from app.data.candle_frame import OHLCV_FIELDS, CandleFrame
+from app.data.trading_calendar import TradingCalendar, duration_to_timedelta, get_calendar
+
+logger = logging.getLogger(__name__)
+
+PANEL_FIELDS = OHLCV_FIELDS
+FILL_POLICIES = ("ffill", "nan")
+INDEX_MODES = ("union", "calendar")
+DEFAULT_PANEL_SUBDIR = "panels"
+
+_DAY = np.timedelta64(86400 * 10**9, "ns")
+
+
+class Panel:
+    """銘柄 × 時刻の価格配列
+
+    codes: 行の銘柄コード
+    time: 列の時刻 (datetime64[ns])
+    fields: {'open'|'high'|'low'|'close'|'volume': (銘柄数, 時刻数) の float64 配列}
+    present: 元データに足があった位置 (bool の2次元配列。埋めた位置は False)
+    positions: {銘柄: 元の各足の列番号 (時刻軸の外なら -1)}
+    """
+
+    def __init__(
+        self,
+        codes: List[str],
+        time: np.ndarray,
+        fields: Dict[str, np.ndarray],
+        present: np.ndarray,
+        positions: Optional[Dict[str, np.ndarray]] = None,
+        fill: str = "ffill",
+    ):
+        self.codes = list(codes)
+        self.time = np.asarray(time, dtype="datetime64[ns]")
+        self.fields = fields
+        self.present = np.asarray(present, dtype=bool)
+        self.positions = positions or {}
+        self.fill = fill
+        self._rows = {code: i for i, code in enumerate(self.codes)}
+
+        shape = (len(self.codes), len(self.time))
+        for name, values in fields.items():
+            if values.shape != shape:
+                raise ValueError(f"panel field shape mismatch: {name} {values.shape} != {shape}")
+
+    @property
+    def shape(self):
+        return len(self.codes), len(self.time)
+
+    def __len__(self) -> int:
+        return len(self.time)
+
+    def __getitem__(self, field: str) -> np.ndarray:
+        return self.fields[field]
+
+    def __repr__(self) -> str:
+        return f"Panel(codes={len(self.codes)}, bars={len(self.time)}, fill={self.fill})"
+
+    @property
+    def close(self) -> np.ndarray:
+        return self.fields["close"]
+
+    def row(self, product_code: str, field: str = "close") -> np.ndarray:
+        """1銘柄分の列(コピーなし)"""
+        return self.fields[field][self._rows[str(product_code)]]
+
+    def first_common_index(self, field: str = "close") -> int:
+        """全銘柄の値がそろう最初の列番号(無ければ -1)"""
+        complete = np.isfinite(self.fields[field]).all(axis=0)
+        hits = np.flatnonzero(complete)
+        return int(hits[0]) if len(hits) else -1
+
+    def normalized(self, field: str = "close", base: Optional[int] = None) -> np.ndarray:
+        """base 列 (省略時は全銘柄がそろう最初の列) を 100 とした値"""
+        base = self.first_common_index(field) if base is None else base
+        values = self.fields[field]
+        if base < 0:
+            return np.full_like(values, np.nan)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            return values / values[:, base : base + 1] * 100.0
+
+    def returns(self, field: str = "close", log: bool = False) -> np.ndarray:
+        """列方向の変化率(先頭列は NaN)"""
+        values = self.fields[field]
+        out = np.full_like(values, np.nan)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            if log:
+                out[:, 1:] = np.diff(np.log(values), axis=1)
+            else:
+                out[:, 1:] = values[:, 1:] / values[:, :-1] - 1.0
+        return out
+
+    def correlation(self, field: str = "close") -> np.ndarray:
+        """全銘柄の変化率がそろう時刻だけを使った相関行列 (銘柄数, 銘柄数)"""
+        rets = self.returns(field)
+        rets = rets[:, np.isfinite(rets).all(axis=0)]
+        n = len(self.codes)
+        if rets.shape[1] < 2:
+            return np.full((n, n), np.nan)
+        return np.atleast_2d(np.corrcoef(rets))
+
+    def ranks(self, values: Optional[np.ndarray] = None, field: str = "close", ascending: bool = True) -> np.ndarray:
+        """時刻ごとの銘柄間の順位 (1 始まり、NaN は NaN)。values 省略時は field の値"""
+        values = self.fields[field] if values is None else np.asarray(values, dtype=np.float64)
+        keyed = values if ascending else -values
+        order = np.argsort(keyed, axis=0, kind="stable")  # NaN は末尾
+        ranks = np.empty_like(values)
+        np.put_along_axis(ranks, order, np.arange(1, len(values) + 1, dtype=np.float64)[:, None], axis=0)
+        ranks[np.isnan(values)] = np.nan
+        return ranks
+
+    def relative_strength(self, benchmark: Optional[str] = None, field: str = "close") -> np.ndarray:
+        """基準化した値を benchmark 銘柄 (省略時は全銘柄の平均) で割った相対強度"""
+        norm = self.normalized(field)
+        if benchmark is not None:
+            reference = norm[self._rows[str(benchmark)]]
+        else:
+            # 全銘柄 NaN の列で出る "Mean of empty slice" は無視する
+            with warnings.catch_warnings():
+                warnings.simplefilter("ignore", category=RuntimeWarning)
+                reference = np.nanmean(norm, axis=0)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            return norm / reference
+
+    def to_dataframe(self, field: str = "close", values: Optional[np.ndarray] = None) -> pd.DataFrame:
+        """time を index、銘柄を列にした DataFrame"""
+        data = self.fields[field] if values is None else values
+        return pd.DataFrame(data.T, index=pd.DatetimeIndex(self.time, name="time"), columns=self.codes)
+
+
+def union_index(frames: Iterable[CandleFrame]) -> np.ndarray:
+    """全銘柄の足の時刻の和集合(昇順)"""
+    times = [frame.time for frame in frames if frame]
+    if not times:
+        return np.array([], dtype="datetime64[ns]")
+    return np.unique(np.concatenate(times))
+
+
+def calendar_index(start, end, duration: str, calendar: Optional[TradingCalendar] = None) -> np.ndarray:
+    """[start, end] の取引日の立会時間内の全ての足の開始時刻(1d は取引日の 0:00)"""
+    calendar = calendar if calendar is not None else get_calendar()
+    step = duration_to_timedelta(duration)
+    if step >= _DAY:
+        return calendar.trading_days_between(start, end).astype("datetime64[ns]")
+    return calendar.slot_start_times(start, end, step)
+
+
+def alignment_map(
+    times: np.ndarray,
+    index: np.ndarray,
+    index_mode: str = "union",
+    duration: Optional[str] = None,
+    calendar: Optional[TradingCalendar] = None,
+) -> np.ndarray:
+    """
+    1銘柄の各足が index の何列目に入るか(入らなければ -1)
+
+    union は時刻の完全一致、calendar は足が属する立会時間内の枠
+    (引けちょうどの足なども直前の枠)で対応付ける。
+    """
+    times = np.asarray(times, dtype="datetime64[ns]")
+    if len(index) == 0 or len(times) == 0:
+        return np.full(len(times), -1, dtype=np.int64)
+
+    if index_mode == "calendar":
+        calendar = calendar if calendar is not None else get_calendar()
+        step = duration_to_timedelta(duration)
+        if step >= _DAY:
+            bars, first = calendar.day_index(times), calendar.day_index(index[:1])[0]
+        else:
+            bars, first = calendar.bar_index(times, step), calendar.bar_index(index[:1], step)[0]
+        cols = bars - first
+        return np.where((bars >= 0) & (cols >= 0) & (cols < len(index)), cols, -1).astype(np.int64)
+
+    cols = np.searchsorted(index, times)
+    clipped = np.minimum(cols, len(index) - 1)
+    return np.where(index[clipped] == times, clipped, -1).astype(np.int64)
+
+
+def _forward_fill(values: np.ndarray, present: np.ndarray) -> np.ndarray:
+    """行ごとに present の位置の値を右へ伸ばす(最初の足より前は NaN のまま)"""
+    cols = np.where(present, np.arange(values.shape[1]), -1)
+    np.maximum.accumulate(cols, axis=1, out=cols)
+    filled = np.take_along_axis(values, np.maximum(cols, 0), axis=1)
+    filled[cols < 0] = np.nan
+    return filled
+
+
+def build_panel(
+    frames: Dict[str, CandleFrame],
+    fill: str = "ffill",
+    index_mode: str = "union",
+    duration: Optional[str] = None,
+    start=None,
+    end=None,
+    calendar: Optional[TradingCalendar] = None,
+) -> Panel:
+    """
+    銘柄ごとの CandleFrame をそろえた Panel を作る
+
+    Args:
+        frames: {銘柄コード: CandleFrame}(足のない銘柄は行に含めない)
+        fill: 'ffill'(直前の終値で埋める。volume は 0)/ 'nan'
+        index_mode: 'union' / 'calendar'(calendar は duration が必要)
+        duration: 時間軸('1m' / '1h' / '1d' など)
+        start, end: calendar の時刻軸の範囲(省略時は全銘柄の最初と最後の足)
+    """
+    if fill not in FILL_POLICIES:
+        raise ValueError(f"unknown fill policy: {fill} (choices: {', '.join(FILL_POLICIES)})")
+    if index_mode not in INDEX_MODES:
+        raise ValueError(f"unknown index mode: {index_mode} (choices: {', '.join(INDEX_MODES)})")
+    if index_mode == "calendar" and duration is None:
+        raise ValueError("duration is required for the calendar index")
+
+    frames = {str(code): frame for code, frame in frames.items() if frame}
+    codes = list(frames)
+    if index_mode == "calendar" and codes:
+        start = start if start is not None else min(frame.time[0] for frame in frames.values())
+        end = end if end is not None else max(frame.time[-1] for frame in frames.values())
+        index = calendar_index(start, end, duration, calendar)
+    else:
+        index = union_index(frames.values())
+
+    shape = (len(codes), len(index))
+    fields = {name: np.full(shape, np.nan) for name in PANEL_FIELDS}
+    present = np.zeros(shape, dtype=bool)
+    positions: Dict[str, np.ndarray] = {}
+    for row, code in enumerate(codes):
+        frame = frames[code]
+        cols = alignment_map(frame.time, index, index_mode, duration, calendar)
+        positions[code] = cols
+        keep = cols >= 0
+        # 同じ枠に複数の足がある場合は後の足で上書きされる(時刻順なので最後の足が残る)
+        for name in PANEL_FIELDS:
+            fields[name][row, cols[keep]] = getattr(frame, name)[keep]
+        present[row, cols[keep]] = True
+
+    if fill == "ffill" and codes:
+        close = _forward_fill(fields["close"], present)
+        for name in ("open", "high", "low"):
+            fields[name] = np.where(present, fields[name], close)
+        fields["close"] = close
+        fields["volume"] = np.where(present, fields["volume"], 0.0)
+
+    return Panel(codes, index, fields, present, positions, fill=fill)
+
+
+def configured_panel_dir() -> Path:
+    """settings.ini の [paths] cache_dir 配下(設定ファイルなしなら results/cache 配下)"""
+    try:
+        import settings
+
+        base = settings.cache_dir
+    except Exception:
+        base = "results/cache"
+    return Path(base) / DEFAULT_PANEL_SUBDIR
+
+
+def _digest(payload) -> str:
+    return hashlib.sha1(json.dumps(payload, default=str, sort_keys=True).encode("utf-8")).hexdigest()[:16]
+
+
+class PanelCache:
+    """CandleStore から作った Panel を銘柄・期間ごとに .npz で保存する
+
+    キーは (銘柄一覧, 時間軸, 期間, fill, 時刻軸) のハッシュ、版は各銘柄の
+    (行数, 最新 time) のハッシュ。元データが更新されれば作り直し、古い版は消す。
+    store は stats(code, duration) と load(code, duration, start=, end=) を持つもの。
+    """
+
+    def __init__(self, store, root: Optional[Path] = None, calendar: Optional[TradingCalendar] = None):
+        self.store = store
+        self.root = Path(root) if root is not None else configured_panel_dir()
+        self.calendar = calendar
+        self.hits = 0
+        self.misses = 0
+
+    def path_for(
+        self,
+        codes: List[str],
+        duration: str,
+        start: Optional[datetime] = None,
+        end: Optional[datetime] = None,
+        fill: str = "ffill",
+        index_mode: str = "union",
+    ) -> Path:
+        universe = _digest([list(map(str, codes)), duration, start, end, fill, index_mode])
+        version = _digest([self.store.stats(code, duration) for code in codes])
+        return self.root / duration.upper() / universe / f"{version}.npz"
+
+    def load(
+        self,
+        codes: List[str],
+        duration: str,
+        start: Optional[datetime] = None,
+        end: Optional[datetime] = None,
+        fill: str = "ffill",
+        index_mode: str = "union",
+    ) -> Panel:
+        """保存済みのパネルを読む(元データが変わっていれば作り直す)"""
+        codes = [str(code) for code in codes]
+        path = self.path_for(codes, duration, start, end, fill, index_mode)
+        if path.exists():
+            self.hits += 1
+            return _read_panel(path)
+
+        self.misses += 1
+        frames = {code: self.store.load(code, duration, start=start, end=end) for code in codes}
+        panel = build_panel(
+            frames, fill=fill, index_mode=index_mode, duration=duration, start=start, end=end, calendar=self.calendar
+        )
+        _write_panel(panel, path)
+        for old in path.parent.iterdir():
+            if old != path and not old.name.startswith("."):
+                old.unlink(missing_ok=True)
+        logger.info(
+            f"action=panel_cache_build duration={duration} codes={len(codes)} loaded={len(panel.codes)} "
+            f"bars={len(panel.time)} path={path}"
+        )
+        return panel
+
+
+def _write_panel(panel: Panel, path: Path) -> None:
+    path.parent.mkdir(parents=True, exist_ok=True)
+    arrays = {f"field_{name}": values for name, values in panel.fields.items()}
+    arrays.update({f"pos_{i}": panel.positions[code] for i, code in enumerate(panel.codes)})
+    tmp = path.with_name(f".{path.stem}.{os.getpid()}.{uuid.uuid4().hex[:8]}.tmp.npz")
+    try:
+        np.savez(
+            tmp,
+            codes=np.array(panel.codes, dtype=str),
+            time=panel.time,
+            present=panel.present,
+            fill=np.array(panel.fill),
+            **arrays,
+        )
+        tmp.replace(path)
+    finally:
+        tmp.unlink(missing_ok=True)
+
+
+def _read_panel(path: Path) -> Panel:
+    with np.load(path) as data:
+        codes = [str(code) for code in data["codes"]]
+        fields = {name: data[f"field_{name}"] for name in PANEL_FIELDS}
+        positions = {code: data[f"pos_{i}"] for i, code in enumerate(codes)}
+        return Panel(codes, data["time"], fields, data["present"], positions, fill=str(data["fill"]))
+
+
+def load_panel(
+    codes: List[str],
+    duration: str,
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None,
+    fill: str = "ffill",
+    index_mode: str = "union",
+    store=None,
+    cache: bool = True,
+) -> Panel:
+    """設定のストア (settings.ini の [db] layout) から Panel を作る(cache=True ならディスクキャッシュを使う)"""
+    if store is None:
+        from app.data.candle_store import get_candle_store
+
+        store = get_candle_store()
+    if cache:
+        return PanelCache(store).load(codes, duration, start=start, end=end, fill=fill, index_mode=index_mode)
+    frames = {str(code): store.load(str(code), duration, start=start, end=end) for code in codes}
+    return build_panel(frames, fill=fill, index_mode=index_mode, duration=duration, start=start, end=end)
@@ -0,0 +1,215 @@
+"""ローソク足の列指向ストア (Parquet, 年ごとのパーティション)。
+
+<root>/<DURATION>/<code>/<YYYY>.parquet に1年分ずつ保存する。読み込みは期間に
+かかる年のファイルだけを開き、time 列の条件を pyarrow に渡して行グループ単位で
+絞り込むため、長期の分足でも必要な範囲だけを numpy 配列で取り出せる。
+
+pyarrow が必要(未インストールなら使用時に ImportError)。
+"""
+
+import logging
+import os
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+from app.data.candle_frame import OHLCV_FIELDS, CandleFrame
+from app.data.year_partition import code_dir_name, code_from_dir_name, concat_frames, merge_frames, partition_years
+
+logger = logging.getLogger(__name__)
+
+PARQUET_COLUMNS = ("time", *OHLCV_FIELDS)
+
+# 1行グループあたりの行数(分足1年 ≒ 7万行を数グループに分け、期間指定で読み飛ばせるようにする)
+DEFAULT_ROW_GROUP_SIZE = 16384
+
+
+def _pa():
+    try:
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+    except ImportError as e:
+        raise ImportError("parquet layout requires pyarrow (pip install pyarrow)") from e
+    return pa, pq
+
+
+def _frame_to_table(frame: CandleFrame):
+    pa, _ = _pa()
+    return pa.table(
+        {
+            "time": pa.array(frame.time.astype("datetime64[us]"), type=pa.timestamp("us")),
+            "open": pa.array(frame.open, type=pa.float64()),
+            "high": pa.array(frame.high, type=pa.float64()),
+            "low": pa.array(frame.low, type=pa.float64()),
+            "close": pa.array(frame.close, type=pa.float64()),
+            "volume": pa.array(frame.volume, type=pa.int64()),
+        }
+    )
+
+
+def _table_to_frame(table) -> CandleFrame:
+    if table.num_rows == 0:
+        return CandleFrame.empty()
+    cols = {name: table.column(name).to_numpy() for name in PARQUET_COLUMNS}
+    return CandleFrame(**cols)
+
+
+class ParquetCandleStore:
+    """銘柄・時間軸ごとに年単位の Parquet ファイルへ保存する(CandleStore と同じメソッド)"""
+
+    layout = "parquet"
+
+    def __init__(self, root: Path, row_group_size: int = DEFAULT_ROW_GROUP_SIZE):
+        self.root = Path(root)
+        self.row_group_size = max(1, int(row_group_size))
+
+    def series_dir(self, product_code: str, duration: str) -> Path:
+        return self.root / duration.upper() / code_dir_name(product_code)
+
+    def partition_path(self, product_code: str, duration: str, year: int) -> Path:
+        return self.series_dir(product_code, duration) / f"{int(year)}.parquet"
+
+    def _partition_years(self, product_code: str, duration: str) -> List[int]:
+        directory = self.series_dir(product_code, duration)
+        if not directory.is_dir():
+            return []
+        return sorted(int(p.stem) for p in directory.glob("*.parquet") if p.stem.isdigit())
+
+    def _read_partition(self, path: Path, start=None, end=None) -> CandleFrame:
+        _, pq = _pa()
+        filters = []
+        if start is not None:
+            filters.append(("time", ">=", np.datetime64(start, "us")))
+        if end is not None:
+            filters.append(("time", "<=", np.datetime64(end, "us")))
+        table = pq.read_table(path, columns=list(PARQUET_COLUMNS), filters=filters or None)
+        return _table_to_frame(table)
+
+    def _write_partition(self, path: Path, frame: CandleFrame) -> None:
+        _, pq = _pa()
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = path.with_name(f"{path.name}.{os.getpid()}.tmp")
+        pq.write_table(_frame_to_table(frame), tmp_path, row_group_size=self.row_group_size, compression="zstd")
+        tmp_path.replace(path)
+
+    def upsert(
+        self, product_code: str, duration: str, frame: CandleFrame, on_conflict: str = "update"
+    ) -> Dict[str, int]:
+        """
+        年ごとのファイルへマージして書き戻す
+
+        Returns:
+            {'inserted': 追加行数, 'updated': 値が変わった行数, 'skipped': 既存と同値・ignore の行数}
+        """
+        if on_conflict not in ("update", "ignore"):
+            raise ValueError(f"unknown on_conflict mode: {on_conflict}")
+        stats = {"inserted": 0, "updated": 0, "skipped": 0}
+        if not frame:
+            return stats
+
+        # 同一時刻は後勝ちにして時刻順に揃える
+        order = np.argsort(frame.time, kind="stable")
+        frame = CandleFrame(**{k: v[order] for k, v in frame.arrays().items()})
+        last = np.append(frame.time[1:] != frame.time[:-1], True)
+        frame = CandleFrame(**{k: v[last] for k, v in frame.arrays().items()})
+
+        years = partition_years(frame.time)
+        for year in np.unique(years):
+            part = CandleFrame(**{k: v[years == year] for k, v in frame.arrays().items()})
+            path = self.partition_path(product_code, duration, int(year))
+            existing = self._read_partition(path) if path.exists() else CandleFrame.empty()
+            merged, counts = merge_frames(existing, part, on_conflict)
+            for key, value in counts.items():
+                stats[key] += value
+            if counts["inserted"] or counts["updated"]:
+                self._write_partition(path, merged)
+
+        logger.debug(
+            f"action=parquet_upsert code={product_code} duration={duration} inserted={stats['inserted']} "
+            f"updated={stats['updated']} skipped={stats['skipped']}"
+        )
+        return stats
+
+    def latest_time(self, product_code: str, duration: str) -> Optional[datetime]:
+        _, pq = _pa()
+        years = self._partition_years(product_code, duration)
+        if not years:
+            return None
+        path = self.partition_path(product_code, duration, years[-1])
+        # 行グループの統計値だけを読む(データ本体は読まない)
+        metadata = pq.ParquetFile(path).metadata
+        index = metadata.schema.names.index("time")
+        latest = None
+        for i in range(metadata.num_row_groups):
+            column_stats = metadata.row_group(i).column(index).statistics
+            if column_stats is None or not column_stats.has_min_max:
+                return _latest_from_frame(self._read_partition(path))
+            value = column_stats.max
+            latest = value if latest is None or value > latest else latest
+        return latest
+
+    def stats(self, product_code: str, duration: str) -> Tuple[int, Optional[datetime]]:
+        """(行数, 最新 time) をファイルのメタデータだけから返す"""
+        _, pq = _pa()
+        years = self._partition_years(product_code, duration)
+        rows = sum(pq.ParquetFile(self.partition_path(product_code, duration, y)).metadata.num_rows for y in years)
+        if not rows:
+            return 0, None
+        return rows, self.latest_time(product_code, duration)
+
+    def load_arrays(
+        self,
+        product_code: str,
+        duration: str,
+        start: Optional[datetime] = None,
+        end: Optional[datetime] = None,
+        limit: Optional[int] = None,
+    ) -> Dict[str, np.ndarray]:
+        """期間内の列を numpy 配列の辞書で返す(limit 指定時は新しい方から limit 本)"""
+        return self.load(product_code, duration, start=start, end=end, limit=limit).arrays()
+
+    def load(
+        self,
+        product_code: str,
+        duration: str,
+        start: Optional[datetime] = None,
+        end: Optional[datetime] = None,
+        limit: Optional[int] = None,
+    ) -> CandleFrame:
+        years = self._partition_years(product_code, duration)
+        if start is not None:
+            years = [y for y in years if y >= start.year]
+        if end is not None:
+            years = [y for y in years if y <= end.year]
+
+        frames: List[CandleFrame] = []
+        remaining = limit
+        # limit 指定時は新しい年から読み、足りた時点で打ち切る
+        for year in reversed(years):
+            part = self._read_partition(self.partition_path(product_code, duration, year), start=start, end=end)
+            frames.append(part)
+            if remaining is not None:
+                remaining -= len(part)
+                if remaining <= 0:
+                    break
+
+        frame = concat_frames(list(reversed(frames)))
+        if limit is not None and len(frame) > limit:
+            frame = frame[len(frame) - int(limit) :]
+        return frame
+
+    def list_codes(self, duration: str) -> List[str]:
+        directory = self.root / duration.upper()
+        if not directory.is_dir():
+            return []
+        return [
+            code_from_dir_name(p.name) for p in sorted(directory.iterdir()) if p.is_dir() and any(p.glob("*.parquet"))
+        ]
+
+
+def _latest_from_frame(frame: CandleFrame) -> Optional[datetime]:
+    if not frame:
+        return None
+    return frame.python_times()[-1].replace(tzinfo=None)
@@ -0,0 +1,402 @@
+"""ローソク足の取得元 (DataProvider) の切り替え。
+
+yahoo / sqlite / mmap / resample / replay / synthetic を名前で選び、どれも CandleFrame を返す。
+replay と synthetic はネットワーク不要なので、取り込み・最適化の処理量を
+隔離環境で再現性をもって計測できる。
+"""
+
+import logging
+import random
+import time
+import zlib
+from abc import ABC, abstractmethod
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import Callable, Dict, List, Optional, Protocol, Tuple, runtime_checkable
+
+import numpy as np
+import pandas as pd
+
+from app.data.candle_frame import CandleFrame
+from app.data.trading_calendar import duration_to_timedelta, get_calendar
+
+logger = logging.getLogger(__name__)
+
+
+@runtime_checkable
+class DataProvider(Protocol):
+    """銘柄コード・期間・時間軸から CandleFrame を返す取得元"""
+
+    name: str
+
+    def fetch_frame(
+        self, product_code: str, period_days: int = 365, duration: str = "1d", market: str = "T"
+    ) -> CandleFrame: ...
+
+    def fetch_frames(
+        self, product_codes: List[str], period_days: int = 365, duration: str = "1d", market: str = "T"
+    ) -> Tuple[Dict[str, CandleFrame], Dict[str, str]]: ...
+
+
+class BaseProvider(ABC):
+    """fetch_frames を fetch_frame の繰り返しで提供する基底クラス(fetch_frame はサブクラスで実装)"""
+
+    name = "base"
+
+    @abstractmethod
+    def fetch_frame(
+        self, product_code: str, period_days: int = 365, duration: str = "1d", market: str = "T"
+    ) -> CandleFrame: ...
+
+    def fetch_frames(
+        self, product_codes: List[str], period_days: int = 365, duration: str = "1d", market: str = "T"
+    ) -> Tuple[Dict[str, CandleFrame], Dict[str, str]]:
+        frames: Dict[str, CandleFrame] = {}
+        failures: Dict[str, str] = {}
+        for code in product_codes:
+            try:
+                frame = self.fetch_frame(code, period_days, duration, market)
+            except Exception as e:
+                failures[code] = str(e)
+                continue
+            if frame:
+                frames[code] = frame
+            else:
+                failures[code] = "no_data"
+        return frames, failures
+
+
+class YahooProvider(BaseProvider):
+    """Yahoo Finance (yfinance) から取得"""
+
+    name = "yahoo"
+
+    def __init__(self, raise_errors: bool = False, chunk_size: int = 50):
+        self.raise_errors = raise_errors
+        self.chunk_size = chunk_size
+
+    def fetch_frame(self, product_code, period_days=365, duration="1d", market="T") -> CandleFrame:
+        from app.data.yahoo import fetch_yahoo_frame
+
+        return fetch_yahoo_frame(product_code, period_days, duration, market, raise_errors=self.raise_errors)
+
+    def fetch_frames(self, product_codes, period_days=365, duration="1d", market="T"):
+        from app.data.yahoo import fetch_yahoo_frames
+
+        return fetch_yahoo_frames(
+            list(product_codes),
+            period_days,
+            duration,
+            market,
+            chunk_size=self.chunk_size,
+            raise_errors=self.raise_errors,
+        )
+
+
+class SqliteProvider(BaseProvider):
+    """保存済みのローソク足から取得([db] layout に応じた CandleStore 経由、読み取り専用接続)"""
+
+    name = "sqlite"
+
+    def __init__(self, store=None, now: Optional[Callable[[], datetime]] = None):
+        self.store = store
+        self._now = now or datetime.now
+
+    def fetch_frame(self, product_code, period_days=365, duration="1d", market="T") -> CandleFrame:
+        from app.data.candle_store import get_candle_store
+        from app.data.sqlite_engine import get_read_engine
+
+        store = self.store if self.store is not None else get_candle_store(bind=get_read_engine())
+        start = self._now() - timedelta(days=int(period_days))
+        return store.load(product_code, duration, start=start)
+
+
+class MmapCacheProvider(BaseProvider):
+    """保存済みのローソク足を mmap キャッシュ (.npy) 経由で返す
+
+    複数ワーカーが同じ銘柄を読んでも DB を読み直さず、配列はページキャッシュを共有する。
+    """
+
+    name = "mmap"
+
+    def __init__(self, store=None, cache_dir: Optional[Path] = None, now: Optional[Callable[[], datetime]] = None):
+        from app.data.candle_cache import MmapCandleCache
+        from app.data.candle_store import get_candle_store
+        from app.data.sqlite_engine import get_read_engine
+
+        if store is None:
+            store = get_candle_store(bind=get_read_engine())
+        self.cache = MmapCandleCache(store, root=cache_dir)
+        self._now = now or datetime.now
+
+    def fetch_frame(self, product_code, period_days=365, duration="1d", market="T") -> CandleFrame:
+        start = self._now() - timedelta(days=int(period_days))
+        return self.cache.load_since(product_code, duration, start)
+
+
+class ResampleProvider(BaseProvider):
+    """保存済みの基準足 (既定 1m) から任意の時間軸 (5m / 15m / 4h / 1d など) を作って返す
+
+    作った足は ResampleCache に保存され、次回以降は新しい基準足の分だけ集計する。
+    """
+
+    name = "resample"
+
+    def __init__(
+        self,
+        base_duration: str = "1m",
+        source=None,
+        cache=None,
+        now: Optional[Callable[[], datetime]] = None,
+    ):
+        from app.data.candle_store import UnifiedCandleStore, get_candle_store
+        from app.data.resample import ResampleCache
+
+        source = source if source is not None else get_candle_store()
+        if cache is None:
+            # tables レイアウトは任意の時間軸名の表を作れないため統合表に保存する
+            cache = source if source.layout != "tables" else UnifiedCandleStore()
+        self.base_duration = base_duration
+        self.source = source
+        self.resampler = ResampleCache(source, cache, base_duration=base_duration)
+        self._now = now or datetime.now
+
+    def fetch_frame(self, product_code, period_days=365, duration="1d", market="T") -> CandleFrame:
+        start = self._now() - timedelta(days=int(period_days))
+        if duration == self.base_duration:
+            return self.source.load(product_code, duration, start=start)
+        return self.resampler.load(product_code, duration, start=start)
+
+
+def replay_fixture_path(root: Path, product_code: str, duration: str, fmt: str = "csv") -> Path:
+    """replay 用の記録ファイルのパス (<root>/<code>_<DURATION>.<fmt>, ^ は IDX_)"""
+    code = str(product_code).strip().replace("^", "IDX_")
+    return Path(root) / f"{code}_{duration.upper()}.{fmt}"
+
+
+def save_replay_fixture(frame: CandleFrame, root: Path, product_code: str, duration: str, fmt: str = "csv") -> Path:
+    """CandleFrame を replay 用の CSV / Parquet に記録する(Parquet は pyarrow が必要)"""
+    path = replay_fixture_path(root, product_code, duration, fmt)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    df = frame.to_dataframe()
+    if frame.tz is not None:
+        # 壁時計時刻のまま保存する(読み込み時も tz なしで扱う)
+        df["time"] = df["time"].dt.tz_localize(None)
+    if fmt == "parquet":
+        df.to_parquet(path, index=False)
+    else:
+        df.to_csv(path, index=False)
+    return path
+
+
+class ReplayProvider(BaseProvider):
+    """記録済みの CSV / Parquet を返す(任意で擬似的な遅延を入れる)
+
+    period_days は記録の最終足を基準に切り出すため、結果は実行日に依存しない。
+    """
+
+    name = "replay"
+
+    def __init__(
+        self,
+        root: Path,
+        latency_sec: float = 0.0,
+        jitter_sec: float = 0.0,
+        seed: int = 0,
+        sleep: Callable[[float], None] = time.sleep,
+    ):
+        self.root = Path(root)
+        self.latency_sec = max(0.0, float(latency_sec))
+        self.jitter_sec = max(0.0, float(jitter_sec))
+        self._rng = random.Random(seed)
+        self._sleep = sleep
+        self._cache: Dict[Tuple[str, str], CandleFrame] = {}
+
+    def _simulate_latency(self) -> None:
+        delay = self.latency_sec
+        if self.jitter_sec > 0:
+            delay += self._rng.uniform(0.0, self.jitter_sec)
+        if delay > 0:
+            self._sleep(delay)
+
+    def _load(self, product_code: str, duration: str) -> CandleFrame:
+        key = (str(product_code), duration.upper())
+        if key in self._cache:
+            return self._cache[key]
+
+        frame = CandleFrame.empty()
+        for fmt in ("parquet", "csv"):
+            path = replay_fixture_path(self.root, product_code, duration, fmt)
+            if not path.exists():
+                continue
+            df = pd.read_parquet(path) if fmt == "parquet" else pd.read_csv(path)
+            frame = _frame_from_fixture(df)
+            break
+        self._cache[key] = frame
+        return frame
+
+    def fetch_frame(self, product_code, period_days=365, duration="1d", market="T") -> CandleFrame:
+        self._simulate_latency()
+        frame = self._load(product_code, duration)
+        if not frame:
+            return frame
+        start = frame.time[-1] - np.timedelta64(int(period_days), "D")
+        return frame[int(np.searchsorted(frame.time, start)) :]
+
+
+def _frame_from_fixture(df: pd.DataFrame) -> CandleFrame:
+    """time/open/.. 列、または yfinance 形式 (Date/Open/..) の表を CandleFrame にする"""
+    df = df.rename(columns={c: str(c).lower() for c in df.columns})
+    if "time" not in df.columns:
+        df = df.rename(columns={"date": "time", "datetime": "time"})
+    times = pd.to_datetime(df["time"])
+    if getattr(times.dt, "tz", None) is not None:
+        times = times.dt.tz_localize(None)
+    return CandleFrame(
+        time=times.to_numpy(dtype="datetime64[ns]"),
+        open=df["open"].to_numpy(dtype=np.float64),
+        high=df["high"].to_numpy(dtype=np.float64),
+        low=df["low"].to_numpy(dtype=np.float64),
+        close=df["close"].to_numpy(dtype=np.float64),
+        volume=df["volume"].fillna(0).to_numpy(dtype=np.int64),
+    )
+
+
+class SyntheticProvider(BaseProvider):
+    """銘柄コードと seed から決まる幾何ブラウン運動のローソク足を生成
+
+    足の時刻は東証の取引日・立会時間 (trading_calendar) に合わせる。
+    """
+
+    name = "synthetic"
+
+    def __init__(
+        self,
+        seed: int = 0,
+        start_price: float = 1000.0,
+        drift: float = 0.0002,
+        volatility: float = 0.02,
+        end: Optional[datetime] = None,
+    ):
+        self.seed = int(seed)
+        self.start_price = float(start_price)
+        self.drift = float(drift)
+        self.volatility = float(volatility)
+        self.end = pd.Timestamp(end) if end is not None else pd.Timestamp.today().normalize()
+
+    def _times(self, period_days: int, duration: str) -> np.ndarray:
+        calendar = get_calendar()
+        end = self.end.to_datetime64()
+        days = calendar.trading_days_between(end - np.timedelta64(int(period_days), "D"), end)
+        if len(days) == 0:
+            days = np.array([calendar.previous_trading_day(end + np.timedelta64(1, "D"))])
+        try:
+            intraday = duration_to_timedelta(duration) < np.timedelta64(1, "D")
+        except ValueError:
+            intraday = False
+        if not intraday:
+            return days.astype("datetime64[ns]")
+        return calendar.slot_start_times(days[0], days[-1], duration)
+
+    def fetch_frame(self, product_code, period_days=365, duration="1d", market="T") -> CandleFrame:
+        times = self._times(period_days, duration)
+        n = len(times)
+        bars_per_day = max(1, n // len(np.unique(times.astype("datetime64[D]"))))
+
+        rng = np.random.default_rng([self.seed, zlib.crc32(str(product_code).encode("utf-8"))])
+        step_vol = self.volatility / np.sqrt(bars_per_day)
+        close = self.start_price * np.exp(np.cumsum(rng.normal(self.drift / bars_per_day, step_vol, n)))
+        open_ = np.concatenate(([self.start_price], close[:-1]))
+        wick = np.abs(rng.normal(0.0, step_vol / 2, (2, n)))
+        return CandleFrame(
+            time=times,
+            open=open_,
+            high=np.maximum(open_, close) * (1 + wick[0]),
+            low=np.minimum(open_, close) * (1 - wick[1]),
+            close=close,
+            volume=rng.integers(100_000, 1_000_000, n),
+        )
+
+
+PROVIDERS: Dict[str, Callable[..., DataProvider]] = {
+    "yahoo": YahooProvider,
+    "sqlite": SqliteProvider,
+    "mmap": MmapCacheProvider,
+    "resample": ResampleProvider,
+    "replay": ReplayProvider,
+    "synthetic": SyntheticProvider,
+}
+
+
+def register_provider(name: str, factory: Callable[..., DataProvider]) -> None:
+    """独自の取得元を名前で登録する"""
+    PROVIDERS[name] = factory
+
+
+def get_provider(name: str, **options) -> DataProvider:
+    """名前から取得元を生成する(options はコンストラクタ引数)"""
+    if name not in PROVIDERS:
+        raise ValueError(f"unknown data provider: {name} (choices: {', '.join(sorted(PROVIDERS))})")
+    return PROVIDERS[name](**options)
+
+
+def add_provider_arguments(parser, default: str = "yahoo") -> None:
+    """CLI共通の取得元指定オプションを argparse に追加する(default が登録名以外ならその値も選択肢に加える)"""
+    choices = sorted(PROVIDERS) + ([default] if default not in PROVIDERS else [])
+    parser.add_argument(
+        "--provider",
+        default=default,
+        choices=choices,
+        help="ローソク足の取得元(mmap の配列をコピーせずに使うのは strategy_vec の実行のみ。"
+        "通常の strategy は従来どおり candles のリストに変換する)",
+    )
+    parser.add_argument("--replay-dir", default="results/replay", help="--provider replay の記録ディレクトリ")
+    parser.add_argument("--replay-latency", type=float, default=0.0, help="replay の1リクエストあたりの擬似遅延秒")
+    parser.add_argument("--replay-jitter", type=float, default=0.0, help="replay の擬似遅延に加える最大ゆらぎ秒")
+    parser.add_argument("--synthetic-seed", type=int, default=0, help="--provider synthetic の乱数シード")
+    parser.add_argument("--resample-base", default="1m", help="--provider resample の基準足(保存済みの時間軸)")
+
+
+def provider_from_args(args, **yahoo_options) -> DataProvider:
+    """add_provider_arguments で追加した引数から取得元を生成する"""
+    if args.provider == "replay":
+        return get_provider(
+            "replay",
+            root=Path(args.replay_dir),
+            latency_sec=float(args.replay_latency),
+            jitter_sec=float(args.replay_jitter),
+            seed=int(args.synthetic_seed),
+        )
+    if args.provider == "synthetic":
+        return get_provider("synthetic", seed=int(args.synthetic_seed))
+    if args.provider == "resample":
+        return get_provider("resample", base_duration=args.resample_base)
+    if args.provider == "yahoo":
+        return get_provider("yahoo", **yahoo_options)
+    return get_provider(args.provider)
+
+
+def engine_from_provider(
+    provider: DataProvider,
+    product_code: str,
+    period_days: int = 365,
+    duration: str = "1d",
+    market: str = "T",
+    risk_management=None,
+):
+    """
+    取得元のローソク足で StrategyEngine を作る(StrategyEngine.from_yahoo の取得元差し替え版)
+
+    StrategyEngine は candles (YahooFinanceCandle のリスト) しか受け取らないので、通常の
+    strategy では mmap の配列もリストに変換される。strategy_vec の実行 (run_vectorized) には
+    取得した CandleFrame の配列をそのまま渡す(mmap ならコピーなし)。
+    """
+    from app.strategy.engine import StrategyEngine
+
+    from app.strategy.vectorized import attach_engine_frame
+
+    frame = provider.fetch_frame(product_code, period_days, duration, market)
+    engine = StrategyEngine(product_code=product_code, candles=frame.candles, risk_management=risk_management)
+    engine.data_source = provider.name
+    attach_engine_frame(engine, frame)
+    return engine
@@ -0,0 +1,174 @@
+"""外部API呼び出し用のレート制御ユーティリティ。
+
+複数スレッドで共有するトークンバケットと、指数バックオフ + ジッター付きの再試行。
+再試行するのは一時的な失敗(通信エラー・タイムアウト・HTTP 429/5xx・yfinance のレート制限)だけで、
+上場廃止やコード誤りのような恒久的な失敗はすぐに呼び出し元へ返す。
+"""
+
+import functools
+import logging
+import random
+import threading
+import time
+from typing import Callable, Optional, Tuple, Type
+
+logger = logging.getLogger(__name__)
+
+
+class TokenBucket:
+    """スレッドセーフなトークンバケット
+
+    rate 個/秒でトークンが補充され、最大 burst 個まで貯まる。
+    rate <= 0 の場合は制限なし。
+    """
+
+    def __init__(
+        self,
+        rate: float,
+        burst: int = 1,
+        clock: Callable[[], float] = time.monotonic,
+        sleep: Callable[[float], None] = time.sleep,
+    ):
+        self.rate = float(rate)
+        self.burst = max(1, int(burst))
+        self._clock = clock
+        self._sleep = sleep
+        self._tokens = float(self.burst)
+        self._updated = clock()
+        self._lock = threading.Lock()
+
+    def _refill(self, now: float) -> None:
+        elapsed = max(0.0, now - self._updated)
+        self._tokens = min(float(self.burst), self._tokens + elapsed * self.rate)
+        self._updated = now
+
+    def try_acquire(self, tokens: float = 1.0) -> float:
+        """
+        トークンを取得できれば消費して 0 を返す。足りなければ必要な待機秒数を返す
+        """
+        if self.rate <= 0:
+            return 0.0
+        with self._lock:
+            self._refill(self._clock())
+            if self._tokens >= tokens:
+                self._tokens -= tokens
+                return 0.0
+            return (tokens - self._tokens) / self.rate
+
+    def acquire(self, tokens: float = 1.0) -> None:
+        """トークンを取得できるまで待機する"""
+        while True:
+            wait = self.try_acquire(tokens)
+            if wait <= 0:
+                return
+            self._sleep(wait)
+
+
+def backoff_delay(
+    attempt: int,
+    base_delay: float = 1.0,
+    max_delay: float = 30.0,
+    rng: Callable[[], float] = random.random,
+) -> float:
+    """attempt 回目(1始まり)の再試行待機秒数(full jitter)"""
+    cap = min(max_delay, base_delay * (2 ** max(0, attempt - 1)))
+    return cap * rng()
+
+
+@functools.lru_cache(maxsize=1)
+def transient_errors() -> Tuple[Type[BaseException], ...]:
+    """再試行で回復しうる例外型(インストールされている HTTP クライアント・yfinance の分も含む)"""
+    errors: list = [ConnectionError, TimeoutError]
+    try:
+        import requests
+
+        errors += [
+            requests.ConnectionError,
+            requests.Timeout,
+            requests.HTTPError,
+            requests.exceptions.ChunkedEncodingError,
+        ]
+    except ImportError:
+        pass
+    try:
+        from curl_cffi.requests import exceptions as curl_exceptions
+
+        errors += [
+            curl_exceptions.ConnectionError,
+            curl_exceptions.Timeout,
+            curl_exceptions.HTTPError,
+            curl_exceptions.ChunkedEncodingError,
+        ]
+    except ImportError:
+        pass
+    try:
+        from yfinance.exceptions import YFRateLimitError
+
+        errors.append(YFRateLimitError)
+    except ImportError:
+        pass
+    return tuple(dict.fromkeys(errors))
+
+
+def is_retryable_status(error: BaseException) -> bool:
+    """HTTP 応答を持つ例外なら 429 / 5xx のときだけ True(応答が無ければ True)"""
+    status = getattr(getattr(error, "response", None), "status_code", None)
+    if status is None:
+        return True
+    return int(status) == 429 or int(status) >= 500
+
+
+def call_with_retry(
+    fn: Callable,
+    *args,
+    max_retries: int = 3,
+    base_delay: float = 1.0,
+    max_delay: float = 30.0,
+    retry_on: Optional[Tuple[Type[BaseException], ...]] = None,
+    limiter: Optional[TokenBucket] = None,
+    sleep: Callable[[float], None] = time.sleep,
+    rng: Callable[[], float] = random.random,
+    **kwargs,
+):
+    """
+    fn を呼び出し、retry_on の例外なら指数バックオフで再試行する
+
+    HTTP 応答を持つ例外は 429 / 5xx の場合だけ再試行し、それ以外(404 など)はそのまま送出する。
+
+    Args:
+        fn: 呼び出す関数
+        max_retries: 最大再試行回数(初回を含まない)
+        base_delay: 1回目の再試行の最大待機秒数
+        max_delay: 待機秒数の上限
+        retry_on: 再試行対象の例外型(省略時は transient_errors())
+        limiter: 指定時は各試行の前にトークンを取得する
+        sleep: 待機関数(テスト用)
+        rng: 0-1 の乱数関数(テスト用)
+
+    Returns:
+        fn の戻り値(再試行を使い切った場合は最後の例外を送出)
+    """
+    if retry_on is None:
+        retry_on = transient_errors()
+    attempt = 0
+    while True:
+        if limiter is not None:
+            limiter.acquire()
+        try:
+            return fn(*args, **kwargs)
+        except retry_on as e:
+            attempt += 1
+            if attempt > max_retries or not is_retryable_status(e):
+                raise
+            delay = backoff_delay(attempt, base_delay, max_delay, rng)
+            logger.warning(f"action=call_with_retry attempt={attempt} delay={delay:.2f} error={e!s}")
+            sleep(delay)
+
+
+def resolve_rate(rate: float, sleep_sec: float) -> float:
+    """CLI の --rate / --sleep-sec から件/秒を決める(rate 優先, 0 は制限なし)"""
+    if rate > 0:
+        return rate
+    if sleep_sec > 0:
+        return 1.0 / sleep_sec
+    return 0.0
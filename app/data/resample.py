@@ -0,0 +1,140 @@
+"""保存済みの基準足 (1m など) から任意の時間軸のローソク足を作る。
+
+5m / 15m / 1h / 4h のような基準足の整数倍、および 1d を numpy の reduceat で
+まとめて集計する。日中足の区切りは東証の前場 (9:00-11:30) / 後場 (12:30-15:30)
+の開始時刻に揃え、昼休みをまたぐ足は作らない(例: 1h は 9:00, 10:00, 11:00, 12:30, ...)。
+立会時間は app.data.trading_calendar と共通。
+
+ResampleCache は結果を CandleStore に保存し、次回は最後の足の区切り以降だけを作り直す。
+"""
+
+import logging
+from datetime import datetime
+from typing import Optional
+
+import numpy as np
+
+from app.data.candle_frame import CandleFrame
+from app.data.trading_calendar import (
+    AFTERNOON_OPEN,
+    MORNING_CLOSE,
+    MORNING_OPEN,
+    afternoon_close_for,
+    duration_to_timedelta,
+)
+
+logger = logging.getLogger(__name__)
+
+_DAY = np.timedelta64(86400 * 10**9, "ns")
+
+
+def check_resample(base_duration: str, target_duration: str) -> None:
+    """target が base から作れるか検査する(作れなければ ValueError)"""
+    base = duration_to_timedelta(base_duration)
+    target = duration_to_timedelta(target_duration)
+    if target >= _DAY:
+        if target != _DAY:
+            raise ValueError(f"only 1d is supported for daily resampling: {target_duration}")
+        if base >= _DAY:
+            raise ValueError(f"base must be intraday to build 1d: {base_duration}")
+        return
+    if target < base or target % base != np.timedelta64(0, "ns"):
+        raise ValueError(f"{target_duration} is not a multiple of {base_duration}")
+
+
+def session_bucket_starts(times: np.ndarray, target_duration: str) -> np.ndarray:
+    """
+    各足が属する集計後の足の開始時刻を返す
+
+    日中足は前場・後場それぞれの開始時刻から target 刻みで区切る。引け (11:30 / 15:30)
+    ちょうどの足や昼休み中の足は直前のセッションの最後の区切りに含める。
+    """
+    times = np.asarray(times, dtype="datetime64[ns]")
+    step = duration_to_timedelta(target_duration)
+    days = times.astype("datetime64[D]").astype("datetime64[ns]")
+    if step >= _DAY:
+        return days
+
+    tod = times - days
+    afternoon = tod >= AFTERNOON_OPEN
+    session_open = np.where(afternoon, AFTERNOON_OPEN, MORNING_OPEN)
+    session_close = np.where(afternoon, afternoon_close_for(days), MORNING_CLOSE)
+    last_offset = session_close - session_open - np.timedelta64(1, "ns")
+    offset = np.clip(tod - session_open, np.timedelta64(0, "ns"), last_offset)
+    return days + session_open + (offset // step) * step
+
+
+def resample_frame(frame: CandleFrame, target_duration: str) -> CandleFrame:
+    """時刻順の CandleFrame を target_duration の足に集計する(time は各足の開始時刻)"""
+    if not frame:
+        return CandleFrame.empty()
+    keys = session_bucket_starts(frame.time, target_duration)
+    starts = np.flatnonzero(np.concatenate(([True], keys[1:] != keys[:-1])))
+    ends = np.append(starts[1:], len(keys)) - 1
+    return CandleFrame(
+        time=keys[starts],
+        open=frame.open[starts],
+        high=np.maximum.reduceat(frame.high, starts),
+        low=np.minimum.reduceat(frame.low, starts),
+        close=frame.close[ends],
+        volume=np.add.reduceat(frame.volume, starts),
+        tz=frame.tz,
+    )
+
+
+def derived_duration(target_duration: str, base_duration: str) -> str:
+    """キャッシュ上の時間軸名(取り込んだ同名の時間軸と区別する。例: '15m@1m')"""
+    return f"{target_duration.lower()}@{base_duration.lower()}"
+
+
+class ResampleCache:
+    """基準足から作った足を CandleStore に保存し、差分だけ更新する
+
+    source: 基準足を読むストア(load を使う)
+    cache: 結果を保存するストア(upsert / latest_time / load を使う。unified / parquet など
+           任意の時間軸名を扱えるもの)
+    """
+
+    def __init__(self, source, cache, base_duration: str = "1m"):
+        self.source = source
+        self.cache = cache
+        self.base_duration = base_duration
+
+    def refresh(self, product_code: str, target_duration: str) -> int:
+        """
+        最後に作った足の開始時刻以降の基準足から作り直して保存する
+
+        最後の足は作成時点で未完成だった可能性があるため、その足から再集計する。
+
+        Returns:
+            追加・更新した足の数
+        """
+        check_resample(self.base_duration, target_duration)
+        key = derived_duration(target_duration, self.base_duration)
+        latest = self.cache.latest_time(product_code, key)
+        base = self.source.load(product_code, self.base_duration, start=latest)
+        if not base:
+            return 0
+        stats = self.cache.upsert(product_code, key, resample_frame(base, target_duration))
+        changed = stats["inserted"] + stats["updated"]
+        logger.info(
+            f"action=resample_refresh code={product_code} duration={key} base_rows={len(base)} "
+            f"inserted={stats['inserted']} updated={stats['updated']}"
+        )
+        return changed
+
+    def load(
+        self,
+        product_code: str,
+        target_duration: str,
+        start: Optional[datetime] = None,
+        end: Optional[datetime] = None,
+        limit: Optional[int] = None,
+        refresh: bool = True,
+    ) -> CandleFrame:
+        """キャッシュを更新してから読み込む(refresh=False なら保存済みの内容のみ)"""
+        if refresh:
+            self.refresh(product_code, target_duration)
+        return self.cache.load(
+            product_code, derived_duration(target_duration, self.base_duration), start=start, end=end, limit=limit
+        )
@@ -0,0 +1,167 @@
+"""一括処理CLIの再開用ジャーナル。
+
+1銘柄の完了/失敗ごとに JSONL を1行追記し、読み込み時に再生して集合へ戻す。
+行数が状態の件数に比べて増えたらスナップショットへ圧縮する。
+"""
+
+import json
+import os
+import time
+from pathlib import Path
+from typing import Optional, Set
+
+STATUS_DONE = "done"
+STATUS_FAILED = "failed"
+
+
+class ResumeJournal:
+    """done/failed の集合を追記専用ファイルで永続化する
+
+    - 記録は1イベント1行の追記のみ(1件あたり一定コスト)
+    - flush は毎回、fsync は fsync_every 件ごとと close 時
+    - 途中で切れた最終行は読み込み時に無視する
+    - 旧形式 ({"done": [...], "failed": [...]} の JSON) は読み込み時に変換する
+    """
+
+    def __init__(self, path, compact_min_lines: int = 1000, fsync_every: int = 50):
+        self.path = Path(path)
+        self.compact_min_lines = max(1, int(compact_min_lines))
+        self.fsync_every = max(1, int(fsync_every))
+        self.done: Set[str] = set()
+        self.failed: Set[str] = set()
+        self._lines = 0
+        self._unsynced = 0
+        self._fh = None
+        self._load()
+
+    def __enter__(self) -> "ResumeJournal":
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        self.close()
+
+    def _apply(self, key: str, status: str) -> None:
+        if status == STATUS_DONE:
+            self.done.add(key)
+            self.failed.discard(key)
+        elif status == STATUS_FAILED and key not in self.done:
+            self.failed.add(key)
+
+    def _load(self) -> None:
+        if not self.path.exists():
+            return
+        if self._replay(self.path.read_text(encoding="utf-8")):
+            self.compact()
+
+    def _replay(self, text: str) -> bool:
+        """text(JSONL または旧形式)の状態を取り込む。ファイルを書き直すべきなら True"""
+        legacy = self._parse_legacy(text)
+        if legacy is not None:
+            for key in legacy.get("done", []):
+                self._apply(str(key), STATUS_DONE)
+            for key in legacy.get("failed", []):
+                self._apply(str(key), STATUS_FAILED)
+            return True
+
+        for line in text.splitlines():
+            if not line.strip():
+                continue
+            try:
+                event = json.loads(line)
+                self._apply(str(event["k"]), str(event["s"]))
+            except Exception:
+                # クラッシュで途中まで書かれた行は捨てる
+                continue
+            self._lines += 1
+
+        # 途中で切れた最終行の後ろに追記すると次のイベントまで壊れるので、先に書き直しておく
+        return bool(text) and not text.endswith("\n")
+
+    @staticmethod
+    def _parse_legacy(text: str) -> Optional[dict]:
+        if not text.lstrip().startswith("{"):
+            return None
+        try:
+            data = json.loads(text)
+        except Exception:
+            return None
+        if isinstance(data, dict) and ("done" in data or "failed" in data):
+            return data
+        return None
+
+    def _open(self):
+        if self._fh is None:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            # close() まで開いたまま追記する
+            self._fh = self.path.open("a", encoding="utf-8")
+        return self._fh
+
+    def _append(self, key: str, status: str) -> None:
+        fh = self._open()
+        fh.write(json.dumps({"k": key, "s": status, "t": int(time.time())}, ensure_ascii=False) + "\n")
+        fh.flush()
+        self._lines += 1
+        self._unsynced += 1
+        if self._unsynced >= self.fsync_every:
+            os.fsync(fh.fileno())
+            self._unsynced = 0
+
+        # 行数が状態件数の2倍を超えたら圧縮(償却で1件あたり一定コスト)
+        if self._lines > max(self.compact_min_lines, 2 * (len(self.done) + len(self.failed))):
+            self.compact()
+
+    def mark_done(self, key: str) -> None:
+        key = str(key)
+        self._apply(key, STATUS_DONE)
+        self._append(key, STATUS_DONE)
+
+    def mark_failed(self, key: str) -> None:
+        key = str(key)
+        if key in self.done:
+            return
+        self._apply(key, STATUS_FAILED)
+        self._append(key, STATUS_FAILED)
+
+    def compact(self) -> None:
+        """現在の状態だけを書いたファイルに原子的に置き換える"""
+        self._close_handle()
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = self.path.with_name(self.path.name + ".tmp")
+        now = int(time.time())
+        with open(tmp_path, "w", encoding="utf-8") as fh:
+            for key in sorted(self.done):
+                fh.write(json.dumps({"k": key, "s": STATUS_DONE, "t": now}, ensure_ascii=False) + "\n")
+            for key in sorted(self.failed):
+                fh.write(json.dumps({"k": key, "s": STATUS_FAILED, "t": now}, ensure_ascii=False) + "\n")
+            fh.flush()
+            os.fsync(fh.fileno())
+        tmp_path.replace(self.path)
+        self._lines = len(self.done) + len(self.failed)
+
+    def _close_handle(self) -> None:
+        if self._fh is not None:
+            self._fh.flush()
+            os.fsync(self._fh.fileno())
+            self._fh.close()
+            self._fh = None
+            self._unsynced = 0
+
+    def close(self) -> None:
+        self._close_handle()
+
+
+def resolve_resume_path(path) -> Path:
+    """
+    再開ファイルのパスを返す
+
+    path(.jsonl)が無く旧形式の同名 .json だけがある場合は、.json を1回読んで同じ状態を
+    path へ書き出す。.json は書き換えずに残す(以降の追記は path にだけ行う)。
+    """
+    path = Path(path)
+    legacy = path.with_suffix(".json")
+    if path.suffix == ".jsonl" and not path.exists() and legacy.exists():
+        journal = ResumeJournal(path)
+        journal._replay(legacy.read_text(encoding="utf-8"))
+        journal.compact()
+        journal.close()
+    return path
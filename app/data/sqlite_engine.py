@@ -0,0 +1,159 @@
+"""SQLite の接続設定 (WAL・PRAGMA) と読み取り専用の接続プール。
+
+既定のロールバックジャーナルでは書き込み中 (取り込み・streamdata) に全ての読み込みが
+待たされるため、WAL にして読み込みと書き込みを並行させる。最適化や Web API のような
+読み込み中心の処理は get_read_engine() の読み取り専用プールを使う。
+
+    configure_shared_engine()         # app.models.base.engine に PRAGMA を適用(各エントリポイントで1回)
+    read_engine = get_read_engine()   # 読み取り専用 (mode=ro) のプール
+"""
+
+import logging
+import threading
+from pathlib import Path
+from typing import Dict, Optional
+
+from sqlalchemy import create_engine, event
+from sqlalchemy.pool import QueuePool
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_DB_NAME = "stockdata.sql"
+
+DEFAULT_PRAGMAS: Dict[str, object] = {
+    "journal_mode": "WAL",
+    # WAL では NORMAL でもコミット済みデータは壊れない(電源断時に直近のコミットが失われ得るのみ)
+    "synchronous": "NORMAL",
+    "mmap_size": 256 * 1024 * 1024,
+    # 負値は KiB 単位
+    "cache_size": -64 * 1024,
+    "busy_timeout": 5000,
+    "temp_store": "MEMORY",
+}
+
+# 読み取り専用接続では設定できない(ファイルに永続化される)もの
+_WRITE_ONLY_PRAGMAS = ("journal_mode", "synchronous")
+
+DEFAULT_READ_POOL_SIZE = 8
+
+_read_engine = None
+_read_engine_lock = threading.Lock()
+
+
+def configured_db_path() -> Path:
+    """settings.ini の [db] name(設定ファイルなしなら stockdata.sql)"""
+    try:
+        import settings
+
+        return Path(settings.db_name)
+    except Exception:
+        return Path(DEFAULT_DB_NAME)
+
+
+def configured_pragmas() -> Dict[str, object]:
+    """settings.ini の [db] の接続設定を反映した PRAGMA(未設定の項目は既定値)"""
+    pragmas = dict(DEFAULT_PRAGMAS)
+    try:
+        import settings
+    except Exception:
+        return pragmas
+    pragmas["journal_mode"] = str(getattr(settings, "db_journal_mode", pragmas["journal_mode"])).upper()
+    pragmas["synchronous"] = str(getattr(settings, "db_synchronous", pragmas["synchronous"])).upper()
+    if hasattr(settings, "db_mmap_size_mb"):
+        pragmas["mmap_size"] = int(settings.db_mmap_size_mb) * 1024 * 1024
+    if hasattr(settings, "db_cache_size_mb"):
+        pragmas["cache_size"] = -int(settings.db_cache_size_mb) * 1024
+    if hasattr(settings, "db_busy_timeout_ms"):
+        pragmas["busy_timeout"] = int(settings.db_busy_timeout_ms)
+    return pragmas
+
+
+def apply_pragmas(dbapi_connection, pragmas: Optional[Dict[str, object]] = None, read_only: bool = False) -> None:
+    """sqlite3 の接続に PRAGMA を適用する(SQLAlchemy を通さない sqlite3.connect でも使える)"""
+    pragmas = DEFAULT_PRAGMAS if pragmas is None else pragmas
+    cursor = dbapi_connection.cursor()
+    try:
+        for name, value in pragmas.items():
+            if read_only and name in _WRITE_ONLY_PRAGMAS:
+                continue
+            cursor.execute(f"PRAGMA {name}={value}")
+        if read_only:
+            cursor.execute("PRAGMA query_only=ON")
+    finally:
+        cursor.close()
+
+
+def configure_sqlite_engine(engine, pragmas: Optional[Dict[str, object]] = None, read_only: bool = False):
+    """エンジンの新しい接続ごとに PRAGMA を適用する(同じエンジンへの2回目以降の呼び出しは何もしない)"""
+    if engine.dialect.name != "sqlite" or getattr(engine, "_sqlite_pragmas_configured", False):
+        return engine
+    pragmas = configured_pragmas() if pragmas is None else pragmas
+
+    @event.listens_for(engine, "connect")
+    def _on_connect(dbapi_connection, connection_record):
+        apply_pragmas(dbapi_connection, pragmas, read_only=read_only)
+
+    engine._sqlite_pragmas_configured = True
+    logger.info(f"action=configure_sqlite_engine url={engine.url} read_only={read_only} pragmas={pragmas}")
+    return engine
+
+
+def configure_shared_engine():
+    """
+    app.models.base.engine(Streamlit・Web・streamdata・取り込みで共有する書き込み用エンジン)に
+    PRAGMA を適用して返す。エントリポイントの起動時に呼ぶ(2回目以降は何もしない)
+    """
+    from app.models.base import engine
+
+    return configure_sqlite_engine(engine)
+
+
+def sqlite_url(db_path: Path, read_only: bool = False) -> str:
+    """SQLAlchemy の URL(read_only は URI の mode=ro で開く)"""
+    path = Path(db_path).resolve()
+    if read_only:
+        return f"sqlite:///file:{path.as_posix()}?mode=ro&uri=true"
+    return f"sqlite:///{path.as_posix()}"
+
+
+def create_sqlite_engine(
+    db_path: Optional[Path] = None,
+    read_only: bool = False,
+    pool_size: int = DEFAULT_READ_POOL_SIZE,
+    pragmas: Optional[Dict[str, object]] = None,
+):
+    """PRAGMA 適用済みのプール付きエンジンを作る(スレッド間で共有可)"""
+    db_path = Path(db_path) if db_path is not None else configured_db_path()
+    engine = create_engine(
+        sqlite_url(db_path, read_only=read_only),
+        poolclass=QueuePool,
+        pool_size=max(1, int(pool_size)),
+        max_overflow=max(1, int(pool_size)),
+        connect_args={"check_same_thread": False},
+    )
+    return configure_sqlite_engine(engine, pragmas=pragmas, read_only=read_only)
+
+
+def get_read_engine():
+    """
+    プロセス内で共有する読み取り専用エンジン(初回呼び出し時に作成)
+
+    mode=ro ではファイルを作れないので、DB ファイルがまだ無い間は共有の書き込み用エンジン
+    (configure_shared_engine)を返す。読み取り専用プールはファイルができた後の呼び出しで作る。
+    """
+    global _read_engine
+    if _read_engine is None:
+        db_path = configured_db_path()
+        if not db_path.exists():
+            logger.warning(f"action=get_read_engine warning=db_not_found path={db_path} fallback=shared_engine")
+            return configure_shared_engine()
+        with _read_engine_lock:
+            if _read_engine is None:
+                try:
+                    import settings
+
+                    pool_size = int(getattr(settings, "db_read_pool_size", DEFAULT_READ_POOL_SIZE))
+                except Exception:
+                    pool_size = DEFAULT_READ_POOL_SIZE
+                _read_engine = create_sqlite_engine(db_path, read_only=True, pool_size=pool_size)
+    return _read_engine
@@ -0,0 +1,394 @@
+"""ローソク足の圧縮アーカイブ (呼値単位の int32 + 日ごとのブロック圧縮)。
+
+東証の株価は呼値の整数倍なので、価格は「10^decimals 倍して呼値 (tick) で割った int32」、
+時刻は先頭からの差分 int64 で持ち、1日分ずつ zlib / lzma (標準ライブラリのみ) で圧縮する。
+REAL 列で保存するより小さく、復号は np.frombuffer + cumsum だけで numpy 配列になる。
+
+<root>/<DURATION>/<code>/<YYYY>.tka に1年分ずつ保存する(ParquetCandleStore と同じ分け方)。
+ファイルは MAGIC の後に日ごとのブロックが並び、各ブロックのヘッダに行数・最初と最後の
+時刻を持つので、期間外の日は展開せずに読み飛ばせる。
+
+呼値は各ブロックの価格の最大公約数から求める(値幅で呼値が変わっても日ごとに追従する)。
+整数の呼値で表せない価格(調整後株価・NaN など)のブロックは float64 のまま圧縮する。
+どちらの形式でも復号結果は元の float64 と一致する。
+
+ArchiveCandleStore は CandleStore と同じメソッドを持ち、TieredCandleStore で
+SQLite / Parquet の手前のストアの後ろに古い履歴の保存先 (cold tier) として置ける。
+"""
+
+import logging
+import lzma
+import os
+import struct
+import zlib
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+from app.data.candle_frame import CandleFrame
+from app.data.year_partition import code_dir_name, code_from_dir_name, concat_frames, merge_frames, partition_years
+
+logger = logging.getLogger(__name__)
+
+MAGIC = b"TKA1"
+ARCHIVE_SUFFIX = ".tka"
+ARCHIVE_CODECS = ("zlib", "lzma", "none")
+
+# 行数, 最初の time (ns), 最後の time (ns), codec, 価格形式, decimals, 呼値, 圧縮後バイト数
+_BLOCK_HEADER = struct.Struct("<IqqBBBqI")
+
+_CODEC_IDS = {"none": 0, "zlib": 1, "lzma": 2}
+
+PRICE_TICKS = 0
+PRICE_FLOAT = 1
+
+# 小数点以下の桁数の上限(ETF・指数は 0.1 / 0.01 刻みのものがある)
+MAX_DECIMALS = 4
+
+_PRICE_FIELDS = ("open", "high", "low", "close")
+_INT32_MAX = np.iinfo(np.int32).max
+
+_DAY_NS = 86400 * 10**9
+
+
+def _compress(raw: bytes, codec: str, level: Optional[int]) -> bytes:
+    if codec == "zlib":
+        return zlib.compress(raw, 6 if level is None else level)
+    if codec == "lzma":
+        return lzma.compress(raw, preset=6 if level is None else level)
+    return raw
+
+
+def _decompress(payload: bytes, codec_id: int) -> bytes:
+    if codec_id == _CODEC_IDS["zlib"]:
+        return zlib.decompress(payload)
+    if codec_id == _CODEC_IDS["lzma"]:
+        return lzma.decompress(payload)
+    return payload
+
+
+def encode_prices(prices: np.ndarray) -> Tuple[int, int, int, np.ndarray]:
+    """
+    価格の2次元配列 (open/high/low/close × 行) を呼値単位の整数にする
+
+    Returns:
+        (価格形式, decimals, 呼値, 配列)。PRICE_TICKS なら int32 の呼値数、
+        表せなければ (PRICE_FLOAT, 0, 0, float64 のまま)
+    """
+    prices = np.asarray(prices, dtype=np.float64)
+    if prices.size == 0 or not np.isfinite(prices).all():
+        return PRICE_FLOAT, 0, 0, prices
+
+    for decimals in range(MAX_DECIMALS + 1):
+        scale = 10.0**decimals
+        scaled = np.rint(prices * scale)
+        if np.abs(scaled).max() >= 2**53:
+            break
+        # 10^decimals で割り戻して元の値と完全に一致するときだけ整数化する
+        if not np.array_equal(scaled / scale, prices):
+            continue
+        ints = scaled.astype(np.int64)
+        nonzero = np.abs(ints[ints != 0])
+        tick = int(np.gcd.reduce(nonzero)) if len(nonzero) else 1
+        ticks = ints // tick
+        if np.abs(ticks).max() > _INT32_MAX:
+            break
+        return PRICE_TICKS, decimals, tick, ticks.astype(np.int32)
+    return PRICE_FLOAT, 0, 0, prices
+
+
+def decode_prices(values: np.ndarray, mode: int, decimals: int, tick: int) -> np.ndarray:
+    if mode == PRICE_FLOAT:
+        return values.astype(np.float64, copy=False)
+    return (values.astype(np.float64) * tick) / (10.0**decimals)
+
+
+def encode_block(frame: CandleFrame, codec: str = "zlib", level: Optional[int] = None) -> bytes:
+    """時刻順の CandleFrame (通常は1日分) をヘッダ付きの1ブロックにする"""
+    if codec not in _CODEC_IDS:
+        raise ValueError(f"unknown archive codec: {codec} (choices: {', '.join(ARCHIVE_CODECS)})")
+    times = frame.time.astype(np.int64)
+    deltas = np.diff(times, prepend=np.int64(0))
+    mode, decimals, tick, prices = encode_prices(np.stack([getattr(frame, name) for name in _PRICE_FIELDS]))
+    raw = deltas.tobytes() + np.ascontiguousarray(prices).tobytes() + frame.volume.astype(np.int64).tobytes()
+    payload = _compress(raw, codec, level)
+    header = _BLOCK_HEADER.pack(
+        len(frame), int(times[0]), int(times[-1]), _CODEC_IDS[codec], mode, decimals, tick, len(payload)
+    )
+    return header + payload
+
+
+def decode_block(header: Tuple, payload: bytes) -> Dict[str, np.ndarray]:
+    """ブロックを time/open/high/low/close/volume の配列に戻す"""
+    rows, _, _, codec_id, mode, decimals, tick, _ = header
+    raw = _decompress(payload, codec_id)
+    price_dtype = np.int32 if mode == PRICE_TICKS else np.float64
+    price_bytes = 4 * rows * np.dtype(price_dtype).itemsize
+
+    deltas = np.frombuffer(raw, dtype=np.int64, count=rows)
+    prices = np.frombuffer(raw, dtype=price_dtype, count=4 * rows, offset=8 * rows).reshape(4, rows)
+    volume = np.frombuffer(raw, dtype=np.int64, count=rows, offset=8 * rows + price_bytes)
+
+    decoded = decode_prices(prices, mode, decimals, tick)
+    columns = {"time": np.cumsum(deltas).view("datetime64[ns]")}
+    columns.update({name: decoded[i] for i, name in enumerate(_PRICE_FIELDS)})
+    columns["volume"] = volume.copy()
+    return columns
+
+
+def split_blocks(data: bytes, pos: int = 0) -> List[Tuple[Tuple, bytes]]:
+    """連続したブロックのバイト列を (ヘッダ, 圧縮データ) に分ける(展開はしない)"""
+    blocks = []
+    while pos < len(data):
+        header = _BLOCK_HEADER.unpack_from(data, pos)
+        pos += _BLOCK_HEADER.size
+        blocks.append((header, data[pos : pos + header[-1]]))
+        pos += header[-1]
+    return blocks
+
+
+def read_blocks(path: Path) -> List[Tuple[Tuple, bytes]]:
+    """ファイル中の (ヘッダ, 圧縮データ) を順に返す(展開はしない)"""
+    data = Path(path).read_bytes()
+    if data[: len(MAGIC)] != MAGIC:
+        raise ValueError(f"not a candle archive: {path}")
+    return split_blocks(data, len(MAGIC))
+
+
+def _blocks_to_frame(blocks: List[Tuple[Tuple, bytes]]) -> CandleFrame:
+    return concat_frames([CandleFrame(**decode_block(h, p)) for h, p in blocks])
+
+
+def _day_keys(times: np.ndarray) -> np.ndarray:
+    return times.astype(np.int64) // _DAY_NS
+
+
+class ArchiveCandleStore:
+    """銘柄・時間軸・年ごとの圧縮アーカイブに保存する(CandleStore と同じメソッド)"""
+
+    layout = "archive"
+
+    def __init__(self, root: Path, codec: str = "zlib", level: Optional[int] = None):
+        if codec not in _CODEC_IDS:
+            raise ValueError(f"unknown archive codec: {codec} (choices: {', '.join(ARCHIVE_CODECS)})")
+        self.root = Path(root)
+        self.codec = codec
+        self.level = level
+
+    def series_dir(self, product_code: str, duration: str) -> Path:
+        return self.root / duration.upper() / code_dir_name(product_code)
+
+    def partition_path(self, product_code: str, duration: str, year: int) -> Path:
+        return self.series_dir(product_code, duration) / f"{int(year)}{ARCHIVE_SUFFIX}"
+
+    def _partition_years(self, product_code: str, duration: str) -> List[int]:
+        directory = self.series_dir(product_code, duration)
+        if not directory.is_dir():
+            return []
+        return sorted(int(p.stem) for p in directory.glob(f"*{ARCHIVE_SUFFIX}") if p.stem.isdigit())
+
+    def _write_partition(self, path: Path, blocks: List[bytes]) -> None:
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = path.with_name(f"{path.name}.{os.getpid()}.tmp")
+        with open(tmp_path, "wb") as f:
+            f.write(MAGIC)
+            for block in blocks:
+                f.write(block)
+        tmp_path.replace(path)
+
+    def upsert(
+        self, product_code: str, duration: str, frame: CandleFrame, on_conflict: str = "update"
+    ) -> Dict[str, int]:
+        """
+        日ごとのブロックにマージして書き戻す(変更のない日のブロックは展開せずそのまま残す)
+
+        Returns:
+            {'inserted': 追加行数, 'updated': 値が変わった行数, 'skipped': 既存と同値・ignore の行数}
+        """
+        if on_conflict not in ("update", "ignore"):
+            raise ValueError(f"unknown on_conflict mode: {on_conflict}")
+        stats = {"inserted": 0, "updated": 0, "skipped": 0}
+        if not frame:
+            return stats
+
+        # 同一時刻は後勝ちにして時刻順に揃える
+        order = np.argsort(frame.time, kind="stable")
+        frame = CandleFrame(**{k: v[order] for k, v in frame.arrays().items()})
+        last = np.append(frame.time[1:] != frame.time[:-1], True)
+        frame = CandleFrame(**{k: v[last] for k, v in frame.arrays().items()})
+
+        years = partition_years(frame.time)
+        for year in np.unique(years):
+            path = self.partition_path(product_code, duration, int(year))
+            blocks = read_blocks(path) if path.exists() else []
+            existing = {header[1] // _DAY_NS: (header, payload) for header, payload in blocks}
+            encoded = {day: _BLOCK_HEADER.pack(*h) + p for day, (h, p) in existing.items()}
+
+            in_year = years == year
+            days = _day_keys(frame.time[in_year])
+            changed = False
+            for day in np.unique(days):
+                part = CandleFrame(**{k: v[in_year][days == day] for k, v in frame.arrays().items()})
+                old = _blocks_to_frame([existing[day]]) if day in existing else CandleFrame.empty()
+                merged, counts = merge_frames(old, part, on_conflict)
+                for key, value in counts.items():
+                    stats[key] += value
+                if counts["inserted"] or counts["updated"]:
+                    encoded[day] = encode_block(merged, self.codec, self.level)
+                    changed = True
+            if changed:
+                self._write_partition(path, [encoded[day] for day in sorted(encoded)])
+
+        logger.debug(
+            f"action=archive_upsert code={product_code} duration={duration} inserted={stats['inserted']} "
+            f"updated={stats['updated']} skipped={stats['skipped']}"
+        )
+        return stats
+
+    def _headers(self, product_code: str, duration: str, years: Optional[List[int]] = None) -> List[Tuple]:
+        years = self._partition_years(product_code, duration) if years is None else years
+        return [h for y in years for h, _ in read_blocks(self.partition_path(product_code, duration, y))]
+
+    def latest_time(self, product_code: str, duration: str) -> Optional[datetime]:
+        """最後のブロックのヘッダから返す(展開しない)"""
+        years = self._partition_years(product_code, duration)
+        headers = self._headers(product_code, duration, years[-1:])
+        if not headers:
+            return None
+        return _to_datetime(headers[-1][2])
+
+    def stats(self, product_code: str, duration: str) -> Tuple[int, Optional[datetime]]:
+        """(行数, 最新 time) をブロックのヘッダだけから返す"""
+        headers = self._headers(product_code, duration)
+        if not headers:
+            return 0, None
+        return sum(h[0] for h in headers), _to_datetime(headers[-1][2])
+
+    def load_arrays(
+        self,
+        product_code: str,
+        duration: str,
+        start: Optional[datetime] = None,
+        end: Optional[datetime] = None,
+        limit: Optional[int] = None,
+    ) -> Dict[str, np.ndarray]:
+        """期間内の列を numpy 配列の辞書で返す(limit 指定時は新しい方から limit 本)"""
+        return self.load(product_code, duration, start=start, end=end, limit=limit).arrays()
+
+    def load(
+        self,
+        product_code: str,
+        duration: str,
+        start: Optional[datetime] = None,
+        end: Optional[datetime] = None,
+        limit: Optional[int] = None,
+    ) -> CandleFrame:
+        years = self._partition_years(product_code, duration)
+        if start is not None:
+            years = [y for y in years if y >= start.year]
+        if end is not None:
+            years = [y for y in years if y <= end.year]
+        start_ns = int(np.datetime64(start, "ns").astype(np.int64)) if start is not None else None
+        end_ns = int(np.datetime64(end, "ns").astype(np.int64)) if end is not None else None
+
+        # 期間にかかるブロックだけを展開する(limit 指定時は新しい方から必要な分だけ)
+        selected: List[Tuple[Tuple, bytes]] = []
+        remaining = limit
+        for year in reversed(years):
+            for header, payload in reversed(read_blocks(self.partition_path(product_code, duration, year))):
+                if (start_ns is not None and header[2] < start_ns) or (end_ns is not None and header[1] > end_ns):
+                    continue
+                selected.append((header, payload))
+                if remaining is not None:
+                    remaining -= header[0]
+                    if remaining <= 0:
+                        break
+            if remaining is not None and remaining <= 0:
+                break
+
+        frame = _blocks_to_frame(list(reversed(selected)))
+        if frame and (start_ns is not None or end_ns is not None):
+            times = frame.time.astype(np.int64)
+            lo = int(np.searchsorted(times, start_ns, side="left")) if start_ns is not None else 0
+            hi = int(np.searchsorted(times, end_ns, side="right")) if end_ns is not None else len(frame)
+            frame = frame[lo:hi]
+        if limit is not None and len(frame) > limit:
+            frame = frame[len(frame) - int(limit) :]
+        return frame
+
+    def list_codes(self, duration: str) -> List[str]:
+        directory = self.root / duration.upper()
+        if not directory.is_dir():
+            return []
+        return [
+            code_from_dir_name(p.name)
+            for p in sorted(directory.iterdir())
+            if p.is_dir() and any(p.glob(f"*{ARCHIVE_SUFFIX}"))
+        ]
+
+
+def _to_datetime(ns: int) -> datetime:
+    return np.datetime64(int(ns), "ns").astype("datetime64[us]").item()
+
+
+class TieredCandleStore:
+    """新しい足を持つストア (hot) の後ろに古い履歴のアーカイブ (cold) を置く
+
+    読み込みは両方を時刻順につなぎ、同じ時刻は hot を優先する。書き込みは hot にだけ行う
+    (cold への移し替えは copy_candle_store や ArchiveCandleStore.upsert で行う)。
+    """
+
+    def __init__(self, hot, cold):
+        self.hot = hot
+        self.cold = cold
+        self.layout = f"{hot.layout}+{cold.layout}"
+
+    def upsert(
+        self, product_code: str, duration: str, frame: CandleFrame, on_conflict: str = "update"
+    ) -> Dict[str, int]:
+        return self.hot.upsert(product_code, duration, frame, on_conflict=on_conflict)
+
+    def latest_time(self, product_code: str, duration: str) -> Optional[datetime]:
+        latest = self.hot.latest_time(product_code, duration)
+        return latest if latest is not None else self.cold.latest_time(product_code, duration)
+
+    def stats(self, product_code: str, duration: str) -> Tuple[int, Optional[datetime]]:
+        """(両方の行数の和, 最新 time)。重なった足は二重に数えるが、キャッシュの版の判定には十分"""
+        hot_rows, hot_latest = self.hot.stats(product_code, duration)
+        cold_rows, cold_latest = self.cold.stats(product_code, duration)
+        latest = max((t for t in (hot_latest, cold_latest) if t is not None), default=None)
+        return hot_rows + cold_rows, latest
+
+    def load_arrays(
+        self,
+        product_code: str,
+        duration: str,
+        start: Optional[datetime] = None,
+        end: Optional[datetime] = None,
+        limit: Optional[int] = None,
+    ) -> Dict[str, np.ndarray]:
+        return self.load(product_code, duration, start=start, end=end, limit=limit).arrays()
+
+    def load(
+        self,
+        product_code: str,
+        duration: str,
+        start: Optional[datetime] = None,
+        end: Optional[datetime] = None,
+        limit: Optional[int] = None,
+    ) -> CandleFrame:
+        hot = self.hot.load(product_code, duration, start=start, end=end, limit=limit)
+        if limit is not None and len(hot) >= limit:
+            return hot
+        cold = self.cold.load(product_code, duration, start=start, end=end)
+        if hot and cold:
+            cold = cold[: int(np.searchsorted(cold.time, hot.time[0]))]
+        frame = concat_frames([cold, hot])
+        if limit is not None and len(frame) > limit:
+            frame = frame[len(frame) - int(limit) :]
+        return frame
+
+    def list_codes(self, duration: str) -> List[str]:
+        return sorted(set(self.hot.list_codes(duration)) | set(self.cold.list_codes(duration)))
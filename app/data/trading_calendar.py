@@ -0,0 +1,275 @@
+"""東証 (JPX) の取引日・立会時間のカレンダー。
+
+休業日(土日・国民の祝日・振替休日・国民の休日・12/31〜1/3)と立会時間
+(前場 9:00-11:30 / 後場 12:30-15:30。2024-11-04 以前の大引けは 15:00)を
+年単位で前計算し、時刻配列から「取引日番号」「日中の足の枠番号」「通し番号」を
+np.searchsorted でまとめて引けるようにする。
+
+銘柄間の時刻合わせ・足の作り直し・欠損足の検出で共通に使う。
+時刻は CandleFrame と同じ東証の壁時計時刻 (tz なし datetime64) で扱う。
+"""
+
+import logging
+import re
+from datetime import date, timedelta
+from functools import lru_cache
+from typing import Iterable, List, Optional, Tuple
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+_DURATION_RE = re.compile(r"^(\d+)([smhd])$")
+_UNIT_NS = {"s": 10**9, "m": 60 * 10**9, "h": 3600 * 10**9, "d": 86400 * 10**9}
+
+MORNING_OPEN = np.timedelta64(9 * 60, "m").astype("timedelta64[ns]")
+MORNING_CLOSE = np.timedelta64(11 * 60 + 30, "m").astype("timedelta64[ns]")
+AFTERNOON_OPEN = np.timedelta64(12 * 60 + 30, "m").astype("timedelta64[ns]")
+AFTERNOON_CLOSE = np.timedelta64(15 * 60 + 30, "m").astype("timedelta64[ns]")
+# 2024-11-05 から大引けが 15:00 -> 15:30 に延長
+LEGACY_AFTERNOON_CLOSE = np.timedelta64(15 * 60, "m").astype("timedelta64[ns]")
+CLOSE_EXTENDED_ON = np.datetime64("2024-11-05", "D")
+
+# 祝日以外の休場日(システム障害による終日売買停止)
+SPECIAL_CLOSURES = ("2020-10-01",)
+
+# 法改正・五輪特措法で日付が動いた祝日 (年 -> {祝日名: 日付})
+_MOVED_HOLIDAYS = {
+    2020: {"marine": (7, 23), "sports": (7, 24), "mountain": (8, 10)},
+    2021: {"marine": (7, 22), "sports": (7, 23), "mountain": (8, 8)},
+}
+
+
+def duration_to_timedelta(duration: str) -> np.timedelta64:
+    """'5s' / '15m' / '4h' / '1d' を timedelta64[ns] にする"""
+    match = _DURATION_RE.match(str(duration).strip().lower())
+    if not match or int(match.group(1)) <= 0:
+        raise ValueError(f"invalid duration: {duration}")
+    return np.timedelta64(int(match.group(1)) * _UNIT_NS[match.group(2)], "ns")
+
+
+def _step_ns(step) -> int:
+    """'15m' のような時間軸名または timedelta64 を ns の整数にする"""
+    if isinstance(step, str):
+        step = duration_to_timedelta(step)
+    return int(np.timedelta64(step, "ns").astype(np.int64))
+
+
+def afternoon_close_for(days) -> np.ndarray:
+    """日付ごとの大引け時刻(日の始まりからの経過 ns)"""
+    days = np.asarray(days).astype("datetime64[D]")
+    return np.where(days >= CLOSE_EXTENDED_ON, AFTERNOON_CLOSE, LEGACY_AFTERNOON_CLOSE)
+
+
+def _nth_monday(year: int, month: int, n: int) -> date:
+    first = date(year, month, 1)
+    return first + timedelta(days=(7 - first.weekday()) % 7 + 7 * (n - 1))
+
+
+def _equinox_days(year: int) -> Tuple[int, int]:
+    """春分日・秋分日(1980-2099 年の近似式)"""
+    offset = 0.242194 * (year - 1980) - int((year - 1980) / 4)
+    return int(20.8431 + offset), int(23.2488 + offset)
+
+
+def japanese_holidays(year: int) -> List[date]:
+    """国民の祝日・振替休日・国民の休日(2000 年以降の制度)"""
+    moved = _MOVED_HOLIDAYS.get(year, {})
+    spring, autumn = _equinox_days(year)
+    days = {
+        date(year, 1, 1),
+        _nth_monday(year, 1, 2),
+        date(year, 2, 11),
+        date(year, 3, spring),
+        date(year, 4, 29),
+        date(year, 5, 3),
+        date(year, 5, 4),
+        date(year, 5, 5),
+        _nth_monday(year, 9, 3) if year >= 2003 else date(year, 9, 15),
+        date(year, 9, autumn),
+        date(year, 11, 3),
+        date(year, 11, 23),
+    }
+    if year >= 2020:
+        days.add(date(year, 2, 23))
+    elif year <= 2018:
+        days.add(date(year, 12, 23))
+
+    if "marine" in moved:
+        days.add(date(year, *moved["marine"]))
+    else:
+        days.add(_nth_monday(year, 7, 3) if year >= 2003 else date(year, 7, 20))
+    if "sports" in moved:
+        days.add(date(year, *moved["sports"]))
+    else:
+        days.add(_nth_monday(year, 10, 2))
+    if "mountain" in moved:
+        days.add(date(year, *moved["mountain"]))
+    elif year >= 2016:
+        days.add(date(year, 8, 11))
+    if year == 2019:
+        # 即位の日・即位礼正殿の儀(前後の 4/30・5/2 は国民の休日になる)
+        days.update({date(2019, 5, 1), date(2019, 10, 22)})
+
+    # 振替休日: 日曜の祝日の後の最初の祝日でない日
+    for day in sorted(days):
+        if day.weekday() == 6:
+            substitute = day + timedelta(days=1)
+            while substitute in days:
+                substitute += timedelta(days=1)
+            days.add(substitute)
+
+    # 国民の休日: 祝日に挟まれた平日
+    for day in sorted(days):
+        between = day + timedelta(days=1)
+        if between not in days and (day + timedelta(days=2)) in days and between.weekday() != 6:
+            days.add(between)
+    return sorted(days)
+
+
+def jpx_closed_days(year: int) -> List[date]:
+    """土日以外の休場日(祝日 + 年末年始 12/31・1/2・1/3 + 特別休場)"""
+    days = set(japanese_holidays(year))
+    days.update({date(year, 1, 2), date(year, 1, 3), date(year, 12, 31)})
+    days.update(date.fromisoformat(d) for d in SPECIAL_CLOSURES if d.startswith(str(year)))
+    return sorted(days)
+
+
+class TradingCalendar:
+    """前計算した取引日配列と、時刻 -> 足の枠番号の一括変換
+
+    half_days に指定した日は前場のみとして扱う(現行制度では半日立会は無い)。
+    """
+
+    def __init__(
+        self,
+        start_year: int = 2000,
+        end_year: Optional[int] = None,
+        extra_holidays: Iterable[str] = (),
+        half_days: Iterable[str] = (),
+    ):
+        end_year = end_year if end_year is not None else date.today().year + 1
+        closed = [d for y in range(start_year, end_year + 1) for d in jpx_closed_days(y)]
+        closed_arr = np.array([*closed, *extra_holidays], dtype="datetime64[D]")
+        days = np.arange(f"{start_year}-01-01", f"{end_year + 1}-01-01", dtype="datetime64[D]")
+        days = days[np.is_busday(days)]
+        self.trading_days = days[~np.isin(days, closed_arr)]
+        self.half_days = np.array(sorted(half_days), dtype="datetime64[D]")
+        self.start_year = start_year
+        self.end_year = end_year
+
+        self._offsets_cache: dict = {}
+        self.afternoon_close = afternoon_close_for(self.trading_days)
+        self.afternoon_close[np.isin(self.trading_days, self.half_days)] = AFTERNOON_OPEN
+
+    def __len__(self) -> int:
+        return len(self.trading_days)
+
+    # --- 取引日 -------------------------------------------------------------
+
+    def day_index(self, times) -> np.ndarray:
+        """各時刻の取引日番号(取引日でなければ -1)"""
+        days = np.asarray(times).astype("datetime64[D]")
+        idx = np.searchsorted(self.trading_days, days)
+        clipped = np.minimum(idx, len(self.trading_days) - 1)
+        return np.where(self.trading_days[clipped] == days, clipped, -1)
+
+    def is_trading_day(self, times) -> np.ndarray:
+        return self.day_index(times) >= 0
+
+    def trading_days_between(self, start, end) -> np.ndarray:
+        """[start, end] の取引日"""
+        lo = np.searchsorted(self.trading_days, np.datetime64(start, "D"), side="left")
+        hi = np.searchsorted(self.trading_days, np.datetime64(end, "D"), side="right")
+        return self.trading_days[lo:hi]
+
+    def next_trading_day(self, day) -> np.datetime64:
+        """day より後の最初の取引日"""
+        return self.trading_days[np.searchsorted(self.trading_days, np.datetime64(day, "D"), side="right")]
+
+    def previous_trading_day(self, day) -> np.datetime64:
+        """day より前の最後の取引日"""
+        return self.trading_days[np.searchsorted(self.trading_days, np.datetime64(day, "D"), side="left") - 1]
+
+    # --- 立会時間内の足の枠 -------------------------------------------------
+
+    def slots_per_day(self, step) -> np.ndarray:
+        """取引日ごとの step 刻みの足の枠数(前場 + 後場、端数の足も1枠)"""
+        step_ns = _step_ns(step)
+        morning = -(-int((MORNING_CLOSE - MORNING_OPEN).astype(np.int64)) // step_ns)
+        afternoon_len = (self.afternoon_close - AFTERNOON_OPEN).astype(np.int64)
+        return morning + (-(-afternoon_len // step_ns))
+
+    def _day_offsets(self, step_ns: int) -> np.ndarray:
+        if step_ns not in self._offsets_cache:
+            self._offsets_cache[step_ns] = np.concatenate(([0], np.cumsum(self.slots_per_day(step_ns))))
+        return self._offsets_cache[step_ns]
+
+    def session_slots(self, times, step) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        各時刻の (取引日番号, 日中の枠番号) を返す
+
+        前場・後場それぞれの開始時刻から step 刻みで枠を数え、引け時刻ちょうどの足は
+        そのセッション最後の枠に含める。取引日以外・立会時間外・昼休みは (-1, -1)。
+        """
+        times = np.asarray(times, dtype="datetime64[ns]")
+        step_ns = _step_ns(step)
+        day_idx = self.day_index(times)
+        tod = times - times.astype("datetime64[D]").astype("datetime64[ns]")
+        close = self.afternoon_close[np.maximum(day_idx, 0)]
+
+        morning_slots = -(-int((MORNING_CLOSE - MORNING_OPEN).astype(np.int64)) // step_ns)
+        in_morning = (tod >= MORNING_OPEN) & (tod <= MORNING_CLOSE)
+        in_afternoon = (tod >= AFTERNOON_OPEN) & (tod <= close) & (close > AFTERNOON_OPEN)
+
+        morning_slot = np.minimum((tod - MORNING_OPEN).astype(np.int64) // step_ns, morning_slots - 1)
+        afternoon_last = -(-(close - AFTERNOON_OPEN).astype(np.int64) // step_ns) - 1
+        afternoon_slot = morning_slots + np.minimum((tod - AFTERNOON_OPEN).astype(np.int64) // step_ns, afternoon_last)
+
+        slot = np.where(in_morning, morning_slot, np.where(in_afternoon, afternoon_slot, -1))
+        valid = (day_idx >= 0) & (slot >= 0)
+        return np.where(valid, day_idx, -1), np.where(valid, slot, -1)
+
+    def bar_index(self, times, step) -> np.ndarray:
+        """カレンダー先頭からの通し足番号(立会時間外は -1)。銘柄間の時刻合わせに使う"""
+        step_ns = _step_ns(step)
+        day_idx, slot = self.session_slots(times, step)
+        offsets = self._day_offsets(step_ns)
+        return np.where(day_idx >= 0, offsets[np.maximum(day_idx, 0)] + slot, -1)
+
+    def slot_start_times(self, start, end, step) -> np.ndarray:
+        """[start, end] の取引日について、立会時間内の全ての足の開始時刻(欠損足の検出用)"""
+        step_ns = _step_ns(step)
+        days = self.trading_days_between(start, end)
+        if len(days) == 0:
+            return np.array([], dtype="datetime64[ns]")
+        day_idx = self.day_index(days)
+        counts = self.slots_per_day(step_ns)[day_idx]
+        morning_slots = -(-int((MORNING_CLOSE - MORNING_OPEN).astype(np.int64)) // step_ns)
+
+        rep_day = np.repeat(days.astype("datetime64[ns]"), counts)
+        slot = np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts, counts)
+        afternoon = slot >= morning_slots
+        offset = np.where(
+            afternoon,
+            AFTERNOON_OPEN.astype(np.int64) + (slot - morning_slots) * step_ns,
+            MORNING_OPEN.astype(np.int64) + slot * step_ns,
+        )
+        return rep_day + offset.astype("timedelta64[ns]")
+
+    def missing_bars(self, times, step, start=None, end=None) -> np.ndarray:
+        """times に無い立会時間内の足の開始時刻(期間省略時は times の最初と最後の日)"""
+        times = np.asarray(times, dtype="datetime64[ns]")
+        if len(times) == 0 and (start is None or end is None):
+            return np.array([], dtype="datetime64[ns]")
+        start = start if start is not None else times[0]
+        end = end if end is not None else times[-1]
+        expected = self.slot_start_times(start, end, step)
+        present = self.bar_index(times, step)
+        return expected[~np.isin(self.bar_index(expected, step), present)]
+
+
+@lru_cache(maxsize=1)
+def get_calendar() -> TradingCalendar:
+    """プロセス内で共有する既定のカレンダー(2000 年〜翌年)"""
+    return TradingCalendar()
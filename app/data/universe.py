@@ -0,0 +1,283 @@
+"""JPX上場銘柄一覧(ユニバース)のローカルキャッシュ。
+
+JPX の Excel 一覧を取得・解析した結果 (code, name, market, sector33) を
+gzip 圧縮した列指向 JSON に保存し、各 CLI から即座に参照できるようにする。
+"""
+
+import gzip
+import json
+import logging
+import re
+import time
+import urllib.parse
+import urllib.request
+from pathlib import Path
+from typing import Iterable, List, Optional
+
+import pandas as pd
+
+logger = logging.getLogger(__name__)
+
+ROOT_DIR = Path(__file__).resolve().parents[2]
+JPX_LISTING_PAGE = "https://www.jpx.co.jp/markets/statistics-equities/misc/01.html"
+DEFAULT_UNIVERSE_CACHE = ROOT_DIR / "results" / "cache" / "jpx_universe.json.gz"
+DEFAULT_MAX_AGE_DAYS = 7.0
+
+UNIVERSE_COLUMNS = ["code", "name", "market", "sector33_code", "sector33"]
+
+# 市場区分の別名(英語表記 -> JPX一覧の表記)
+MARKET_ALIASES = {
+    "prime": "プライム",
+    "standard": "スタンダード",
+    "growth": "グロース",
+    "etf": "ETF",
+    "reit": "REIT",
+    "pro": "PRO Market",
+}
+
+
+def extract_codes_from_df(df: pd.DataFrame) -> List[str]:
+    """一覧 DataFrame のコード列から4桁銘柄コードを順序維持・重複なしで取り出す"""
+    code_col = _find_column(df, ["コード", "銘柄コード", "Code", "code"], ["コード", "Code", "code"])
+    if code_col is None:
+        return []
+
+    codes: List[str] = []
+    for raw in df[code_col].astype(str):
+        m = re.search(r"\b(\d{4})\b", raw)
+        if m:
+            codes.append(m.group(1))
+    return list(dict.fromkeys(codes))
+
+
+def _find_column(df: pd.DataFrame, exact: List[str], partial: List[str]):
+    for col in df.columns:
+        col_str = str(col).strip()
+        if col_str in exact or any(key in col_str for key in partial):
+            return col
+    return None
+
+
+def find_jpx_list_url() -> str:
+    """JPX の上場銘柄一覧ページから xls/xlsx ファイルのURLを探す"""
+    with urllib.request.urlopen(JPX_LISTING_PAGE, timeout=30) as response:
+        html = response.read().decode("utf-8", errors="ignore")
+
+    # 上場銘柄一覧の xls/xlsx へのリンクを拾う
+    matches = re.findall(r'href="([^"]+data_j\.(?:xls|xlsx))"', html)
+    if not matches:
+        matches = re.findall(r'href="([^"]+\.(?:xls|xlsx))"', html)
+    if not matches:
+        raise RuntimeError("JPXの上場銘柄一覧ファイルURLを検出できませんでした")
+
+    for href in matches:
+        abs_url = urllib.parse.urljoin(JPX_LISTING_PAGE, href)
+        if "data_j" in abs_url or "listed" in abs_url.lower() or "jpx" in abs_url.lower():
+            return abs_url
+    return urllib.parse.urljoin(JPX_LISTING_PAGE, matches[0])
+
+
+def parse_jpx_listing(df: pd.DataFrame) -> pd.DataFrame:
+    """
+    JPX上場銘柄一覧を code/name/market/sector33_code/sector33 の表に整形
+
+    Args:
+        df: pd.read_excel(dtype=str) した上場銘柄一覧
+
+    Returns:
+        UNIVERSE_COLUMNS を列に持つ DataFrame(code で重複除去済み)
+    """
+    code_col = _find_column(df, ["コード", "銘柄コード", "Code", "code"], ["コード", "Code", "code"])
+    if code_col is None:
+        raise RuntimeError("JPX上場銘柄一覧から銘柄コードを抽出できませんでした")
+
+    name_col = _find_column(df, ["銘柄名"], ["銘柄名", "Name"])
+    market_col = _find_column(df, ["市場・商品区分"], ["市場", "Market"])
+    sector_code_col = _find_column(df, ["33業種コード"], ["33業種コード"])
+    sector_col = _find_column(df, ["33業種区分"], ["33業種区分"])
+
+    def _col(col) -> pd.Series:
+        if col is None:
+            return pd.Series([""] * len(df), index=df.index)
+        return df[col].fillna("").astype(str).str.strip()
+
+    out = pd.DataFrame(
+        {
+            "code": df[code_col].astype(str).str.extract(r"\b(\d{4})\b", expand=False),
+            "name": _col(name_col),
+            "market": _col(market_col),
+            "sector33_code": _col(sector_code_col),
+            "sector33": _col(sector_col),
+        }
+    )
+    out = out.dropna(subset=["code"]).drop_duplicates(subset=["code"]).reset_index(drop=True)
+    if out.empty:
+        raise RuntimeError("JPX上場銘柄一覧から銘柄コードを抽出できませんでした")
+    return out
+
+
+def download_jpx_listing() -> pd.DataFrame:
+    """JPXから上場銘柄一覧をダウンロードして整形する(ネットワーク必須・低速)"""
+    list_url = find_jpx_list_url()
+    logger.info(f"action=download_jpx_listing url={list_url}")
+    return parse_jpx_listing(pd.read_excel(list_url, dtype=str))
+
+
+def save_universe(df: pd.DataFrame, path: Path = DEFAULT_UNIVERSE_CACHE) -> None:
+    """ユニバースを gzip 圧縮の列指向 JSON で保存する"""
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    payload = {
+        "fetched_at_epoch": int(time.time()),
+        "columns": {col: df[col].astype(str).tolist() for col in UNIVERSE_COLUMNS},
+    }
+    tmp_path = path.with_name(path.name + ".tmp")
+    with gzip.open(tmp_path, "wt", encoding="utf-8") as fh:
+        json.dump(payload, fh, ensure_ascii=False, separators=(",", ":"))
+    tmp_path.replace(path)
+
+
+def read_universe_cache(path: Path = DEFAULT_UNIVERSE_CACHE) -> Optional[pd.DataFrame]:
+    """キャッシュを読み込む(無い・壊れている場合は None)"""
+    path = Path(path)
+    if not path.exists():
+        return None
+    try:
+        with gzip.open(path, "rt", encoding="utf-8") as fh:
+            payload = json.load(fh)
+        df = pd.DataFrame(payload["columns"], columns=UNIVERSE_COLUMNS)
+        df.attrs["fetched_at_epoch"] = int(payload.get("fetched_at_epoch", 0))
+        return df
+    except Exception as e:
+        logger.warning(f"action=read_universe_cache error={e!s} path={path}")
+        return None
+
+
+def load_universe(
+    path: Path = DEFAULT_UNIVERSE_CACHE,
+    max_age_days: float = DEFAULT_MAX_AGE_DAYS,
+    refresh: bool = False,
+    downloader=download_jpx_listing,
+) -> pd.DataFrame:
+    """
+    ユニバースを返す。キャッシュが期限切れ・未作成・refresh 指定時のみ JPX から再取得する
+
+    Args:
+        path: キャッシュファイル
+        max_age_days: キャッシュの有効日数
+        refresh: True なら期限に関係なく再取得
+        downloader: 一覧の取得関数(テスト用)
+
+    Returns:
+        UNIVERSE_COLUMNS を列に持つ DataFrame
+    """
+    cached = None if refresh else read_universe_cache(path)
+    if cached is not None:
+        age_days = (time.time() - cached.attrs.get("fetched_at_epoch", 0)) / 86400.0
+        if age_days < max_age_days:
+            return cached
+
+    try:
+        df = downloader()
+    except Exception as e:
+        # ネットワーク不通時は期限切れでも手元のキャッシュを使う
+        stale = cached if cached is not None else read_universe_cache(path)
+        if stale is not None:
+            logger.warning(f"action=load_universe warning=refresh_failed_using_stale_cache error={e!s}")
+            return stale
+        raise
+
+    save_universe(df, path)
+    df = df[UNIVERSE_COLUMNS].reset_index(drop=True)
+    df.attrs["fetched_at_epoch"] = int(time.time())
+    return df
+
+
+def _split_filter(values: Optional[Iterable[str]]) -> List[str]:
+    if not values:
+        return []
+    if isinstance(values, str):
+        values = [values]
+    out: List[str] = []
+    for value in values:
+        out.extend(v.strip() for v in str(value).split(",") if v.strip())
+    return out
+
+
+def filter_universe(
+    df: pd.DataFrame, markets: Optional[Iterable[str]] = None, sectors: Optional[Iterable[str]] = None
+) -> pd.DataFrame:
+    """
+    市場区分・33業種でユニバースを絞り込む
+
+    Args:
+        df: load_universe の結果
+        markets: 市場区分('prime', 'プライム', 'growth' など。部分一致, カンマ区切り可)
+        sectors: 33業種('電気機器' などの区分名、または '3650' などのコード。カンマ区切り可)
+
+    Returns:
+        絞り込み後の DataFrame
+    """
+    mask = pd.Series(True, index=df.index)
+
+    market_keys = [MARKET_ALIASES.get(m.lower(), m) for m in _split_filter(markets)]
+    if market_keys:
+        market_mask = pd.Series(False, index=df.index)
+        for key in market_keys:
+            market_mask |= df["market"].str.contains(key, case=False, regex=False)
+        mask &= market_mask
+
+    sector_keys = _split_filter(sectors)
+    if sector_keys:
+        mask &= df["sector33"].isin(sector_keys) | df["sector33_code"].isin(sector_keys)
+
+    return df[mask]
+
+
+def resolve_universe_codes(
+    markets: Optional[Iterable[str]] = None,
+    sectors: Optional[Iterable[str]] = None,
+    path: Path = DEFAULT_UNIVERSE_CACHE,
+    max_age_days: float = DEFAULT_MAX_AGE_DAYS,
+    refresh: bool = False,
+) -> List[str]:
+    """キャッシュ済みユニバースから条件に合う銘柄コードを返す"""
+    df = load_universe(path=path, max_age_days=max_age_days, refresh=refresh)
+    return filter_universe(df, markets=markets, sectors=sectors)["code"].tolist()
+
+
+def add_universe_arguments(parser) -> None:
+    """一括処理CLI共通のユニバース指定オプションを argparse に追加する"""
+    parser.add_argument(
+        "--segment",
+        action="append",
+        default=[],
+        help="市場区分で絞り込み (prime/standard/growth/etf など。複数指定・カンマ区切り可)",
+    )
+    parser.add_argument(
+        "--sector", action="append", default=[], help="33業種区分名またはコードで絞り込み (複数指定・カンマ区切り可)"
+    )
+    parser.add_argument(
+        "--refresh-universe", action="store_true", help="JPX上場銘柄一覧のキャッシュを期限に関係なく再取得"
+    )
+    parser.add_argument(
+        "--universe-max-age-days",
+        type=float,
+        default=DEFAULT_MAX_AGE_DAYS,
+        help="JPX上場銘柄一覧キャッシュの有効日数",
+    )
+
+
+def universe_filter_given(args) -> bool:
+    """CLI引数で市場区分・業種の絞り込みが指定されているか"""
+    return bool(_split_filter(args.segment) or _split_filter(args.sector))
+
+
+def resolve_universe_codes_from_args(args) -> List[str]:
+    """add_universe_arguments で追加した引数からユニバースの銘柄コードを解決する"""
+    return resolve_universe_codes(
+        markets=args.segment,
+        sectors=args.sector,
+        max_age_days=float(args.universe_max_age_days),
+        refresh=bool(args.refresh_universe),
+    )
@@ -1,15 +1,23 @@
 import logging
 from datetime import datetime, timedelta
-from typing import List, Optional
+from typing import Dict, List, Optional, Tuple
 
+import numpy as np
 import pandas as pd
 import yfinance as yf
 
+from app.data.candle_db import latest_candle_time, upsert_candle_frame
+from app.data.candle_frame import CandleFrame
+from app.data.candle_store import configured_layout, get_candle_store
 from app.models.candle import factory_candle_class
 
 logger = logging.getLogger(__name__)
 
 
+class NoDataError(RuntimeError):
+    """取得結果が空だった(上場廃止・誤ったコード・取得元が握りつぶした通信エラーなど)"""
+
+
 class YahooFinanceCandle:
     """Yahoo Financeから取得したローソク足データを表すクラス"""
 
@@ -38,6 +46,43 @@ class YahooFinanceClient:
 
     @staticmethod
     def get_historical_data(ticker: str, period_days: int = 365, interval: str = "1d") -> List[YahooFinanceCandle]:
+        """
+        Yahoo Financeから過去データを取得(YahooFinanceCandle のリスト)
+
+        列指向で扱える場合は get_historical_frame を使う。引数は同じ。
+
+        Returns:
+            YahooFinanceCandle のリスト
+        """
+        frame = YahooFinanceClient.get_historical_frame(ticker, period_days, interval)
+        if not frame:
+            return []
+        return frame.candles
+
+    @staticmethod
+    def _date_range(period_days: int, interval: str):
+        """取得期間(開始日, 終了日)を interval ごとの上限に合わせて返す"""
+        # 終了日は今日、開始日はperiod_days日前
+        end_date = datetime.now()
+        start_date = end_date - timedelta(days=period_days)
+
+        # データ取得の制限に対応
+        if interval == "1m" and period_days > 7:
+            logger.warning(f"action=get_historical_data warning=1m_interval_max_7days adjusting_to_7days")
+            start_date = end_date - timedelta(days=7)
+        elif interval == "5m" and period_days > 60:
+            logger.warning(f"action=get_historical_data warning=5m_interval_max_60days adjusting_to_60days")
+            start_date = end_date - timedelta(days=60)
+        elif interval == "1h" and period_days > 725:
+            logger.warning(f"action=get_historical_data warning=1h_interval_max_725days adjusting_to_725days")
+            start_date = end_date - timedelta(days=725)
+
+        return start_date, end_date
+
+    @staticmethod
+    def get_historical_frame(
+        ticker: str, period_days: int = 365, interval: str = "1d", raise_errors: bool = False
+    ) -> CandleFrame:
         """
         Yahoo Financeから過去データを取得
 
@@ -53,9 +98,10 @@ class YahooFinanceClient:
                 - '1d': 日足(デフォルト)
                 - '1wk': 週足
                 - '1mo': 月足
+            raise_errors: True なら取得時の例外を握りつぶさず送出する(再試行用)
 
         Returns:
-            YahooFinanceCandle のリスト
+            CandleFrame (取得失敗時は空)
         """
         logger.info(f"action=get_historical_data ticker={ticker} period_days={period_days} interval={interval}")
 
@@ -63,20 +109,7 @@ class YahooFinanceClient:
             # Yahoo Financeのティッカーオブジェクトを作成
             stock = yf.Ticker(ticker)
 
-            # 終了日は今日、開始日はperiod_days日前
-            end_date = datetime.now()
-            start_date = end_date - timedelta(days=period_days)
-
-            # データ取得の制限に対応
-            if interval == "1m" and period_days > 7:
-                logger.warning(f"action=get_historical_data warning=1m_interval_max_7days adjusting_to_7days")
-                start_date = end_date - timedelta(days=7)
-            elif interval == "5m" and period_days > 60:
-                logger.warning(f"action=get_historical_data warning=5m_interval_max_60days adjusting_to_60days")
-                start_date = end_date - timedelta(days=60)
-            elif interval == "1h" and period_days > 725:
-                logger.warning(f"action=get_historical_data warning=1h_interval_max_725days adjusting_to_725days")
-                start_date = end_date - timedelta(days=725)
+            start_date, end_date = YahooFinanceClient._date_range(period_days, interval)
 
             # データ取得
             df = stock.history(
@@ -85,27 +118,125 @@ class YahooFinanceClient:
 
             if df.empty:
                 logger.error(f"action=get_historical_data error=no_data_returned ticker={ticker}")
-                return []
-
-            # YahooFinanceCandleのリストに変換
-            candles = []
-            for index, row in df.iterrows():
-                candle = YahooFinanceCandle(
-                    time=index.to_pydatetime(),
-                    open=float(row["Open"]),
-                    high=float(row["High"]),
-                    low=float(row["Low"]),
-                    close=float(row["Close"]),
-                    volume=int(row["Volume"]),
-                )
-                candles.append(candle)
+                return CandleFrame.empty()
+
+            # 列単位でnumpy配列へ変換(行ループなし)
+            frame = CandleFrame.from_dataframe(df)
 
-            logger.info(f"action=get_historical_data success=true count={len(candles)}")
-            return candles
+            logger.info(f"action=get_historical_data success=true count={len(frame)}")
+            return frame
 
         except Exception as e:
             logger.error(f"action=get_historical_data error={e!s} ticker={ticker}")
-            return []
+            if raise_errors:
+                raise
+            return CandleFrame.empty()
+
+    @staticmethod
+    def get_window_frame(
+        ticker: str, start: datetime, end: datetime, interval: str = "1m", raise_errors: bool = False
+    ) -> CandleFrame:
+        """
+        [start, end) の期間を1リクエストで取得する(期間の上限調整はしない)
+
+        日中足の長期履歴を取得上限内の区間に分けてつなぐ用途(app.data.intraday_history)。
+        """
+        logger.info(f"action=get_window_frame ticker={ticker} interval={interval} start={start} end={end}")
+        try:
+            df = yf.Ticker(ticker).history(start=start, end=end, interval=interval)
+        except Exception as e:
+            logger.error(f"action=get_window_frame error={e!s} ticker={ticker}")
+            if raise_errors:
+                raise
+            return CandleFrame.empty()
+        return CandleFrame.from_dataframe(df)
+
+    @staticmethod
+    def get_historical_frames(
+        tickers: List[str],
+        period_days: int = 365,
+        interval: str = "1d",
+        chunk_size: int = 50,
+        raise_errors: bool = False,
+    ) -> Tuple[Dict[str, CandleFrame], Dict[str, str]]:
+        """
+        複数ティッカーを chunk_size 件ずつまとめて1リクエストで取得
+
+        Args:
+            tickers: ティッカーシンボルのリスト
+            period_days: 取得する過去日数
+            interval: データ間隔(get_historical_frame と同じ)
+            chunk_size: 1リクエストあたりのティッカー数
+            raise_errors: True ならチャンク単位の例外を送出する
+
+        Returns:
+            (ティッカー -> CandleFrame, ティッカー -> 失敗理由)
+        """
+        frames: Dict[str, CandleFrame] = {}
+        failures: Dict[str, str] = {}
+        tickers = list(dict.fromkeys(tickers))
+        if not tickers:
+            return frames, failures
+
+        chunk_size = max(1, int(chunk_size))
+        start_date, end_date = YahooFinanceClient._date_range(period_days, interval)
+
+        for i in range(0, len(tickers), chunk_size):
+            chunk = tickers[i : i + chunk_size]
+            logger.info(f"action=get_historical_frames tickers={len(chunk)} offset={i} interval={interval}")
+            try:
+                df = yf.download(
+                    tickers=chunk,
+                    start=start_date.strftime("%Y-%m-%d"),
+                    end=end_date.strftime("%Y-%m-%d"),
+                    interval=interval,
+                    group_by="ticker",
+                    auto_adjust=True,
+                    progress=False,
+                    threads=False,
+                )
+            except Exception as e:
+                logger.error(f"action=get_historical_frames error={e!s} tickers={len(chunk)}")
+                if raise_errors:
+                    raise
+                for ticker in chunk:
+                    failures[ticker] = str(e)
+                continue
+
+            errors = dict(getattr(getattr(yf, "shared", None), "_ERRORS", {}) or {})
+            chunk_frames = YahooFinanceClient._split_download(df, chunk)
+            for ticker in chunk:
+                frame = chunk_frames.get(ticker)
+                if frame:
+                    frames[ticker] = frame
+                else:
+                    failures[ticker] = str(errors.get(ticker, "no_data"))
+
+        logger.info(f"action=get_historical_frames success={len(frames)} failed={len(failures)}")
+        return frames, failures
+
+    @staticmethod
+    def _split_download(df: pd.DataFrame, tickers: List[str]) -> Dict[str, CandleFrame]:
+        """yf.download の横持ち結果をティッカーごとの CandleFrame に分割"""
+        frames: Dict[str, CandleFrame] = {}
+        if df is None or df.empty:
+            return frames
+
+        if not isinstance(df.columns, pd.MultiIndex):
+            # 単一ティッカー時は列が1段になる場合がある
+            sub = df.dropna(subset=["Open", "High", "Low", "Close"], how="all")
+            if len(tickers) == 1 and not sub.empty:
+                frames[tickers[0]] = CandleFrame.from_dataframe(sub)
+            return frames
+
+        available = set(df.columns.get_level_values(0))
+        for ticker in tickers:
+            if ticker not in available:
+                continue
+            sub = df[ticker].dropna(subset=["Open", "High", "Low", "Close"], how="all")
+            if not sub.empty:
+                frames[ticker] = CandleFrame.from_dataframe(sub)
+        return frames
 
     @staticmethod
     def ticker_from_product_code(product_code: str, market: str = "T") -> str:
@@ -170,7 +301,246 @@ def fetch_yahoo_data(
     return client.get_historical_data(ticker, period_days, interval)
 
 
-def save_yahoo_data_to_db(product_code: str, period_days: int = 365, duration: str = "1d", market: str = "T") -> int:
+def fetch_yahoo_frame(
+    product_code: str, period_days: int = 365, duration: str = "1d", market: str = "T", raise_errors: bool = False
+) -> CandleFrame:
+    """
+    Yahoo Financeからデータを列指向(CandleFrame)で取得する便利関数
+
+    Args:
+        product_code: 銘柄コード(例: '1459')
+        period_days: 取得する過去日数
+        duration: 時間軸('5s', '1m', '1h'など)
+        market: 市場コード(デフォルト: 'T' = 東証)
+        raise_errors: True なら取得時の例外を送出する
+
+    Returns:
+        CandleFrame
+    """
+    client = YahooFinanceClient()
+    ticker = client.ticker_from_product_code(product_code, market)
+    interval = client.convert_duration_to_interval(duration)
+    return client.get_historical_frame(ticker, period_days, interval, raise_errors=raise_errors)
+
+
+def fetch_yahoo_window(
+    product_code: str,
+    start: datetime,
+    end: datetime,
+    duration: str = "1m",
+    market: str = "T",
+    raise_errors: bool = False,
+) -> CandleFrame:
+    """銘柄コードと時間軸で [start, end) の期間を取得する便利関数"""
+    client = YahooFinanceClient()
+    ticker = client.ticker_from_product_code(product_code, market)
+    interval = client.convert_duration_to_interval(duration)
+    return client.get_window_frame(ticker, start, end, interval, raise_errors=raise_errors)
+
+
+def fetch_yahoo_frames(
+    product_codes: List[str],
+    period_days: int = 365,
+    duration: str = "1d",
+    market: str = "T",
+    chunk_size: int = 50,
+    raise_errors: bool = False,
+) -> Tuple[Dict[str, CandleFrame], Dict[str, str]]:
+    """
+    複数銘柄をまとめて取得する便利関数(銘柄コード単位で結果を返す)
+
+    Args:
+        product_codes: 銘柄コードのリスト(例: ['7203', '9984'])
+        period_days: 取得する過去日数
+        duration: 時間軸('5s', '1m', '1h'など)
+        market: 市場コード(デフォルト: 'T' = 東証)
+        chunk_size: 1リクエストあたりの銘柄数
+        raise_errors: True ならチャンク単位の例外を送出する
+
+    Returns:
+        (銘柄コード -> CandleFrame, 銘柄コード -> 失敗理由)
+    """
+    client = YahooFinanceClient()
+    interval = client.convert_duration_to_interval(duration)
+    ticker_to_code = {client.ticker_from_product_code(code, market): code for code in product_codes}
+
+    ticker_frames, ticker_failures = client.get_historical_frames(
+        list(ticker_to_code), period_days, interval, chunk_size=chunk_size, raise_errors=raise_errors
+    )
+    frames = {ticker_to_code[t]: f for t, f in ticker_frames.items()}
+    failures = {ticker_to_code[t]: reason for t, reason in ticker_failures.items()}
+    return frames, failures
+
+
+def save_candle_frame_to_db(
+    product_code: str, frame: CandleFrame, duration: str = "1d", on_conflict: str = "update"
+) -> Dict[str, int]:
+    """
+    取得済みの CandleFrame を1トランザクションでデータベースに一括保存
+
+    Args:
+        product_code: 銘柄コード(例: '1459')
+        frame: 保存するローソク足
+        duration: 時間軸('5s', '1m', '1h'など)
+        on_conflict: 既存行と衝突した場合の動作('update' または 'ignore')
+
+    Returns:
+        {'inserted': 新規行数, 'updated': 上書き行数, 'skipped': 書き込まなかった行数}
+    """
+    stats = {"inserted": 0, "updated": 0, "skipped": 0}
+    if not frame:
+        return stats
+
+    candle_cls = factory_candle_class(product_code, duration)
+    if candle_cls is None:
+        logger.error(f"action=save_candle_frame_to_db error=unknown_duration duration={duration}")
+        return stats
+
+    return upsert_candle_frame(candle_cls.__tablename__, frame, on_conflict=on_conflict)
+
+
+def incremental_period_days(
+    latest: Optional[datetime], period_days: int, overlap_days: int = 1, now: Optional[datetime] = None
+) -> int:
+    """
+    保存済み最新足から現在までを取り直すのに必要な取得日数を返す
+
+    Args:
+        latest: 保存済みの最新 time(None なら period_days をそのまま返す)
+        period_days: 通常時の取得日数(上限)
+        overlap_days: 最終足の補修用に重ねて取得する日数
+        now: 現在時刻(テスト用)
+
+    Returns:
+        取得日数
+    """
+    if latest is None:
+        return period_days
+    now = now or datetime.now()
+    gap_days = (now - latest).days + max(0, overlap_days)
+    return max(1, min(period_days, gap_days))
+
+
+def _frame_since(frame: CandleFrame, latest: Optional[datetime]) -> CandleFrame:
+    """latest 以降(latest を含む)の足だけを残す"""
+    if latest is None or not frame:
+        return frame
+    return frame[int(np.searchsorted(frame.time, np.datetime64(latest, "ns"))) :]
+
+
+def _resolve_store(store):
+    """明示指定が無ければ [db] layout が tables 以外の時だけストア経由で保存する(tables は従来経路)"""
+    if store is not None:
+        return store
+    if configured_layout() != "tables":
+        return get_candle_store()
+    return None
+
+
+def save_yahoo_batch_to_db(
+    product_codes: List[str],
+    period_days: int = 365,
+    duration: str = "1d",
+    market: str = "T",
+    chunk_size: int = 50,
+    on_conflict: str = "update",
+    incremental: bool = False,
+    overlap_days: int = 1,
+    raise_errors: bool = False,
+    provider=None,
+    store=None,
+) -> Tuple[Dict[str, int], Dict[str, str]]:
+    """
+    複数銘柄をまとめて取得し、銘柄ごとに一括保存する
+
+    incremental 時は対象銘柄のうち最も古い最新足に合わせて取得期間を決め、
+    各銘柄は自分の最新足以降だけを書き込む。
+
+    Args:
+        product_codes: 銘柄コードのリスト
+        period_days: 取得する過去日数
+        duration: 時間軸('5s', '1m', '1h'など)
+        market: 市場コード(デフォルト: 'T' = 東証)
+        chunk_size: 1リクエストあたりの銘柄数
+        on_conflict: 既存行と衝突した場合の動作('update' または 'ignore')
+        incremental: True ならテーブルの MAX(time) 以降だけを保存する
+        overlap_days: incremental 時に最終足の補修用に重ねて取得する日数
+        raise_errors: True ならチャンク単位の取得例外を送出する
+        provider: 取得元の DataProvider(省略時は Yahoo Finance)
+        store: 保存先の CandleStore(省略時は settings.ini の [db] layout に従う)
+
+    Returns:
+        (銘柄コード -> 保存件数, 銘柄コード -> 失敗理由)
+    """
+    saved: Dict[str, int] = {}
+    failures: Dict[str, str] = {}
+    store = _resolve_store(store)
+
+    candle_classes = {}
+    if store is not None:
+        candle_classes = {code: None for code in product_codes}
+    else:
+        for code in product_codes:
+            candle_cls = factory_candle_class(code, duration)
+            if candle_cls is None:
+                failures[code] = f"unknown_duration:{duration}"
+            else:
+                candle_classes[code] = candle_cls
+    if not candle_classes:
+        return saved, failures
+
+    latest_times: Dict[str, Optional[datetime]] = {}
+    if incremental:
+        if store is not None:
+            latest_times = {code: store.latest_time(code, duration) for code in candle_classes}
+        else:
+            latest_times = {code: latest_candle_time(cls.__tablename__) for code, cls in candle_classes.items()}
+        period_days = max(incremental_period_days(t, period_days, overlap_days) for t in latest_times.values())
+
+    if provider is None:
+        frames, fetch_failures = fetch_yahoo_frames(
+            list(candle_classes), period_days, duration, market, chunk_size=chunk_size, raise_errors=raise_errors
+        )
+    else:
+        frames, fetch_failures = provider.fetch_frames(list(candle_classes), period_days, duration, market)
+    failures.update(fetch_failures)
+
+    for code, frame in frames.items():
+        frame = _frame_since(frame, latest_times.get(code))
+        if not frame:
+            saved[code] = 0
+            continue
+        if store is not None:
+            stats = store.upsert(code, duration, frame, on_conflict=on_conflict)
+        else:
+            stats = upsert_candle_frame(candle_classes[code].__tablename__, frame, on_conflict=on_conflict)
+        saved[code] = stats["inserted"] + stats["updated"]
+
+    logger.info(f"action=save_yahoo_batch_to_db saved={len(saved)} failed={len(failures)}")
+    return saved, failures
+
+
+def _has_trading_days(period_days: int, now: Optional[datetime] = None) -> bool:
+    """直近 period_days 日に東証の取引日があるか"""
+    from app.data.trading_calendar import get_calendar
+
+    today = (now or datetime.now()).date()
+    return len(get_calendar().trading_days_between(today - timedelta(days=int(period_days)), today)) > 0
+
+
+def save_yahoo_data_to_db(
+    product_code: str,
+    period_days: int = 365,
+    duration: str = "1d",
+    market: str = "T",
+    bulk: bool = True,
+    on_conflict: str = "update",
+    incremental: bool = False,
+    overlap_days: int = 1,
+    raise_errors: bool = False,
+    provider=None,
+    store=None,
+) -> int:
     """
     Yahoo Financeからデータを取得してデータベースに保存
 
@@ -179,37 +549,95 @@ def save_yahoo_data_to_db(product_code: str, period_days: int = 365, duration: s
         period_days: 取得する過去日数
         duration: 時間軸('5s', '1m', '1h'など)
         market: 市場コード(デフォルト: 'T' = 東証)
+        bulk: True なら INSERT ... ON CONFLICT の一括書き込み、False なら1行ずつ create
+        on_conflict: bulk 時に既存行と衝突した場合の動作('update' または 'ignore')
+        incremental: True ならテーブルの MAX(time) 以降だけを取得・保存する
+        overlap_days: incremental 時に最終足の補修用に重ねて取得する日数
+        raise_errors: True なら取得時の例外を送出する(呼び出し側で再試行する場合)
+        provider: 取得元の DataProvider(省略時は Yahoo Finance)
+        store: 保存先の CandleStore(省略時は settings.ini の [db] layout に従う。指定時は常に一括書き込み)
 
     Returns:
-        保存した件数
+        保存した件数(bulk 時は新規 + 上書き件数)
+
+    Raises:
+        NoDataError: raise_errors=True で、取引日を含む期間の取得結果が空だった場合
     """
     logger.info(f"action=save_yahoo_data_to_db product_code={product_code} duration={duration}")
 
-    # Yahoo Financeからデータ取得
-    candles = fetch_yahoo_data(product_code, period_days, duration, market)
-
-    if not candles:
-        logger.warning("action=save_yahoo_data_to_db warning=no_data")
+    store = _resolve_store(store)
+    candle_cls = None
+    latest = None
+    if incremental and store is not None:
+        latest = store.latest_time(product_code, duration)
+        period_days = incremental_period_days(latest, period_days, overlap_days)
+    elif incremental:
+        # 差分取得は保存済み最新足が基準なので、先にテーブルを解決する
+        candle_cls = factory_candle_class(product_code, duration)
+        if candle_cls is None:
+            logger.error(f"action=save_yahoo_data_to_db error=unknown_duration duration={duration}")
+            return 0
+        latest = latest_candle_time(candle_cls.__tablename__)
+        period_days = incremental_period_days(latest, period_days, overlap_days)
+        logger.info(f"action=save_yahoo_data_to_db incremental=true latest={latest} period_days={period_days}")
+
+    # Yahoo Finance(または指定の取得元)からデータ取得
+    if provider is None:
+        frame = fetch_yahoo_frame(product_code, period_days, duration, market, raise_errors=raise_errors)
+    else:
+        frame = provider.fetch_frame(product_code, period_days, duration, market)
+
+    fetched_rows = len(frame)
+    if latest is not None:
+        # 最終足(補修対象)以降だけを書き込む
+        frame = _frame_since(frame, latest)
+
+    if not frame:
+        # 取得できたが新しい足が無い(最新まで取り込み済み)のと、取得結果が空なのを区別する。
+        # 空でも期間に取引日が無ければ(休日だけの差分取得)取り込み済みとして扱う
+        if raise_errors and fetched_rows == 0 and _has_trading_days(period_days):
+            raise NoDataError(f"no_data code={product_code} duration={duration} period_days={period_days}")
+        logger.warning(f"action=save_yahoo_data_to_db warning=no_data fetched_rows={fetched_rows}")
         return 0
 
     # データベースに保存
-    candle_cls = factory_candle_class(product_code, duration)
+    if store is not None:
+        stats = store.upsert(product_code, duration, frame, on_conflict=on_conflict)
+        logger.info(
+            f"action=save_yahoo_data_to_db success=true layout={store.layout} inserted={stats['inserted']} "
+            f"updated={stats['updated']} skipped={stats['skipped']}"
+        )
+        return stats["inserted"] + stats["updated"]
+
+    if candle_cls is None:
+        candle_cls = factory_candle_class(product_code, duration)
     if candle_cls is None:
         logger.error(f"action=save_yahoo_data_to_db error=unknown_duration duration={duration}")
         return 0
 
-    saved_count = 0
-    for candle in candles:
-        result = candle_cls.create(
-            time=candle.time,
-            open=candle.open,
-            close=candle.close,
-            high=candle.high,
-            low=candle.low,
-            volume=candle.volume,
+    if bulk:
+        stats = upsert_candle_frame(candle_cls.__tablename__, frame, on_conflict=on_conflict)
+        saved_count = stats["inserted"] + stats["updated"]
+        logger.info(
+            f"action=save_yahoo_data_to_db success=true inserted={stats['inserted']} "
+            f"updated={stats['updated']} skipped={stats['skipped']}"
         )
+        return saved_count
+
+    saved_count = 0
+    rows = zip(
+        frame.python_times(),
+        frame.open.tolist(),
+        frame.close.tolist(),
+        frame.high.tolist(),
+        frame.low.tolist(),
+        frame.volume.tolist(),
+        strict=True,
+    )
+    for time, open_, close, high, low, volume in rows:
+        result = candle_cls.create(time=time, open=open_, close=close, high=high, low=low, volume=volume)
         if result:
             saved_count += 1
 
-    logger.info(f"action=save_yahoo_data_to_db success=true saved={saved_count}/{len(candles)}")
+    logger.info(f"action=save_yahoo_data_to_db success=true saved={saved_count}/{len(frame)}")
     return saved_count
@@ -0,0 +1,78 @@
+"""年ごとのパーティションに分けたローソク足ストアの共通処理。
+
+ParquetCandleStore (parquet_store) と ArchiveCandleStore (tick_archive) はどちらも
+<root>/<DURATION>/<code>/<YYYY>.<拡張子> に1年分ずつ保存し、同じ規則でディレクトリ名を作り、
+既存の年と新しい足を時刻キーでマージする。
+"""
+
+from typing import List
+
+import numpy as np
+
+from app.data.candle_frame import OHLCV_FIELDS, CandleFrame
+
+FRAME_COLUMNS = ("time", *OHLCV_FIELDS)
+
+
+def code_dir_name(product_code: str) -> str:
+    """銘柄コードをディレクトリ名にする(指数の ^ は IDX_ に置き換える)"""
+    return str(product_code).strip().replace("^", "IDX_")
+
+
+def code_from_dir_name(name: str) -> str:
+    """code_dir_name の逆変換"""
+    return "^" + name[len("IDX_") :] if name.startswith("IDX_") else name
+
+
+def concat_frames(frames: List[CandleFrame]) -> CandleFrame:
+    """時刻順に並んだフレームを連結する(空のフレームは除く)"""
+    frames = [f for f in frames if f]
+    if not frames:
+        return CandleFrame.empty()
+    if len(frames) == 1:
+        return frames[0]
+    return CandleFrame(**{name: np.concatenate([getattr(f, name) for f in frames]) for name in FRAME_COLUMNS})
+
+
+def partition_years(times: np.ndarray) -> np.ndarray:
+    """各時刻の西暦年(パーティションのキー)"""
+    return times.astype("datetime64[Y]").astype(np.int64) + 1970
+
+
+def merge_frames(existing: CandleFrame, incoming: CandleFrame, on_conflict: str):
+    """時刻順の2つのフレームを時刻キーでマージし、(結果, 件数) を返す"""
+    counts = {"inserted": 0, "updated": 0, "skipped": 0}
+    if not existing:
+        counts["inserted"] = len(incoming)
+        return incoming, counts
+
+    pos = np.searchsorted(existing.time, incoming.time)
+    clipped = np.minimum(pos, len(existing) - 1)
+    matched = existing.time[clipped] == incoming.time
+    new = ~matched
+
+    changed = np.zeros(len(incoming), dtype=bool)
+    for name in OHLCV_FIELDS:
+        old = getattr(existing, name)[clipped]
+        value = getattr(incoming, name)
+        same = old == value
+        if value.dtype.kind == "f":
+            same |= np.isnan(old) & np.isnan(value)
+        changed |= ~same
+    changed &= matched
+
+    counts["inserted"] = int(new.sum())
+    if on_conflict == "update":
+        counts["updated"] = int(changed.sum())
+        counts["skipped"] = int((matched & ~changed).sum())
+    else:
+        counts["skipped"] = int(matched.sum())
+
+    columns = {}
+    for name in FRAME_COLUMNS:
+        base = getattr(existing, name).copy()
+        if on_conflict == "update" and name != "time":
+            base[clipped[changed]] = getattr(incoming, name)[changed]
+        columns[name] = np.concatenate([base, getattr(incoming, name)[new]])
+    order = np.argsort(columns["time"], kind="stable")
+    return CandleFrame(**{name: values[order] for name, values in columns.items()}), counts
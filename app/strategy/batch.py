@@ -0,0 +1,139 @@
+"""同じ engine でパラメータの組を一括実行する run_many。
+
+最適化のループ (bulk_optimize_symbols / multi_stock_backtest / Streamlit のバックテスト) は
+engine.run を1組ずつ呼んで結果の dict から数値を拾っていた。run_many は各試行を
+result_level(既定 "metrics")で実行し、試行ごとに1行の表 (DataFrame、または numpy の
+レコード配列) にして返す。行番号 (index "trial") は param_list の位置と同じ。
+
+- run_many がまとめるのは試行の実行と結果の収集だけで、コンテキスト (StrategyContext) は
+  これまでどおり engine.run が試行ごとに作る。試行間で共有されるのは run_strategy が engine に
+  持たせるもの(ローソク足の配列 engine_arrays と指標の engine.indicator_cache)だけ
+- workers > 1 ならスレッドで並列に実行する(engine.run がスレッドセーフな場合のみ指定する)
+
+    table = run_many(engine, strategy_fn, grid, objective="sharpe_ratio")
+    best = grid[int(table["objective"].idxmax())]
+"""
+
+import logging
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, Iterable, Optional, Union
+
+import numpy as np
+import pandas as pd
+
+from app.strategy.results import run_strategy, validate_result_level
+
+logger = logging.getLogger(__name__)
+
+# metrics から表に取り出す列
+METRIC_COLUMNS = ("total_profit", "win_rate", "max_drawdown", "sharpe_ratio", "robust_score")
+
+Objective = Union[str, Callable[[Dict], float]]
+
+# 表の結果の列(パラメータ名と重なると値を上書きしてしまうので使えない)
+RESULT_COLUMNS = frozenset({"total_trades", "return_percent", *METRIC_COLUMNS, "objective", "error"})
+
+
+def _float(value) -> float:
+    try:
+        return float(value) if value is not None else float("nan")
+    except (TypeError, ValueError):
+        return float("nan")
+
+
+def _objective_value(objective: Objective, metrics: Dict) -> float:
+    if callable(objective):
+        return _float(objective(metrics))
+    return _float(metrics.get(objective))
+
+
+def summarize_result(result: Dict) -> Dict:
+    """1回分の結果 dict を表の1行(数値だけ)にする"""
+    metrics = result.get("metrics") or {}
+    row = {
+        "total_trades": int(result.get("total_trades", metrics.get("total_trades", 0)) or 0),
+        "return_percent": float((result.get("risk_management_stats") or {}).get("return_percent", 0.0) or 0.0),
+    }
+    for key in METRIC_COLUMNS:
+        row[key] = float(metrics.get(key, 0.0) or 0.0)
+    if result.get("error"):
+        row["error"] = str(result["error"])
+    return row
+
+
+def run_many(
+    engine,
+    strategy_fn: Callable,
+    param_list: Iterable[Optional[Dict]],
+    objective: Optional[Objective] = None,
+    result_level: str = "metrics",
+    workers: int = 1,
+    as_records: bool = False,
+):
+    """
+    param_list の各パラメータで strategy_fn を実行し、結果を1試行1行の表で返す
+
+    Args:
+        engine: StrategyEngine(candles / run を持つもの)
+        strategy_fn: strategy(ctx[, params]) または strategy_vec
+        param_list: パラメータ dict の列
+        objective: metrics のキー名、または metrics を受け取って評価値を返す関数
+            (指定時は objective 列を追加する)
+        result_level: 各試行の result_level。"metrics" 以外の場合、試行ごとの結果 dict を
+            DataFrame.attrs["results"] に入れる
+        workers: 並列に実行するスレッド数
+        as_records: True なら numpy のレコード配列で返す
+    Returns:
+        列はパラメータ名・total_trades・return_percent・METRIC_COLUMNS(・objective・error)
+    Raises:
+        ValueError: パラメータ名が RESULT_COLUMNS と重なる場合(試行を実行する前に送出する)
+    """
+    validate_result_level(result_level)
+    param_list = [dict(params or {}) for params in param_list]
+    collisions = sorted({name for params in param_list for name in params} & RESULT_COLUMNS)
+    if collisions:
+        raise ValueError(f"parameter names collide with result columns: {', '.join(collisions)}")
+
+    def trial(params: Dict) -> Dict:
+        return run_strategy(engine, strategy_fn, params, result_level=result_level)
+
+    started = time.perf_counter()
+    workers = max(1, int(workers))
+    if workers > 1 and len(param_list) > 1:
+        with ThreadPoolExecutor(max_workers=min(workers, len(param_list))) as executor:
+            results = list(executor.map(trial, param_list))
+    else:
+        results = [trial(params) for params in param_list]
+
+    rows = []
+    for params, result in zip(param_list, results, strict=True):
+        row = {**params, **summarize_result(result)}
+        if objective is not None:
+            row["objective"] = _objective_value(objective, result.get("metrics") or {})
+        rows.append(row)
+    columns = None
+    if not rows:
+        columns = ["total_trades", "return_percent", *METRIC_COLUMNS] + (["objective"] if objective is not None else [])
+    table = pd.DataFrame.from_records(rows, index=pd.RangeIndex(len(rows), name="trial"), columns=columns)
+    if result_level != "metrics":
+        table.attrs["results"] = results
+
+    logger.info(
+        f"action=run_many code={getattr(engine, 'product_code', '')} trials={len(param_list)} "
+        f"workers={workers} result_level={result_level} elapsed_sec={time.perf_counter() - started:.3f}"
+    )
+    if as_records:
+        return table.to_records()
+    return table
+
+
+def best_trial(table: pd.DataFrame, column: str = "objective", maximize: bool = True) -> Optional[int]:
+    """column が最良(NaN を除く)の試行番号。同点は先の試行を返す。該当なしなら None"""
+    if table.empty or column not in table:
+        return None
+    values = table[column].astype(float)
+    values = values[~np.isnan(values)]
+    if values.empty:
+        return None
+    return int(values.idxmax() if maximize else values.idxmin())
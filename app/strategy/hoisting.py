@@ -0,0 +1,181 @@
+"""足ごとのループから ctx.ta の呼び出しを外に出す (indicator hoisting)。
+
+ctx.ta.ema(ctx.close, 5) は最初の呼び出しで全期間を計算し、以降の足ではメモを引くが、
+そのたびに引数の正規化・ハッシュ・dict 参照がかかる。足数 × 呼び出し数だけ繰り返されるので
+長い系列では無視できない。
+
+HoistedTA は最初に ctx.ta を呼んだ足を発見パスとして、その足での呼び出し列
+(関数名・引数・結果)を記録する。以降の足では k 番目の呼び出しが記録の k 番目と
+同じ関数・同じ引数(numpy 配列は同一オブジェクト、リスト・タプルは記録時の内容と等しい、
+スカラーは等値)なら記録済みの配列をそのまま返す。
+numpy 配列は同じオブジェクトでもその場で書き換えられうるので、配列引数が書き込み不可か
+ctx の元系列 (open/high/low/close/volume) の呼び出しだけを再利用する。ストラテジーが自前で
+持つ書き込み可能なバッファを渡す呼び出しは毎回元の ctx.ta に任せる。
+一致しない呼び出し(条件分岐の中の指標など)は元の ctx.ta に任せるので結果は変わらない。
+記録するのは CACHEABLE_TA_FUNCTIONS の指標関数だけで、crossover / crossunder のように
+足の位置で結果が変わる関数は記録しない。
+
+    ctx.ta = HoistedTA(ctx)
+    for i in range(n):
+        ctx.index = i
+        strategy(ctx, params)
+
+engine.run のようにループが呼び出し側にない場合は with_hoisting(strategy) を渡す
+(run_strategy は通常のストラテジーをこれで包む)。
+"""
+
+import functools
+import inspect
+from typing import Callable, Dict, List, Optional, Tuple
+
+import numpy as np
+
+from app.strategy.indicator_cache import CACHEABLE_TA_FUNCTIONS, context_series
+
+
+def _snapshot(value):
+    """記録する引数(リストはその場で書き換えられても比べられるよう中身を写し取る)"""
+    if isinstance(value, list):
+        return [_snapshot(v) for v in value]
+    if isinstance(value, tuple):
+        return tuple(_snapshot(v) for v in value)
+    return value
+
+
+def _replayable(value, context_ids) -> bool:
+    """引数の配列が足をまたいで書き換えられない(書き込み不可か ctx の元系列)か"""
+    if isinstance(value, np.ndarray):
+        return not value.flags.writeable or id(value) in context_ids
+    if isinstance(value, (list, tuple)):
+        return all(_replayable(v, context_ids) for v in value)
+    return True
+
+
+def _same_value(recorded, value) -> bool:
+    if isinstance(recorded, np.ndarray) or isinstance(value, np.ndarray):
+        return recorded is value and recorded.shape == value.shape
+    if isinstance(recorded, (list, tuple)) or isinstance(value, (list, tuple)):
+        # 同じリストでも要素が書き換えられていれば別の呼び出し
+        return (
+            type(recorded) is type(value)
+            and len(recorded) == len(value)
+            and all(_same_value(a, b) for a, b in zip(recorded, value, strict=True))
+        )
+    if recorded is value:
+        return True
+    try:
+        return type(recorded) is type(value) and bool(recorded == value)
+    except (TypeError, ValueError):
+        return False
+
+
+def _same_call(recorded_args, recorded_kwargs, args, kwargs) -> bool:
+    if len(recorded_args) != len(args) or len(recorded_kwargs) != len(kwargs):
+        return False
+    for a, b in zip(recorded_args, args, strict=True):
+        if not _same_value(a, b):
+            return False
+    for key, value in kwargs.items():
+        if key not in recorded_kwargs or not _same_value(recorded_kwargs[key], value):
+            return False
+    return True
+
+
+class HoistedTA:
+    """ctx.ta を包み、発見パスで記録した指標を以降の足で O(1) で返す"""
+
+    def __init__(self, ctx, ta=None):
+        self._ctx = ctx
+        self._ta = ta if ta is not None else ctx.ta
+        self._plan: List[Tuple[str, tuple, dict, bool, object]] = []
+        self._context_ids: Optional[set] = None
+        self._recording = True
+        self._bar = None
+        self._slot = 0
+        self.hoisted = 0
+        self.fallbacks = 0
+
+    @property
+    def plan(self) -> List[Tuple[str, tuple, dict]]:
+        """発見パスで記録した呼び出し (関数名, 引数, キーワード引数) の列"""
+        return [(name, args, kwargs) for name, args, kwargs, _, _ in self._plan]
+
+    def stats(self) -> Dict[str, int]:
+        return {"hoisted_calls": len(self._plan), "hoisted": self.hoisted, "fallbacks": self.fallbacks}
+
+    def __getattr__(self, name: str):
+        attr = getattr(self._ta, name)
+        if name not in CACHEABLE_TA_FUNCTIONS or not callable(attr):
+            return attr
+
+        def call(*args, **kwargs):
+            index = self._ctx.index
+            if index != self._bar:
+                if self._plan:
+                    self._recording = False
+                self._bar = index
+                self._slot = 0
+            slot = self._slot
+            self._slot = slot + 1
+            if self._recording:
+                if self._context_ids is None:
+                    self._context_ids = set(context_series(self._ctx))
+                result = attr(*args, **kwargs)
+                replayable = _replayable((args, tuple(kwargs.values())), self._context_ids)
+                self._plan.append(
+                    (name, _snapshot(args), {k: _snapshot(v) for k, v in kwargs.items()}, replayable, result)
+                )
+                return result
+            if slot < len(self._plan):
+                recorded_name, recorded_args, recorded_kwargs, replayable, result = self._plan[slot]
+                if replayable and recorded_name == name and _same_call(recorded_args, recorded_kwargs, args, kwargs):
+                    self.hoisted += 1
+                    return result
+            self.fallbacks += 1
+            return attr(*args, **kwargs)
+
+        # 次回からは __getattr__ を通らずインスタンス属性として引ける
+        setattr(self, name, call)
+        return call
+
+
+def bind_strategy(strategy_fn: Callable, params: Optional[Dict] = None) -> Callable:
+    """strategy(ctx) / strategy(ctx, params) のどちらでも fn(ctx) で呼べるようにする"""
+    params = dict(params or {})
+    try:
+        positional = [
+            p
+            for p in inspect.signature(strategy_fn).parameters.values()
+            if p.kind in (p.POSITIONAL_ONLY, p.POSITIONAL_OR_KEYWORD, p.VAR_POSITIONAL)
+        ]
+    except (TypeError, ValueError):
+        positional = [None, None]
+    if len(positional) >= 2:
+        return lambda ctx: strategy_fn(ctx, params)
+    return strategy_fn
+
+
+def run_bars(ctx, strategy_fn: Callable, params: Optional[Dict] = None, hoist: bool = True) -> Optional[HoistedTA]:
+    """ctx の全ての足で strategy を呼ぶ(hoist=True なら ctx.ta を HoistedTA に差し替える)"""
+    hoisted = None
+    if hoist and not isinstance(ctx.ta, HoistedTA):
+        hoisted = HoistedTA(ctx)
+        ctx.ta = hoisted
+    step = bind_strategy(strategy_fn, params)
+    for i in range(len(ctx.close)):
+        ctx.index = i
+        step(ctx)
+    return hoisted
+
+
+def with_hoisting(strategy_fn: Callable) -> Callable:
+    """最初に呼ばれたときに ctx.ta を HoistedTA に差し替える strategy を返す(ctx.index を持つ ctx のみ)"""
+
+    @functools.wraps(strategy_fn)
+    def wrapped(ctx, *args, **kwargs):
+        ta = getattr(ctx, "ta", None)
+        if ta is not None and hasattr(ctx, "index") and not isinstance(ta, HoistedTA):
+            ctx.ta = HoistedTA(ctx)
+        return strategy_fn(ctx, *args, **kwargs)
+
+    return wrapped
@@ -0,0 +1,235 @@
+"""実行をまたいで共有するテクニカル指標のキャッシュ。
+
+StrategyContext の ctx.ta のメモ化はコンテキスト1つの中だけなので、パラメータグリッドの
+試行ごとに ema(close, 5) のような共通の指標を計算し直している。IndicatorCache は
+(ローソク足の指紋, 関数名, 引数) をキーに結果を保持し、同じローソク足での次の実行から使う。
+
+- メモリ上限 (max_bytes) を超えると最も長く使われていない結果から捨てる (LRU)
+- hits / misses / evictions を数える
+- キャッシュ内の配列は書き込み不可にして外に出さない。CachedTA は試行ごと(インスタンスごと)に
+  1回だけ複製を返すので、ストラテジーが結果に書き込んでも別の試行の指標は変わらない
+
+engine_indicator_cache(engine) で engine (StrategyEngine) の indicator_cache 属性に1つ作り、
+CachedTA で ctx.ta を包むと、その engine での全ての実行が同じキャッシュを使う。
+"""
+
+import hashlib
+import threading
+from collections import OrderedDict
+from typing import Callable, Dict, Hashable, Optional
+
+import numpy as np
+
+DEFAULT_MAX_BYTES = 256 * 1024 * 1024
+
+# 結果が引数の系列と期間だけで決まる指標関数。ここに無い関数 (crossover / crossunder のように
+# 現在の足 ctx.index に依存するもの、functions など) は共有せず元の ctx.ta をそのまま呼ぶ
+CACHEABLE_TA_FUNCTIONS = frozenset({"sma", "ema", "rsi", "macd", "bbands", "atr"})
+
+_CONTEXT_SERIES = ("open", "high", "low", "close", "volume")
+
+_MISSING = object()
+
+
+def array_fingerprint(*arrays) -> str:
+    """配列の形・dtype・内容からキーを作る(内容が同じなら別オブジェクトでも同じキー)"""
+    digest = hashlib.blake2b(digest_size=16)
+    for array in arrays:
+        array = np.ascontiguousarray(array)
+        digest.update(f"{array.dtype.str}{array.shape}".encode())
+        digest.update(array.view(np.uint8).reshape(-1) if array.size else b"")
+    return digest.hexdigest()
+
+
+def _result_nbytes(value) -> int:
+    if isinstance(value, np.ndarray):
+        return int(value.nbytes)
+    if isinstance(value, (tuple, list)):
+        return sum(_result_nbytes(v) for v in value)
+    return 64
+
+
+def _freeze(value):
+    if isinstance(value, np.ndarray):
+        value.setflags(write=False)
+    elif isinstance(value, (tuple, list)):
+        for v in value:
+            _freeze(v)
+    return value
+
+
+def _copy_result(value):
+    if isinstance(value, np.ndarray):
+        return value.copy()
+    if isinstance(value, tuple):
+        return tuple(_copy_result(v) for v in value)
+    if isinstance(value, list):
+        return [_copy_result(v) for v in value]
+    return value
+
+
+class IndicatorCache:
+    """メモリ上限付きの LRU キャッシュ(スレッドセーフ)"""
+
+    def __init__(self, max_bytes: int = DEFAULT_MAX_BYTES):
+        self.max_bytes = int(max_bytes)
+        self.current_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._entries: "OrderedDict[Hashable, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def __contains__(self, key) -> bool:
+        return key in self._entries
+
+    def get(self, key, default=None):
+        with self._lock:
+            entry = self._entries.get(key, _MISSING)
+            if entry is _MISSING:
+                self.misses += 1
+                return default
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[0]
+
+    def put(self, key, value) -> None:
+        """結果を保存する(1件で上限を超えるものは保存しない)"""
+        size = _result_nbytes(value)
+        if size > self.max_bytes:
+            return
+        _freeze(value)
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self.current_bytes -= old[1]
+            while self._entries and self.current_bytes + size > self.max_bytes:
+                _, (_, evicted) = self._entries.popitem(last=False)
+                self.current_bytes -= evicted
+                self.evictions += 1
+            self._entries[key] = (value, size)
+            self.current_bytes += size
+
+    def get_or_compute(self, key, compute: Callable[[], object]):
+        value = self.get(key, _MISSING)
+        if value is _MISSING:
+            value = compute()
+            self.put(key, value)
+        return value
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self.current_bytes = 0
+
+    def stats(self) -> Dict[str, float]:
+        total = self.hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "bytes": self.current_bytes,
+            "max_bytes": self.max_bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "hit_rate": round(self.hits / total, 4) if total else 0.0,
+        }
+
+
+def _normalize_arg(value, named: Dict[int, str]):
+    if isinstance(value, np.ndarray):
+        name = named.get(id(value))
+        return ("series", name) if name is not None else ("array", array_fingerprint(value))
+    if isinstance(value, (list, tuple)):
+        if value and all(isinstance(v, (int, float, np.number)) for v in value):
+            return ("array", array_fingerprint(np.asarray(value, dtype=np.float64)))
+        return tuple(_normalize_arg(v, named) for v in value)
+    if isinstance(value, np.generic):
+        return value.item()
+    if isinstance(value, float) and value.is_integer():
+        # ema(close, 5) と ema(close, 5.0) を同じ結果として扱う
+        return int(value)
+    return value
+
+
+class CachedTA:
+    """ctx.ta を包み、関数の結果を IndicatorCache で実行をまたいで共有する
+
+    named_series に ctx の元系列 ({id(ctx.close): 'close', ...}) を渡すと、その配列は
+    内容のハッシュを取らず名前でキーにする。
+    共有キャッシュの結果はこのインスタンスで初めて引いたときに複製し、以降は同じ複製を返す
+    (ctx.ta のメモと同じく、1つの試行の中では同じ配列になる)。
+    """
+
+    def __init__(self, ta, cache: IndicatorCache, data_key: str, named_series: Optional[Dict[int, str]] = None):
+        self._ta = ta
+        self._cache = cache
+        self._data_key = data_key
+        self._named = dict(named_series or {})
+        self._wrapped: Dict[str, Callable] = {}
+        self._local: Dict[Hashable, object] = {}
+
+    def __getattr__(self, name: str):
+        attr = getattr(self._ta, name)
+        if name not in CACHEABLE_TA_FUNCTIONS or not callable(attr):
+            return attr
+        wrapped = self._wrapped.get(name)
+        if wrapped is None:
+
+            def wrapped(*args, **kwargs):
+                key = (
+                    self._data_key,
+                    name,
+                    tuple(_normalize_arg(a, self._named) for a in args),
+                    tuple(sorted((k, _normalize_arg(v, self._named)) for k, v in kwargs.items())),
+                )
+                try:
+                    hash(key)
+                except TypeError:
+                    return attr(*args, **kwargs)
+                value = self._local.get(key, _MISSING)
+                if value is _MISSING:
+                    value = _copy_result(self._cache.get_or_compute(key, lambda: attr(*args, **kwargs)))
+                    self._local[key] = value
+                return value
+
+            self._wrapped[name] = wrapped
+        return wrapped
+
+
+def context_series(ctx) -> Dict[int, str]:
+    """ctx の元系列 (open/high/low/close/volume) の {id: 名前}"""
+    named = {}
+    for name in _CONTEXT_SERIES:
+        values = getattr(ctx, name, None)
+        if isinstance(values, np.ndarray):
+            named[id(values)] = name
+    return named
+
+
+def engine_indicator_cache(engine, max_bytes: Optional[int] = None) -> IndicatorCache:
+    """engine の indicator_cache 属性(無ければ作成)。同じ engine の実行で共有される"""
+    cache = getattr(engine, "indicator_cache", None)
+    if cache is None:
+        cache = IndicatorCache(max_bytes if max_bytes is not None else DEFAULT_MAX_BYTES)
+        engine.indicator_cache = cache
+    return cache
+
+
+def engine_data_key(engine, frame) -> str:
+    """engine のローソク足の指紋(candles が差し替えられたら計算し直す)"""
+    cached = getattr(engine, "_indicator_data_key", None)
+    if cached is not None and cached[0] is engine.candles:
+        return cached[1]
+    key = array_fingerprint(frame.time.astype(np.int64), frame.open, frame.high, frame.low, frame.close, frame.volume)
+    engine._indicator_data_key = (engine.candles, key)
+    return key
+
+
+def attach_indicator_cache(engine, ctx, frame) -> IndicatorCache:
+    """ctx.ta を engine のキャッシュを使う CachedTA に差し替える"""
+    cache = engine_indicator_cache(engine)
+    ctx.ta = CachedTA(ctx.ta, cache, engine_data_key(engine, frame), context_series(ctx))
+    return cache
@@ -0,0 +1,97 @@
+"""最適化向けに実行結果を絞る result_level。
+
+engine.run の戻り値には ohlcv の配列・全ての plots・signals・trades が入るが、最適化の
+試行では metrics しか読まない。result_level で残す内容を選ぶ。
+
+- "metrics": metrics / total_trades / risk_management_stats(と error)だけ
+- "trades": metrics に加えて trades
+- "full": これまでどおり全て
+
+run_strategy(engine, strategy_fn, params, result_level) は通常のストラテジーなら engine.run、
+strategy_vec なら run_vectorized を呼ぶ。割り当てが減るのは結果を自前で組み立てる
+run_vectorized(plots・indicators を作らない)と、result_level を受け取る engine.run だけ。
+受け取らない engine.run は全ての結果を作ってから戻り値の dict を絞るだけなので、
+返す・保持する・pickle する量は減るが、実行中の割り当ては減らない。
+どちらの場合も ctx.ta は engine の indicator_cache を使う(同じ engine の試行間で指標を共有する)。
+通常のストラテジーは hoist=True なら HoistedTA で足ごとの ctx.ta 呼び出しも省く。
+"""
+
+import functools
+import inspect
+from typing import Callable, Dict, Optional
+
+RESULT_LEVELS = ("metrics", "trades", "full")
+
+_METRICS_KEYS = ("metrics", "total_trades", "risk_management_stats", "error")
+_TRADES_KEYS = _METRICS_KEYS + ("trades",)
+
+
+def validate_result_level(result_level: str) -> str:
+    if result_level not in RESULT_LEVELS:
+        raise ValueError(f"unknown result_level: {result_level} (expected one of {', '.join(RESULT_LEVELS)})")
+    return result_level
+
+
+def shape_results(results: Dict, result_level: str = "full") -> Dict:
+    """result_level に必要なキーだけを残した dict を返す("full" はそのまま)"""
+    validate_result_level(result_level)
+    if result_level == "full":
+        return results
+    keys = _TRADES_KEYS if result_level == "trades" else _METRICS_KEYS
+    return {key: results[key] for key in keys if key in results}
+
+
+def _accepts_result_level(run: Callable) -> bool:
+    try:
+        parameters = inspect.signature(run).parameters
+    except (TypeError, ValueError):
+        return False
+    return "result_level" in parameters or any(p.kind is p.VAR_KEYWORD for p in parameters.values())
+
+
+def with_indicator_cache(engine, strategy_fn: Callable) -> Callable:
+    """
+    最初に呼ばれたときに ctx.ta を engine の indicator_cache を使う CachedTA に差し替える strategy を返す
+
+    engine.run は ctx を内部で作るので、strategy の呼び出しを包んで ctx に取り付ける。
+    engine にローソク足が無ければ strategy_fn をそのまま返す。
+    """
+    from app.strategy.hoisting import HoistedTA
+    from app.strategy.indicator_cache import CachedTA, attach_indicator_cache
+    from app.strategy.vectorized import engine_arrays
+
+    if not getattr(engine, "candles", None):
+        return strategy_fn
+    frame, _ = engine_arrays(engine)
+
+    @functools.wraps(strategy_fn)
+    def wrapped(ctx, *args, **kwargs):
+        ta = getattr(ctx, "ta", None)
+        # HoistedTA は CachedTA を包んだ後に差し替えたもの
+        if ta is not None and not isinstance(ta, (CachedTA, HoistedTA)):
+            attach_indicator_cache(engine, ctx, frame)
+        return strategy_fn(ctx, *args, **kwargs)
+
+    return wrapped
+
+
+def run_strategy(
+    engine, strategy_fn: Callable, params: Optional[Dict] = None, result_level: str = "full", hoist: bool = True
+) -> Dict:
+    """
+    engine で strategy_fn を1回実行し、result_level の内容で返す(hoist=False なら HoistedTA を使わない)
+
+    engine.run が result_level を受け取らない場合、result_level は戻り値の形を絞るだけで
+    plots などの割り当ては減らない(モジュールの説明を参照)。
+    """
+    from app.strategy.hoisting import with_hoisting
+    from app.strategy.vectorized import is_vectorized_strategy, run_vectorized
+
+    validate_result_level(result_level)
+    if is_vectorized_strategy(strategy_fn):
+        return run_vectorized(engine, strategy_fn, params, result_level=result_level)
+    # キャッシュを先に取り付け、HoistedTA はその CachedTA を包む
+    strategy_fn = with_indicator_cache(engine, with_hoisting(strategy_fn) if hoist else strategy_fn)
+    if result_level != "full" and _accepts_result_level(engine.run):
+        return shape_results(engine.run(strategy_fn, params=params, result_level=result_level), result_level)
+    return shape_results(engine.run(strategy_fn, params=params), result_level)
@@ -0,0 +1,287 @@
+"""ベクトル化したストラテジー (strategy_vec) のシグナル変換。
+
+通常のストラテジー strategy(ctx, params) は足ごとに呼ばれるが、strategy_vec(ctx, params) は
+全期間の配列を一度に受け取り、エントリー・エグジットの bool 配列(と任意でエントリーごとの
+リスク設定の配列)を返す。ここではそれを EnhancedBacktest.execute_backtest に渡せる
+シグナルの dict 列へ1回の配列演算で変換する(Python の処理はシグナルが出た足の数だけ)。
+
+    def strategy_vec(ctx, params):
+        fast = ctx.ta.ema(ctx.close, params["fast"])
+        slow = ctx.ta.ema(ctx.close, params["slow"])
+        return {
+            "entries": crossover(fast, slow),
+            "exits": crossunder(fast, slow),
+            "risk": {"stop_loss_pct": 3.0},
+        }
+
+    results = run_vectorized(engine, strategy_vec, params)
+"""
+
+import copy
+import logging
+from typing import Callable, Dict, List, Mapping, Optional, Sequence
+
+import numpy as np
+import pandas as pd
+
+logger = logging.getLogger(__name__)
+
+# StrategyContext.entry が記録する risk のキー
+RISK_KEYS = (
+    "stop_loss",
+    "take_profit",
+    "stop_loss_pct",
+    "take_profit_pct",
+    "trailing_stop_pct",
+    "break_even_trigger_pct",
+    "max_bars_hold",
+    "atr_stop_multiple",
+    "atr_value",
+)
+
+_INT_RISK_KEYS = ("max_bars_hold",)
+
+VECTORIZED_STRATEGY_NAME = "strategy_vec"
+
+
+def crossover(a, b) -> np.ndarray:
+    """a が b を上抜けた足で True(ctx.ta.crossover の全期間版)"""
+    a = np.asarray(a, dtype=np.float64)
+    b = np.asarray(b, dtype=np.float64)
+    out = np.zeros(len(a), dtype=bool)
+    out[1:] = (a[:-1] <= b[:-1]) & (a[1:] > b[1:])
+    return out
+
+
+def crossunder(a, b) -> np.ndarray:
+    """a が b を下抜けた足で True(ctx.ta.crossunder の全期間版)"""
+    return crossover(b, a)
+
+
+def is_vectorized_strategy(fn) -> bool:
+    """strategy_vec という名前の関数、または vectorized=True 属性を持つ関数か"""
+    return callable(fn) and (
+        getattr(fn, "__name__", "") == VECTORIZED_STRATEGY_NAME or bool(getattr(fn, "vectorized", False))
+    )
+
+
+def compile_vectorized_strategy(code: str) -> Callable:
+    """
+    strategy_vec(ctx, params) を含むコードを compile_strategy と同じ制限付き環境でコンパイルする
+
+    compile_strategy は strategy という名前の関数を返すので、strategy_vec を呼ぶだけの
+    strategy を足してコンパイルし、vectorized=True の印を付けて返す。
+    """
+    from app.strategy.engine import compile_strategy
+
+    if f"def {VECTORIZED_STRATEGY_NAME}" not in code:
+        raise ValueError(f"{VECTORIZED_STRATEGY_NAME}(ctx, params) is not defined")
+    wrapper = f"\n\ndef strategy(ctx, params=None):\n    return {VECTORIZED_STRATEGY_NAME}(ctx, params or {{}})\n"
+    fn = compile_strategy(code + wrapper)
+    fn.vectorized = True
+    return fn
+
+
+def load_strategy(code: str) -> Callable:
+    """strategy_vec があればベクトル化版、なければ通常の strategy をコンパイルする"""
+    from app.strategy.engine import compile_strategy
+
+    if f"def {VECTORIZED_STRATEGY_NAME}" in code:
+        return compile_vectorized_strategy(code)
+    return compile_strategy(code)
+
+
+def position_events(entries, exits) -> np.ndarray:
+    """
+    エントリー・エグジットの bool 配列から、実際に約定するシグナルの足番号を返す
+
+    ポジションがない時のエントリーと、ポジションがある時のエグジットだけを残す
+    (連続するエントリーは最初の1回)。同じ足で両方 True の場合は無視する。
+    Returns:
+        足番号の配列(偶数番目がエントリー、奇数番目がエグジット)
+    """
+    entries = np.asarray(entries, dtype=bool)
+    exits = np.asarray(exits, dtype=bool)
+    if entries.shape != exits.shape:
+        raise ValueError(f"entries/exits length mismatch: {entries.shape} != {exits.shape}")
+
+    event = entries.astype(np.int8) - exits.astype(np.int8)
+    idx = np.flatnonzero(event)
+    kinds = event[idx]
+    # 直前のシグナルと種類が変わった足だけが状態を変える(最初はポジションなし = エグジット扱い)
+    changed = kinds != np.concatenate(([-1], kinds[:-1]))
+    return idx[changed]
+
+
+def _risk_value(values, i: int, key: str):
+    if values is None:
+        return None
+    value = values[i] if np.ndim(values) else values
+    if value is None:
+        return None
+    value = float(value)
+    if value != value:
+        return None
+    return int(value) if key in _INT_RISK_KEYS else value
+
+
+def _python_times(times, indices: np.ndarray) -> List:
+    if isinstance(times, np.ndarray) and times.dtype.kind == "M":
+        return list(pd.DatetimeIndex(times[indices]).to_pydatetime())
+    return [times[int(i)] for i in indices]
+
+
+def signals_from_arrays(
+    times: Sequence,
+    closes,
+    entries,
+    exits,
+    risk: Optional[Mapping[str, object]] = None,
+    indicators: Optional[Mapping[str, object]] = None,
+    direction: str = "long",
+) -> List[Dict]:
+    """
+    bool 配列を execute_backtest のシグナル dict 列にする
+
+    Args:
+        times: 各足の時刻(ローソク足の time のリスト、または datetime64 配列)
+        closes: 各足の終値(シグナルの価格)
+        entries, exits: エントリー・エグジットの bool 配列
+        risk: RISK_KEYS の値(スカラーまたは足ごとの配列。NaN は未指定)
+        indicators: シグナルに添える指標 {名前: 足ごとの配列}
+        direction: 'long'(エントリー BUY / エグジット SELL)または 'short'(逆)
+    """
+    if direction not in ("long", "short"):
+        raise ValueError(f"unknown direction: {direction}")
+    closes = np.asarray(closes, dtype=np.float64)
+    events = position_events(entries, exits)
+    if len(events) == 0:
+        return []
+
+    risk = dict(risk or {})
+    unknown = set(risk) - set(RISK_KEYS)
+    if unknown:
+        raise ValueError(f"unknown risk keys: {', '.join(sorted(unknown))}")
+    risk_arrays = {key: (np.asarray(value) if value is not None else None) for key, value in risk.items()}
+    indicator_arrays = {name: np.asarray(values, dtype=np.float64) for name, values in (indicators or {}).items()}
+
+    entry_type, exit_type = ("BUY", "SELL") if direction == "long" else ("SELL", "BUY")
+    prices = closes[events].tolist()
+    event_times = _python_times(times, events)
+    signals = []
+    for n, i in enumerate(events.tolist()):
+        signal = {
+            "time": event_times[n],
+            "type": entry_type if n % 2 == 0 else exit_type,
+            "price": prices[n],
+            "indicators": {name: float(values[i]) for name, values in indicator_arrays.items()},
+        }
+        if n % 2 == 0:
+            signal["risk"] = {key: _risk_value(risk_arrays.get(key), i, key) for key in RISK_KEYS}
+        signals.append(signal)
+    return signals
+
+
+def vectorized_signals(
+    strategy_vec: Callable,
+    ctx,
+    times: Sequence,
+    closes,
+    params: Optional[Dict] = None,
+    with_indicators: bool = True,
+) -> List[Dict]:
+    """
+    strategy_vec(ctx, params) を1回呼び、戻り値を times / closes のシグナル dict 列にする
+
+    with_indicators=False ならシグナルに indicators の値を添えない(最適化の試行用)。
+    """
+    output = strategy_vec(ctx, dict(params or {}))
+    if not isinstance(output, Mapping) or "entries" not in output or "exits" not in output:
+        raise ValueError("strategy_vec must return a dict with 'entries' and 'exits'")
+    return signals_from_arrays(
+        times,
+        closes,
+        output["entries"],
+        output["exits"],
+        risk=output.get("risk"),
+        indicators=output.get("indicators") if with_indicators else None,
+        direction=output.get("direction", "long"),
+    )
+
+
+def engine_arrays(engine):
+    """
+    engine のローソク足の CandleFrame と time のリスト(candles が同じ間は engine 上で使い回す)
+
+    run_many のように同じ engine で何度も実行するとき、ローソク足の変換は1回で済む。
+    """
+    from app.data.candle_frame import CandleFrame
+
+    cached = getattr(engine, "_vectorized_arrays", None)
+    if cached is not None and cached[0] is engine.candles:
+        return cached[1], cached[2]
+    candles = engine.candles
+    frame = CandleFrame.from_candles(candles)
+    times = [c.time for c in candles]
+    engine._vectorized_arrays = (candles, frame, times)
+    return frame, times
+
+
+def attach_engine_frame(engine, frame) -> None:
+    """
+    engine_arrays が frame の配列をそのまま返すようにする
+
+    取得元の CandleFrame (mmap キャッシュなど) から engine を作ったとき、strategy_vec の実行で
+    engine.candles から配列を作り直さず、元の配列をコピーなしで使う。
+    """
+    candles = engine.candles
+    engine._vectorized_arrays = (candles, frame, [c.time for c in candles])
+
+
+def run_vectorized(engine, strategy_vec: Callable, params: Optional[Dict] = None, result_level: str = "full") -> Dict:
+    """
+    engine のローソク足で strategy_vec を実行し、EnhancedBacktest でバックテストする
+
+    engine は product_code / candles / risk_management 属性を持つもの (StrategyEngine)。
+    RiskManagement は実行ごとにコピーするので、同じ engine で繰り返し呼んでも結果は変わらない。
+    戻り値は execute_backtest の結果に signals / plots と(無ければ)BacktestMetrics の metrics を
+    加えたもの。result_level が "full" 以外なら signals の indicators と plots を作らず、
+    shape_results で必要なキーだけにして返す。
+    """
+    from app.backtest.backtest_metrics import BacktestMetrics
+    from app.strategy.context import StrategyContext
+    from enhanced_backtest import EnhancedBacktest
+
+    from app.strategy.indicator_cache import attach_indicator_cache
+    from app.strategy.results import shape_results, validate_result_level
+
+    full = validate_result_level(result_level) == "full"
+
+    candles = engine.candles
+    if not candles:
+        return {"error": "no_candles"}
+    frame, times = engine_arrays(engine)
+    ctx = StrategyContext(**frame.context_arrays())
+    # 同じ engine での試行間で ctx.ta の計算結果を共有する
+    cache = attach_indicator_cache(engine, ctx, frame)
+    # シグナルの時刻はローソク足の time と同じオブジェクトにする(execute_backtest の突き合わせ用)
+    signals = vectorized_signals(strategy_vec, ctx, times, frame.close, params, with_indicators=full)
+
+    risk = copy.deepcopy(getattr(engine, "risk_management", None))
+    backtest = EnhancedBacktest(product_code=engine.product_code, candles=candles, risk_management=risk)
+    results = dict(backtest.execute_backtest(signals))
+    if full:
+        results["signals"] = signals
+        results["plots"] = ctx.get_plots()
+    if "metrics" not in results:
+        years = max((frame.time[-1] - frame.time[0]) / np.timedelta64(365 * 86400, "s"), 1 / 365)
+        initial_capital = float(getattr(risk, "initial_capital", 1_000_000))
+        results["metrics"] = BacktestMetrics(results.get("trades", [])).get_all_metrics(
+            initial_capital=initial_capital, years=float(years)
+        )
+    logger.info(
+        f"action=run_vectorized code={engine.product_code} bars={len(frame)} signals={len(signals)} "
+        f"total_trades={results.get('total_trades', 0)} indicator_cache_hits={cache.hits} "
+        f"indicator_cache_misses={cache.misses} result_level={result_level}"
+    )
+    return shape_results(results, result_level)
@@ -0,0 +1,109 @@
+"""足ごとのループでの ctx.ta 呼び出しのオーバーヘッドを HoistedTA の有無で比べるベンチマーク。
+
+テストの uptrend_candles と同じ V 字(下降→上昇)の終値系列を --bars 本まで繰り返して
+StrategyContext を作り、EMA クロスのストラテジーを全ての足で呼ぶ。
+ctx.ta のメモを毎回引く通常のループと、HoistedTA で記録済みの配列を返すループの
+1足あたりの時間と、両者のエントリー足が一致するかを JSON で表示する。
+
+    python scripts/bench_indicator_hoisting.py --bars 100000 --repeat 3
+"""
+
+import argparse
+import json
+import sys
+import time
+from datetime import datetime, timedelta
+from pathlib import Path
+
+ROOT_DIR = Path(__file__).resolve().parents[1]
+if str(ROOT_DIR) not in sys.path:
+    sys.path.insert(0, str(ROOT_DIR))
+
+import numpy as np
+from app.strategy.context import StrategyContext
+
+from app.strategy.hoisting import run_bars
+
+
+def uptrend_closes(bars: int) -> np.ndarray:
+    """uptrend_candles の V 字 (100 から 30 本下げて 30 本上げる) を bars 本まで繰り返す"""
+    cycle = np.array([100 - i for i in range(30)] + [70 + i * 2 for i in range(30)], dtype=float)
+    return np.resize(cycle, bars)
+
+
+def build_context(closes: np.ndarray) -> StrategyContext:
+    start = datetime(2024, 1, 1)
+    n = len(closes)
+    return StrategyContext(
+        times=[start + timedelta(minutes=i) for i in range(n)],
+        opens=closes,
+        highs=closes + 1,
+        lows=closes - 1,
+        closes=closes,
+        volumes=np.full(n, 1000.0),
+    )
+
+
+def strategy(ctx, params):
+    fast = ctx.ta.ema(ctx.close, params["fast"])
+    slow = ctx.ta.ema(ctx.close, params["slow"])
+    atr = ctx.ta.atr(14)
+    if ctx.ta.crossover(fast, slow):
+        ctx.strategy.entry("long", ctx.strategy.long, atr_value=float(atr[ctx.index]))
+    elif ctx.ta.crossunder(fast, slow):
+        ctx.strategy.close("long")
+
+
+def run_case(closes: np.ndarray, hoist: bool, params: dict) -> tuple:
+    ctx = build_context(closes)
+    t0 = time.perf_counter()
+    hoisted = run_bars(ctx, strategy, params, hoist=hoist)
+    elapsed = time.perf_counter() - t0
+    entries = [str(order["time"]) for order in ctx.get_orders() if order["type"] == "BUY"]
+    return elapsed, entries, hoisted.stats() if hoisted is not None else {}
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="ctx.ta の足ごとのオーバーヘッドを HoistedTA の有無で比較")
+    parser.add_argument("--bars", type=int, default=100_000, help="足数")
+    parser.add_argument("--repeat", type=int, default=3, help="各条件の繰り返し回数(最速を採用)")
+    parser.add_argument("--fast", type=int, default=5, help="短期 EMA の期間")
+    parser.add_argument("--slow", type=int, default=20, help="長期 EMA の期間")
+    args = parser.parse_args()
+
+    closes = uptrend_closes(max(60, int(args.bars)))
+    params = {"fast": args.fast, "slow": args.slow}
+    results = {}
+    for hoist in (False, True):
+        runs = [run_case(closes, hoist, params) for _ in range(max(1, int(args.repeat)))]
+        best = min(runs, key=lambda r: r[0])
+        results[hoist] = best
+        print(
+            json.dumps(
+                {
+                    "mode": "hoisted" if hoist else "memo",
+                    "bars": len(closes),
+                    "seconds": round(best[0], 4),
+                    "us_per_bar": round(best[0] / len(closes) * 1e6, 3),
+                    "entries": len(best[1]),
+                    **best[2],
+                },
+                ensure_ascii=False,
+            )
+        )
+
+    memo, hoisted = results[False], results[True]
+    print(
+        json.dumps(
+            {
+                "speedup": round(memo[0] / hoisted[0], 2) if hoisted[0] else None,
+                "saved_us_per_bar": round((memo[0] - hoisted[0]) / len(closes) * 1e6, 3),
+                "same_entries": memo[1] == hoisted[1],
+            },
+            ensure_ascii=False,
+        )
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,135 @@
+"""取り込み(書き込み)中の読み込みスループットを journal_mode 別に計測するベンチマーク。
+
+一時 DB にローソク足表を作り、書き込みスレッドが upsert を繰り返す間に
+読み込みスレッドが期間指定の SELECT を回す。DELETE(既定のロールバックジャーナル)と
+WAL を同じ条件で比べ、読み込み回数/秒・待ち時間・書き込みコミット数を表示する。
+
+    python scripts/bench_sqlite_contention.py --readers 8 --seconds 5
+"""
+
+import argparse
+import json
+import statistics
+import sys
+import tempfile
+import threading
+import time
+from pathlib import Path
+
+ROOT_DIR = Path(__file__).resolve().parents[1]
+if str(ROOT_DIR) not in sys.path:
+    sys.path.insert(0, str(ROOT_DIR))
+
+import numpy as np
+
+from app.data.candle_db import format_db_times
+from app.data.sqlite_engine import DEFAULT_PRAGMAS, create_sqlite_engine
+
+TABLE = "CANDLE_BENCH_1M"
+
+
+def _seed(db_path: Path, rows: int) -> np.ndarray:
+    engine = create_sqlite_engine(db_path, pool_size=1, pragmas={"journal_mode": "DELETE"})
+    times = format_db_times(np.datetime64("2024-01-04T09:00") + np.arange(rows).astype("timedelta64[m]"))
+    with engine.begin() as conn:
+        conn.exec_driver_sql(
+            f'CREATE TABLE "{TABLE}" (time DATETIME NOT NULL, open FLOAT, close FLOAT, '
+            "high FLOAT, low FLOAT, volume INTEGER, PRIMARY KEY (time))"
+        )
+        conn.exec_driver_sql(
+            f'INSERT INTO "{TABLE}" VALUES (?, ?, ?, ?, ?, ?)',
+            [(t, 100.0, 100.0, 101.0, 99.0, 1000) for t in times],
+        )
+    engine.dispose()
+    return np.asarray(times)
+
+
+def run_case(
+    db_path: Path, journal_mode: str, readers: int, seconds: float, write_batch: int, times: np.ndarray
+) -> dict:
+    pragmas = dict(DEFAULT_PRAGMAS, journal_mode=journal_mode)
+    if journal_mode.upper() != "WAL":
+        pragmas["synchronous"] = "FULL"
+    write_engine = create_sqlite_engine(db_path, pool_size=1, pragmas=pragmas)
+    with write_engine.connect() as conn:
+        conn.exec_driver_sql(f"PRAGMA journal_mode={journal_mode}")
+    read_engine = create_sqlite_engine(db_path, read_only=True, pool_size=readers, pragmas=pragmas)
+
+    stop = threading.Event()
+    latencies: list[list[float]] = [[] for _ in range(readers)]
+    errors: list[str] = []
+    commits = [0]
+
+    def writer() -> None:
+        rng = np.random.default_rng(0)
+        while not stop.is_set():
+            picked = times[rng.integers(0, len(times), write_batch)]
+            try:
+                with write_engine.begin() as conn:
+                    conn.exec_driver_sql(
+                        f'UPDATE "{TABLE}" SET close = close + 0.01, volume = volume + 1 WHERE time = ?',
+                        [(str(t),) for t in picked],
+                    )
+                commits[0] += 1
+            except Exception as e:
+                errors.append(f"writer: {e}")
+
+    def reader(slot: int) -> None:
+        rng = np.random.default_rng(slot + 1)
+        while not stop.is_set():
+            i = int(rng.integers(0, len(times) - 500))
+            t0 = time.perf_counter()
+            try:
+                with read_engine.connect() as conn:
+                    conn.exec_driver_sql(
+                        f'SELECT time, open, high, low, close, volume FROM "{TABLE}" WHERE time >= ? AND time <= ?',
+                        (str(times[i]), str(times[i + 500])),
+                    ).fetchall()
+            except Exception as e:
+                errors.append(f"reader: {e}")
+                continue
+            latencies[slot].append(time.perf_counter() - t0)
+
+    threads = [threading.Thread(target=writer)] + [threading.Thread(target=reader, args=(i,)) for i in range(readers)]
+    for t in threads:
+        t.start()
+    time.sleep(seconds)
+    stop.set()
+    for t in threads:
+        t.join()
+    write_engine.dispose()
+    read_engine.dispose()
+
+    flat = [x for lat in latencies for x in lat]
+    return {
+        "journal_mode": journal_mode.upper(),
+        "reads_per_sec": round(len(flat) / seconds, 1),
+        "read_p50_ms": round(statistics.median(flat) * 1000, 2) if flat else None,
+        "read_p99_ms": round(float(np.percentile(flat, 99)) * 1000, 2) if flat else None,
+        "write_commits_per_sec": round(commits[0] / seconds, 1),
+        "errors": len(errors),
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="書き込み中の読み込みスループットを journal_mode 別に計測")
+    parser.add_argument("--rows", type=int, default=100_000, help="ベンチ用テーブルの行数")
+    parser.add_argument("--readers", type=int, default=8, help="読み込みスレッド数")
+    parser.add_argument("--seconds", type=float, default=5.0, help="各ケースの計測秒数")
+    parser.add_argument("--write-batch", type=int, default=500, help="1コミットあたりの更新行数")
+    parser.add_argument("--modes", type=str, default="DELETE,WAL", help="比較する journal_mode(カンマ区切り)")
+    args = parser.parse_args()
+
+    results = []
+    with tempfile.TemporaryDirectory() as tmp:
+        for mode in [m.strip() for m in args.modes.split(",") if m.strip()]:
+            db_path = Path(tmp) / f"bench_{mode.lower()}.sql"
+            times = _seed(db_path, int(args.rows))
+            results.append(
+                run_case(db_path, mode, int(args.readers), float(args.seconds), int(args.write_batch), times)
+            )
+            print(json.dumps(results[-1], ensure_ascii=False))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,38 @@
+"""financial_cache から正規化ファンダメンタルズ表を作成・差分更新するCLI。"""
+
+import argparse
+import sys
+from pathlib import Path
+
+ROOT_DIR = Path(__file__).resolve().parents[1]
+if str(ROOT_DIR) not in sys.path:
+    sys.path.insert(0, str(ROOT_DIR))
+
+from app.data.financial_cache import DEFAULT_CACHE_DB
+from app.data.fundamentals import latest_snapshot, sync_fundamentals
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="financial_cache を fundamentals 表へ展開")
+    parser.add_argument("--cache-db", type=str, default=str(DEFAULT_CACHE_DB), help="キャッシュDBファイル")
+    parser.add_argument("--full", action="store_true", help="差分ではなく全銘柄を作り直す")
+    parser.add_argument(
+        "--show", type=str, default="", help="作成後に表示する info 項目 (カンマ区切り。例: trailingPE,returnOnEquity)"
+    )
+    parser.add_argument("--top-n", type=int, default=20, help="--show の表示件数")
+    args = parser.parse_args()
+
+    db_path = Path(args.cache_db)
+    stats = sync_fundamentals(db_path, full=bool(args.full))
+    print(
+        f"fundamentals_sync rebuilt={stats['rebuilt']} removed={stats['removed']} rows={stats['rows']} cache_db={db_path}"
+    )
+
+    items = [s.strip() for s in args.show.split(",") if s.strip()]
+    if items:
+        df = latest_snapshot(db_path, items).dropna(subset=[items[0]])
+        print(df.sort_values(items[0]).head(int(args.top_n)).to_string(index=False))
+
+
+if __name__ == "__main__":
+    main()
@@ -11,17 +11,28 @@ from pathlib import Path
 
 import numpy as np
 import pandas as pd
-from sqlalchemy import text
 
 ROOT_DIR = Path(__file__).resolve().parents[1]
 if str(ROOT_DIR) not in sys.path:
     sys.path.insert(0, str(ROOT_DIR))
 
-from app.models.base import engine
-from app.strategy.engine import StrategyEngine, compile_strategy
+from app.strategy.engine import StrategyEngine
 from app.strategy.optimization_utils import build_param_grid, objective_info
 from enhanced_backtest import RiskManagement
 
+from app.data.candle_store import configured_cold_archive_dir, configured_layout, get_candle_store
+from app.data.providers import (
+    DataProvider,
+    add_provider_arguments,
+    engine_from_provider,
+    get_provider,
+    provider_from_args,
+)
+from app.data.sqlite_engine import get_read_engine
+from app.data.universe import add_universe_arguments, resolve_universe_codes_from_args, universe_filter_given
+from app.strategy.batch import best_trial, run_many
+from app.strategy.vectorized import load_strategy
+
 OBJECTIVE_LABELS = [
     "ロバストスコア(最大化)",
     "純利益(最大化)",
@@ -33,41 +44,22 @@ OBJECTIVE_LABELS = [
 ]
 
 
-def _table_suffix(duration: str) -> str:
-    return duration.upper()
+def load_codes_from_db(duration: str) -> list[str]:
+    """保存済みの銘柄コード一覧([db] layout に応じて表名または candle_series から取得。読み取り専用接続)"""
+    return get_candle_store(bind=get_read_engine()).list_codes(duration)
 
 
-def _decode_code_from_table(table_name: str, duration: str) -> str | None:
-    prefix = "CANDLE_"
-    suffix = f"_{_table_suffix(duration)}"
-    if not table_name.startswith(prefix) or not table_name.endswith(suffix):
-        return None
+def auto_provider() -> DataProvider | None:
+    """
+    --provider auto の取得元
 
-    body = table_name[len(prefix) : -len(suffix)]
-    if not body:
+    layout が tables なら従来どおり StrategyEngine.from_db_or_yahoo(DB を優先し、無ければ Yahoo)
+    を使うので None。from_db_or_yahoo は銘柄ごとの表しか読まないため、それ以外の layout や
+    cold_archive_dir を使う場合は、全銘柄を再取得しないよう保存済みのストアから読む SqliteProvider を返す。
+    """
+    if configured_layout() == "tables" and configured_cold_archive_dir() is None:
         return None
-
-    # create_candle_class で ^ は IDX_ に変換される
-    if body.startswith("IDX_"):
-        return "^" + body[len("IDX_") :]
-    return body
-
-
-def load_codes_from_db(duration: str) -> list[str]:
-    suffix = _table_suffix(duration)
-    with engine.connect() as conn:
-        rows = conn.execute(
-            text("SELECT name FROM sqlite_master WHERE type='table' AND name LIKE :pattern ORDER BY name"),
-            {"pattern": f"CANDLE_%_{suffix}"},
-        ).fetchall()
-
-    codes: list[str] = []
-    for (name,) in rows:
-        code = _decode_code_from_table(str(name), duration)
-        if code:
-            codes.append(code)
-
-    return list(dict.fromkeys(codes))
+    return get_provider("sqlite")
 
 
 def load_codes_from_file(path: str) -> list[str]:
@@ -113,15 +105,21 @@ def optimize_symbol(
     duration: str,
     market: str,
     risk: RiskManagement,
+    provider: DataProvider | None = None,
 ) -> dict:
-    engine_obj = StrategyEngine.from_db_or_yahoo(
-        product_code=code,
-        period_days=period_days,
-        duration=duration,
-        market=market,
-        risk_management=risk,
-        force_refresh=False,
-    )
+    if provider is None:
+        engine_obj = StrategyEngine.from_db_or_yahoo(
+            product_code=code,
+            period_days=period_days,
+            duration=duration,
+            market=market,
+            risk_management=risk,
+            force_refresh=False,
+        )
+    else:
+        engine_obj = engine_from_provider(
+            provider, product_code=code, period_days=period_days, duration=duration, market=market, risk_management=risk
+        )
 
     if not engine_obj.candles:
         return {
@@ -133,37 +131,22 @@ def optimize_symbol(
             "total_trades": 0,
         }
 
-    best_score = None
-    best_metrics = None
-    best_params = None
-    valid_trials = 0
-
-    for params in grid:
-        result = engine_obj.run(strategy_fn, params=params)
-        metrics = result.get("metrics", {})
-        score = calc_objective(metrics, objective_key)
-        total_trades = int(metrics.get("total_trades", 0) or 0)
-
-        if exclude_no_trade and total_trades <= 0:
-            continue
-        if np.isnan(score):
-            continue
-
-        valid_trials += 1
-        if best_score is None:
-            best_score = score
-            best_metrics = metrics
-            best_params = params
-            continue
-
-        if maximize and score > best_score:
-            best_score = score
-            best_metrics = metrics
-            best_params = params
-        elif (not maximize) and score < best_score:
-            best_score = score
-            best_metrics = metrics
-            best_params = params
+    # 試行では metrics しか使わないので plots / ohlcv / signals を作らせない
+    table = run_many(
+        engine_obj,
+        strategy_fn,
+        grid,
+        objective=lambda metrics: calc_objective(metrics, objective_key),
+        result_level="metrics",
+    )
+    if exclude_no_trade:
+        table = table[table["total_trades"] > 0]
+    table = table[~np.isnan(table["objective"])]
+    valid_trials = len(table)
+    best = best_trial(table, "objective", maximize=maximize)
+    best_metrics = table.loc[best] if best is not None else None
+    best_params = grid[best] if best is not None else None
+    best_score = best_metrics["objective"] if best_metrics is not None else None
 
     if best_metrics is None:
         return {
@@ -196,15 +179,20 @@ def optimize_symbol(
 
 def main() -> None:
     parser = argparse.ArgumentParser(description="全銘柄一括最適化")
-    parser.add_argument("--strategy-file", required=True, help="strategy(ctx, params) を含むPythonファイル")
+    parser.add_argument(
+        "--strategy-file", required=True, help="strategy(ctx, params) または strategy_vec(ctx, params) を含むPythonファイル"
+    )
     parser.add_argument("--optimize-spec", required=True, help="最適化範囲テキスト。例: fast=5:30:5")
     parser.add_argument("--objective", default=OBJECTIVE_LABELS[1], choices=OBJECTIVE_LABELS, help="目的関数")
-    parser.add_argument("--duration", default="1d", choices=["5s", "1m", "1h", "1d"], help="時間軸")
+    parser.add_argument(
+        "--duration", default="1d", help="時間軸(5s/1m/1h/1d。--provider resample なら 5m/15m/4h なども可)"
+    )
     parser.add_argument("--days", type=int, default=365, help="取得日数")
     parser.add_argument("--market", default="T", help="市場サフィックス")
     parser.add_argument("--max-trials", type=int, default=200, help="銘柄あたりの最大試行数")
     parser.add_argument("--include-no-trade", action="store_true", help="取引0件も候補に含める")
     parser.add_argument("--codes-file", default="", help="対象銘柄ファイル(省略時DB全銘柄)")
+    add_universe_arguments(parser)
     parser.add_argument("--max-symbols", type=int, default=0, help="先頭N銘柄のみ実行(0で全件)")
     parser.add_argument("--sleep-sec", type=float, default=0.0, help="銘柄間の待機秒")
     parser.add_argument("--capital", type=float, default=1_000_000, help="初期資金")
@@ -212,11 +200,15 @@ def main() -> None:
     parser.add_argument("--slippage", type=float, default=0.02, help="スリッページ(%%)")
     parser.add_argument("--top-n", type=int, default=20, help="表示する上位件数")
     parser.add_argument("--output", default="", help="出力CSVパス")
+    add_provider_arguments(parser, default="auto")
 
     args = parser.parse_args()
+    if args.provider != "resample" and args.duration not in ("5s", "1m", "1h", "1d"):
+        parser.error(f"--duration {args.duration} は --provider resample の時のみ指定できます")
+    provider = auto_provider() if args.provider == "auto" else provider_from_args(args)
 
     strategy_code = Path(args.strategy_file).read_text(encoding="utf-8")
-    strategy_fn = compile_strategy(strategy_code)
+    strategy_fn = load_strategy(strategy_code)
 
     objective_key, maximize = objective_info(args.objective)
     optimize_spec_text = args.optimize_spec.replace("\\n", "\n")
@@ -227,7 +219,13 @@ def main() -> None:
     if args.codes_file:
         codes = load_codes_from_file(args.codes_file)
     else:
-        codes = load_codes_from_db(args.duration)
+        # resample は基準足が保存済みの銘柄が対象
+        codes = load_codes_from_db(args.resample_base if args.provider == "resample" else args.duration)
+
+    if universe_filter_given(args):
+        # 市場区分・業種で絞り込む(指数など一覧に無いシンボルは除外される)
+        allowed = set(resolve_universe_codes_from_args(args))
+        codes = [c for c in codes if c in allowed]
 
     if args.max_symbols > 0:
         codes = codes[: args.max_symbols]
@@ -257,6 +255,7 @@ def main() -> None:
             duration=args.duration,
             market=args.market,
             risk=risk,
+            provider=provider,
         )
         rows.append(row)
         print(
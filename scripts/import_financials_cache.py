@@ -1,119 +1,31 @@
-"""Yahoo Financeの財務諸表を一括取得してキャッシュDBへ保存するCLI。"""
+"""Yahoo Financeの財務諸表を並列取得してキャッシュDBへ保存するCLI。"""
 
 import argparse
-import json
 import re
 import sqlite3
 import sys
-import time
-import urllib.parse
-import urllib.request
-from io import StringIO
+import threading
+from collections.abc import Callable
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from pathlib import Path
 
-import pandas as pd
-import yfinance as yf
-
 ROOT_DIR = Path(__file__).resolve().parents[1]
 if str(ROOT_DIR) not in sys.path:
     sys.path.insert(0, str(ROOT_DIR))
 
-JPX_LISTING_PAGE = "https://www.jpx.co.jp/markets/statistics-equities/misc/01.html"
-DEFAULT_CACHE_DB = ROOT_DIR / "stockdata.sql"
-
-
-def _ensure_fin_cache_table(db_path: Path) -> None:
-    db_path.parent.mkdir(parents=True, exist_ok=True)
-    with sqlite3.connect(db_path) as con:
-        con.execute(
-            """
-            CREATE TABLE IF NOT EXISTS financial_cache (
-                symbol TEXT PRIMARY KEY,
-                updated_at TEXT NOT NULL,
-                info_json TEXT NOT NULL,
-                financials_json TEXT NOT NULL,
-                balance_sheet_json TEXT NOT NULL,
-                cashflow_json TEXT NOT NULL
-            )
-            """
-        )
-
-
-def _df_to_json(df: pd.DataFrame | None) -> str:
-    if df is None:
-        return ""
-    try:
-        return df.to_json(orient="split", date_format="iso")
-    except Exception:
-        return ""
-
-
-def _load_resume(path: Path) -> dict:
-    if not path.exists():
-        return {"done": [], "failed": []}
-    try:
-        data = json.loads(path.read_text(encoding="utf-8"))
-        done = list(dict.fromkeys([str(x) for x in data.get("done", [])]))
-        failed = list(dict.fromkeys([str(x) for x in data.get("failed", [])]))
-        return {"done": done, "failed": failed}
-    except Exception:
-        return {"done": [], "failed": []}
-
-
-def _save_resume(path: Path, done: list[str], failed: list[str]) -> None:
-    path.parent.mkdir(parents=True, exist_ok=True)
-    payload = {
-        "done": done,
-        "failed": failed,
-        "updated_at_epoch": int(time.time()),
-    }
-    path.write_text(json.dumps(payload, ensure_ascii=False, indent=2), encoding="utf-8")
-
-
-def _extract_codes_from_df(df: pd.DataFrame) -> list[str]:
-    candidates = ["コード", "銘柄コード", "Code", "code"]
-    code_col = None
-    for col in df.columns:
-        col_str = str(col).strip()
-        if col_str in candidates or any(key in col_str for key in ["コード", "Code", "code"]):
-            code_col = col
-            break
-
-    if code_col is None:
-        return []
-
-    codes: list[str] = []
-    for raw in df[code_col].astype(str):
-        m = re.search(r"\b(\d{4})\b", raw)
-        if m:
-            codes.append(m.group(1))
-    return list(dict.fromkeys(codes))
-
-
-def _find_jpx_list_url() -> str:
-    with urllib.request.urlopen(JPX_LISTING_PAGE, timeout=30) as response:
-        html = response.read().decode("utf-8", errors="ignore")
-
-    matches = re.findall(r'href="([^"]+data_j\.(?:xls|xlsx))"', html)
-    if not matches:
-        matches = re.findall(r'href="([^"]+\.(?:xls|xlsx))"', html)
-    if not matches:
-        raise RuntimeError("JPXの上場銘柄一覧ファイルURLを検出できませんでした")
-
-    for href in matches:
-        abs_url = urllib.parse.urljoin(JPX_LISTING_PAGE, href)
-        if "data_j" in abs_url or "listed" in abs_url.lower() or "jpx" in abs_url.lower():
-            return abs_url
-    return urllib.parse.urljoin(JPX_LISTING_PAGE, matches[0])
-
-
-def _load_tse_codes_from_jpx() -> list[str]:
-    list_url = _find_jpx_list_url()
-    df = pd.read_excel(list_url, dtype=str)
-    codes = _extract_codes_from_df(df)
-    if not codes:
-        raise RuntimeError("JPX上場銘柄一覧から銘柄コードを抽出できませんでした")
-    return codes
+from app.data.financial_cache import (
+    DEFAULT_CACHE_DB,
+    FINANCIAL_REQUESTS_PER_ROW,
+    FinancialCacheWriter,
+    ensure_financial_cache_table,
+    fetch_financial_row,
+    stale_symbols,
+    upsert_financial_rows,
+)
+from app.data.fundamentals import sync_fundamentals
+from app.data.rate_limit import TokenBucket, call_with_retry, resolve_rate, transient_errors
+from app.data.resume_journal import ResumeJournal, resolve_resume_path
+from app.data.universe import add_universe_arguments, resolve_universe_codes_from_args
 
 
 def _load_codes_from_file(path: str) -> list[str]:
@@ -135,84 +47,109 @@ def _build_symbol(code: str, market: str) -> str:
     return c
 
 
-def _save_one_symbol_to_cache(symbol: str, db_path: Path) -> None:
-    ticker = yf.Ticker(symbol)
-    info = ticker.info or {}
-    financials = ticker.financials
-    balance_sheet = ticker.balance_sheet
-    cashflow = ticker.cashflow
-
-    with sqlite3.connect(db_path) as con:
-        con.execute(
-            """
-            INSERT INTO financial_cache (
-                symbol, updated_at, info_json, financials_json, balance_sheet_json, cashflow_json
-            ) VALUES (?, ?, ?, ?, ?, ?)
-            ON CONFLICT(symbol) DO UPDATE SET
-                updated_at=excluded.updated_at,
-                info_json=excluded.info_json,
-                financials_json=excluded.financials_json,
-                balance_sheet_json=excluded.balance_sheet_json,
-                cashflow_json=excluded.cashflow_json
-            """,
-            (
-                symbol,
-                pd.Timestamp.now(tz="UTC").isoformat(),
-                json.dumps(info, ensure_ascii=False, default=str),
-                _df_to_json(financials),
-                _df_to_json(balance_sheet),
-                _df_to_json(cashflow),
-            ),
-        )
-
-
 def _run_bulk_fetch(
     symbols: list[str],
     db_path: Path,
     sleep_sec: float,
     resume_path: Path,
     max_symbols: int,
+    workers: int = 4,
+    rate: float = 0.0,
+    burst: int = 1,
+    max_retries: int = 3,
+    retry_base_sec: float = 1.0,
+    compress: bool = False,
+    max_age_days: float = 0.0,
+    commit_every: int = 50,
+    fetch_fn: Callable[[str], tuple] | None = None,
+    limiter: TokenBucket | None = None,
 ) -> None:
-    _ensure_fin_cache_table(db_path)
-
-    state = _load_resume(resume_path)
-    done = list(state["done"])
-    failed = [code for code in state["failed"] if code not in set(done)]
-    done_set = set(done)
-    failed_set = set(failed)
-
-    targets = [s for s in symbols if s not in done_set]
-    if max_symbols > 0:
-        targets = targets[:max_symbols]
-
-    total = len(targets)
-    print(f"bulk_financial_fetch_start total_targets={total} sleep_sec={sleep_sec}")
-    if total == 0:
-        print("bulk_financial_fetch_nothing_to_do")
-        return
-
-    for idx, symbol in enumerate(targets, start=1):
+    """銘柄群の財務諸表をワーカープールで取得し、書き込みスレッド経由で保存する。
+
+    取得は共有トークンバケット(rate リクエスト/秒, burst)で制御し、例外は指数バックオフで再試行する。
+    既定の取得は1銘柄で FINANCIAL_REQUESTS_PER_ROW 回リクエストするので、トークンは
+    リクエストごとに取る(rate 未指定時の sleep_sec は銘柄ごとの間隔としてリクエスト/秒に換算する)。
+    fetch_fn を渡した場合は1回の呼び出しで1トークンを取る。
+    書き込みは FinancialCacheWriter が commit_every 件ずつまとめてコミットし、
+    コミット済みの銘柄だけを resume_path に done として記録する。
+
+    max_age_days > 0 の場合は再開ファイルではなく updated_at を見て、
+    未取得または max_age_days より古い銘柄だけを再取得する。
+    fetch_fn(symbol) -> financial_cache の1行 を渡すとネットワークなしで動かせる。
+    """
+    per_request = fetch_fn is None
+    if per_request and rate <= 0 and sleep_sec > 0:
+        rate = FINANCIAL_REQUESTS_PER_ROW / sleep_sec
+    rate = resolve_rate(rate, sleep_sec)
+    if limiter is None:
+        limiter = TokenBucket(rate=rate, burst=burst)
+    if per_request:
+
+        def fetch_fn(symbol: str) -> tuple:
+            return fetch_financial_row(symbol, compress=compress, limiter=limiter)
+
+    workers = max(1, int(workers))
+
+    ensure_financial_cache_table(db_path)
+
+    def _task(symbol: str):
         try:
-            _save_one_symbol_to_cache(symbol, db_path)
-            if symbol not in done_set:
-                done.append(symbol)
-                done_set.add(symbol)
-            if symbol in failed_set:
-                failed = [x for x in failed if x != symbol]
-                failed_set.discard(symbol)
-            print(f"[{idx}/{total}] symbol={symbol} status=ok")
+            return call_with_retry(
+                fetch_fn,
+                symbol,
+                max_retries=max_retries,
+                base_delay=retry_base_sec,
+                retry_on=transient_errors(),
+                # 既定の取得は fetch_financial_row がリクエストごとにトークンを取る
+                limiter=None if per_request else limiter,
+            )
         except Exception as e:
-            if symbol not in failed_set:
-                failed.append(symbol)
-                failed_set.add(symbol)
-            print(f"[{idx}/{total}] symbol={symbol} status=error error={e}")
+            return e
 
-        _save_resume(resume_path, done, failed)
-        if sleep_sec > 0:
-            time.sleep(sleep_sec)
+    with ResumeJournal(resume_path) as journal:
+        if max_age_days > 0:
+            targets = stale_symbols(db_path, list(dict.fromkeys(symbols)), max_age_days)
+        else:
+            targets = [s for s in symbols if s not in journal.done]
+        if max_symbols > 0:
+            targets = targets[:max_symbols]
+
+        total = len(targets)
+        print(
+            f"bulk_financial_fetch_start total_targets={total} workers={workers} rate={rate} burst={burst} "
+            f"compress={compress} max_age_days={max_age_days}"
+        )
+        if total == 0:
+            print("bulk_financial_fetch_nothing_to_do")
+            return
+
+        # done は書き込みスレッド、failed はメインスレッドから記録する
+        journal_lock = threading.Lock()
+
+        def _on_commit(committed: list[str]) -> None:
+            with journal_lock:
+                for symbol in committed:
+                    journal.mark_done(symbol)
+
+        with (
+            FinancialCacheWriter(db_path, batch_size=commit_every, on_commit=_on_commit) as writer,
+            ThreadPoolExecutor(max_workers=workers) as executor,
+        ):
+            futures = {executor.submit(_task, symbol): symbol for symbol in targets}
+            for idx, future in enumerate(as_completed(futures), start=1):
+                symbol = futures[future]
+                row = future.result()
+                if isinstance(row, Exception):
+                    with journal_lock:
+                        journal.mark_failed(symbol)
+                    print(f"[{idx}/{total}] symbol={symbol} status=error error={row}")
+                    continue
+                writer.put(row)
+                print(f"[{idx}/{total}] symbol={symbol} status=ok")
 
     print(
-        f"bulk_financial_fetch_done success_total={len(done)} failed_total={len(failed)} resume_file={resume_path} cache_db={db_path}"
+        f"bulk_financial_fetch_done success_total={len(journal.done)} failed_total={len(journal.failed)} "
+        f"commits={writer.commits} resume_file={resume_path} cache_db={db_path}"
     )
 
 
@@ -222,15 +159,37 @@ def main() -> None:
     parser.add_argument("--code", type=str, help="単一銘柄コード (例: 7203)")
     parser.add_argument("--market", type=str, default="T", help="市場サフィックス (例: T)")
 
-    parser.add_argument("--all-tse", action="store_true", help="JPX上場銘柄を自動取得して実行")
+    parser.add_argument(
+        "--all-tse", action="store_true", help="JPX上場銘柄一覧キャッシュから実行(--segment/--sector で絞り込み)"
+    )
     parser.add_argument("--codes-file", type=str, default="", help="銘柄コード一覧ファイル")
-    parser.add_argument("--sleep-sec", type=float, default=1.5, help="銘柄ごとの待機秒数")
+    add_universe_arguments(parser)
+    parser.add_argument(
+        "--sleep-sec",
+        type=float,
+        default=1.5,
+        help="銘柄ごとの待機秒数(--rate 未指定時は 銘柄あたりのリクエスト数/sleep-sec リクエスト/秒に換算)",
+    )
+    parser.add_argument(
+        "--rate", type=float, default=0.0, help="全ワーカー合計の最大リクエスト数/秒(0で--sleep-secから換算)"
+    )
+    parser.add_argument("--burst", type=int, default=2, help="トークンバケットの最大バースト数")
+    parser.add_argument("--workers", type=int, default=4, help="並列ワーカー数")
+    parser.add_argument("--max-retries", type=int, default=3, help="一時的な失敗時の最大再試行回数")
+    parser.add_argument("--commit-every", type=int, default=50, help="書き込みスレッドが1コミットにまとめる銘柄数")
+    parser.add_argument("--compress", action="store_true", help="財務諸表JSONをzlib圧縮して保存")
+    parser.add_argument(
+        "--max-age-days",
+        type=float,
+        default=0.0,
+        help="updated_at がこの日数より古い銘柄だけ再取得(0で再開ファイルに従う)",
+    )
     parser.add_argument("--max-symbols", type=int, default=0, help="先頭N銘柄のみ実行(0で全件)")
     parser.add_argument(
         "--resume-file",
         type=str,
-        default="results/cache/bulk_financial_fetch_resume.json",
-        help="進捗保存ファイル",
+        default="results/cache/bulk_financial_fetch_resume.jsonl",
+        help="進捗保存ファイル(JSONLジャーナル。無い場合は同名の旧形式 .json を引き継ぐ)",
     )
     parser.add_argument(
         "--cache-db",
@@ -238,17 +197,18 @@ def main() -> None:
         default=str(DEFAULT_CACHE_DB),
         help="保存先キャッシュDBファイル",
     )
+    parser.add_argument("--build-fundamentals", action="store_true", help="取得後に fundamentals 表を差分更新する")
 
     args = parser.parse_args()
 
     db_path = Path(args.cache_db)
-    resume_path = Path(args.resume_file)
+    resume_path = resolve_resume_path(args.resume_file)
 
     if args.all_tse or args.codes_file:
         if args.codes_file:
             codes = _load_codes_from_file(args.codes_file)
         else:
-            codes = _load_tse_codes_from_jpx()
+            codes = resolve_universe_codes_from_args(args)
         symbols = [_build_symbol(code, args.market) for code in codes]
         _run_bulk_fetch(
             symbols=symbols,
@@ -256,7 +216,16 @@ def main() -> None:
             sleep_sec=max(0.0, float(args.sleep_sec)),
             resume_path=resume_path,
             max_symbols=int(args.max_symbols),
+            workers=int(args.workers),
+            rate=float(args.rate),
+            burst=int(args.burst),
+            max_retries=max(0, int(args.max_retries)),
+            compress=bool(args.compress),
+            max_age_days=max(0.0, float(args.max_age_days)),
+            commit_every=max(1, int(args.commit_every)),
         )
+        if args.build_fundamentals:
+            print(f"fundamentals_sync {sync_fundamentals(db_path)}")
         return
 
     if args.symbol:
@@ -266,9 +235,13 @@ def main() -> None:
     else:
         raise SystemExit("--symbol / --code / --all-tse / --codes-file のいずれかを指定してください")
 
-    _ensure_fin_cache_table(db_path)
-    _save_one_symbol_to_cache(symbol, db_path)
+    ensure_financial_cache_table(db_path)
+    row = fetch_financial_row(symbol, compress=bool(args.compress))
+    with sqlite3.connect(db_path) as con:
+        upsert_financial_rows(con, [row])
     print(f"saved_financials symbol={symbol} cache_db={db_path}")
+    if args.build_fundamentals:
+        print(f"fundamentals_sync {sync_fundamentals(db_path)}")
 
 
 if __name__ == "__main__":
@@ -1,79 +1,27 @@
 """Yahoo Finance data importer for SQLite candle tables.
 
-単一銘柄取り込みに加えて、東証全銘柄の低速バッチ取り込みに対応する。
+単一銘柄取り込みに加えて、東証全銘柄のレート制御付き並列バッチ取り込みに対応する。
 """
 
 import argparse
-import json
 import re
 import sys
-import time
-import urllib.parse
-import urllib.request
+from collections.abc import Callable
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from pathlib import Path
 
-import pandas as pd
-
 ROOT_DIR = Path(__file__).resolve().parents[1]
 if str(ROOT_DIR) not in sys.path:
     sys.path.insert(0, str(ROOT_DIR))
 
-from app.data.yahoo import save_yahoo_data_to_db
-
-JPX_LISTING_PAGE = "https://www.jpx.co.jp/markets/statistics-equities/misc/01.html"
-
-
-def _extract_codes_from_df(df: pd.DataFrame) -> list[str]:
-    candidates = [
-        "コード",
-        "銘柄コード",
-        "Code",
-        "code",
-    ]
-    code_col = None
-    for col in df.columns:
-        col_str = str(col).strip()
-        if col_str in candidates or any(key in col_str for key in ["コード", "Code", "code"]):
-            code_col = col
-            break
-
-    if code_col is None:
-        return []
-
-    codes: list[str] = []
-    for raw in df[code_col].astype(str):
-        m = re.search(r"\b(\d{4})\b", raw)
-        if m:
-            codes.append(m.group(1))
-    # 順序維持で重複削除
-    return list(dict.fromkeys(codes))
-
-
-def _find_jpx_list_url() -> str:
-    with urllib.request.urlopen(JPX_LISTING_PAGE, timeout=30) as response:
-        html = response.read().decode("utf-8", errors="ignore")
-
-    # 上場銘柄一覧の xls/xlsx へのリンクを拾う
-    matches = re.findall(r'href="([^"]+data_j\.(?:xls|xlsx))"', html)
-    if not matches:
-        matches = re.findall(r'href="([^"]+\.(?:xls|xlsx))"', html)
-    if not matches:
-        raise RuntimeError("JPXの上場銘柄一覧ファイルURLを検出できませんでした")
-
-    for href in matches:
-        abs_url = urllib.parse.urljoin(JPX_LISTING_PAGE, href)
-        if "data_j" in abs_url or "listed" in abs_url.lower() or "jpx" in abs_url.lower():
-            return abs_url
-    return urllib.parse.urljoin(JPX_LISTING_PAGE, matches[0])
-
-
-def _load_tse_codes_from_jpx() -> list[str]:
-    list_url = _find_jpx_list_url()
-    df = pd.read_excel(list_url, dtype=str)
-    codes = _extract_codes_from_df(df)
-    if not codes:
-        raise RuntimeError("JPX上場銘柄一覧から銘柄コードを抽出できませんでした")
-    return codes
+from app.data.candle_store import CANDLE_LAYOUTS, get_candle_store
+from app.data.intraday_history import INTRADAY_LIMITS, stitch_intraday_history
+from app.data.providers import DataProvider, add_provider_arguments, provider_from_args
+from app.data.rate_limit import TokenBucket, call_with_retry, resolve_rate, transient_errors
+from app.data.resume_journal import ResumeJournal, resolve_resume_path
+from app.data.sqlite_engine import configure_shared_engine
+from app.data.universe import add_universe_arguments, resolve_universe_codes_from_args
+from app.data.yahoo import save_yahoo_batch_to_db, save_yahoo_data_to_db
 
 
 def _load_codes_from_file(path: str) -> list[str]:
@@ -86,134 +34,273 @@ def _load_codes_from_file(path: str) -> list[str]:
     return list(dict.fromkeys(codes))
 
 
-def _load_resume(path: Path) -> dict:
-    if not path.exists():
-        return {"done": [], "failed": []}
-    try:
-        data = json.loads(path.read_text(encoding="utf-8"))
-        done = list(dict.fromkeys([str(x) for x in data.get("done", [])]))
-        failed = list(dict.fromkeys([str(x) for x in data.get("failed", [])]))
-        return {"done": done, "failed": failed}
-    except Exception:
-        return {"done": [], "failed": []}
-
-
-def _save_resume(path: Path, done: list[str], failed: list[str]) -> None:
-    path.parent.mkdir(parents=True, exist_ok=True)
-    payload = {
-        "done": done,
-        "failed": failed,
-        "updated_at_epoch": int(time.time()),
-    }
-    path.write_text(json.dumps(payload, ensure_ascii=False, indent=2), encoding="utf-8")
-
-
 def _run_bulk_import(
     codes: list[str],
     days: int,
     duration: str,
     market: str,
-    sleep_sec: float,
     resume_path: Path,
     max_symbols: int,
+    on_conflict: str = "update",
+    incremental: bool = False,
+    overlap_days: int = 1,
+    workers: int = 4,
+    rate: float = 0.0,
+    burst: int = 1,
+    max_retries: int = 3,
+    retry_base_sec: float = 1.0,
+    fetch_fn: Callable[[str], int] | None = None,
+    limiter: TokenBucket | None = None,
+    batch_size: int = 0,
+    batch_fetch_fn: Callable[[list[str]], tuple[dict[str, int], dict[str, str]]] | None = None,
+    provider: DataProvider | None = None,
+    store=None,
+    stitch: bool = False,
 ) -> None:
-    state = _load_resume(resume_path)
-    done = list(state["done"])
-    failed = [code for code in state["failed"] if code not in set(done)]
-    done_set = set(done)
-    failed_set = set(failed)
-
-    targets = [c for c in codes if c not in done_set]
-    if max_symbols > 0:
-        targets = targets[:max_symbols]
-
-    total = len(targets)
-    print(f"bulk_import_start total_targets={total} sleep_sec={sleep_sec}")
-    if total == 0:
-        print("bulk_import_nothing_to_do")
-        return
+    """銘柄群をワーカープールで取り込む。
 
-    for idx, code in enumerate(targets, start=1):
-        try:
-            saved = save_yahoo_data_to_db(
+    リクエスト数は共有トークンバケット(rate 件/秒, burst)で制御し、
+    例外は指数バックオフ + ジッターで再試行する。進捗は1銘柄完了ごとに
+    resume_path(JSONL ジャーナル)へ追記し、再実行時は done 済み銘柄を飛ばす。
+
+    batch_size > 0 の場合は batch_size 銘柄を1リクエストでまとめて取得する。
+    fetch_fn(code) -> 保存件数 / batch_fetch_fn(codes) -> (保存件数, 失敗理由)
+    を渡すか、provider に replay / synthetic を指定するとネットワークなしで動かせる。
+    store を渡すと settings.ini の [db] layout に関わらずそのストアへ保存する。
+    stitch=True なら日中足を取得上限内の区間に分けて未取得分だけを取り込む(1銘柄ずつ)。
+    """
+    # stitch は1銘柄で区間の数だけリクエストするので、トークンは銘柄ごとでなく区間ごとに取る
+    stitch_windows = fetch_fn is None and stitch
+    if stitch_windows:
+
+        def fetch_fn(code: str) -> int:
+            return stitch_intraday_history(
+                code, duration, market, store=store, raise_errors=True, limiter=limiter
+            )["saved"]
+
+        batch_size = 0
+
+    if fetch_fn is None:
+
+        def fetch_fn(code: str) -> int:
+            return save_yahoo_data_to_db(
                 product_code=code,
                 period_days=days,
                 duration=duration,
                 market=market,
+                on_conflict=on_conflict,
+                incremental=incremental,
+                overlap_days=overlap_days,
+                raise_errors=True,
+                provider=provider,
+                store=store,
+            )
+
+    if batch_fetch_fn is None:
+
+        def batch_fetch_fn(chunk: list[str]) -> tuple[dict[str, int], dict[str, str]]:
+            return save_yahoo_batch_to_db(
+                product_codes=chunk,
+                period_days=days,
+                duration=duration,
+                market=market,
+                chunk_size=len(chunk),
+                on_conflict=on_conflict,
+                incremental=incremental,
+                overlap_days=overlap_days,
+                raise_errors=True,
+                provider=provider,
+                store=store,
             )
-            if saved > 0:
-                if code not in done_set:
-                    done.append(code)
-                    done_set.add(code)
-                if code in failed_set:
-                    failed = [x for x in failed if x != code]
-                    failed_set.discard(code)
-                print(f"[{idx}/{total}] code={code} saved_rows={saved}")
-            else:
-                if code not in failed_set:
-                    failed.append(code)
-                    failed_set.add(code)
-                print(f"[{idx}/{total}] code={code} no_data_or_no_insert saved_rows=0")
+
+    if limiter is None:
+        limiter = TokenBucket(rate=rate, burst=burst)
+
+    workers = max(1, int(workers))
+    batch_size = max(0, int(batch_size))
+
+    def _retry(fn, arg):
+        return call_with_retry(
+            fn,
+            arg,
+            max_retries=max_retries,
+            base_delay=retry_base_sec,
+            retry_on=transient_errors(),
+            limiter=None if stitch_windows else limiter,
+        )
+
+    def _task(chunk: list[str]) -> dict:
+        # 銘柄コード -> 保存件数 または 例外
+        if batch_size > 0:
+            try:
+                saved_map, failures = _retry(batch_fetch_fn, chunk)
+            except Exception as e:
+                return {code: e for code in chunk}
+            out: dict = {code: RuntimeError(reason) for code, reason in failures.items()}
+            out.update(saved_map)
+            return {code: out.get(code, RuntimeError("missing_from_batch")) for code in chunk}
+
+        code = chunk[0]
+        try:
+            return {code: _retry(fetch_fn, code)}
         except Exception as e:
-            if code not in failed_set:
-                failed.append(code)
-                failed_set.add(code)
-            print(f"[{idx}/{total}] code={code} error={e}")
+            return {code: e}
 
-        _save_resume(resume_path, done, failed)
-        if sleep_sec > 0:
-            time.sleep(sleep_sec)
+    with ResumeJournal(resume_path) as journal:
+        targets = [c for c in codes if c not in journal.done]
+        if max_symbols > 0:
+            targets = targets[:max_symbols]
+
+        total = len(targets)
+        print(
+            f"bulk_import_start total_targets={total} workers={workers} rate={rate} burst={burst} "
+            f"batch_size={batch_size} incremental={incremental}"
+        )
+        if total == 0:
+            print("bulk_import_nothing_to_do")
+            return
+
+        unit = batch_size if batch_size > 0 else 1
+        chunks = [targets[i : i + unit] for i in range(0, total, unit)]
+
+        idx = 0
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            futures = [executor.submit(_task, chunk) for chunk in chunks]
+            for future in as_completed(futures):
+                for code, saved in future.result().items():
+                    idx += 1
+                    _record_result(idx, total, code, saved, journal)
 
     print(
-        f"bulk_import_done success_total={len(done)} failed_total={len(failed)} resume_file={resume_path}"
+        f"bulk_import_done success_total={len(journal.done)} failed_total={len(journal.failed)} "
+        f"resume_file={resume_path}"
     )
 
 
+def _record_result(
+    idx: int,
+    total: int,
+    code: str,
+    saved,
+    journal: ResumeJournal,
+) -> None:
+    # 例外・取得元が失敗と報告した銘柄だけを failed にする(取得結果が空なら save_yahoo_data_to_db が
+    # NoDataError を送出する)。取得できて保存 0 件(最新まで取り込み済み)は正常終了として done にする
+    if isinstance(saved, Exception):
+        journal.mark_failed(code)
+        print(f"[{idx}/{total}] code={code} error={saved}")
+        return
+
+    journal.mark_done(code)
+    print(f"[{idx}/{total}] code={code} saved_rows={saved}")
+
+
 def main():
     parser = argparse.ArgumentParser(description="Yahoo FinanceデータをSQLiteへ保存")
     parser.add_argument("--code", type=str, help="銘柄コード (例: 7203)")
     parser.add_argument("--days", type=int, default=365, help="取得日数 (デフォルト: 365)")
     parser.add_argument("--duration", type=str, default="1d", choices=["5s", "1m", "1h", "1d"], help="時間軸")
     parser.add_argument("--market", type=str, default="T", help="市場サフィックス (例: T)")
+    parser.add_argument(
+        "--on-conflict",
+        type=str,
+        default="update",
+        choices=["update", "ignore"],
+        help="既存行と重複した場合: update=値が違えば上書き / ignore=既存を残す",
+    )
+    parser.add_argument(
+        "--incremental",
+        action="store_true",
+        help="テーブルの最新足以降だけを取得して保存する(--days は上限として扱う)",
+    )
+    parser.add_argument("--overlap-days", type=int, default=1, help="差分取得時に最終足の補修用に重ねる日数")
+    parser.add_argument(
+        "--stitch",
+        action="store_true",
+        help="日中足(1m/1h)を取得上限内の区間に分けて未取得分だけ取り込み、保存済み履歴を伸ばす(--days は無視)",
+    )
 
-    parser.add_argument("--all-tse", action="store_true", help="東証上場銘柄をJPX一覧から読み込んで順次取り込む")
+    parser.add_argument(
+        "--all-tse", action="store_true", help="東証上場銘柄をJPX一覧キャッシュから読み込んで取り込む(--segment/--sector で絞り込み)"
+    )
     parser.add_argument("--codes-file", type=str, default="", help="銘柄コード一覧ファイル(4桁コードを抽出)")
-    parser.add_argument("--sleep-sec", type=float, default=1.5, help="銘柄ごとの待機秒数")
+    add_universe_arguments(parser)
+    parser.add_argument(
+        "--sleep-sec", type=float, default=1.5, help="銘柄ごとの待機秒数(--rate 未指定時は 1/sleep-sec 件/秒に換算)"
+    )
+    parser.add_argument("--rate", type=float, default=0.0, help="全ワーカー合計の最大リクエスト数/秒(0で--sleep-secから換算)")
+    parser.add_argument("--burst", type=int, default=2, help="トークンバケットの最大バースト数")
+    parser.add_argument("--workers", type=int, default=4, help="並列ワーカー数")
+    parser.add_argument("--max-retries", type=int, default=3, help="一時的な失敗時の最大再試行回数")
+    parser.add_argument(
+        "--batch-size", type=int, default=0, help="N銘柄をまとめて1リクエストで取得(0で銘柄ごとに取得)"
+    )
     parser.add_argument(
         "--resume-file",
         type=str,
-        default="results/cache/bulk_import_tse_resume.json",
-        help="進捗保存ファイル",
+        default="results/cache/bulk_import_tse_resume.jsonl",
+        help="進捗保存ファイル(JSONLジャーナル。無い場合は同名の旧形式 .json を引き継ぐ)",
     )
     parser.add_argument("--max-symbols", type=int, default=0, help="先頭N銘柄のみ実行(0で全件)")
+    parser.add_argument(
+        "--layout", type=str, default="", choices=["", *CANDLE_LAYOUTS], help="保存先レイアウト(省略時は settings.ini の [db] layout)"
+    )
+    add_provider_arguments(parser)
 
     args = parser.parse_args()
+    if args.stitch and args.duration not in INTRADAY_LIMITS:
+        parser.error("--stitch は日中足 (--duration 1m / 1h) のみ指定できます")
+    # WAL にして取り込み中も最適化・Web API からの読み込みを止めない
+    configure_shared_engine()
+    # yahoo は既定の取得経路を使う(再試行のため例外は送出させる)
+    provider = provider_from_args(args) if args.provider != "yahoo" else None
+    store = get_candle_store(args.layout) if args.layout else None
 
     if args.all_tse or args.codes_file:
         if args.codes_file:
             codes = _load_codes_from_file(args.codes_file)
         else:
-            codes = _load_tse_codes_from_jpx()
+            codes = resolve_universe_codes_from_args(args)
 
         _run_bulk_import(
             codes=codes,
             days=args.days,
             duration=args.duration,
             market=args.market,
-            sleep_sec=max(0.0, float(args.sleep_sec)),
-            resume_path=Path(args.resume_file),
+            resume_path=resolve_resume_path(args.resume_file),
             max_symbols=int(args.max_symbols),
+            on_conflict=args.on_conflict,
+            incremental=bool(args.incremental),
+            overlap_days=max(0, int(args.overlap_days)),
+            workers=int(args.workers),
+            rate=resolve_rate(float(args.rate), float(args.sleep_sec)),
+            burst=int(args.burst),
+            max_retries=max(0, int(args.max_retries)),
+            batch_size=max(0, int(args.batch_size)),
+            provider=provider,
+            store=store,
+            stitch=bool(args.stitch),
         )
         return
 
     if not args.code:
         raise SystemExit("--code か --all-tse / --codes-file のいずれかを指定してください")
 
+    if args.stitch:
+        stats = stitch_intraday_history(args.code, args.duration, args.market, store=store)
+        print(f"saved_rows={stats['saved']} windows={stats['windows']} gap_days={stats['gap_days']}")
+        return
+
     saved = save_yahoo_data_to_db(
         product_code=args.code,
         period_days=args.days,
         duration=args.duration,
         market=args.market,
+        on_conflict=args.on_conflict,
+        incremental=bool(args.incremental),
+        overlap_days=max(0, int(args.overlap_days)),
+        provider=provider,
+        store=store,
     )
 
     print(f"saved_rows={saved}")
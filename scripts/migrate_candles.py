@@ -0,0 +1,81 @@
+"""ローソク足を保存レイアウト間で移行するCLI。
+
+- unified: 銘柄ごとの表 (CANDLE_<code>_<DURATION>) を統合 candles 表へ SQL で一括移行
+- parquet: tables / unified の内容を年ごとの Parquet ファイルへ書き出す
+- archive: tables / unified / parquet の内容を年ごとの圧縮アーカイブ (呼値単位の int32) へ書き出す
+"""
+
+import argparse
+import sys
+from pathlib import Path
+
+ROOT_DIR = Path(__file__).resolve().parents[1]
+if str(ROOT_DIR) not in sys.path:
+    sys.path.insert(0, str(ROOT_DIR))
+
+from app.data.candle_store import copy_candle_store, get_candle_store, migrate_tables_to_unified
+from app.data.sqlite_engine import configure_shared_engine
+
+DURATIONS = ["5s", "1m", "1h", "1d"]
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="ローソク足を保存レイアウト間で移行")
+    parser.add_argument(
+        "--target", default="unified", choices=["unified", "parquet", "archive"], help="移行先レイアウト"
+    )
+    parser.add_argument(
+        "--source",
+        default="tables",
+        choices=["tables", "unified", "parquet"],
+        help="--target parquet / archive の移行元レイアウト",
+    )
+    parser.add_argument("--parquet-dir", default="", help="parquet の保存先(省略時は settings.ini の [db] parquet_dir)")
+    parser.add_argument(
+        "--archive-dir", default="", help="--target archive の保存先(省略時は settings.ini の [db] archive_dir)"
+    )
+    parser.add_argument(
+        "--codec",
+        default="",
+        choices=["", "zlib", "lzma", "none"],
+        help="--target archive の圧縮方式(省略時は settings.ini)",
+    )
+    parser.add_argument("--duration", action="append", default=[], choices=DURATIONS, help="移行する時間軸(複数指定可)")
+    parser.add_argument("--drop-source", action="store_true", help="--target unified で移行後に元の表を削除する")
+    parser.add_argument("--vacuum", action="store_true", help="移行後に VACUUM してファイルを縮める")
+    args = parser.parse_args()
+    configure_shared_engine()
+
+    def _progress(name: str, rows: int) -> None:
+        print(f"migrated {name} rows={rows}")
+
+    parquet_dir = Path(args.parquet_dir) if args.parquet_dir else None
+    if args.target in ("parquet", "archive"):
+        dst = get_candle_store(
+            args.target,
+            parquet_dir=parquet_dir,
+            archive_dir=Path(args.archive_dir) if args.archive_dir else None,
+            archive_codec=args.codec or None,
+        )
+        stats = copy_candle_store(
+            get_candle_store(args.source, parquet_dir=parquet_dir), dst, args.duration or DURATIONS, progress=_progress
+        )
+        print(f"migrate_done series={stats['series']} rows={stats['rows']} {args.target}_dir={dst.root}")
+    else:
+        stats = migrate_tables_to_unified(
+            durations=args.duration or None, drop_source=args.drop_source, progress=_progress
+        )
+        print(f"migrate_done tables={stats['tables']} rows={stats['rows']}")
+
+    if args.vacuum:
+        from app.models.base import engine
+
+        with engine.connect() as conn:
+            conn.exec_driver_sql("VACUUM")
+        print("vacuum_done")
+
+    print(f"settings.ini の [db] に layout = {args.target} を設定すると移行先を使用します")
+
+
+if __name__ == "__main__":
+    main()
@@ -20,28 +20,53 @@ if __package__ is None or __package__ == "":
         sys.path.insert(0, str(repo_root))
 
 import settings
+from app.data.panel import Panel, build_panel
+from app.data.providers import (
+    DataProvider,
+    add_provider_arguments,
+    engine_from_provider,
+    get_provider,
+    provider_from_args,
+)
 from app.strategy.engine import StrategyEngine, compile_strategy
+from app.strategy.batch import run_many
 from enhanced_backtest import RiskManagement
 
 logging.basicConfig(level=logging.INFO, stream=sys.stdout)
 logger = logging.getLogger(__name__)
 
 
-def run_backtest_analysis(product_code: str, period_days: int, duration: str, detailed: bool = False):
-    """銘柄1つ分の戦略最適化バックテストを実行する。"""
+def run_backtest_analysis(
+    product_code: str,
+    period_days: int,
+    duration: str,
+    detailed: bool = False,
+    provider: Optional[DataProvider] = None,
+):
+    """銘柄1つ分の戦略最適化バックテストを実行する。provider 省略時は Yahoo Finance から取得する。"""
     risk = RiskManagement(
         initial_capital=1_000_000,
         transaction_cost_percent=0.1,
         slippage_percent=0.02,
     )
 
-    engine = StrategyEngine.from_yahoo(
-        product_code=product_code,
-        period_days=period_days,
-        duration=duration,
-        market="T",
-        risk_management=risk,
-    )
+    if provider is None:
+        engine = StrategyEngine.from_yahoo(
+            product_code=product_code,
+            period_days=period_days,
+            duration=duration,
+            market="T",
+            risk_management=risk,
+        )
+    else:
+        engine = engine_from_provider(
+            provider,
+            product_code=product_code,
+            period_days=period_days,
+            duration=duration,
+            market="T",
+            risk_management=risk,
+        )
 
     strategy_specs = {
         "ema": {
@@ -141,19 +166,18 @@ def strategy(ctx, params):
 
     for strategy_name, spec in strategy_specs.items():
         strategy_fn = compile_strategy(spec["code"])
-        all_rows = []
-
-        for params in spec["params"]:
-            result = engine.run(strategy_fn, params)
-            perf = float(result.get("risk_management_stats", {}).get("return_percent", 0.0))
-
-            row = {**params}
-            row["performance"] = perf
-            row["total_trades"] = int(result.get("total_trades", 0))
-            row["win_rate"] = float(result.get("metrics", {}).get("win_rate", 0.0))
-            row["max_drawdown"] = float(result.get("metrics", {}).get("max_drawdown", 0.0))
-            row["sharpe_ratio"] = float(result.get("metrics", {}).get("sharpe_ratio", 0.0))
-            all_rows.append(row)
+        table = run_many(engine, strategy_fn, spec["params"], result_level="metrics")
+        all_rows = [
+            {
+                **params,
+                "performance": float(rec.return_percent),
+                "total_trades": int(rec.total_trades),
+                "win_rate": float(rec.win_rate),
+                "max_drawdown": float(rec.max_drawdown),
+                "sharpe_ratio": float(rec.sharpe_ratio),
+            }
+            for params, rec in zip(spec["params"], table.itertuples(), strict=True)
+        ]
 
         if not all_rows:
             continue
@@ -179,18 +203,27 @@ def strategy(ctx, params):
 class MultiStockBacktest:
     """複数銘柄の一括バックテスト"""
 
-    def __init__(self, product_codes: List[str], period_days: int, duration: str, max_workers: int = 4):
+    def __init__(
+        self,
+        product_codes: List[str],
+        period_days: int,
+        duration: str,
+        max_workers: int = 4,
+        provider: Optional[DataProvider] = None,
+    ):
         """
         Args:
             product_codes: 銘柄コードのリスト
             period_days: バックテスト期間（日数）
             duration: 時間軸
             max_workers: 並列処理の最大ワーカー数
+            provider: ローソク足の取得元（省略時は Yahoo Finance）
         """
         self.product_codes = product_codes
         self.period_days = period_days
         self.duration = duration
         self.max_workers = max_workers
+        self.provider = provider
         self.results = {}
 
     def run_single_backtest(self, product_code: str, detailed: bool = False) -> Dict:
@@ -203,6 +236,7 @@ class MultiStockBacktest:
                 period_days=self.period_days,
                 duration=self.duration,
                 detailed=detailed,
+                provider=self.provider,
             )
 
             if not results:
@@ -325,6 +359,29 @@ class MultiStockBacktest:
                 df.to_csv(filename, index=False, encoding="utf-8-sig")
                 logger.info(f"action=save_ranking_csv strategy={strategy} file={filename}")
 
+    def load_panel(self, fill: str = "ffill") -> Panel:
+        """対象銘柄のローソク足を共通の時刻軸にそろえた Panel(相関・順位などの銘柄横断の分析用)"""
+        provider = self.provider if self.provider is not None else get_provider("yahoo")
+        frames, failures = provider.fetch_frames(self.product_codes, self.period_days, self.duration)
+        for code, error in failures.items():
+            logger.warning(f"action=load_panel product_code={code} error={error}")
+        return build_panel(frames, fill=fill, duration=self.duration)
+
+    def save_correlation_csv(self, output_dir: Optional[str] = None, panel: Optional[Panel] = None):
+        """終値の変化率の銘柄間相関行列を CSV に保存"""
+        output_dir = output_dir or settings.backtest_rankings_dir
+        os.makedirs(output_dir, exist_ok=True)
+        panel = panel if panel is not None else self.load_panel()
+        if len(panel.codes) < 2:
+            logger.warning(f"action=save_correlation_csv status=skipped codes={len(panel.codes)}")
+            return None
+
+        df = pd.DataFrame(panel.correlation(), index=panel.codes, columns=panel.codes)
+        filename = f"{output_dir}/correlation_{datetime.now().strftime('%Y%m%d_%H%M%S')}.csv"
+        df.to_csv(filename, encoding="utf-8-sig")
+        logger.info(f"action=save_correlation_csv codes={len(panel.codes)} bars={len(panel.time)} file={filename}")
+        return filename
+
     def print_summary(self):
         """結果サマリーを表示"""
         print("\n" + "=" * 80)
@@ -382,8 +439,11 @@ def main():
     parser.add_argument("--detailed", action="store_true", help="詳細バックテスト")
     parser.add_argument("--parallel", action="store_true", help="並列実行")
     parser.add_argument("--workers", type=int, default=4, help="並列ワーカー数")
+    parser.add_argument("--correlation", action="store_true", help="銘柄間の相関行列をCSVに保存")
+    add_provider_arguments(parser)
 
     args = parser.parse_args()
+    provider = provider_from_args(args) if args.provider != "yahoo" else None
 
     print("\n複数銘柄バックテスト開始")
     print(f"対象銘柄: {', '.join(args.codes)}")
@@ -395,7 +455,11 @@ def main():
 
     # バックテスト実行
     multi_backtest = MultiStockBacktest(
-        product_codes=args.codes, period_days=args.period, duration=args.duration, max_workers=args.workers
+        product_codes=args.codes,
+        period_days=args.period,
+        duration=args.duration,
+        max_workers=args.workers,
+        provider=provider,
     )
 
     multi_backtest.run_all(detailed=args.detailed, parallel=args.parallel)
@@ -406,6 +470,8 @@ def main():
     # 結果保存
     multi_backtest.save_results()
     multi_backtest.save_ranking_csv()
+    if args.correlation:
+        multi_backtest.save_correlation_csv()
 
     print("\nバックテスト完了！")
     print(f"結果は {settings.multi_stock_results_file} に保存されました。")
@@ -0,0 +1,101 @@
+"""保存済みのローソク足を圧縮アーカイブ形式にしたときの圧縮率と復号速度を表示するツール。
+
+指定したストア (tables / unified / parquet) の系列を日ごとのブロックに符号化し、
+圧縮方式ごとに「float64 の列 (time + OHLCV = 48 バイト/行) に対する圧縮率」
+「呼値で整数化できたブロックの割合」「符号化・復号の行数/秒」を JSON で1行ずつ出す。
+アーカイブへの書き出しは scripts/migrate_candles.py --target archive で行う。
+
+    python scripts/report_tick_archive.py --source unified --duration 1m --limit 50
+"""
+
+import argparse
+import itertools
+import json
+import sys
+import time
+from pathlib import Path
+
+ROOT_DIR = Path(__file__).resolve().parents[1]
+if str(ROOT_DIR) not in sys.path:
+    sys.path.insert(0, str(ROOT_DIR))
+
+import numpy as np
+
+from app.data.candle_frame import CandleFrame
+from app.data.candle_store import get_candle_store
+from app.data.tick_archive import ARCHIVE_CODECS, PRICE_TICKS, decode_block, encode_block, split_blocks
+
+# float64 の time + OHLCV 列の1行あたりのバイト数
+RAW_BYTES_PER_ROW = 8 * 6
+
+
+def _day_frames(frame: CandleFrame):
+    days = frame.time.astype("datetime64[D]")
+    cuts = np.flatnonzero(days[1:] != days[:-1]) + 1
+    bounds = np.concatenate(([0], cuts, [len(frame)]))
+    return [frame[int(a) : int(b)] for a, b in itertools.pairwise(bounds)]
+
+
+def report_codec(frames, codec: str, level=None) -> dict:
+    """frames (系列ごとの CandleFrame) を codec で符号化・復号して計測する"""
+    rows = sum(len(f) for f in frames)
+    blocks = []
+    t0 = time.perf_counter()
+    for frame in frames:
+        blocks.extend(encode_block(day, codec, level) for day in _day_frames(frame))
+    encode_sec = time.perf_counter() - t0
+
+    parsed = split_blocks(b"".join(blocks))
+    t0 = time.perf_counter()
+    for header, payload in parsed:
+        decode_block(header, payload)
+    decode_sec = time.perf_counter() - t0
+
+    archived = sum(len(block) for block in blocks)
+    raw = rows * RAW_BYTES_PER_ROW
+    return {
+        "codec": codec,
+        "series": len(frames),
+        "rows": rows,
+        "blocks": len(blocks),
+        "tick_blocks_pct": round(100.0 * sum(h[4] == PRICE_TICKS for h, _ in parsed) / max(1, len(blocks)), 1),
+        "raw_mb": round(raw / 1e6, 2),
+        "archive_mb": round(archived / 1e6, 3),
+        "ratio": round(raw / archived, 2) if archived else None,
+        "bytes_per_row": round(archived / rows, 2) if rows else None,
+        "encode_rows_per_sec": round(rows / encode_sec) if encode_sec else None,
+        "decode_rows_per_sec": round(rows / decode_sec) if decode_sec else None,
+        "decode_mb_per_sec": round(raw / 1e6 / decode_sec, 1) if decode_sec else None,
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="圧縮アーカイブ形式の圧縮率と復号速度を表示")
+    parser.add_argument(
+        "--source",
+        default="",
+        choices=["", "tables", "unified", "parquet"],
+        help="読み込むレイアウト(省略時は settings.ini)",
+    )
+    parser.add_argument("--duration", default="1m", help="時間軸")
+    parser.add_argument("--codes", nargs="*", default=[], help="対象銘柄(省略時はストアの全銘柄)")
+    parser.add_argument("--limit", type=int, default=20, help="--codes 省略時の最大銘柄数")
+    parser.add_argument(
+        "--codec", action="append", default=[], choices=list(ARCHIVE_CODECS), help="比較する圧縮方式(複数指定可)"
+    )
+    parser.add_argument("--level", type=int, default=None, help="圧縮レベル(zlib: 0-9 / lzma: 0-9)")
+    args = parser.parse_args()
+
+    store = get_candle_store(args.source or None)
+    codes = args.codes or store.list_codes(args.duration)[: max(1, int(args.limit))]
+    frames = [frame for frame in (store.load(code, args.duration) for code in codes) if frame]
+    if not frames:
+        print(json.dumps({"error": "no_candles", "duration": args.duration}, ensure_ascii=False))
+        return
+
+    for codec in args.codec or ["zlib", "lzma"]:
+        print(json.dumps(report_codec(frames, codec, args.level), ensure_ascii=False))
+
+
+if __name__ == "__main__":
+    main()
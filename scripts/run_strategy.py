@@ -8,9 +8,10 @@
 import argparse
 import json
 
-from app.strategy import run_strategy_file
 from enhanced_backtest import RiskManagement
 
+from app.strategy import run_strategy_file
+
 
 def main():
     parser = argparse.ArgumentParser(description="コードベース・ストラテジーのバックテスト")
@@ -0,0 +1,47 @@
+"""JPX上場銘柄一覧キャッシュの更新・確認CLI。"""
+
+import argparse
+import sys
+from pathlib import Path
+
+ROOT_DIR = Path(__file__).resolve().parents[1]
+if str(ROOT_DIR) not in sys.path:
+    sys.path.insert(0, str(ROOT_DIR))
+
+from app.data.universe import DEFAULT_UNIVERSE_CACHE, filter_universe, load_universe
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="JPX上場銘柄一覧をローカルにキャッシュする")
+    parser.add_argument("--refresh", action="store_true", help="有効期限に関係なくJPXから再取得")
+    parser.add_argument("--max-age-days", type=float, default=7.0, help="キャッシュの有効日数")
+    parser.add_argument("--cache-file", type=str, default=str(DEFAULT_UNIVERSE_CACHE), help="キャッシュファイル")
+    parser.add_argument(
+        "--segment", action="append", default=[], help="市場区分で絞り込み (prime/standard/growth など)"
+    )
+    parser.add_argument("--sector", action="append", default=[], help="33業種区分名またはコードで絞り込み")
+    parser.add_argument("--list-sectors", action="store_true", help="33業種ごとの銘柄数を表示")
+    parser.add_argument("--output", type=str, default="", help="絞り込んだ銘柄コードを1行1銘柄で書き出すファイル")
+    args = parser.parse_args()
+
+    df = load_universe(path=Path(args.cache_file), max_age_days=float(args.max_age_days), refresh=bool(args.refresh))
+    print(f"universe cache={args.cache_file} symbols={len(df)}")
+
+    if args.list_sectors:
+        counts = df.groupby(["sector33_code", "sector33"]).size().reset_index(name="count")
+        for row in counts.itertuples(index=False):
+            print(f"{row.sector33_code}\t{row.sector33}\t{row.count}")
+
+    filtered = filter_universe(df, markets=args.segment, sectors=args.sector)
+    if args.segment or args.sector:
+        print(f"filtered symbols={len(filtered)}")
+
+    if args.output:
+        out_path = Path(args.output)
+        out_path.parent.mkdir(parents=True, exist_ok=True)
+        out_path.write_text("\n".join(filtered["code"].tolist()) + "\n", encoding="utf-8")
+        print(f"saved codes: {out_path}")
+
+
+if __name__ == "__main__":
+    main()
@@ -13,6 +13,16 @@ product_code = conf["kabusapi"]["product_code"]
 
 db_name = conf["db"]["name"]
 db_driver = conf["db"]["driver"]
+# ローソク足の保存レイアウト: tables(銘柄ごとの表) / unified(candles 表1つ) / parquet(年ごとの Parquet)
+# / archive(年ごとの圧縮アーカイブ。価格は呼値単位の int32)
+db_layout = conf.get("db", "layout", fallback="tables").lower()
+# SQLite の接続設定(app.data.sqlite_engine): WAL で読み込みと書き込みを並行させる
+db_journal_mode = conf.get("db", "journal_mode", fallback="wal")
+db_synchronous = conf.get("db", "synchronous", fallback="normal")
+db_mmap_size_mb = conf.getint("db", "mmap_size_mb", fallback=256)
+db_cache_size_mb = conf.getint("db", "cache_size_mb", fallback=64)
+db_busy_timeout_ms = conf.getint("db", "busy_timeout_ms", fallback=5000)
+db_read_pool_size = conf.getint("db", "read_pool_size", fallback=8)
 
 web_port = int(conf["web"]["port"])
 
@@ -32,6 +42,13 @@ backtest_details_dir = conf.get("paths", "backtest_details_dir", fallback=f"{res
 backtest_rankings_dir = conf.get("paths", "backtest_rankings_dir", fallback=f"{results_dir}/backtest_rankings")
 walkforward_dir = conf.get("paths", "walkforward_dir", fallback=f"{results_dir}/walkforward")
 cache_dir = conf.get("paths", "cache_dir", fallback=f"{results_dir}/cache")
+# [db] layout = parquet の保存先
+db_parquet_dir = conf.get("db", "parquet_dir", fallback=f"{results_dir}/candles")
+# [db] layout = archive の保存先と圧縮方式 (zlib / lzma / none)
+db_archive_dir = conf.get("db", "archive_dir", fallback=f"{results_dir}/candles_archive")
+db_archive_codec = conf.get("db", "archive_codec", fallback="zlib").lower()
+# [db] cold_archive_dir を指定すると layout のストアの後ろに古い履歴のアーカイブを置く(空なら使わない)
+db_cold_archive_dir = conf.get("db", "cold_archive_dir", fallback="")
 
 for path in [results_dir, backtest_details_dir, backtest_rankings_dir, walkforward_dir, cache_dir]:
 	os.makedirs(path, exist_ok=True)
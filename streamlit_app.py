@@ -16,7 +16,10 @@ import numpy as np
 
 import constants
 import settings
-from app.data.yahoo import fetch_yahoo_data, save_yahoo_data_to_db
+from app.data.candle_frame import CandleFrame
+from app.data.panel import build_panel
+from app.data.sqlite_engine import configure_shared_engine
+from app.data.yahoo import fetch_yahoo_frame, save_yahoo_data_to_db
 from app.models.dfcandle import DataFrameCandle
 
 # 拡張バックテスト機能をインポート（オプション）
@@ -34,6 +37,9 @@ BACKTEST_RESULTS_FILE = settings.backtest_results_file
 BACKTEST_DETAILS_DIR = settings.backtest_details_dir
 os.makedirs(CACHE_DIR, exist_ok=True)
 
+# 取り込み中も読み込みを止めないよう共有エンジンを WAL にする
+configure_shared_engine()
+
 # streamlit_appではバックテスト機能を無効化し、strategy_labへ統合する
 BACKTEST_ENABLED = False
 
@@ -765,6 +771,47 @@ def load_industry_averages():
         return None
 
 
+@st.cache_data(ttl=600)
+def load_fundamental_group_averages(industry, sector):
+    """fundamentals 表(import_financials_cache --build-fundamentals で作成)から業種内平均を取得"""
+    from app.data.financial_cache import DEFAULT_CACHE_DB
+    from app.data.fundamentals import group_averages, has_fundamentals
+
+    if not has_fundamentals(DEFAULT_CACHE_DB):
+        return {}
+    items = ["returnOnEquity", "returnOnAssets", "operatingMargins"]
+    try:
+        averages = group_averages(DEFAULT_CACHE_DB, items, industry=industry)
+        if not averages:
+            averages = group_averages(DEFAULT_CACHE_DB, items, sector=sector)
+        return averages
+    except Exception:
+        return {}
+
+
+@st.cache_data(ttl=600)
+def load_fundamental_comparison(codes):
+    """比較する銘柄の主要指標を fundamentals 表から1回のクエリで取得(表が無ければ None)"""
+    from app.data.financial_cache import DEFAULT_CACHE_DB
+    from app.data.fundamentals import has_fundamentals, latest_snapshot
+
+    if not has_fundamentals(DEFAULT_CACHE_DB):
+        return None
+    items = ["trailingPE", "priceToBook", "returnOnEquity", "operatingMargins", "dividendYield"]
+    try:
+        return latest_snapshot(DEFAULT_CACHE_DB, items, symbols=[f"{code}.T" for code in codes])
+    except Exception:
+        return None
+
+
+def format_group_average_pct(averages, item):
+    """load_fundamental_group_averages の結果を「平均% (社数)」で表示"""
+    if item not in averages:
+        return "N/A"
+    avg, count = averages[item]
+    return f"{avg*100:.2f}% ({count}社)"
+
+
 @st.cache_data
 def load_market_cap_by_sector():
     """業種別時価総額データをPDFから読み込み"""
@@ -1283,11 +1330,11 @@ def load_chart_data(product_code, period_days, duration, force_refresh=False):
     # APIからデータ取得
     duration_time = constants.TRADE_MAP.get(duration, {}).get("duration", constants.DURATION_1M)
 
-    yahoo_candles = fetch_yahoo_data(
+    yahoo_frame = fetch_yahoo_frame(
         product_code=product_code, period_days=period_days, duration=duration_time, market="T"
     )
 
-    if not yahoo_candles:
+    if not yahoo_frame:
         # APIが失敗した場合、古いキャッシュでも使用
         if os.path.exists(cache_file):
             df = load_from_cache(cache_file)
@@ -1296,22 +1343,8 @@ def load_chart_data(product_code, period_days, duration, force_refresh=False):
                 return df
         return None
 
-    # DataFrameに変換
-    data = []
-    for candle in yahoo_candles:
-        data.append(
-            {
-                "time": candle.time,
-                "open": candle.open,
-                "high": candle.high,
-                "low": candle.low,
-                "close": candle.close,
-                "volume": candle.volume,
-            }
-        )
-
-    df = pd.DataFrame(data)
-    df["time"] = pd.to_datetime(df["time"])
+    # DataFrameに変換(列配列から直接組み立てる)
+    df = yahoo_frame.to_dataframe()
 
     # CSVに保存
     if save_to_cache(df, cache_file):
@@ -1320,6 +1353,21 @@ def load_chart_data(product_code, period_days, duration, force_refresh=False):
     return df
 
 
+def _comparison_frame(df):
+    """load_chart_data の DataFrame を CandleFrame にする(時刻は東証の壁時計時刻)"""
+    time = pd.DatetimeIndex(df["time"])
+    if time.tz is not None:
+        time = time.tz_localize(None)
+    return CandleFrame(
+        time=time.to_numpy(dtype="datetime64[ns]"),
+        open=df["open"].to_numpy(dtype=float),
+        high=df["high"].to_numpy(dtype=float),
+        low=df["low"].to_numpy(dtype=float),
+        close=df["close"].to_numpy(dtype=float),
+        volume=df["volume"].fillna(0).to_numpy(dtype=np.int64),
+    )
+
+
 # テクニカル指標計算
 def calculate_sma(df, periods):
     """SMAを計算"""
@@ -1356,6 +1404,8 @@ def run_backtest_analysis(product_code, period_days, duration, indicators, detai
     from app.strategy.engine import StrategyEngine, compile_strategy
     from enhanced_backtest import RiskManagement
 
+    from app.strategy.batch import run_many
+
     timestamp = datetime.now()
     timestamp_iso = timestamp.isoformat()
     timestamp_label = timestamp.strftime("%Y%m%d_%H%M%S")
@@ -1483,19 +1533,18 @@ def strategy(ctx, params):
             continue
 
         strategy_fn = compile_strategy(spec["code"])
-        all_rows = []
-
-        for params in spec["params"]:
-            result = engine.run(strategy_fn, params)
-            perf = float(result.get("risk_management_stats", {}).get("return_percent", 0.0))
-
-            row = {**params}
-            row["performance"] = perf
-            row["total_trades"] = int(result.get("total_trades", 0))
-            row["win_rate"] = float(result.get("metrics", {}).get("win_rate", 0.0))
-            row["max_drawdown"] = float(result.get("metrics", {}).get("max_drawdown", 0.0))
-            row["sharpe_ratio"] = float(result.get("metrics", {}).get("sharpe_ratio", 0.0))
-            all_rows.append(row)
+        table = run_many(engine, strategy_fn, spec["params"], result_level="metrics")
+        all_rows = [
+            {
+                **params,
+                "performance": float(rec.return_percent),
+                "total_trades": int(rec.total_trades),
+                "win_rate": float(rec.win_rate),
+                "max_drawdown": float(rec.max_drawdown),
+                "sharpe_ratio": float(rec.sharpe_ratio),
+            }
+            for params, rec in zip(spec["params"], table.itertuples(), strict=True)
+        ]
 
         if not all_rows:
             continue
@@ -2098,6 +2147,7 @@ if data_source == "Yahoo Finance":
 
             # 業界平均データを取得
             industry_data = get_industry_data(sector, industry)
+            fundamental_averages = load_fundamental_group_averages(industry, sector)
 
             # 追加データを取得
             sector_market_cap = None
@@ -2190,7 +2240,7 @@ if data_source == "Yahoo Finance":
                             {
                                 "指標": "ROE",
                                 "当社": f"{company_roe*100:.2f}%",
-                                "業界平均": "N/A",
+                                "業界平均": format_group_average_pct(fundamental_averages, "returnOnEquity"),
                                 "セクター平均": "N/A",
                                 "日経平均": "9.5% (参考)",
                                 "判定": "優良" if company_roe > 0.10 else "標準" if company_roe > 0.05 else "低い",
@@ -2205,7 +2255,7 @@ if data_source == "Yahoo Finance":
                             {
                                 "指標": "ROA",
                                 "当社": f"{company_roa*100:.2f}%",
-                                "業界平均": "N/A",
+                                "業界平均": format_group_average_pct(fundamental_averages, "returnOnAssets"),
                                 "セクター平均": "N/A",
                                 "日経平均": "5.0% (参考)",
                                 "判定": "優良" if company_roa > 0.05 else "標準" if company_roa > 0.02 else "低い",
@@ -2241,7 +2291,7 @@ if data_source == "Yahoo Finance":
                             {
                                 "指標": "営業利益率",
                                 "当社": f"{operating_margin*100:.2f}%",
-                                "業界平均": "N/A",
+                                "業界平均": format_group_average_pct(fundamental_averages, "operatingMargins"),
                                 "セクター平均": "N/A",
                                 "日経平均": "8.0% (参考)",
                                 "判定": "優良"
@@ -3050,20 +3100,27 @@ elif st.session_state.run_compare:
                     st.warning(f"⚠️ {code}: データ取得に失敗しました")
 
             if len(comparison_data) >= 2:
+                # 共通の時刻軸にそろえる(全銘柄がそろう最初の足を基準にする)
+                panel = build_panel({code: _comparison_frame(df) for code, df in comparison_data.items()})
+                base = panel.first_common_index()
+                if base < 0:
+                    base = 0
+
                 # 比較チャート作成
                 fig = go.Figure()
 
-                for code, df in comparison_data.items():
-                    if normalize:
-                        # 正規化（開始時点を100とする）
-                        normalized = (df["close"] / df["close"].iloc[0]) * 100
-                        y_data = normalized
-                        y_label = "正規化価格（開始=100）"
-                    else:
-                        y_data = df["close"]
-                        y_label = "価格"
+                if normalize:
+                    # 正規化（全銘柄がそろう最初の足を100とする）
+                    values = panel.normalized(base=base)
+                    y_label = "正規化価格（開始=100）"
+                else:
+                    values = panel.close
+                    y_label = "価格"
 
-                    fig.add_trace(go.Scatter(x=df["time"], y=y_data, name=code, mode="lines", line=dict(width=2)))
+                for row, code in enumerate(panel.codes):
+                    fig.add_trace(
+                        go.Scatter(x=panel.time, y=values[row], name=code, mode="lines", line=dict(width=2))
+                    )
 
                 fig.update_layout(
                     title="銘柄比較チャート",
@@ -3082,9 +3139,9 @@ elif st.session_state.run_compare:
                 st.subheader("📈 パフォーマンス比較")
 
                 perf_data = []
-                for code, df in comparison_data.items():
-                    start_price = df["close"].iloc[0]
-                    end_price = df["close"].iloc[-1]
+                for row, code in enumerate(panel.codes):
+                    start_price = panel.close[row, base]
+                    end_price = panel.close[row, -1]
                     change = end_price - start_price
                     change_pct = (change / start_price) * 100
 
@@ -3101,6 +3158,36 @@ elif st.session_state.run_compare:
                 perf_df = pd.DataFrame(perf_data)
                 st.dataframe(perf_df, width="stretch", hide_index=True)
 
+                # 相関行列（全銘柄の足がそろう時刻の変化率）
+                st.subheader("🔗 相関行列")
+                corr_df = pd.DataFrame(panel.correlation(), index=panel.codes, columns=panel.codes)
+                st.dataframe(corr_df.round(2), width="stretch")
+
+                # 財務指標(fundamentals 表を比較銘柄だけ SQL で引く)
+                st.subheader("📋 財務指標比較")
+                fundamentals_df = load_fundamental_comparison(tuple(panel.codes))
+                if fundamentals_df is None:
+                    st.info("💡 import_financials_cache.py --build-fundamentals で財務指標の比較を表示できます")
+                elif fundamentals_df.empty:
+                    st.info("比較銘柄の財務データがキャッシュにありません")
+                else:
+                    st.dataframe(
+                        fundamentals_df.rename(
+                            columns={
+                                "symbol": "銘柄",
+                                "name": "社名",
+                                "industry": "業種",
+                                "trailingPE": "PER",
+                                "priceToBook": "PBR",
+                                "returnOnEquity": "ROE",
+                                "operatingMargins": "営業利益率",
+                                "dividendYield": "配当利回り",
+                            }
+                        ).drop(columns=["sector"]),
+                        width="stretch",
+                        hide_index=True,
+                    )
+
             else:
                 st.error("❌ データを取得できた銘柄が2つ未満です")
 
@@ -27,6 +27,23 @@ def make_candles(closes, start=None):
     return candles
 
 
+def make_frame(closes, start=None, times=None, volume=100):
+    """終値リストから CandleFrame を生成する (times 省略時は start から日足)。"""
+    from app.data.candle_frame import CandleFrame
+
+    if times is None:
+        start = start or datetime(2024, 1, 1)
+        times = [start + timedelta(days=i) for i in range(len(closes))]
+    return CandleFrame(
+        time=times,
+        open=closes,
+        high=[c + 1 for c in closes],
+        low=[c - 1 for c in closes],
+        close=closes,
+        volume=[volume] * len(closes),
+    )
+
+
 @pytest.fixture
 def uptrend_candles():
     """EMAクロスが発生するV字（下降→上昇）系列。"""
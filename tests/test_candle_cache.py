@@ -0,0 +1,82 @@
+"""ローソク足 mmap キャッシュのテスト。"""
+
+from datetime import datetime
+
+import numpy as np
+from conftest import make_frame
+from sqlalchemy import create_engine
+from sqlalchemy.pool import StaticPool
+
+from app.data.candle_cache import MmapCandleCache, cache_version
+from app.data.candle_store import UnifiedCandleStore
+from app.data.providers import MmapCacheProvider
+
+
+def _is_mmap_view(array) -> bool:
+    while array is not None:
+        if isinstance(array, np.memmap):
+            return True
+        array = array.base
+    return False
+
+
+def _store():
+    return UnifiedCandleStore(bind=create_engine("sqlite://", poolclass=StaticPool))
+
+
+def test_cache_is_mmapped_and_invalidated_by_source_changes(tmp_path):
+    store = _store()
+    store.upsert("7203", "1d", make_frame([1.0, 2.0, 3.0]))
+    cache = MmapCandleCache(store, root=tmp_path)
+
+    frame = cache.load("7203", "1d")
+    assert frame.close.tolist() == [1.0, 2.0, 3.0]
+    assert _is_mmap_view(frame.close)
+    assert not frame.close.flags.writeable
+    assert (cache.hits, cache.misses) == (0, 1)
+
+    cache.load("7203", "1d")
+    assert (cache.hits, cache.misses) == (1, 1)
+
+    # 新しい足が増えたら作り直し、古い版は消える
+    store.upsert("7203", "1d", make_frame([4.0], start=datetime(2024, 1, 4)))
+    assert cache.load("7203", "1d").close.tolist() == [1.0, 2.0, 3.0, 4.0]
+    assert cache.misses == 2
+    assert len(list(cache.series_dir("7203", "1d").iterdir())) == 1
+
+    assert not cache.load("6758", "1d")
+
+
+def test_stale_cleanup_keeps_newer_versions(tmp_path):
+    store = _store()
+    store.upsert("7203", "1d", make_frame([1.0, 2.0, 3.0]))
+    cache = MmapCandleCache(store, root=tmp_path)
+    series = cache.series_dir("7203", "1d")
+    # 他のプロセスが先に作った新しい版と古い版
+    newer = series / cache_version(4, datetime(2024, 1, 4))
+    older = series / cache_version(2, datetime(2024, 1, 2))
+    newer.mkdir(parents=True)
+    older.mkdir()
+
+    cache.load("7203", "1d")
+
+    assert newer.exists()
+    assert not older.exists()
+
+
+def test_load_since_returns_a_view(tmp_path):
+    store = _store()
+    store.upsert("7203", "1d", make_frame([1.0, 2.0, 3.0, 4.0]))
+    cache = MmapCandleCache(store, root=tmp_path)
+
+    frame = cache.load_since("7203", "1d", datetime(2024, 1, 3))
+    assert frame.close.tolist() == [3.0, 4.0]
+    assert _is_mmap_view(frame.close)
+
+
+def test_mmap_provider_slices_period(tmp_path):
+    store = _store()
+    store.upsert("7203", "1d", make_frame([1.0, 2.0, 3.0, 4.0]))
+    provider = MmapCacheProvider(store=store, cache_dir=tmp_path, now=lambda: datetime(2024, 1, 5))
+
+    assert provider.fetch_frame("7203", period_days=2).close.tolist() == [3.0, 4.0]
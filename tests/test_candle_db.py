@@ -0,0 +1,112 @@
+"""ローソク足テーブル一括書き込みのテスト（インメモリSQLite）。"""
+
+from datetime import datetime
+
+import numpy as np
+import pytest
+from conftest import make_frame
+from sqlalchemy import create_engine
+from sqlalchemy.pool import StaticPool
+
+from app.data.candle_db import (
+    candle_table_name,
+    format_db_times,
+    latest_candle_time,
+    load_candle_frame,
+    load_candle_table_arrays,
+    upsert_candle_frame,
+)
+from app.data.candle_frame import CandleFrame
+
+TABLE = "CANDLE_7203_1D"
+
+
+@pytest.fixture
+def bind():
+    eng = create_engine("sqlite://", poolclass=StaticPool)
+    with eng.begin() as conn:
+        conn.exec_driver_sql(
+            f'CREATE TABLE "{TABLE}" (time DATETIME NOT NULL, open FLOAT, close FLOAT, '
+            "high FLOAT, low FLOAT, volume INTEGER, PRIMARY KEY (time))"
+        )
+    return eng
+
+
+def test_candle_table_name_matches_model_naming():
+    assert candle_table_name("7203", "1d") == "CANDLE_7203_1D"
+    assert candle_table_name("^N225", "1h") == "CANDLE_IDX_N225_1H"
+
+
+def test_format_db_times_uses_sqlalchemy_datetime_format():
+    times = make_frame([100.0]).time
+    assert format_db_times(times) == ["2024-01-01 00:00:00.000000"]
+
+
+def test_upsert_counts_inserted_updated_and_skipped(bind):
+    first = upsert_candle_frame(TABLE, make_frame([100.0, 101.0, 102.0]), bind=bind)
+    assert first == {"inserted": 3, "updated": 0, "skipped": 0}
+
+    # 1/2 を変更, 1/3 は同値, 1/4 は新規
+    second = upsert_candle_frame(TABLE, make_frame([105.0, 102.0, 103.0], start=datetime(2024, 1, 2)), bind=bind)
+    assert second == {"inserted": 1, "updated": 1, "skipped": 1}
+
+    with bind.connect() as conn:
+        rows = conn.exec_driver_sql(f'SELECT time, close FROM "{TABLE}" ORDER BY time').fetchall()
+    assert [r[1] for r in rows] == [100.0, 105.0, 102.0, 103.0]
+
+
+def test_upsert_ignore_keeps_existing_rows(bind):
+    upsert_candle_frame(TABLE, make_frame([100.0, 101.0]), bind=bind)
+    stats = upsert_candle_frame(TABLE, make_frame([200.0, 201.0, 202.0]), on_conflict="ignore", bind=bind)
+    assert stats == {"inserted": 1, "updated": 0, "skipped": 2}
+
+    with bind.connect() as conn:
+        closes = [r[0] for r in conn.exec_driver_sql(f'SELECT close FROM "{TABLE}" ORDER BY time')]
+    assert closes == [100.0, 101.0, 202.0]
+
+
+def test_upsert_rejects_unknown_mode(bind):
+    with pytest.raises(ValueError):
+        upsert_candle_frame(TABLE, make_frame([100.0]), on_conflict="replace", bind=bind)
+
+
+def test_latest_candle_time_reads_max_time(bind):
+    assert latest_candle_time("CANDLE_MISSING_1D", bind=bind) is None
+    assert latest_candle_time(TABLE, bind=bind) is None
+
+    upsert_candle_frame(TABLE, make_frame([100.0, 101.0, 102.0]), bind=bind)
+    assert latest_candle_time(TABLE, bind=bind) == datetime(2024, 1, 3)
+
+
+def test_load_candle_frame_filters_by_range_and_limit(bind):
+    upsert_candle_frame(TABLE, make_frame([100.0, 101.0, 102.0, 103.0]), bind=bind)
+
+    frame = load_candle_frame(TABLE, start=datetime(2024, 1, 2), bind=bind)
+    assert frame.close.tolist() == [101.0, 102.0, 103.0]
+    assert frame.time[0] == np.datetime64("2024-01-02")
+
+    latest = load_candle_frame(TABLE, end=datetime(2024, 1, 3), limit=2, bind=bind)
+    assert latest.close.tolist() == [101.0, 102.0]
+    assert len(load_candle_frame("CANDLE_MISSING_1D", bind=bind)) == 0
+
+
+def test_load_candle_table_arrays_fills_typed_arrays(bind):
+    frame = CandleFrame(
+        time=[datetime(2024, 1, 4, 9, 0, 5, 250000), datetime(2024, 1, 4, 9, 0, 10)],
+        open=[1.0, 2.0],
+        high=[1.5, 2.5],
+        low=[0.5, 1.5],
+        close=[1.2, float("nan")],
+        volume=[10, 20],
+    )
+    upsert_candle_frame(TABLE, frame, bind=bind)
+
+    arrays = load_candle_table_arrays(TABLE, bind=bind)
+    assert arrays["time"].dtype == np.dtype("datetime64[ns]")
+    assert arrays["time"].tolist() == frame.time.tolist()
+    assert arrays["volume"].dtype == np.int64
+    assert np.isnan(arrays["close"][1])
+    assert all(a.flags.c_contiguous for a in arrays.values())
+
+    empty = load_candle_table_arrays("CANDLE_MISSING_1D", bind=bind)
+    assert {k: len(v) for k, v in empty.items()} == dict.fromkeys(arrays, 0)
@@ -0,0 +1,90 @@
+"""ローソク足の保存レイアウト (tables / unified) と移行のテスト（インメモリSQLite）。"""
+
+from datetime import datetime
+
+import pytest
+from conftest import make_frame
+from sqlalchemy import create_engine
+from sqlalchemy.pool import StaticPool
+
+from app.data.candle_store import (
+    TableCandleStore,
+    UnifiedCandleStore,
+    get_candle_store,
+    load_candle_arrays,
+    migrate_tables_to_unified,
+)
+
+
+@pytest.fixture
+def bind():
+    return create_engine("sqlite://", poolclass=StaticPool)
+
+
+def _create_table(bind, name, closes):
+    with bind.begin() as conn:
+        conn.exec_driver_sql(
+            f'CREATE TABLE "{name}" (time DATETIME NOT NULL, open FLOAT, close FLOAT, '
+            "high FLOAT, low FLOAT, volume INTEGER, PRIMARY KEY (time))"
+        )
+        for i, c in enumerate(closes):
+            conn.exec_driver_sql(
+                f'INSERT INTO "{name}" VALUES (?, ?, ?, ?, ?, ?)',
+                (f"2024-01-{i + 1:02d} 00:00:00.000000", c, c, c + 1, c - 1, 100),
+            )
+
+
+def test_unified_store_keeps_series_apart(bind):
+    store = UnifiedCandleStore(bind=bind)
+
+    assert store.upsert("7203", "1d", make_frame([1.0, 2.0, 3.0]))["inserted"] == 3
+    assert store.upsert("6758", "1d", make_frame([10.0, 20.0]))["inserted"] == 2
+    assert store.upsert("7203", "1h", make_frame([5.0]))["inserted"] == 1
+
+    stats = store.upsert("7203", "1d", make_frame([3.0, 4.0], start=datetime(2024, 1, 3)))
+    assert (stats["inserted"], stats["updated"], stats["skipped"]) == (1, 0, 1)
+
+    assert store.latest_time("7203", "1d") == datetime(2024, 1, 4)
+    assert store.latest_time("9999", "1d") is None
+    assert store.load("6758", "1d").close.tolist() == [10.0, 20.0]
+    assert store.load("7203", "1d", start=datetime(2024, 1, 2), limit=2).close.tolist() == [3.0, 4.0]
+    assert store.list_codes("1d") == ["6758", "7203"]
+    assert store.list_codes("1h") == ["7203"]
+
+    arrays = load_candle_arrays("7203", "1d", end=datetime(2024, 1, 3), limit=2, store=store)
+    assert arrays["close"].tolist() == [2.0, 3.0]
+
+
+def test_table_store_lists_codes_from_table_names(bind):
+    _create_table(bind, "CANDLE_7203_1D", [1.0])
+    _create_table(bind, "CANDLE_IDX_N225_1D", [1.0])
+    _create_table(bind, "CANDLE_7203_1H", [1.0])
+
+    store = TableCandleStore(bind=bind)
+    assert store.list_codes("1d") == ["7203", "^N225"]
+    assert store.load("7203", "1d").close.tolist() == [1.0]
+
+
+def test_get_candle_store_rejects_unknown_layout():
+    assert isinstance(get_candle_store("unified"), UnifiedCandleStore)
+    with pytest.raises(ValueError):
+        get_candle_store("columnar-typo")
+
+
+def test_migrate_tables_to_unified_is_rerunnable(bind):
+    _create_table(bind, "CANDLE_7203_1D", [1.0, 2.0])
+    _create_table(bind, "CANDLE_6758_1D", [5.0])
+    _create_table(bind, "CANDLE_6758_1H", [7.0])
+
+    stats = migrate_tables_to_unified(bind=bind, durations=["1d"])
+    assert stats == {"tables": 2, "rows": 3}
+    assert migrate_tables_to_unified(bind=bind, durations=["1d"])["tables"] == 2
+
+    store = UnifiedCandleStore(bind=bind)
+    assert store.list_codes("1d") == ["6758", "7203"]
+    assert store.list_codes("1h") == []
+    assert store.load("7203", "1d").close.tolist() == [1.0, 2.0]
+
+    migrate_tables_to_unified(bind=bind, drop_source=True)
+    assert store.list_codes("1h") == ["6758"]
+    assert TableCandleStore(bind=bind).list_codes("1d") == []
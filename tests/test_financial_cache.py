@@ -0,0 +1,129 @@
+"""財務諸表キャッシュと並列取得CLIのテスト（fetch_fn 注入でネットワーク非依存）。"""
+
+import sqlite3
+
+import pandas as pd
+
+from app.data import financial_cache as fc
+from app.data.rate_limit import TokenBucket
+from app.data.resume_journal import ResumeJournal
+from scripts import import_financials_cache as cli
+
+
+def _row(symbol, updated_at="2026-01-01T00:00:00+00:00", compress=False):
+    return (
+        symbol,
+        updated_at,
+        fc.encode_payload('{"longName": "x"}', compress),
+        fc.encode_payload('{"columns": [], "index": [], "data": []}', compress),
+        "",
+        "",
+    )
+
+
+def test_payload_roundtrip_plain_and_compressed():
+    text = '{"a": 1, "name": "トヨタ"}' * 50
+    packed = fc.encode_payload(text, compress=True)
+    assert isinstance(packed, bytes)
+    assert len(packed) < len(text.encode("utf-8"))
+    assert fc.decode_payload(packed) == text
+    assert fc.decode_payload(fc.encode_payload(text)) == text
+    assert fc.encode_payload("", compress=True) == ""
+
+
+def test_writer_batches_commits_and_reports_symbols(tmp_path):
+    db_path = tmp_path / "cache.sql"
+    fc.ensure_financial_cache_table(db_path)
+    committed = []
+
+    with fc.FinancialCacheWriter(db_path, batch_size=2, flush_interval=60, on_commit=committed.append) as writer:
+        for symbol in ["1301.T", "1332.T", "7203.T"]:
+            writer.put(_row(symbol, compress=True))
+
+    assert writer.written == 3
+    assert writer.commits == 2
+    assert committed == [["1301.T", "1332.T"], ["7203.T"]]
+    loaded = fc.load_financial_cache_row(db_path, "7203.T")
+    assert loaded["info_json"] == '{"longName": "x"}'
+
+
+def test_stale_symbols_uses_updated_at(tmp_path):
+    db_path = tmp_path / "cache.sql"
+    fc.ensure_financial_cache_table(db_path)
+    now = pd.Timestamp("2026-03-01", tz="UTC")
+    with sqlite3.connect(db_path) as con:
+        fc.upsert_financial_rows(
+            con,
+            [
+                _row("1301.T", (now - pd.Timedelta(days=1)).isoformat()),
+                _row("1332.T", (now - pd.Timedelta(days=40)).isoformat()),
+            ],
+        )
+        indexes = {name for (name,) in con.execute("SELECT name FROM sqlite_master WHERE type='index'")}
+
+    assert "idx_financial_cache_updated_at" in indexes
+    stale = fc.stale_symbols(db_path, ["7203.T", "1301.T", "1332.T"], max_age_days=30, now=now)
+    assert stale == ["7203.T", "1332.T"]
+
+
+def test_fetch_financial_row_takes_a_token_per_request():
+    class _Ticker:
+        info = {"longName": "x"}
+        financials = balance_sheet = cashflow = pd.DataFrame()
+
+    class _Limiter:
+        acquired = 0
+
+        def acquire(self, tokens=1.0):
+            self.acquired += tokens
+
+    limiter = _Limiter()
+    row = fc.fetch_financial_row("1301.T", ticker_factory=lambda symbol: _Ticker(), limiter=limiter)
+    assert row[0] == "1301.T"
+    assert limiter.acquired == fc.FINANCIAL_REQUESTS_PER_ROW
+
+
+def test_bulk_fetch_writes_rows_and_journals_commits(tmp_path):
+    db_path = tmp_path / "cache.sql"
+    resume = tmp_path / "resume.jsonl"
+
+    def fetch(symbol):
+        if symbol == "9999.T":
+            raise ValueError("bad symbol")
+        return _row(symbol, fc.utc_now_iso())
+
+    cli._run_bulk_fetch(
+        symbols=["1301.T", "1332.T", "9999.T"],
+        db_path=db_path,
+        sleep_sec=0.0,
+        resume_path=resume,
+        max_symbols=0,
+        workers=3,
+        max_retries=0,
+        commit_every=1,
+        fetch_fn=fetch,
+        limiter=TokenBucket(rate=0),
+    )
+
+    journal = ResumeJournal(resume)
+    assert journal.done == {"1301.T", "1332.T"}
+    assert journal.failed == {"9999.T"}
+
+    # 鮮度指定時は updated_at が新しい銘柄を取得しない
+    calls = []
+
+    def fetch_again(symbol):
+        calls.append(symbol)
+        return _row(symbol, fc.utc_now_iso())
+
+    cli._run_bulk_fetch(
+        symbols=["1301.T", "1332.T", "9999.T"],
+        db_path=db_path,
+        sleep_sec=0.0,
+        resume_path=resume,
+        max_symbols=0,
+        max_age_days=7,
+        fetch_fn=fetch_again,
+        limiter=TokenBucket(rate=0),
+    )
+    assert calls == ["9999.T"]
@@ -0,0 +1,88 @@
+"""ファンダメンタルズ表の展開・差分更新のテスト。"""
+
+import json
+import sqlite3
+
+import pandas as pd
+
+from app.data import financial_cache as fc
+from app.data import fundamentals as fd
+
+
+def _statement_json() -> str:
+    df = pd.DataFrame(
+        {pd.Timestamp("2025-03-31"): [1000.0, 80.0], pd.Timestamp("2024-03-31"): [900.0, None]},
+        index=["Total Revenue", "Net Income"],
+    )
+    return fc.df_to_json(df)
+
+
+def _cache_row(symbol, industry, roe, updated_at="2026-01-01T00:00:00+00:00", compress=False):
+    info = {"longName": symbol, "sector": "Consumer Cyclical", "industry": industry, "returnOnEquity": roe, "x": "n/a"}
+    return (
+        symbol,
+        updated_at,
+        fc.encode_payload(json.dumps(info), compress),
+        fc.encode_payload(_statement_json(), compress),
+        "",
+        "",
+    )
+
+
+def _seed(db_path, rows):
+    fc.ensure_financial_cache_table(db_path)
+    with sqlite3.connect(db_path) as con:
+        fc.upsert_financial_rows(con, rows)
+
+
+def test_extract_statement_rows_flattens_split_json():
+    rows = fd.extract_statement_rows("7203.T", "financials", _statement_json())
+
+    assert ("7203.T", "2025-03-31", "financials", "Total Revenue", 1000.0) in rows
+    assert ("7203.T", "2024-03-31", "financials", "Net Income", 80.0) not in rows
+    assert len(rows) == 3
+
+
+def test_extract_cache_row_tolerates_broken_info_json():
+    row = {"symbol": "7203.T", "info_json": "{not json", "financials_json": _statement_json()}
+
+    rows, profile = fd.extract_cache_row(row)
+
+    assert ("7203.T", "2025-03-31", "financials", "Total Revenue", 1000.0) in rows
+    assert profile == ("7203.T", "", "", "", "")
+
+
+def test_sync_fundamentals_is_incremental(tmp_path):
+    db_path = tmp_path / "cache.sql"
+    _seed(
+        db_path,
+        [
+            _cache_row("7203.T", "Auto Manufacturers", 0.12, compress=True),
+            _cache_row("7267.T", "Auto Manufacturers", 0.08),
+        ],
+    )
+
+    first = fd.sync_fundamentals(db_path)
+    assert first["rebuilt"] == 2
+    assert fd.sync_fundamentals(db_path)["rebuilt"] == 0
+
+    # 1銘柄だけ更新 -> その銘柄だけ作り直す
+    _seed(db_path, [_cache_row("7267.T", "Auto Manufacturers", 0.10, updated_at="2026-02-01T00:00:00+00:00")])
+    second = fd.sync_fundamentals(db_path)
+    assert second["rebuilt"] == 1
+
+    averages = fd.group_averages(db_path, ["returnOnEquity"], industry="Auto Manufacturers")
+    assert averages["returnOnEquity"][1] == 2
+    assert abs(averages["returnOnEquity"][0] - 0.11) < 1e-9
+
+    snapshot = fd.latest_snapshot(db_path, ["returnOnEquity"])
+    assert snapshot["symbol"].tolist() == ["7203.T", "7267.T"]
+    assert snapshot["industry"].tolist() == ["Auto Manufacturers"] * 2
+    assert fd.latest_snapshot(db_path, ["returnOnEquity"], symbols=["7267.T"])["symbol"].tolist() == ["7267.T"]
+    assert fd.latest_snapshot(db_path, ["returnOnEquity"], symbols=[]).empty
+
+    # キャッシュから消えた銘柄は削除される
+    with sqlite3.connect(db_path) as con:
+        con.execute("DELETE FROM financial_cache WHERE symbol = '7203.T'")
+    assert fd.sync_fundamentals(db_path)["removed"] == 1
+    assert fd.latest_snapshot(db_path, ["returnOnEquity"])["symbol"].tolist() == ["7267.T"]
@@ -0,0 +1,129 @@
+"""ctx.ta 呼び出しのループ外への移動 (HoistedTA) のテスト。"""
+
+import numpy as np
+
+from app.strategy.hoisting import HoistedTA, bind_strategy, run_bars, with_hoisting
+
+
+class _TA:
+    def __init__(self, ctx):
+        self._ctx = ctx
+        self.calls = []
+
+    def ema(self, values, period):
+        self.calls.append(("ema", period))
+        return np.asarray(values, dtype=float) + period
+
+    def atr(self, period):
+        self.calls.append(("atr", period))
+        return self._ctx.high - self._ctx.low
+
+    def crossover(self, a, b):
+        i = self._ctx.index
+        return i > 0 and a[i - 1] <= b[i - 1] and a[i] > b[i]
+
+
+class _Ctx:
+    def __init__(self, closes):
+        self.close = np.asarray(closes, dtype=float)
+        self.high = self.close + 1
+        self.low = self.close - 1
+        self.index = 0
+        self.ta = _TA(self)
+        self.entries = []
+
+
+def _ema_cross(ctx, params):
+    fast = ctx.ta.ema(ctx.close, params["fast"])
+    slow = ctx.ta.ema(ctx.close, params["slow"])
+    if ctx.ta.crossover(fast, slow):
+        ctx.entries.append(ctx.index)
+
+
+def test_indicators_are_computed_once_and_replayed():
+    ctx = _Ctx([100 - i for i in range(10)] + [90 + 3 * i for i in range(10)])
+    plain = _Ctx(ctx.close)
+    run_bars(plain, _ema_cross, {"fast": 1, "slow": 2}, hoist=False)
+
+    hoisted = run_bars(ctx, _ema_cross, {"fast": 1, "slow": 2})
+    assert ctx.entries == plain.entries
+    assert ctx.ta is hoisted and [name for name, _, _ in hoisted.plan] == ["ema", "ema"]
+    assert hoisted.stats() == {"hoisted_calls": 2, "hoisted": 38, "fallbacks": 0}
+    assert ctx.ta._ta.calls == [("ema", 1), ("ema", 2)]
+
+
+def test_calls_that_differ_from_the_plan_fall_back():
+    ctx = _Ctx(np.arange(6.0))
+    seen = []
+
+    def strategy(ctx):
+        atr = ctx.ta.atr(14)
+        if ctx.index == 0:
+            return
+        seen.append(ctx.ta.ema(ctx.close, 2 if ctx.index % 2 else 3)[ctx.index])
+
+    hoisted = run_bars(ctx, strategy)
+    # 最初の足は atr だけなので ema は計画外 → 元の ta で計算する
+    assert [name for name, _, _ in hoisted.plan] == ["atr"]
+    assert seen == [3.0, 5.0, 5.0, 7.0, 7.0]
+    assert hoisted.hoisted == 5 and hoisted.fallbacks == 5
+
+
+def test_scalar_arguments_must_match_type_and_value():
+    ctx = _Ctx(np.arange(3.0))
+    ta = HoistedTA(ctx)
+    ctx.index = 0
+    first = ta.ema(ctx.close, 5)
+    ctx.index = 1
+    assert ta.ema(ctx.close, 5) is first
+    assert ta.ema(ctx.close.copy(), 5) is not first
+    ctx.index = 2
+    assert ta.ema(ctx.close, 5.0) is not first
+
+
+def test_bind_strategy_accepts_one_or_two_arguments():
+    assert bind_strategy(lambda ctx: ctx * 2)(3) == 6
+    assert bind_strategy(lambda ctx, params: params["x"], {"x": 1})(None) == 1
+
+
+def test_mutated_list_arguments_are_not_replayed():
+    ctx = _Ctx(np.arange(3.0))
+    ta = HoistedTA(ctx)
+    values = [1.0, 2.0, 3.0]
+    ctx.index = 0
+    first = ta.ema(values, 5)
+    values[0] = 10.0
+    ctx.index = 1
+    assert ta.ema(values, 5) is not first
+    assert ta.fallbacks == 1
+
+
+def test_writable_buffers_are_not_replayed():
+    ctx = _Ctx(np.arange(3.0))
+    ta = HoistedTA(ctx)
+    buffer = np.zeros(3)
+    frozen = np.ones(3)
+    frozen.setflags(write=False)
+    ctx.index = 0
+    ta.ema(buffer, 5)
+    from_frozen = ta.ema(frozen, 5)
+    from_close = ta.ema(ctx.close, 5)
+    buffer[:] = 7.0  # 同じオブジェクトのままその場で更新する
+    ctx.index = 1
+    assert ta.ema(buffer, 5).tolist() == [12.0, 12.0, 12.0]
+    # 書き込み不可の配列と ctx の元系列は再利用する
+    assert ta.ema(frozen, 5) is from_frozen and ta.ema(ctx.close, 5) is from_close
+    assert ta.fallbacks == 1 and ta.hoisted == 2
+
+
+def test_with_hoisting_wraps_ta_on_first_call():
+    ctx = _Ctx([100 - i for i in range(10)] + [90 + 3 * i for i in range(10)])
+    plain = _Ctx(ctx.close)
+    run_bars(plain, _ema_cross, {"fast": 1, "slow": 2}, hoist=False)
+
+    step = with_hoisting(_ema_cross)
+    for i in range(len(ctx.close)):
+        ctx.index = i
+        step(ctx, {"fast": 1, "slow": 2})
+    assert isinstance(ctx.ta, HoistedTA) and ctx.ta.hoisted == 38
+    assert ctx.entries == plain.entries
@@ -0,0 +1,139 @@
+"""一括取り込みCLIのテスト（fetch_fn 注入でネットワーク非依存）。"""
+
+import threading
+
+from conftest import make_frame
+from sqlalchemy import create_engine
+from sqlalchemy.pool import StaticPool
+
+from app.data.candle_frame import CandleFrame
+from app.data.candle_store import UnifiedCandleStore
+from app.data.providers import BaseProvider
+from app.data.rate_limit import TokenBucket
+from app.data.resume_journal import ResumeJournal
+from scripts import import_yahoo_to_db as importer
+
+
+def _run(tmp_path, fetch_fn, codes, **kwargs):
+    resume = tmp_path / "resume.jsonl"
+    importer._run_bulk_import(
+        codes=codes,
+        days=30,
+        duration="1d",
+        market="T",
+        resume_path=resume,
+        max_symbols=kwargs.pop("max_symbols", 0),
+        fetch_fn=fetch_fn,
+        limiter=TokenBucket(rate=0),
+        retry_base_sec=0.0,
+        **kwargs,
+    )
+    journal = ResumeJournal(resume)
+    return {"done": sorted(journal.done), "failed": sorted(journal.failed)}
+
+
+def test_bulk_import_records_done_and_failed(tmp_path):
+    # 1332 は最新まで取り込み済み(新しい行なし)でも正常終了として done にする
+    saved = {"1301": 10, "1332": 0}
+
+    def fetch(code):
+        if code == "9999":
+            raise ValueError("bad code")
+        return saved[code]
+
+    state = _run(tmp_path, fetch, ["1301", "1332", "9999"], workers=3, max_retries=0)
+
+    assert state["done"] == ["1301", "1332"]
+    assert state["failed"] == ["9999"]
+
+
+def test_bulk_import_retries_transient_failures(tmp_path):
+    attempts = {}
+    lock = threading.Lock()
+
+    def fetch(code):
+        with lock:
+            attempts[code] = attempts.get(code, 0) + 1
+            n = attempts[code]
+        if n < 3:
+            raise ConnectionError("rate limited")
+        return 5
+
+    state = _run(tmp_path, fetch, ["1301", "1332"], workers=2, max_retries=3)
+
+    assert sorted(state["done"]) == ["1301", "1332"]
+    assert state["failed"] == []
+    assert attempts == {"1301": 3, "1332": 3}
+
+
+def test_bulk_import_resume_skips_done_and_clears_recovered_failures(tmp_path):
+    calls = []
+
+    def fetch(code):
+        calls.append(code)
+        return 1
+
+    with ResumeJournal(tmp_path / "resume.jsonl") as journal:
+        journal.mark_done("1301")
+        journal.mark_failed("1332")
+
+    state = _run(tmp_path, fetch, ["1301", "1332", "1333"], workers=2)
+
+    assert sorted(calls) == ["1332", "1333"]
+    assert sorted(state["done"]) == ["1301", "1332", "1333"]
+    assert state["failed"] == []
+
+
+def test_bulk_import_batch_mode_splits_chunks_and_reports_failures(tmp_path):
+    chunks = []
+    lock = threading.Lock()
+
+    def batch_fetch(chunk):
+        with lock:
+            chunks.append(list(chunk))
+        saved = {code: 3 for code in chunk if code not in ("1333", "1335")}
+        failures = {"1333": "no_data"} if "1333" in chunk else {}
+        if "1335" in chunk:
+            saved["1335"] = 0
+        return saved, failures
+
+    state = _run(
+        tmp_path,
+        None,
+        ["1301", "1332", "1333", "1334", "1335"],
+        workers=2,
+        batch_size=2,
+        batch_fetch_fn=batch_fetch,
+    )
+
+    assert sorted(len(c) for c in chunks) == [1, 2, 2]
+    assert sorted(state["done"]) == ["1301", "1332", "1334", "1335"]
+    assert state["failed"] == ["1333"]
+
+
+class _StoredProvider(BaseProvider):
+    """1301 は保存済みと同じ足、9998 は空(上場廃止・取得失敗)を返す"""
+
+    name = "stored"
+
+    def __init__(self, frame):
+        self.frame = frame
+
+    def fetch_frame(self, product_code, period_days=365, duration="1d", market="T"):
+        return self.frame if product_code == "1301" else CandleFrame.empty()
+
+
+def test_bulk_import_separates_empty_fetch_from_up_to_date(tmp_path):
+    store = UnifiedCandleStore(
+        bind=create_engine("sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool)
+    )
+    frame = make_frame([1.0, 2.0, 3.0])
+    store.upsert("1301", "1d", frame)
+
+    state = _run(
+        tmp_path, None, ["1301", "9998"], workers=1, max_retries=2, provider=_StoredProvider(frame), store=store
+    )
+
+    # 取得できて保存 0 件は done、取得結果が空は failed(次回再試行する)
+    assert state["done"] == ["1301"]
+    assert state["failed"] == ["9998"]
@@ -0,0 +1,156 @@
+"""実行をまたいで共有する指標キャッシュのテスト。"""
+
+import numpy as np
+import pytest
+from conftest import make_frame
+
+from app.strategy.indicator_cache import (
+    CachedTA,
+    IndicatorCache,
+    array_fingerprint,
+    context_series,
+    engine_indicator_cache,
+)
+from app.strategy.results import run_strategy
+
+
+class _CountingTA:
+    def __init__(self):
+        self.calls = []
+
+    def ema(self, values, period):
+        self.calls.append(("ema", period))
+        return np.asarray(values, dtype=float) * period
+
+    def bbands(self, values, period=20, nbdev=2.0):
+        self.calls.append(("bbands", period, nbdev))
+        values = np.asarray(values, dtype=float)
+        return values + nbdev, values, values - nbdev
+
+    def crossover(self, a, b):
+        self.calls.append(("crossover",))
+        return True
+
+
+class _Ctx:
+    def __init__(self, close):
+        self.close = close
+
+
+def test_lru_eviction_and_counters():
+    cache = IndicatorCache(max_bytes=8 * 20)
+    cache.put("a", np.zeros(10))
+    cache.put("b", np.zeros(10))
+    assert cache.get("a") is not None
+    cache.put("c", np.zeros(10))  # 最も使われていない b を捨てる
+    assert "b" not in cache and "a" in cache and "c" in cache
+    assert cache.get("b") is None
+    assert cache.stats()["hits"] == 1 and cache.stats()["misses"] == 1
+    assert cache.evictions == 1 and cache.current_bytes == 160
+
+    cache.put("huge", np.zeros(100))
+    assert "huge" not in cache and len(cache) == 2
+
+
+def test_cached_values_are_read_only():
+    cache = IndicatorCache()
+    value = cache.get_or_compute("k", lambda: np.arange(3.0))
+    with pytest.raises(ValueError):
+        value[0] = 1.0
+
+
+def test_cached_ta_shares_results_across_contexts():
+    close = np.arange(5.0)
+    cache = IndicatorCache()
+    ta = _CountingTA()
+    key = array_fingerprint(close)
+
+    first = CachedTA(ta, cache, key, context_series(_Ctx(close)))
+    expected = first.ema(close, 3)
+    # 別の試行: 新しいコンテキスト(別オブジェクトで同じ内容の close)でも再計算しない
+    other_close = close.copy()
+    second = CachedTA(ta, cache, key, context_series(_Ctx(other_close)))
+    shared = second.ema(other_close, 3.0)
+    assert shared.tolist() == expected.tolist() and shared is not expected
+    assert second.ema(other_close, 3) is shared  # 同じ試行の中では同じ複製
+    second.ema(other_close, period=3)  # キーワード指定は別キー
+    assert [c for c in ta.calls if c[0] == "ema"] == [("ema", 3), ("ema", 3)]
+
+    upper, _, _ = second.bbands(other_close, 20, 2.0)
+    assert second.bbands(other_close, 20, 2.0)[0] is upper
+    assert ta.calls.count(("bbands", 20, 2.0)) == 1
+
+    # 許可リストに無い関数(足の位置に依存する crossover など)はキャッシュしない
+    second.crossover(close, close)
+    second.crossover(close, close)
+    assert ta.calls.count(("crossover",)) == 2
+
+
+def test_strategies_can_write_into_cached_results():
+    close = np.arange(5.0)
+    cache = IndicatorCache()
+    ta = _CountingTA()
+    key = array_fingerprint(close)
+
+    first = CachedTA(ta, cache, key, context_series(_Ctx(close)))
+    first.ema(close, 3)[0] = -1.0
+    # 書き込みは試行の中だけに残り、別の試行にはキャッシュの元の値が渡る
+    assert first.ema(close, 3)[0] == -1.0
+    second = CachedTA(ta, cache, key, context_series(_Ctx(close)))
+    assert second.ema(close, 3).tolist() == (close * 3).tolist()
+    assert ta.calls == [("ema", 3)]
+
+
+def test_different_data_does_not_share_results():
+    cache = IndicatorCache()
+    ta = _CountingTA()
+    a, b = np.arange(5.0), np.arange(5.0) + 1
+    CachedTA(ta, cache, array_fingerprint(a), context_series(_Ctx(a))).ema(a, 3)
+    result = CachedTA(ta, cache, array_fingerprint(b), context_series(_Ctx(b))).ema(b, 3)
+    assert result.tolist() == (b * 3).tolist()
+    assert len(ta.calls) == 2
+
+
+def test_engine_cache_is_created_once():
+    class _Engine:
+        pass
+
+    engine = _Engine()
+    cache = engine_indicator_cache(engine, max_bytes=1024)
+    assert engine_indicator_cache(engine) is cache and cache.max_bytes == 1024
+
+
+class _ScalarEngine:
+    """engine.run のように ctx を作って strategy を足ごとに呼ぶ"""
+
+    product_code = "TEST"
+
+    def __init__(self, closes):
+        self.candles = make_frame(closes).candles
+        self.ta = _CountingTA()
+
+    def run(self, strategy_fn, params=None):
+        ctx = _Ctx(np.array([c.close for c in self.candles]))
+        ctx.ta = self.ta
+        for i in range(len(self.candles)):
+            ctx.index = i
+            strategy_fn(ctx, params)
+        return {"metrics": {}, "total_trades": 0}
+
+
+def test_scalar_strategies_share_the_engine_cache():
+    engine = _ScalarEngine([1.0, 2.0, 3.0])
+
+    def strategy(ctx, params):
+        ctx.ta.ema(ctx.close, params["fast"])
+
+    run_strategy(engine, strategy, {"fast": 5}, result_level="metrics", hoist=False)
+    run_strategy(engine, strategy, {"fast": 5}, result_level="metrics", hoist=False)
+    # ctx は試行ごとに作り直されるが、2回目の試行は engine のキャッシュから返す
+    # (キャッシュを引くのは各試行で最初の呼び出しだけ、以降の足は試行内の複製を返す)
+    assert engine.ta.calls == [("ema", 5)]
+    assert engine.indicator_cache.hits == 1
+
+    run_strategy(engine, strategy, {"fast": 5}, result_level="metrics")
+    assert engine.ta.calls == [("ema", 5)]
+    assert engine.indicator_cache.hits == 2
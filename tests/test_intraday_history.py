@@ -0,0 +1,129 @@
+"""日中足の区間分割取得と取得済み区間 (coverage) のテスト。"""
+
+from datetime import datetime, timedelta
+
+import numpy as np
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.pool import StaticPool
+
+from app.data.candle_frame import CandleFrame
+from app.data.candle_store import UnifiedCandleStore
+from app.data.intraday_history import (
+    add_coverage,
+    ensure_coverage_table,
+    has_trading_days,
+    load_coverage,
+    merge_intervals,
+    missing_windows,
+    stitch_intraday_history,
+)
+
+
+@pytest.fixture
+def bind():
+    return create_engine("sqlite://", poolclass=StaticPool)
+
+
+class FakeYahoo:
+    """区間の各営業日 9:00 から 3本の1分足を返す"""
+
+    def __init__(self):
+        self.calls = []
+
+    def __call__(self, code, start, end, duration, market):
+        self.calls.append((start, end))
+        days = np.arange(np.datetime64(start, "D"), np.datetime64(end, "D"))
+        days = days[np.is_busday(days)]
+        times = (days[:, None] + np.timedelta64(9, "h") + np.arange(3).astype("timedelta64[m]")).ravel()
+        n = len(times)
+        return CandleFrame(
+            time=times, open=np.ones(n), high=np.ones(n), low=np.ones(n), close=np.ones(n), volume=np.ones(n)
+        )
+
+
+def test_missing_windows_splits_gaps_by_window():
+    d = datetime(2024, 1, 1)
+    covered = [(d + timedelta(days=10), d + timedelta(days=12))]
+    windows = missing_windows(covered, d, d + timedelta(days=20), window_days=7)
+    assert [(s.day, e.day) for s, e in windows] == [(1, 8), (8, 11), (13, 20), (20, 21)]
+    assert merge_intervals([(d, d + timedelta(1)), (d + timedelta(1), d + timedelta(2))]) == [(d, d + timedelta(2))]
+
+
+def test_coverage_is_merged_and_persisted(bind):
+    ensure_coverage_table(bind)
+    d = datetime(2024, 1, 1)
+    add_coverage("7203", "1m", d, d + timedelta(days=2), bind=bind)
+    add_coverage("7203", "1m", d + timedelta(days=5), d + timedelta(days=6), bind=bind)
+    merged = add_coverage("7203", "1m", d + timedelta(days=1), d + timedelta(days=5), bind=bind)
+    assert merged == [(d, d + timedelta(days=6))]
+    assert load_coverage("7203", "1m", bind=bind) == merged
+    assert load_coverage("7203", "1h", bind=bind) == []
+
+
+def test_daily_runs_fetch_only_missing_windows(bind):
+    store = UnifiedCandleStore(bind=bind)
+    fake = FakeYahoo()
+
+    first = stitch_intraday_history(
+        "7203", "1m", store=store, bind=bind, fetch_window=fake, now=datetime(2024, 3, 1, 10)
+    )
+    # 過去29日 + 当日を7日以内の区間で取得
+    assert first["windows"] == 5
+    assert all(e - s <= timedelta(days=7) for s, e in fake.calls)
+    rows = len(store.load("7203", "1m"))
+
+    # 翌日は前日の当日分(未記録)から取り直すだけ。重複は upsert で吸収される
+    fake.calls.clear()
+    second = stitch_intraday_history(
+        "7203", "1m", store=store, bind=bind, fetch_window=fake, now=datetime(2024, 3, 4, 10)
+    )
+    assert fake.calls == [(datetime(2024, 3, 1), datetime(2024, 3, 5))]
+    assert second["saved"] == 3
+    assert len(store.load("7203", "1m")) == rows + 3
+    assert load_coverage("7203", "1m", bind=bind)[-1][1] == datetime(2024, 3, 4)
+
+
+def test_long_pause_reports_unrecoverable_gap(bind):
+    store = UnifiedCandleStore(bind=bind)
+    fake = FakeYahoo()
+    stitch_intraday_history("7203", "1m", store=store, bind=bind, fetch_window=fake, now=datetime(2024, 1, 31))
+    stats = stitch_intraday_history("7203", "1m", store=store, bind=bind, fetch_window=fake, now=datetime(2024, 4, 1))
+    assert stats["gap_days"] > 0
+
+    with pytest.raises(ValueError):
+        stitch_intraday_history("7203", "1d", store=store, bind=bind, fetch_window=fake)
+
+
+class _Limiter:
+    def __init__(self):
+        self.tokens = 0
+
+    def acquire(self, tokens=1.0):
+        self.tokens += tokens
+
+
+def test_empty_windows_are_recorded_only_without_trading_days(bind):
+    store = UnifiedCandleStore(bind=bind)
+    failed = []
+
+    def fetch_nothing(code, start, end, duration, market):
+        failed.append((start, end))
+        return CandleFrame.empty()
+
+    limiter = _Limiter()
+    stats = stitch_intraday_history(
+        "7203", "1m", store=store, bind=bind, fetch_window=fetch_nothing, now=datetime(2024, 3, 1, 10), limiter=limiter
+    )
+    # 取得に失敗した空の区間は記録せず、次回も同じ区間を取り直す
+    assert load_coverage("7203", "1m", bind=bind) == []
+    assert limiter.tokens == stats["windows"] == len(failed)
+
+    # 金曜まで取得済みなら、月曜の実行で取得した土日の区間は空でも記録する
+    add_coverage("7203", "1m", datetime(2024, 2, 1), datetime(2024, 3, 2), bind=bind)
+    stitch_intraday_history(
+        "7203", "1m", store=store, bind=bind, fetch_window=fetch_nothing, now=datetime(2024, 3, 4, 10)
+    )
+    assert load_coverage("7203", "1m", bind=bind) == [(datetime(2024, 2, 1), datetime(2024, 3, 4))]
+    assert not has_trading_days(datetime(2024, 3, 2), datetime(2024, 3, 4))
+    assert has_trading_days(datetime(2024, 3, 2), datetime(2024, 3, 5))
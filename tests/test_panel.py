@@ -0,0 +1,101 @@
+"""銘柄 × 時刻パネルのテスト。"""
+
+import numpy as np
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.pool import StaticPool
+
+from app.data.candle_frame import CandleFrame
+from app.data.candle_store import UnifiedCandleStore
+from app.data.panel import PanelCache, build_panel
+from app.data.trading_calendar import TradingCalendar
+
+
+def _frame(times, closes):
+    closes = np.asarray(closes, dtype=float)
+    return CandleFrame(
+        time=np.array(times, dtype="datetime64[ns]"),
+        open=closes - 0.5,
+        high=closes + 1,
+        low=closes - 1,
+        close=closes,
+        volume=np.full(len(closes), 100),
+    )
+
+
+def _frames():
+    return {
+        "1001": _frame(["2024-01-04", "2024-01-05", "2024-01-09", "2024-01-10"], [100, 101, 102, 104]),
+        "1002": _frame(["2024-01-05", "2024-01-10"], [50, 55]),
+    }
+
+
+def test_union_index_with_forward_fill():
+    panel = build_panel(_frames())
+    assert panel.shape == (2, 4)
+    assert panel.time[0] == np.datetime64("2024-01-04")
+
+    close = panel.row("1002")
+    assert np.isnan(close[0])
+    assert close[1:].tolist() == [50, 50, 55]
+    assert panel.row("1002", "open")[2] == 50  # 埋めた足は直前の終値
+    assert panel.row("1002", "volume")[1:].tolist() == [100, 0, 100]
+    assert panel.present[1].tolist() == [False, True, False, True]
+    assert panel.positions["1002"].tolist() == [1, 3]
+
+
+def test_nan_policy_keeps_gaps():
+    panel = build_panel(_frames(), fill="nan")
+    assert np.isnan(panel.row("1002")[2])
+    with pytest.raises(ValueError):
+        build_panel(_frames(), fill="zero")
+
+
+def test_cross_sectional_helpers():
+    panel = build_panel(_frames())
+    assert panel.first_common_index() == 1
+    assert panel.normalized()[:, 1].tolist() == [100, 100]
+    assert panel.ranks(ascending=False)[:, 3].tolist() == [1, 2]
+    assert np.isnan(panel.ranks()[1, 0])
+
+    rs = panel.relative_strength(benchmark="1002")
+    assert rs[1, 1:].tolist() == [1, 1, 1]
+    assert rs[0, 3] == pytest.approx((104 / 101) / (55 / 50))
+
+    corr = panel.correlation()
+    assert corr.shape == (2, 2) and corr[0, 0] == pytest.approx(1.0)
+    assert list(panel.to_dataframe().columns) == ["1001", "1002"]
+
+
+def test_calendar_index_includes_empty_slots():
+    frames = {
+        "A": _frame(["2024-11-05T09:00", "2024-11-05T09:30", "2024-11-05T15:30"], [10, 11, 12]),
+        "B": _frame(["2024-11-05T10:00"], [20]),
+    }
+    calendar = TradingCalendar(start_year=2024, end_year=2024)
+    panel = build_panel(frames, index_mode="calendar", duration="30m", calendar=calendar)
+    assert len(panel.time) == 11
+    # 大引けちょうどの足は最後の枠 (15:00) に入る
+    assert panel.positions["A"].tolist() == [0, 1, 10]
+    assert panel.row("A")[[2, 10]].tolist() == [11, 12]
+    assert panel.row("B")[2] == 20 and np.isnan(panel.row("B")[1])
+
+
+def test_panel_cache_round_trip_and_invalidation(tmp_path):
+    store = UnifiedCandleStore(bind=create_engine("sqlite://", poolclass=StaticPool))
+    for code, frame in _frames().items():
+        store.upsert(code, "1d", frame)
+    cache = PanelCache(store, root=tmp_path)
+
+    first = cache.load(["1001", "1002"], "1d")
+    again = cache.load(["1001", "1002"], "1d")
+    assert (cache.misses, cache.hits) == (1, 1)
+    np.testing.assert_array_equal(first.close, again.close)
+    assert again.positions["1002"].tolist() == [1, 3]
+    assert again.fill == "ffill"
+
+    store.upsert("1002", "1d", _frame(["2024-01-11"], [56]))
+    updated = cache.load(["1001", "1002"], "1d")
+    assert cache.misses == 2
+    assert updated.row("1002")[-1] == 56
+    assert len(list(cache.path_for(["1001", "1002"], "1d").parent.glob("*.npz"))) == 1
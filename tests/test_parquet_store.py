@@ -0,0 +1,61 @@
+"""年ごとの Parquet ローソク足ストアのテスト。"""
+
+from datetime import datetime
+
+import numpy as np
+import pytest
+
+pytest.importorskip("pyarrow")
+
+from conftest import make_frame
+
+from app.data.candle_store import copy_candle_store, get_candle_store
+from app.data.parquet_store import ParquetCandleStore
+
+
+def test_upsert_partitions_by_year_and_counts(tmp_path):
+    store = ParquetCandleStore(tmp_path, row_group_size=2)
+    times = [datetime(2023, 12, 29), datetime(2024, 1, 4), datetime(2024, 1, 5)]
+
+    stats = store.upsert("7203", "1d", make_frame([1.0, 2.0, 3.0], times=times))
+    assert stats == {"inserted": 3, "updated": 0, "skipped": 0}
+    assert sorted(p.name for p in store.series_dir("7203", "1d").iterdir()) == ["2023.parquet", "2024.parquet"]
+
+    stats = store.upsert("7203", "1d", make_frame([3.5, 4.0], times=[datetime(2024, 1, 5), datetime(2024, 1, 9)]))
+    assert stats == {"inserted": 1, "updated": 1, "skipped": 0}
+    stats = store.upsert("7203", "1d", make_frame([9.0], times=[datetime(2024, 1, 5)]), on_conflict="ignore")
+    assert stats == {"inserted": 0, "updated": 0, "skipped": 1}
+
+    assert store.latest_time("7203", "1d") == datetime(2024, 1, 9)
+    assert store.latest_time("6758", "1d") is None
+    assert store.load("7203", "1d").close.tolist() == [1.0, 2.0, 3.5, 4.0]
+
+
+def test_load_pushes_down_time_range_and_limit(tmp_path):
+    store = ParquetCandleStore(tmp_path, row_group_size=3)
+    times = np.arange("2022-12-25", "2024-01-10", dtype="datetime64[D]")
+    store.upsert("^N225", "1d", make_frame(np.arange(len(times), dtype=float).tolist(), times=times))
+
+    frame = store.load("^N225", "1d", start=datetime(2023, 12, 30), end=datetime(2024, 1, 2))
+    assert frame.python_times() == [
+        datetime(2023, 12, 30),
+        datetime(2023, 12, 31),
+        datetime(2024, 1, 1),
+        datetime(2024, 1, 2),
+    ]
+
+    arrays = store.load_arrays("^N225", "1d", limit=3)
+    assert isinstance(arrays["close"], np.ndarray)
+    assert arrays["time"][-1] == np.datetime64("2024-01-09")
+    assert len(arrays["time"]) == 3
+    assert store.list_codes("1d") == ["^N225"]
+
+
+def test_copy_candle_store_is_incremental(tmp_path):
+    src = ParquetCandleStore(tmp_path / "src")
+    src.upsert("7203", "1d", make_frame([1.0, 2.0], times=[datetime(2024, 1, 4), datetime(2024, 1, 5)]))
+    dst = get_candle_store("parquet", parquet_dir=tmp_path / "dst")
+
+    assert copy_candle_store(src, dst, ["1d", "1h"]) == {"series": 1, "rows": 2}
+    assert copy_candle_store(src, dst, ["1d"]) == {"series": 1, "rows": 0}
+    assert dst.load("7203", "1d").close.tolist() == [1.0, 2.0]
@@ -0,0 +1,66 @@
+"""DataProvider の切り替えと replay / synthetic 取得元のテスト。"""
+
+from datetime import datetime
+
+import numpy as np
+import pytest
+
+from app.data import providers
+from app.data.candle_frame import CandleFrame
+from app.data.trading_calendar import get_calendar
+
+
+def _frame(n=30):
+    times = np.datetime64("2024-01-01") + np.arange(n).astype("timedelta64[D]")
+    closes = 100.0 + np.arange(n)
+    return CandleFrame(times, closes, closes + 1, closes - 1, closes, np.full(n, 1000), tz="Asia/Tokyo")
+
+
+def test_get_provider_by_name_and_unknown_name():
+    assert isinstance(providers.get_provider("synthetic"), providers.DataProvider)
+    assert providers.get_provider("replay", root="x").name == "replay"
+    with pytest.raises(ValueError):
+        providers.get_provider("bloomberg")
+
+
+def test_synthetic_provider_is_deterministic_per_symbol():
+    provider = providers.SyntheticProvider(seed=7, end=datetime(2025, 12, 30))
+
+    a = provider.fetch_frame("7203", period_days=60)
+    b = provider.fetch_frame("7203", period_days=60)
+    c = provider.fetch_frame("9984", period_days=60)
+
+    assert len(a) == len(get_calendar().trading_days_between("2025-10-31", "2025-12-30"))
+    np.testing.assert_array_equal(a.close, b.close)
+    assert not np.array_equal(a.close, c.close)
+    assert (a.high >= np.maximum(a.open, a.close)).all()
+    assert (a.low <= np.minimum(a.open, a.close)).all()
+
+
+def test_synthetic_intraday_bars_follow_jpx_sessions():
+    provider = providers.SyntheticProvider(seed=1, end=datetime(2025, 11, 4))
+
+    frame = provider.fetch_frame("7203", period_days=4, duration="1h")
+
+    # 11/1-11/3 は土日・文化の日なので 10/31 と 11/4 の立会時間だけ
+    days = np.unique(frame.time.astype("datetime64[D]"))
+    assert days.tolist() == [np.datetime64("2025-10-31"), np.datetime64("2025-11-04")]
+    _, slots = get_calendar().session_slots(frame.time, "1h")
+    assert (slots >= 0).all()
+    assert len(frame) == len(get_calendar().slot_start_times("2025-10-31", "2025-11-04", "1h"))
+
+
+def test_replay_provider_serves_recorded_csv_with_latency(tmp_path):
+    providers.save_replay_fixture(_frame(30), tmp_path, "7203", "1d")
+    delays = []
+    provider = providers.ReplayProvider(tmp_path, latency_sec=0.05, jitter_sec=0.01, sleep=delays.append)
+
+    frame = provider.fetch_frame("7203", period_days=9, duration="1d")
+    assert frame.close.tolist() == [120.0 + i for i in range(10)]
+    assert frame.time[-1] == np.datetime64("2024-01-30")
+
+    frames, failures = provider.fetch_frames(["7203", "9984"], period_days=9)
+    assert list(frames) == ["7203"]
+    assert failures == {"9984": "no_data"}
+    assert len(delays) == 3
+    assert all(0.05 <= d <= 0.06 for d in delays)
@@ -0,0 +1,102 @@
+"""トークンバケットと再試行ユーティリティのテスト。"""
+
+import pytest
+
+from app.data.rate_limit import TokenBucket, backoff_delay, call_with_retry
+
+
+class _FakeClock:
+    def __init__(self):
+        self.now = 0.0
+        self.sleeps = []
+
+    def __call__(self):
+        return self.now
+
+    def sleep(self, sec):
+        self.sleeps.append(sec)
+        self.now += sec
+
+
+def test_token_bucket_allows_burst_then_paces_to_rate():
+    clock = _FakeClock()
+    bucket = TokenBucket(rate=2.0, burst=3, clock=clock, sleep=clock.sleep)
+
+    for _ in range(3):
+        bucket.acquire()
+    assert clock.now == 0.0
+
+    for _ in range(4):
+        bucket.acquire()
+    # バースト消費後は 2件/秒 で払い出される
+    assert clock.now == pytest.approx(2.0)
+
+
+def test_token_bucket_unlimited_when_rate_is_zero():
+    clock = _FakeClock()
+    bucket = TokenBucket(rate=0, burst=1, clock=clock, sleep=clock.sleep)
+    for _ in range(100):
+        bucket.acquire()
+    assert clock.sleeps == []
+
+
+def test_backoff_delay_grows_exponentially_with_cap():
+    assert backoff_delay(1, base_delay=1.0, max_delay=30.0, rng=lambda: 1.0) == 1.0
+    assert backoff_delay(3, base_delay=1.0, max_delay=30.0, rng=lambda: 1.0) == 4.0
+    assert backoff_delay(10, base_delay=1.0, max_delay=30.0, rng=lambda: 1.0) == 30.0
+    assert backoff_delay(3, base_delay=1.0, max_delay=30.0, rng=lambda: 0.5) == 2.0
+
+
+def test_call_with_retry_retries_then_succeeds():
+    calls = []
+    sleeps = []
+
+    def flaky(x):
+        calls.append(x)
+        if len(calls) < 3:
+            raise ConnectionError("temporary")
+        return x * 2
+
+    out = call_with_retry(flaky, 21, max_retries=3, base_delay=1.0, sleep=sleeps.append, rng=lambda: 1.0)
+    assert out == 42
+    assert len(calls) == 3
+    assert sleeps == [1.0, 2.0]
+
+
+def test_call_with_retry_raises_after_max_retries():
+    def always_fail():
+        raise ConnectionError("down")
+
+    with pytest.raises(ConnectionError):
+        call_with_retry(always_fail, max_retries=2, sleep=lambda _: None)
+
+
+class _HTTPError(Exception):
+    def __init__(self, status):
+        super().__init__(f"HTTP {status}")
+        self.response = type("Response", (), {"status_code": status})()
+
+
+def test_call_with_retry_does_not_retry_permanent_errors_by_default():
+    calls = []
+
+    def bad_code():
+        calls.append(1)
+        raise ValueError("delisted")
+
+    with pytest.raises(ValueError):
+        call_with_retry(bad_code, max_retries=3, sleep=lambda _: None)
+    assert len(calls) == 1
+
+
+@pytest.mark.parametrize(("status", "expected_calls"), [(503, 3), (429, 3), (404, 1)])
+def test_call_with_retry_retries_only_429_and_5xx_responses(status, expected_calls):
+    calls = []
+
+    def fetch():
+        calls.append(1)
+        raise _HTTPError(status)
+
+    with pytest.raises(_HTTPError):
+        call_with_retry(fetch, max_retries=2, retry_on=(_HTTPError,), sleep=lambda _: None)
+    assert len(calls) == expected_calls
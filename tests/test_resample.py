@@ -0,0 +1,89 @@
+"""基準足からの時間軸変換 (東証のセッション境界に揃える) のテスト。"""
+
+import numpy as np
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.pool import StaticPool
+
+from app.data.candle_frame import CandleFrame
+from app.data.candle_store import UnifiedCandleStore
+from app.data.resample import (
+    ResampleCache,
+    check_resample,
+    derived_duration,
+    resample_frame,
+    session_bucket_starts,
+)
+
+
+def _minute_bars(day: str, start: str, end: str, price0: float = 100.0) -> CandleFrame:
+    times = np.arange(np.datetime64(f"{day}T{start}"), np.datetime64(f"{day}T{end}"), np.timedelta64(1, "m"))
+    n = len(times)
+    close = price0 + np.arange(n, dtype=float)
+    return CandleFrame(
+        time=times, open=close - 0.5, high=close + 1, low=close - 1, close=close, volume=np.ones(n, dtype=np.int64)
+    )
+
+
+def _concat(*frames: CandleFrame) -> CandleFrame:
+    return CandleFrame(**{k: np.concatenate([f.arrays()[k] for f in frames]) for k in frames[0].arrays()})
+
+
+def _session_day(day: str, price0: float = 100.0) -> CandleFrame:
+    return _concat(_minute_bars(day, "09:00", "11:31", price0), _minute_bars(day, "12:30", "15:31", price0 + 1000))
+
+
+def test_hourly_buckets_restart_at_afternoon_open():
+    frame = resample_frame(_session_day("2024-01-04"), "1h")
+
+    assert [str(t)[11:16] for t in frame.time.astype("datetime64[m]")] == [
+        "09:00",
+        "10:00",
+        "11:00",
+        "12:30",
+        "13:30",
+        "14:30",
+    ]
+    # 11:00 の足は 11:30 の引けの足まで含む(31本)、後場最後の足は 15:30 まで(61本)
+    assert frame.volume.tolist() == [60, 60, 31, 60, 60, 61]
+    assert frame.open[0] == 99.5
+    assert frame.close[2] == 100.0 + 150
+    assert frame.high[3] == 1100.0 + 59 + 1
+
+
+def test_daily_and_minute_multiples():
+    bars = _concat(_session_day("2024-01-04"), _session_day("2024-01-05"))
+    daily = resample_frame(bars, "1d")
+    assert daily.time.tolist() == np.array(["2024-01-04", "2024-01-05"], dtype="datetime64[ns]").tolist()
+    assert daily.volume.tolist() == [332, 332]
+
+    starts = session_bucket_starts(np.array(["2024-01-04T12:44"], dtype="datetime64[ns]"), "15m")
+    assert starts[0] == np.datetime64("2024-01-04T12:30")
+
+
+def test_check_resample_rejects_non_multiples():
+    check_resample("1m", "15m")
+    check_resample("5s", "1d")
+    with pytest.raises(ValueError):
+        check_resample("5m", "7m")
+    with pytest.raises(ValueError):
+        check_resample("1m", "2d")
+    with pytest.raises(ValueError):
+        check_resample("1m", "abc")
+
+
+def test_resample_cache_updates_incrementally():
+    bind = create_engine("sqlite://", poolclass=StaticPool)
+    source = UnifiedCandleStore(bind=bind)
+    cache = ResampleCache(source, source, base_duration="1m")
+
+    source.upsert("7203", "1m", _minute_bars("2024-01-04", "09:00", "09:20"))
+    assert cache.refresh("7203", "15m") == 2
+    first = cache.load("7203", "15m", refresh=False)
+    assert first.volume.tolist() == [15, 5]
+
+    # 新しい基準足が届くと未完成だった 09:15 の足を更新し、09:30 の足を追加する
+    source.upsert("7203", "1m", _minute_bars("2024-01-04", "09:20", "09:35", price0=200.0))
+    frame = cache.load("7203", "15m")
+    assert frame.volume.tolist() == [15, 15, 5]
+    assert source.list_codes(derived_duration("15m", "1m")) == ["7203"]
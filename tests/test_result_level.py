@@ -0,0 +1,49 @@
+"""result_level による実行結果の絞り込みのテスト。"""
+
+import pytest
+
+from app.strategy.results import run_strategy, shape_results
+
+FULL = {
+    "metrics": {"total_profit": 1.0},
+    "total_trades": 2,
+    "risk_management_stats": {"return_percent": 0.5},
+    "trades": [{"profit": 1.0}],
+    "signals": [{"type": "BUY"}],
+    "plots": {"fast": {}},
+    "ohlcv": {"close": [1.0]},
+}
+
+
+class _Engine:
+    def __init__(self):
+        self.calls = []
+
+    def run(self, strategy_fn, params=None):
+        self.calls.append(params)
+        return dict(FULL)
+
+
+class _LeanEngine(_Engine):
+    def run(self, strategy_fn, params=None, result_level="full"):
+        self.calls.append(result_level)
+        return dict(FULL)
+
+
+def test_shape_results_keeps_only_requested_keys():
+    assert set(shape_results(FULL, "metrics")) == {"metrics", "total_trades", "risk_management_stats"}
+    assert set(shape_results(FULL, "trades")) == {"metrics", "total_trades", "risk_management_stats", "trades"}
+    assert shape_results(FULL, "full") is FULL
+    assert shape_results({"error": "no_candles"}, "metrics") == {"error": "no_candles"}
+    with pytest.raises(ValueError):
+        shape_results(FULL, "plots")
+
+
+def test_run_strategy_passes_result_level_when_engine_supports_it():
+    lean = _LeanEngine()
+    result = run_strategy(lean, lambda ctx: None, {"fast": 5}, result_level="metrics")
+    assert lean.calls == ["metrics"] and "plots" not in result
+
+    engine = _Engine()
+    result = run_strategy(engine, lambda ctx: None, {"fast": 5}, result_level="trades")
+    assert engine.calls == [{"fast": 5}] and result["trades"] == FULL["trades"] and "ohlcv" not in result
@@ -0,0 +1,94 @@
+"""再開用ジャーナルのテスト。"""
+
+import json
+
+from app.data.resume_journal import ResumeJournal, resolve_resume_path
+
+
+def test_journal_replays_events_into_sets(tmp_path):
+    path = tmp_path / "resume.jsonl"
+    with ResumeJournal(path) as journal:
+        journal.mark_failed("1301")
+        journal.mark_done("1332")
+        journal.mark_done("1301")
+        journal.mark_failed("1333")
+        # done 済みは失敗扱いに戻らない
+        journal.mark_failed("1332")
+
+    reloaded = ResumeJournal(path)
+    assert reloaded.done == {"1301", "1332"}
+    assert reloaded.failed == {"1333"}
+    # 1イベント1行の追記
+    assert len(path.read_text(encoding="utf-8").splitlines()) == 4
+
+
+def test_journal_ignores_torn_last_line(tmp_path):
+    path = tmp_path / "resume.jsonl"
+    with ResumeJournal(path) as journal:
+        journal.mark_done("1301")
+    with open(path, "a", encoding="utf-8") as fh:
+        fh.write('{"k": "1332", "s": "do')
+
+    reloaded = ResumeJournal(path)
+    assert reloaded.done == {"1301"}
+
+
+def test_journal_compacts_when_log_outgrows_state(tmp_path):
+    path = tmp_path / "resume.jsonl"
+    with ResumeJournal(path, compact_min_lines=4) as journal:
+        for _ in range(5):
+            journal.mark_failed("1301")
+            journal.mark_done("1332")
+
+    lines = path.read_text(encoding="utf-8").splitlines()
+    assert len(lines) <= 4
+    reloaded = ResumeJournal(path)
+    assert reloaded.done == {"1332"}
+    assert reloaded.failed == {"1301"}
+
+
+def test_journal_migrates_legacy_json_snapshot(tmp_path):
+    path = tmp_path / "resume.json"
+    path.write_text(
+        json.dumps({"done": ["1301", "1332"], "failed": ["1332", "1333"], "updated_at_epoch": 0}, indent=2),
+        encoding="utf-8",
+    )
+
+    journal = ResumeJournal(path)
+    assert journal.done == {"1301", "1332"}
+    assert journal.failed == {"1333"}
+
+    # 変換後は JSONL 形式で読み直せる
+    lines = [json.loads(line) for line in path.read_text(encoding="utf-8").splitlines()]
+    assert {line["k"] for line in lines} == {"1301", "1332", "1333"}
+
+
+def test_journal_repairs_torn_last_line_before_appending(tmp_path):
+    path = tmp_path / "resume.jsonl"
+    with ResumeJournal(path) as journal:
+        journal.mark_done("1301")
+    with open(path, "a", encoding="utf-8") as fh:
+        fh.write('{"k": "13')
+
+    with ResumeJournal(path) as journal:
+        journal.mark_done("7203")
+
+    assert path.read_text(encoding="utf-8").endswith("\n")
+    assert ResumeJournal(path).done == {"1301", "7203"}
+
+
+def test_resolve_resume_path_migrates_legacy_json(tmp_path):
+    path = tmp_path / "resume.jsonl"
+    assert resolve_resume_path(path) == path and not path.exists()
+
+    legacy = tmp_path / "resume.json"
+    legacy_text = json.dumps({"done": ["1301"], "failed": ["1332"]})
+    legacy.write_text(legacy_text, encoding="utf-8")
+    assert resolve_resume_path(path) == path
+    with ResumeJournal(path) as journal:
+        assert journal.done == {"1301"} and journal.failed == {"1332"}
+        journal.mark_done("7203")
+
+    # 追記は .jsonl にだけ行い、旧形式のファイルはそのまま残す
+    assert legacy.read_text(encoding="utf-8") == legacy_text
+    assert ResumeJournal(resolve_resume_path(path)).done == {"1301", "7203"}
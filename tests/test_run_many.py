@@ -0,0 +1,67 @@
+"""run_many(パラメータの組の一括実行)のテスト。"""
+
+import numpy as np
+import pytest
+
+from app.strategy.batch import best_trial, run_many
+
+
+class _Engine:
+    product_code = "TEST"
+
+    def __init__(self):
+        self.calls = []
+
+    def run(self, strategy_fn, params=None):
+        self.calls.append(params)
+        fast = params["fast"]
+        trades = 0 if fast == 3 else fast
+        return {
+            "metrics": {"total_profit": float(fast * 10), "sharpe_ratio": float(-fast), "total_trades": trades},
+            "total_trades": trades,
+            "risk_management_stats": {"return_percent": fast / 10},
+            "plots": {"fast": np.arange(3)},
+        }
+
+
+def _strategy(ctx, params):
+    return None
+
+
+def test_run_many_returns_one_row_per_trial():
+    engine = _Engine()
+    grid = [{"fast": 5}, {"fast": 3}, {"fast": 8}]
+    table = run_many(engine, _strategy, grid, objective="sharpe_ratio")
+
+    assert engine.calls == grid
+    assert table.index.tolist() == [0, 1, 2]
+    assert table["fast"].tolist() == [5, 3, 8]
+    assert table["return_percent"].tolist() == [0.5, 0.3, 0.8]
+    assert table["objective"].tolist() == [-5.0, -3.0, -8.0]
+    assert "plots" not in table.attrs
+    assert best_trial(table, "objective") == 1
+    assert best_trial(table[table["total_trades"] > 0], "total_profit", maximize=False) == 0
+
+
+def test_run_many_callable_objective_workers_and_records():
+    grid = [{"fast": n} for n in range(1, 9)]
+    table = run_many(_Engine(), _strategy, grid, objective=lambda m: m["total_profit"] / 2, workers=4)
+    assert table["objective"].tolist() == [n * 5.0 for n in range(1, 9)]
+
+    records = run_many(_Engine(), _strategy, grid[:2], as_records=True)
+    assert records.dtype.names[0] == "trial" and records["total_profit"].tolist() == [10.0, 20.0]
+
+
+def test_run_many_keeps_full_results_and_handles_empty_grid():
+    table = run_many(_Engine(), _strategy, [{"fast": 2}], result_level="full")
+    assert "plots" in table.attrs["results"][0]
+
+    empty = run_many(_Engine(), _strategy, [], objective="sharpe_ratio")
+    assert empty.empty and "objective" in empty and best_trial(empty) is None
+
+
+def test_run_many_rejects_params_named_like_result_columns():
+    engine = _Engine()
+    with pytest.raises(ValueError, match="win_rate"):
+        run_many(engine, _strategy, [{"fast": 5}, {"fast": 3, "win_rate": 0.5}])
+    assert engine.calls == []
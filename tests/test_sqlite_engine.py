@@ -0,0 +1,59 @@
+"""SQLite の PRAGMA 設定と読み取り専用エンジンのテスト。"""
+
+import sqlite3
+
+import pytest
+from sqlalchemy.exc import OperationalError
+
+from app.data import sqlite_engine
+from app.data.sqlite_engine import apply_pragmas, configure_sqlite_engine, create_sqlite_engine
+
+
+def test_write_engine_uses_wal_and_pragmas(tmp_path):
+    engine = create_sqlite_engine(tmp_path / "db.sql", pool_size=2)
+    with engine.connect() as conn:
+        assert conn.exec_driver_sql("PRAGMA journal_mode").scalar() == "wal"
+        assert conn.exec_driver_sql("PRAGMA synchronous").scalar() == 1  # NORMAL
+        assert conn.exec_driver_sql("PRAGMA busy_timeout").scalar() == 5000
+
+    # 2回目の設定は listener を重複登録しない
+    assert configure_sqlite_engine(engine) is engine
+
+
+def test_read_only_engine_reads_while_rejecting_writes(tmp_path):
+    db_path = tmp_path / "db.sql"
+    writer = create_sqlite_engine(db_path, pool_size=1)
+    with writer.begin() as conn:
+        conn.exec_driver_sql("CREATE TABLE t (x INTEGER)")
+        conn.exec_driver_sql("INSERT INTO t VALUES (1)")
+
+    reader = create_sqlite_engine(db_path, read_only=True, pool_size=2)
+    with reader.connect() as conn:
+        assert conn.exec_driver_sql("SELECT x FROM t").scalar() == 1
+        with pytest.raises(OperationalError):
+            conn.exec_driver_sql("INSERT INTO t VALUES (2)")
+
+
+def test_apply_pragmas_on_plain_sqlite3_connection(tmp_path):
+    con = sqlite3.connect(tmp_path / "db.sql")
+    apply_pragmas(con, {"journal_mode": "WAL", "cache_size": -2048})
+    assert con.execute("PRAGMA journal_mode").fetchone()[0] == "wal"
+    assert con.execute("PRAGMA cache_size").fetchone()[0] == -2048
+    con.close()
+
+
+def test_read_engine_falls_back_until_the_db_file_exists(tmp_path, monkeypatch):
+    from app.models.base import engine as shared_engine
+
+    db_path = tmp_path / "stockdata.sql"
+    monkeypatch.setattr(sqlite_engine, "configured_db_path", lambda: db_path)
+    monkeypatch.setattr(sqlite_engine, "_read_engine", None)
+
+    # mode=ro ではファイルを作れないので、共有の書き込み用エンジンを返し読み取り専用プールは作らない
+    assert sqlite_engine.get_read_engine() is shared_engine
+    assert sqlite_engine._read_engine is None
+
+    sqlite3.connect(db_path).close()
+    reader = sqlite_engine.get_read_engine()
+    assert reader is not shared_engine and reader.url.database.endswith("stockdata.sql")
+    assert sqlite_engine.get_read_engine() is reader
@@ -0,0 +1,109 @@
+"""圧縮アーカイブ (呼値単位の int32 + ブロック圧縮) のテスト。"""
+
+from datetime import datetime
+
+import numpy as np
+import pytest
+
+from app.data.candle_frame import CandleFrame
+from app.data.candle_store import get_candle_store
+from app.data.tick_archive import (
+    PRICE_FLOAT,
+    PRICE_TICKS,
+    ArchiveCandleStore,
+    TieredCandleStore,
+    decode_block,
+    encode_block,
+    encode_prices,
+    split_blocks,
+)
+
+
+def _minute_frame(day: str, closes, start: str = "09:00"):
+    closes = np.asarray(closes, dtype=float)
+    times = np.datetime64(f"{day}T{start}") + np.arange(len(closes)).astype("timedelta64[m]")
+    return CandleFrame(
+        time=times,
+        open=closes - 5,
+        high=closes + 10,
+        low=closes - 10,
+        close=closes,
+        volume=np.arange(len(closes)) * 100,
+    )
+
+
+def _assert_same(a: CandleFrame, b: CandleFrame):
+    for name, values in a.arrays().items():
+        np.testing.assert_array_equal(values, b.arrays()[name], err_msg=name)
+
+
+def test_prices_become_int32_ticks():
+    mode, decimals, tick, ticks = encode_prices(np.array([[2500.0, 2505.0], [2510.0, 2495.0]]))
+    assert (mode, decimals, tick) == (PRICE_TICKS, 0, 5)
+    assert ticks.dtype == np.int32 and ticks.tolist() == [[500, 501], [502, 499]]
+
+    mode, decimals, tick, _ = encode_prices(np.array([[1234.5, 1234.6]]))
+    assert (mode, decimals, tick) == (PRICE_TICKS, 1, 1)
+
+    assert encode_prices(np.array([[100.123456789]]))[0] == PRICE_FLOAT
+    assert encode_prices(np.array([[np.nan, 1.0]]))[0] == PRICE_FLOAT
+
+
+@pytest.mark.parametrize("codec", ["zlib", "lzma", "none"])
+def test_block_round_trip_is_exact(codec):
+    frame = _minute_frame("2024-01-04", 3000 + np.arange(300) * 0.5)
+    ((header, payload),) = split_blocks(encode_block(frame, codec))
+    assert header[0] == 300 and header[4] == PRICE_TICKS
+    _assert_same(frame, CandleFrame(**decode_block(header, payload)))
+
+
+def test_float_fallback_round_trip():
+    frame = _minute_frame("2024-01-04", [101.37 / 3, np.nan, 99.5])
+    ((header, payload),) = split_blocks(encode_block(frame))
+    assert header[4] == PRICE_FLOAT
+    _assert_same(frame, CandleFrame(**decode_block(header, payload)))
+
+
+def test_compresses_below_float_columns():
+    frame = _minute_frame("2024-01-04", 2000 + np.cumsum(np.random.default_rng(0).integers(-2, 3, 330)))
+    assert len(encode_block(frame)) < len(frame) * 48 / 3
+
+
+def test_store_upsert_load_and_stats(tmp_path):
+    store = ArchiveCandleStore(tmp_path)
+    day1 = _minute_frame("2024-01-04", [100, 101, 102])
+    day2 = _minute_frame("2024-01-05", [103, 104])
+    both = CandleFrame(**{k: np.concatenate([day1.arrays()[k], day2.arrays()[k]]) for k in day1.arrays()})
+    assert store.upsert("7203", "1m", both) == {"inserted": 5, "updated": 0, "skipped": 0}
+    assert store.stats("7203", "1m") == (5, datetime(2024, 1, 5, 9, 1))
+    assert store.list_codes("1m") == ["7203"]
+
+    changed = _minute_frame("2024-01-05", [200], start="09:01")
+    assert store.upsert("7203", "1m", changed) == {"inserted": 0, "updated": 1, "skipped": 0}
+    assert store.load("7203", "1m").close.tolist() == [100, 101, 102, 103, 200]
+
+    ranged = store.load("7203", "1m", start=datetime(2024, 1, 4, 9, 1), end=datetime(2024, 1, 5, 9, 0))
+    assert ranged.close.tolist() == [101, 102, 103]
+    assert store.load("7203", "1m", limit=2).close.tolist() == [103, 200]
+
+
+def test_tiered_store_prefers_hot_rows(tmp_path):
+    cold = ArchiveCandleStore(tmp_path / "cold", codec="lzma")
+    hot = ArchiveCandleStore(tmp_path / "hot")
+    cold.upsert("7203", "1m", _minute_frame("2024-01-04", [100, 101, 102]))
+    hot.upsert("7203", "1m", _minute_frame("2024-01-04", [500, 501], start="09:02"))
+
+    tiered = TieredCandleStore(hot, cold)
+    assert tiered.load("7203", "1m").close.tolist() == [100, 101, 500, 501]
+    assert tiered.latest_time("7203", "1m") == datetime(2024, 1, 4, 9, 3)
+    assert tiered.load("7203", "1m", limit=3).close.tolist() == [101, 500, 501]
+
+    tiered.upsert("7203", "1m", _minute_frame("2024-01-05", [600]))
+    assert hot.stats("7203", "1m")[0] == 3 and cold.stats("7203", "1m")[0] == 3
+
+
+def test_cold_archive_dir_wraps_the_layout_store(tmp_path):
+    store = get_candle_store("archive", archive_dir=tmp_path / "hot", cold_archive_dir=tmp_path / "cold")
+    assert isinstance(store, TieredCandleStore)
+    assert store.layout == "archive+archive"
+    assert not isinstance(get_candle_store("archive", archive_dir=tmp_path / "hot"), TieredCandleStore)
@@ -0,0 +1,86 @@
+"""東証の取引日・立会時間カレンダーのテスト。"""
+
+from datetime import date
+
+import numpy as np
+
+from app.data.trading_calendar import TradingCalendar, duration_to_timedelta, japanese_holidays, jpx_closed_days
+
+
+def _cal() -> TradingCalendar:
+    return TradingCalendar(start_year=2019, end_year=2025)
+
+
+def test_year_end_and_holidays_are_closed():
+    cal = _cal()
+    closed = ["2024-01-01", "2024-01-02", "2024-01-03", "2024-01-08", "2023-12-31", "2020-10-01"]
+    assert not cal.is_trading_day(np.array(closed, dtype="datetime64[D]")).any()
+    assert cal.is_trading_day(np.array(["2024-01-04", "2024-01-09"], dtype="datetime64[D]")).all()
+
+
+def test_substitute_and_citizens_holidays():
+    assert date(2021, 8, 9) in japanese_holidays(2021)  # 山の日 (8/8 日曜) の振替休日
+    holidays_2019 = japanese_holidays(2019)
+    assert date(2019, 4, 30) in holidays_2019 and date(2019, 5, 2) in holidays_2019
+    assert date(2019, 5, 6) in holidays_2019  # こどもの日 (日曜) の振替休日
+    assert date(2025, 12, 31) in jpx_closed_days(2025)
+
+
+def test_next_and_previous_trading_day():
+    cal = _cal()
+    assert cal.next_trading_day("2023-12-29") == np.datetime64("2024-01-04")
+    assert cal.previous_trading_day("2024-01-04") == np.datetime64("2023-12-29")
+    assert len(cal.trading_days_between("2024-01-01", "2024-01-12")) == 6
+
+
+def test_slots_per_day_follows_close_extension():
+    cal = _cal()
+    counts = cal.slots_per_day("1m")[cal.day_index(np.array(["2024-11-01", "2024-11-05"], dtype="datetime64[D]"))]
+    assert counts.tolist() == [300, 330]
+    assert cal.slots_per_day("1h")[cal.day_index(np.array(["2024-11-05"], dtype="datetime64[D]"))].tolist() == [6]
+
+
+def test_session_slots_clip_close_and_skip_lunch():
+    cal = _cal()
+    times = np.array(
+        [
+            "2024-11-05T09:00",
+            "2024-11-05T11:29",
+            "2024-11-05T11:30",
+            "2024-11-05T12:00",
+            "2024-11-05T12:30",
+            "2024-11-05T15:30",
+        ],
+        dtype="datetime64[ns]",
+    )
+    day_idx, slot = cal.session_slots(times, "1m")
+    assert slot.tolist() == [0, 149, 149, -1, 150, 329]
+    assert day_idx[3] == -1 and (day_idx[[0, 1, 2, 4, 5]] == cal.day_index(times[:1])[0]).all()
+
+    _, hourly = cal.session_slots(times, duration_to_timedelta("1h"))
+    assert hourly.tolist() == [0, 2, 2, -1, 3, 5]
+
+
+def test_bar_index_is_continuous_across_days():
+    cal = _cal()
+    times = np.array(["2024-11-05T15:29", "2024-11-06T09:00", "2024-11-09T10:00"], dtype="datetime64[ns]")
+    index = cal.bar_index(times, "1m")
+    assert index[1] == index[0] + 1
+    assert index[2] == -1  # 土曜
+
+
+def test_slot_start_times_and_missing_bars():
+    cal = _cal()
+    expected = cal.slot_start_times("2024-11-05", "2024-11-05", "30m")
+    assert len(expected) == 11
+    assert expected[5] == np.datetime64("2024-11-05T12:30")
+
+    present = np.delete(expected, [2, 7])
+    missing = cal.missing_bars(present, "30m")
+    assert missing.tolist() == expected[[2, 7]].tolist()
+
+
+def test_half_day_has_morning_session_only():
+    cal = TradingCalendar(start_year=2024, end_year=2024, half_days=["2024-12-30"])
+    counts = cal.slots_per_day("1m")[cal.day_index(np.array(["2024-12-30"], dtype="datetime64[D]"))]
+    assert counts.tolist() == [150]
@@ -0,0 +1,83 @@
+"""JPX上場銘柄ユニバースキャッシュのテスト。"""
+
+import pandas as pd
+import pytest
+
+from app.data import universe
+
+
+def _jpx_sheet() -> pd.DataFrame:
+    return pd.DataFrame(
+        {
+            "日付": ["20260930"] * 5,
+            "コード": ["1301", "7203", "7203", "9984", "1306"],
+            "銘柄名": ["極洋", "トヨタ自動車", "トヨタ自動車", "ソフトバンクグループ", "NEXT FUNDS TOPIX"],
+            "市場・商品区分": [
+                "プライム（内国株式）",
+                "プライム（内国株式）",
+                "プライム（内国株式）",
+                "プライム（内国株式）",
+                "ETF・ETN",
+            ],
+            "33業種コード": ["50", "3700", "3700", "5250", "-"],
+            "33業種区分": ["水産・農林業", "輸送用機器", "輸送用機器", "情報・通信業", "-"],
+        }
+    )
+
+
+def test_parse_jpx_listing_extracts_columns_and_dedupes():
+    df = universe.parse_jpx_listing(_jpx_sheet())
+
+    assert list(df.columns) == universe.UNIVERSE_COLUMNS
+    assert df["code"].tolist() == ["1301", "7203", "9984", "1306"]
+    assert df.loc[df["code"] == "7203", "sector33"].item() == "輸送用機器"
+
+
+def test_filter_universe_by_segment_alias_and_sector():
+    df = universe.parse_jpx_listing(_jpx_sheet())
+
+    prime = universe.filter_universe(df, markets=["prime"])
+    assert prime["code"].tolist() == ["1301", "7203", "9984"]
+
+    etf = universe.filter_universe(df, markets="etf")
+    assert etf["code"].tolist() == ["1306"]
+
+    # 区分名・コード・カンマ区切りのいずれでも指定できる
+    picked = universe.filter_universe(df, markets=["prime"], sectors=["輸送用機器,5250"])
+    assert picked["code"].tolist() == ["7203", "9984"]
+
+
+def test_load_universe_uses_cache_until_ttl_expires(tmp_path):
+    path = tmp_path / "universe.json.gz"
+    calls = []
+
+    def _downloader():
+        calls.append(1)
+        return universe.parse_jpx_listing(_jpx_sheet())
+
+    first = universe.load_universe(path=path, downloader=_downloader)
+    second = universe.load_universe(path=path, downloader=_downloader)
+    assert len(calls) == 1
+    assert second["code"].tolist() == first["code"].tolist()
+    assert second["market"].tolist() == first["market"].tolist()
+
+    universe.load_universe(path=path, downloader=_downloader, refresh=True)
+    assert len(calls) == 2
+
+    # 期限切れのキャッシュは再取得する
+    universe.load_universe(path=path, downloader=_downloader, max_age_days=0)
+    assert len(calls) == 3
+
+
+def test_load_universe_falls_back_to_stale_cache_when_refresh_fails(tmp_path):
+    path = tmp_path / "universe.json.gz"
+    universe.save_universe(universe.parse_jpx_listing(_jpx_sheet()), path)
+
+    def _offline():
+        raise OSError("network down")
+
+    df = universe.load_universe(path=path, downloader=_offline, refresh=True)
+    assert len(df) == 4
+
+    with pytest.raises(OSError):
+        universe.load_universe(path=tmp_path / "missing.json.gz", downloader=_offline)
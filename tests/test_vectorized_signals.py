@@ -0,0 +1,106 @@
+"""ベクトル化ストラテジーのシグナル変換のテスト。"""
+
+import types
+from datetime import datetime, timedelta
+
+import numpy as np
+import pytest
+from conftest import make_frame
+
+from app.strategy.vectorized import (
+    attach_engine_frame,
+    crossover,
+    crossunder,
+    engine_arrays,
+    is_vectorized_strategy,
+    position_events,
+    signals_from_arrays,
+    vectorized_signals,
+)
+
+
+def _times(n):
+    return [datetime(2024, 1, 1) + timedelta(days=i) for i in range(n)]
+
+
+def test_position_events_alternate_entries_and_exits():
+    entries = np.array([0, 1, 1, 0, 0, 1, 0, 1], dtype=bool)
+    exits = np.array([1, 0, 0, 1, 1, 0, 0, 1], dtype=bool)
+    # 先頭のエグジットはポジションなしなので無視、連続エントリーは最初だけ、同じ足の両方は無視
+    assert position_events(entries, exits).tolist() == [1, 3, 5]
+
+
+def test_crossover_and_crossunder_arrays():
+    fast = np.array([1.0, 1.0, 3.0, 3.0, 1.0])
+    slow = np.full(5, 2.0)
+    assert crossover(fast, slow).tolist() == [False, False, True, False, False]
+    assert crossunder(fast, slow).tolist() == [False, False, False, False, True]
+
+
+def test_signals_carry_price_time_and_per_entry_risk():
+    closes = np.array([100.0, 101.0, 102.0, 103.0, 104.0])
+    entries = np.array([0, 1, 0, 1, 0], dtype=bool)
+    exits = np.array([0, 0, 1, 0, 1], dtype=bool)
+    stop = np.array([np.nan, 95.0, np.nan, np.nan, np.nan])
+    signals = signals_from_arrays(
+        _times(5),
+        closes,
+        entries,
+        exits,
+        risk={"stop_loss": stop, "trailing_stop_pct": 4.0, "max_bars_hold": 3.0},
+        indicators={"ema": closes - 1},
+    )
+
+    assert [s["type"] for s in signals] == ["BUY", "SELL", "BUY", "SELL"]
+    assert [s["price"] for s in signals] == [101.0, 102.0, 103.0, 104.0]
+    assert signals[0]["time"] == datetime(2024, 1, 2)
+    assert signals[0]["indicators"] == {"ema": 100.0}
+    assert signals[0]["risk"]["stop_loss"] == 95.0
+    assert signals[0]["risk"]["trailing_stop_pct"] == 4.0
+    assert signals[0]["risk"]["max_bars_hold"] == 3
+    assert signals[2]["risk"]["stop_loss"] is None
+    assert "risk" not in signals[1]
+
+
+def test_short_direction_and_datetime64_times():
+    times = np.array(["2024-01-04T09:00", "2024-01-04T09:01", "2024-01-04T09:02"], dtype="datetime64[ns]")
+    signals = signals_from_arrays(times, [10, 11, 12], [1, 0, 0], [0, 0, 1], direction="short")
+    assert [s["type"] for s in signals] == ["SELL", "BUY"]
+    assert signals[1]["time"] == datetime(2024, 1, 4, 9, 2)
+
+
+def test_invalid_inputs_raise():
+    with pytest.raises(ValueError):
+        signals_from_arrays(_times(2), [1, 2], [1, 0], [0, 1], risk={"unknown": 1.0})
+    with pytest.raises(ValueError):
+        position_events([1, 0], [0, 1, 0])
+
+
+def test_vectorized_strategy_is_called_once():
+    calls = []
+
+    def strategy_vec(ctx, params):
+        calls.append(params)
+        fast = np.asarray(ctx["close"]) - params["offset"]
+        return {"entries": crossover(fast, np.full(len(fast), 100.0)), "exits": np.zeros(len(fast), dtype=bool)}
+
+    closes = np.array([99.0, 99.5, 102.0, 103.0])
+    signals = vectorized_signals(strategy_vec, {"close": closes}, _times(4), closes, {"offset": 1.0})
+    assert len(calls) == 1
+    assert [(s["type"], s["price"]) for s in signals] == [("BUY", 102.0)]
+    assert is_vectorized_strategy(strategy_vec)
+    assert not is_vectorized_strategy(lambda ctx, params: None)
+
+
+def test_attached_frame_is_reused_without_conversion():
+    frame = make_frame([1.0, 2.0, 3.0])
+    engine = types.SimpleNamespace(candles=frame.candles)
+
+    attach_engine_frame(engine, frame)
+    arrays, times = engine_arrays(engine)
+
+    assert arrays is frame
+    assert times == [c.time for c in engine.candles]
+    # candles が差し替えられたら作り直す
+    engine.candles = make_frame([4.0]).candles
+    assert engine_arrays(engine)[0] is not frame
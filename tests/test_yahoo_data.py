@@ -1,5 +1,6 @@
 from datetime import datetime
 
+import numpy as np
 import pandas as pd
 
 from app.data import yahoo
@@ -62,6 +63,53 @@ def test_get_historical_data_builds_candles_and_applies_1m_limit(monkeypatch):
     assert calls["end"] == "2024-01-10"
 
 
+def test_get_historical_frame_returns_column_arrays(monkeypatch):
+    class _FakeTicker:
+        def history(self, start, end, interval):
+            idx = pd.to_datetime(["2024-01-08 09:00", "2024-01-09 09:00"]).tz_localize("Asia/Tokyo")
+            return pd.DataFrame(
+                {
+                    "Open": [100, 101],
+                    "High": [102, 103],
+                    "Low": [99, 100],
+                    "Close": [101, 102],
+                    "Volume": [1000, 1200],
+                },
+                index=idx,
+            )
+
+    monkeypatch.setattr(yahoo, "datetime", _FixedDateTime)
+    monkeypatch.setattr(yahoo.yf, "Ticker", lambda _: _FakeTicker())
+
+    frame = yahoo.YahooFinanceClient.get_historical_frame("7203.T", period_days=30, interval="1d")
+
+    assert len(frame) == 2
+    assert frame.close.dtype == np.float64
+    assert frame.volume.tolist() == [1000, 1200]
+    # DBのDATETIMEと同じく取引所ローカルの壁時計時刻で保持する
+    assert str(frame.time[0]) == "2024-01-08T09:00:00.000000000"
+    assert frame.tz == "Asia/Tokyo"
+    # 旧来のリスト表現も引き続き利用できる
+    assert frame.candles[0].time.hour == 9
+    assert frame.candles[0].time.tzinfo is not None
+    assert frame[1].value["close"] == 102.0
+    assert frame.arrays()["close"] is frame.close
+
+
+def test_candle_frame_from_candles_round_trip():
+    candles = [
+        yahoo.YahooFinanceCandle(datetime(2024, 1, 1), 100, 101, 99, 100, 1000),
+        yahoo.YahooFinanceCandle(datetime(2024, 1, 2), 101, 102, 100, 101, 1200),
+    ]
+    frame = yahoo.CandleFrame.from_candles(candles)
+
+    assert frame.tz is None
+    assert [c.time for c in frame] == [datetime(2024, 1, 1), datetime(2024, 1, 2)]
+    assert len(frame[1:]) == 1
+    assert frame.to_dataframe()["open"].tolist() == [100.0, 101.0]
+    assert not yahoo.CandleFrame.empty()
+
+
 def test_get_historical_data_returns_empty_on_exception(monkeypatch):
     def _raise(_):
         raise RuntimeError("boom")
@@ -97,13 +145,14 @@ def test_fetch_yahoo_data_calls_client_methods(monkeypatch):
 
 
 def test_save_yahoo_data_to_db_returns_zero_when_no_candles(monkeypatch):
-    monkeypatch.setattr(yahoo, "fetch_yahoo_data", lambda *args, **kwargs: [])
+    monkeypatch.setattr(yahoo, "fetch_yahoo_frame", lambda *args, **kwargs: yahoo.CandleFrame.empty())
     assert yahoo.save_yahoo_data_to_db("1459") == 0
 
 
 def test_save_yahoo_data_to_db_returns_zero_when_class_not_found(monkeypatch):
     candle = yahoo.YahooFinanceCandle(datetime(2024, 1, 1), 100, 101, 99, 100, 1000)
-    monkeypatch.setattr(yahoo, "fetch_yahoo_data", lambda *args, **kwargs: [candle])
+    frame = yahoo.CandleFrame.from_candles([candle])
+    monkeypatch.setattr(yahoo, "fetch_yahoo_frame", lambda *args, **kwargs: frame)
     monkeypatch.setattr(yahoo, "factory_candle_class", lambda *args, **kwargs: None)
     assert yahoo.save_yahoo_data_to_db("1459", duration="unknown") == 0
 
@@ -113,7 +162,8 @@ def test_save_yahoo_data_to_db_counts_only_success(monkeypatch):
         yahoo.YahooFinanceCandle(datetime(2024, 1, 1), 100, 101, 99, 100, 1000),
         yahoo.YahooFinanceCandle(datetime(2024, 1, 2), 101, 102, 100, 101, 1200),
     ]
-    monkeypatch.setattr(yahoo, "fetch_yahoo_data", lambda *args, **kwargs: candles)
+    frame = yahoo.CandleFrame.from_candles(candles)
+    monkeypatch.setattr(yahoo, "fetch_yahoo_frame", lambda *args, **kwargs: frame)
 
     class _FakeCandleCls:
         calls = 0
@@ -125,5 +175,114 @@ def test_save_yahoo_data_to_db_counts_only_success(monkeypatch):
 
     monkeypatch.setattr(yahoo, "factory_candle_class", lambda *args, **kwargs: _FakeCandleCls)
 
-    saved = yahoo.save_yahoo_data_to_db("1459", duration="1d")
+    saved = yahoo.save_yahoo_data_to_db("1459", duration="1d", bulk=False)
+    assert saved == 1
+
+
+def test_save_yahoo_data_to_db_bulk_uses_upsert(monkeypatch):
+    candles = [
+        yahoo.YahooFinanceCandle(datetime(2024, 1, 1), 100, 101, 99, 100, 1000),
+        yahoo.YahooFinanceCandle(datetime(2024, 1, 2), 101, 102, 100, 101, 1200),
+    ]
+    frame = yahoo.CandleFrame.from_candles(candles)
+    monkeypatch.setattr(yahoo, "fetch_yahoo_frame", lambda *args, **kwargs: frame)
+
+    class _FakeCandleCls:
+        __tablename__ = "CANDLE_1459_1D"
+
+    called = {}
+
+    def _fake_upsert(table_name, frame_arg, on_conflict="update"):
+        called["args"] = (table_name, frame_arg, on_conflict)
+        return {"inserted": 1, "updated": 1, "skipped": 0}
+
+    monkeypatch.setattr(yahoo, "factory_candle_class", lambda *args, **kwargs: _FakeCandleCls)
+    monkeypatch.setattr(yahoo, "upsert_candle_frame", _fake_upsert)
+
+    saved = yahoo.save_yahoo_data_to_db("1459", duration="1d", on_conflict="ignore")
+    assert saved == 2
+    assert called["args"] == ("CANDLE_1459_1D", frame, "ignore")
+
+
+def test_incremental_period_days_covers_gap_with_overlap():
+    now = datetime(2024, 1, 10, 12, 0)
+    assert yahoo.incremental_period_days(None, 365, now=now) == 365
+    assert yahoo.incremental_period_days(datetime(2024, 1, 9), 365, overlap_days=1, now=now) == 2
+    assert yahoo.incremental_period_days(datetime(2024, 1, 10, 9, 0), 365, overlap_days=0, now=now) == 1
+    # 保存済みが古すぎる場合は period_days が上限
+    assert yahoo.incremental_period_days(datetime(2020, 1, 1), 30, now=now) == 30
+
+
+def test_save_yahoo_data_to_db_incremental_writes_from_latest(monkeypatch):
+    candles = [
+        yahoo.YahooFinanceCandle(datetime(2024, 1, 8), 100, 101, 99, 100, 1000),
+        yahoo.YahooFinanceCandle(datetime(2024, 1, 9), 101, 102, 100, 101, 1200),
+        yahoo.YahooFinanceCandle(datetime(2024, 1, 10), 102, 103, 101, 102, 1300),
+    ]
+    frame = yahoo.CandleFrame.from_candles(candles)
+    called = {}
+
+    def _fake_fetch(product_code, period_days, duration, market, raise_errors=False):
+        called["period_days"] = period_days
+        return frame
+
+    class _FakeCandleCls:
+        __tablename__ = "CANDLE_1459_1D"
+
+    def _fake_upsert(table_name, frame_arg, on_conflict="update"):
+        called["times"] = [c.time for c in frame_arg]
+        return {"inserted": 1, "updated": 0, "skipped": 1}
+
+    monkeypatch.setattr(yahoo, "datetime", _FixedDateTime)
+    monkeypatch.setattr(yahoo, "fetch_yahoo_frame", _fake_fetch)
+    monkeypatch.setattr(yahoo, "factory_candle_class", lambda *args, **kwargs: _FakeCandleCls)
+    monkeypatch.setattr(yahoo, "latest_candle_time", lambda table_name: datetime(2024, 1, 9))
+    monkeypatch.setattr(yahoo, "upsert_candle_frame", _fake_upsert)
+
+    saved = yahoo.save_yahoo_data_to_db("1459", period_days=365, duration="1d", incremental=True)
+
     assert saved == 1
+    assert called["period_days"] == 2
+    # 最終足(1/9)の補修分と新規足のみ書き込む
+    assert called["times"] == [datetime(2024, 1, 9), datetime(2024, 1, 10)]
+
+
+def test_fetch_yahoo_frames_splits_wide_download_by_symbol(monkeypatch):
+    calls = []
+
+    def _fake_download(tickers, **kwargs):
+        calls.append(list(tickers))
+        idx = pd.to_datetime(["2024-01-08", "2024-01-09"])
+        data = {}
+        for ticker in tickers:
+            if ticker == "0000.T":
+                values = [np.nan, np.nan]
+                volume = [np.nan, np.nan]
+            else:
+                values = [100.0, 101.0]
+                volume = [1000, 1200]
+            for field in ["Open", "High", "Low", "Close"]:
+                data[(ticker, field)] = values
+            data[(ticker, "Volume")] = volume
+        return pd.DataFrame(data, index=idx)
+
+    monkeypatch.setattr(yahoo, "datetime", _FixedDateTime)
+    monkeypatch.setattr(yahoo.yf, "download", _fake_download)
+
+    frames, failures = yahoo.fetch_yahoo_frames(["7203", "9984", "0000"], period_days=30, chunk_size=2)
+
+    assert calls == [["7203.T", "9984.T"], ["0000.T"]]
+    assert sorted(frames) == ["7203", "9984"]
+    assert frames["7203"].close.tolist() == [100.0, 101.0]
+    assert failures == {"0000": "no_data"}
+
+
+def test_fetch_yahoo_frames_reports_chunk_errors(monkeypatch):
+    def _raise(tickers, **kwargs):
+        raise RuntimeError("boom")
+
+    monkeypatch.setattr(yahoo.yf, "download", _raise)
+
+    frames, failures = yahoo.fetch_yahoo_frames(["7203", "9984"], chunk_size=5)
+    assert frames == {}
+    assert failures == {"7203": "boom", "9984": "boom"}